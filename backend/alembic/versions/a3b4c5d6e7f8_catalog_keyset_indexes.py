@@ -0,0 +1,40 @@
+"""Keyset pagination indexes: products (created_at, id), companies (registration_date, id).
+
+Revision ID: a3b4c5d6e7f8
+Revises: f2a3b4c5d6e7
+Create Date: 2026-10-18
+"""
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "a3b4c5d6e7f8"
+down_revision = "f2a3b4c5d6e7"
+branch_labels = None
+depends_on = None
+
+
+def _index_exists(name: str) -> bool:
+	bind = op.get_bind()
+	rows = bind.execute(sa.text("SELECT 1 FROM pg_indexes WHERE indexname = :n"), {"n": name}).fetchone()
+	return rows is not None
+
+
+def upgrade() -> None:
+	if not _index_exists("ix_products_created_at_id"):
+		op.create_index("ix_products_created_at_id", "products", ["created_at", "id"])
+	if not _index_exists("ix_products_type_created_at_id"):
+		op.create_index("ix_products_type_created_at_id", "products", ["type", "created_at", "id"])
+	if not _index_exists("ix_companies_registration_date_id"):
+		op.create_index("ix_companies_registration_date_id", "companies", ["registration_date", "id"])
+
+
+def downgrade() -> None:
+	for name, table in (
+		("ix_companies_registration_date_id", "companies"),
+		("ix_products_type_created_at_id", "products"),
+		("ix_products_created_at_id", "products"),
+	):
+		if _index_exists(name):
+			op.drop_index(name, table_name=table)
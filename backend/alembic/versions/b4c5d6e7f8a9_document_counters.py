@@ -0,0 +1,67 @@
+"""Document number counters (company × type × year) and deal id sequence.
+
+Revision ID: b4c5d6e7f8a9
+Revises: a3b4c5d6e7f8
+Create Date: 2026-10-18
+"""
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "b4c5d6e7f8a9"
+down_revision = "a3b4c5d6e7f8"
+branch_labels = None
+depends_on = None
+
+# (doc_type, колонка номера, колонка компании, дата документа) — как считали номера до счётчиков
+_COUNTER_SOURCES = (
+	("buyer_order", "buyer_order_number", "buyer_company_id", "created_at"),
+	("seller_order", "seller_order_number", "seller_company_id", "created_at"),
+	("bill", "bill_number", "seller_company_id", "COALESCE(bill_date, created_at)"),
+	("contract", "contract_number", "seller_company_id", "COALESCE(contract_date, created_at)"),
+	("supply_contract", "supply_contracts_number", "seller_company_id", "COALESCE(supply_contracts_date, created_at)"),
+)
+
+
+def _table_exists(name: str) -> bool:
+	bind = op.get_bind()
+	return sa.inspect(bind).has_table(name)
+
+
+def upgrade() -> None:
+	if not _table_exists("document_counters"):
+		op.create_table(
+			"document_counters",
+			sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True, nullable=False),
+			sa.Column("company_id", sa.Integer(), nullable=False),
+			sa.Column("doc_type", sa.String(length=32), nullable=False),
+			sa.Column("year", sa.Integer(), nullable=False),
+			sa.Column("last_value", sa.Integer(), nullable=False, server_default="0"),
+			sa.UniqueConstraint("company_id", "doc_type", "year", name="uq_document_counters_company_type_year"),
+		)
+
+	# Счётчики продолжают уже выданные номера
+	for doc_type, number_col, company_col, date_expr in _COUNTER_SOURCES:
+		op.execute(
+			f"""
+			INSERT INTO document_counters (company_id, doc_type, year, last_value)
+			SELECT {company_col}, '{doc_type}', EXTRACT(YEAR FROM {date_expr})::int,
+				MAX(NULLIF(regexp_replace({number_col}, '\\D', '', 'g'), '')::int)
+			FROM orders
+			WHERE {number_col} IS NOT NULL
+			GROUP BY {company_col}, EXTRACT(YEAR FROM {date_expr})::int
+			HAVING MAX(NULLIF(regexp_replace({number_col}, '\\D', '', 'g'), '')::int) IS NOT NULL
+			ON CONFLICT (company_id, doc_type, year) DO UPDATE
+				SET last_value = GREATEST(document_counters.last_value, EXCLUDED.last_value)
+			"""
+		)
+
+	op.execute("CREATE SEQUENCE IF NOT EXISTS orders_deal_id_seq")
+	op.execute("SELECT setval('orders_deal_id_seq', COALESCE((SELECT MAX(id) FROM orders), 0) + 1, false)")
+
+
+def downgrade() -> None:
+	op.execute("DROP SEQUENCE IF EXISTS orders_deal_id_seq")
+	if _table_exists("document_counters"):
+		op.drop_table("document_counters")
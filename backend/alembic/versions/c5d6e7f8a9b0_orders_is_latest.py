@@ -0,0 +1,61 @@
+"""Orders: is_latest flag for the latest deal version and partial indexes for deal lists.
+
+Revision ID: c5d6e7f8a9b0
+Revises: b4c5d6e7f8a9
+Create Date: 2026-10-18
+"""
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "c5d6e7f8a9b0"
+down_revision = "b4c5d6e7f8a9"
+branch_labels = None
+depends_on = None
+
+# (имя индекса, колонки) — частичные индексы WHERE is_latest
+_LATEST_INDEXES = (
+	("ix_orders_buyer_latest", ["buyer_company_id", "updated_at", "id"]),
+	("ix_orders_seller_latest", ["seller_company_id", "updated_at", "id"]),
+	("ix_orders_id_latest", ["id"]),
+)
+
+
+def _column_exists(table: str, column: str) -> bool:
+	bind = op.get_bind()
+	return any(c["name"] == column for c in sa.inspect(bind).get_columns(table))
+
+
+def upgrade() -> None:
+	if not _column_exists("orders", "is_latest"):
+		op.add_column(
+			"orders",
+			sa.Column("is_latest", sa.Boolean(), nullable=False, server_default=sa.true()),
+		)
+
+	# Latest — строка с максимальной version внутри сделки
+	op.execute(
+		"""
+		UPDATE orders AS o
+		SET is_latest = (o.version = latest.max_version)
+		FROM (SELECT id, MAX(version) AS max_version FROM orders GROUP BY id) AS latest
+		WHERE latest.id = o.id
+		"""
+	)
+
+	for name, columns in _LATEST_INDEXES:
+		op.create_index(
+			name,
+			"orders",
+			columns,
+			postgresql_where=sa.text("is_latest"),
+			if_not_exists=True,
+		)
+
+
+def downgrade() -> None:
+	for name, _ in reversed(_LATEST_INDEXES):
+		op.drop_index(name, table_name="orders", if_exists=True)
+	if _column_exists("orders", "is_latest"):
+		op.drop_column("orders", "is_latest")
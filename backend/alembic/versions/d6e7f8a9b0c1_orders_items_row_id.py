@@ -0,0 +1,48 @@
+"""Orders: items_row_id — deal versions share order_items copy-on-write instead of cloning them.
+
+Revision ID: d6e7f8a9b0c1
+Revises: c5d6e7f8a9b0
+Create Date: 2026-10-18
+"""
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "d6e7f8a9b0c1"
+down_revision = "c5d6e7f8a9b0"
+branch_labels = None
+depends_on = None
+
+
+def _column_exists(table: str, column: str) -> bool:
+	bind = op.get_bind()
+	return any(c["name"] == column for c in sa.inspect(bind).get_columns(table))
+
+
+def upgrade() -> None:
+	# Существующие версии остаются со своими позициями (NULL)
+	if not _column_exists("orders", "items_row_id"):
+		op.add_column("orders", sa.Column("items_row_id", sa.Integer(), nullable=True))
+	op.create_index("ix_orders_items_row_id", "orders", ["items_row_id"], if_not_exists=True)
+
+
+def downgrade() -> None:
+	# Вернуть версиям собственные копии общих позиций
+	op.execute(
+		"""
+		INSERT INTO order_items (
+			order_row_id, product_id, product_name, product_slug, product_description, product_article,
+			product_type, logo_url, quantity, unit_of_measurement, price, amount, position, created_at, updated_at
+		)
+		SELECT o.row_id, i.product_id, i.product_name, i.product_slug, i.product_description, i.product_article,
+			i.product_type, i.logo_url, i.quantity, i.unit_of_measurement, i.price, i.amount, i.position,
+			i.created_at, i.updated_at
+		FROM orders o
+		JOIN order_items i ON i.order_row_id = o.items_row_id
+		WHERE o.items_row_id IS NOT NULL
+		"""
+	)
+	op.drop_index("ix_orders_items_row_id", table_name="orders", if_exists=True)
+	if _column_exists("orders", "items_row_id"):
+		op.drop_column("orders", "items_row_id")
@@ -0,0 +1,31 @@
+"""Composite (chat_id, id) index for cursor-based chat history.
+
+Revision ID: e1f2a3b4c5d6
+Revises: d4e5f6a7b8c9
+Create Date: 2026-10-18
+"""
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "e1f2a3b4c5d6"
+down_revision = "d4e5f6a7b8c9"
+branch_labels = None
+depends_on = None
+
+
+def _index_exists(name: str) -> bool:
+	bind = op.get_bind()
+	rows = bind.execute(sa.text("SELECT 1 FROM pg_indexes WHERE indexname = :n"), {"n": name}).fetchone()
+	return rows is not None
+
+
+def upgrade() -> None:
+	if not _index_exists("ix_messages_chat_id_id"):
+		op.create_index("ix_messages_chat_id_id", "messages", ["chat_id", "id"])
+
+
+def downgrade() -> None:
+	if _index_exists("ix_messages_chat_id_id"):
+		op.drop_index("ix_messages_chat_id_id", table_name="messages")
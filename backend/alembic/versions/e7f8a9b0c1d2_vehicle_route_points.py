@@ -0,0 +1,129 @@
+"""Vehicle route points indexed by city/region for transport search; city coordinates.
+
+Revision ID: e7f8a9b0c1d2
+Revises: d6e7f8a9b0c1
+Create Date: 2026-10-18
+"""
+from __future__ import annotations
+
+import json
+import re
+from collections import defaultdict
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "e7f8a9b0c1d2"
+down_revision = "d6e7f8a9b0c1"
+branch_labels = None
+depends_on = None
+
+# Та же нормализация, что normalize() в app/api/common/services/gazetteer.py
+_SEPARATORS = re.compile(r"[\s\-–—.,()]+")
+
+
+def _normalize(value) -> str:
+	if not value:
+		return ""
+	return _SEPARATORS.sub(" ", str(value).lower().replace("ё", "е")).strip()
+
+
+def _table_exists(name: str) -> bool:
+	bind = op.get_bind()
+	return sa.inspect(bind).has_table(name)
+
+
+def _column_exists(table: str, column: str) -> bool:
+	bind = op.get_bind()
+	return any(c["name"] == column for c in sa.inspect(bind).get_columns(table))
+
+
+def _backfill() -> None:
+	"""Точки маршрутов существующих ТС (дальше их ведёт приложение и shipments.reindex_vehicle_routes)."""
+	bind = op.get_bind()
+	cities = defaultdict(list)
+	for city_id, name, region_id in bind.execute(sa.text("SELECT id, name, region_id FROM cities WHERE is_active")):
+		cities[_normalize(name)].append((city_id, region_id))
+	regions = defaultdict(list)
+	for region_id, name in bind.execute(sa.text("SELECT id, name FROM regions WHERE is_active")):
+		regions[_normalize(name)].append((None, region_id))
+
+	rows = []
+	for vehicle_id, from_locations, to_locations in bind.execute(
+		sa.text("SELECT id, from_locations, to_locations FROM company_vehicles")
+	):
+		for direction, locations in (("from", from_locations), ("to", to_locations)):
+			if isinstance(locations, str):
+				locations = json.loads(locations)
+			points = {}
+			for location in locations or []:
+				if not isinstance(location, dict):
+					continue
+				name_key = _normalize(location.get("name"))[:200]
+				if not name_key:
+					continue
+				for city_id, region_id in cities.get(name_key, []) + regions.get(name_key, []) or [(None, None)]:
+					points[(city_id, region_id, name_key)] = {
+						"vehicle_id": vehicle_id,
+						"direction": direction,
+						"name_key": name_key,
+						"city_id": city_id,
+						"region_id": region_id,
+					}
+			rows.extend(points.values())
+	if rows:
+		table = sa.table(
+			"company_vehicle_route_points",
+			sa.column("vehicle_id"),
+			sa.column("direction"),
+			sa.column("name_key"),
+			sa.column("city_id"),
+			sa.column("region_id"),
+		)
+		op.bulk_insert(table, rows)
+
+
+def upgrade() -> None:
+	if not _column_exists("cities", "latitude"):
+		op.add_column("cities", sa.Column("latitude", sa.Float(), nullable=True))
+	if not _column_exists("cities", "longitude"):
+		op.add_column("cities", sa.Column("longitude", sa.Float(), nullable=True))
+
+	if not _table_exists("company_vehicle_route_points"):
+		op.create_table(
+			"company_vehicle_route_points",
+			sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True, nullable=False),
+			sa.Column(
+				"vehicle_id", sa.Integer(), sa.ForeignKey("company_vehicles.id", ondelete="CASCADE"), nullable=False
+			),
+			sa.Column("direction", sa.String(length=4), nullable=False),
+			sa.Column("name_key", sa.String(length=200), nullable=False),
+			sa.Column("city_id", sa.Integer(), sa.ForeignKey("cities.id", ondelete="SET NULL"), nullable=True),
+			sa.Column("region_id", sa.Integer(), sa.ForeignKey("regions.id", ondelete="SET NULL"), nullable=True),
+		)
+		_backfill()
+	op.create_index(
+		"ix_company_vehicle_route_points_vehicle_id", "company_vehicle_route_points", ["vehicle_id"],
+		if_not_exists=True,
+	)
+	op.create_index(
+		"ix_vehicle_route_points_city", "company_vehicle_route_points", ["direction", "city_id", "vehicle_id"],
+		if_not_exists=True,
+	)
+	op.create_index(
+		"ix_vehicle_route_points_region", "company_vehicle_route_points", ["direction", "region_id", "vehicle_id"],
+		if_not_exists=True,
+	)
+	op.create_index(
+		"ix_vehicle_route_points_name", "company_vehicle_route_points", ["direction", "name_key", "vehicle_id"],
+		if_not_exists=True,
+	)
+
+
+def downgrade() -> None:
+	if _table_exists("company_vehicle_route_points"):
+		op.drop_table("company_vehicle_route_points")
+	if _column_exists("cities", "longitude"):
+		op.drop_column("cities", "longitude")
+	if _column_exists("cities", "latitude"):
+		op.drop_column("cities", "latitude")
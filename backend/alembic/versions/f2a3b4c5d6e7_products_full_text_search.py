@@ -0,0 +1,63 @@
+"""Full-text search index for products: generated tsvector + GIN, trigram index on article.
+
+Revision ID: f2a3b4c5d6e7
+Revises: e1f2a3b4c5d6
+Create Date: 2026-10-18
+"""
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "f2a3b4c5d6e7"
+down_revision = "e1f2a3b4c5d6"
+branch_labels = None
+depends_on = None
+
+# Название и артикул весят больше описания (вес A против B в ts_rank_cd)
+SEARCH_VECTOR_EXPRESSION = (
+	"setweight(to_tsvector('russian'::regconfig, coalesce(name, '')), 'A') || "
+	"setweight(to_tsvector('simple'::regconfig, coalesce(article, '')), 'A') || "
+	"setweight(to_tsvector('russian'::regconfig, coalesce(description, '')), 'B')"
+)
+
+
+def _index_exists(name: str) -> bool:
+	bind = op.get_bind()
+	rows = bind.execute(sa.text("SELECT 1 FROM pg_indexes WHERE indexname = :n"), {"n": name}).fetchone()
+	return rows is not None
+
+
+def _column_exists(table: str, column: str) -> bool:
+	bind = op.get_bind()
+	rows = bind.execute(
+		sa.text("SELECT 1 FROM information_schema.columns WHERE table_name = :t AND column_name = :c"),
+		{"t": table, "c": column},
+	).fetchone()
+	return rows is not None
+
+
+def upgrade() -> None:
+	op.execute(sa.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+	if not _column_exists("products", "search_vector"):
+		# Генерируемая колонка: БД сама пересчитывает её при INSERT/UPDATE товара
+		op.execute(
+			sa.text(
+				f"ALTER TABLE products ADD COLUMN search_vector tsvector "
+				f"GENERATED ALWAYS AS ({SEARCH_VECTOR_EXPRESSION}) STORED"
+			)
+		)
+	if not _index_exists("ix_products_search_vector"):
+		op.execute(sa.text("CREATE INDEX ix_products_search_vector ON products USING gin (search_vector)"))
+	if not _index_exists("ix_products_name_trgm"):
+		op.execute(sa.text("CREATE INDEX ix_products_name_trgm ON products USING gin (name gin_trgm_ops)"))
+	if not _index_exists("ix_products_article_trgm"):
+		op.execute(sa.text("CREATE INDEX ix_products_article_trgm ON products USING gin (article gin_trgm_ops)"))
+
+
+def downgrade() -> None:
+	for name in ("ix_products_article_trgm", "ix_products_search_vector"):
+		if _index_exists(name):
+			op.drop_index(name, table_name="products")
+	if _column_exists("products", "search_vector"):
+		op.drop_column("products", "search_vector")
@@ -0,0 +1,50 @@
+"""Shipment requests: at most one open (passive/active) request per client and carrier.
+
+Revision ID: f8a9b0c1d2e3
+Revises: e7f8a9b0c1d2
+Create Date: 2026-10-18
+"""
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "f8a9b0c1d2e3"
+down_revision = "e7f8a9b0c1d2"
+branch_labels = None
+depends_on = None
+
+_OPEN = "status IN ('passive', 'active')"
+
+
+def upgrade() -> None:
+	# Дубликаты открытых заявок: оставляем последнюю обновлённую, остальные закрываем
+	op.execute(
+		f"""
+		UPDATE shipment_requests SET status = 'expired'
+		WHERE {_OPEN} AND id NOT IN (
+			SELECT id FROM (
+				SELECT id, ROW_NUMBER() OVER (
+					PARTITION BY client_company_id, carrier_company_id
+					ORDER BY updated_at DESC, id DESC
+				) AS rn
+				FROM shipment_requests
+				WHERE {_OPEN}
+			) ranked
+			WHERE rn = 1
+		)
+		"""
+	)
+	op.create_index(
+		"uq_shipment_requests_open",
+		"shipment_requests",
+		["client_company_id", "carrier_company_id"],
+		unique=True,
+		postgresql_where=sa.text(_OPEN),
+		sqlite_where=sa.text(_OPEN),
+		if_not_exists=True,
+	)
+
+
+def downgrade() -> None:
+	op.drop_index("uq_shipment_requests_open", table_name="shipment_requests", if_exists=True)
@@ -3,9 +3,20 @@ from app.api.common.models.country import Country
 from app.api.common.models.federal_district import FederalDistrict
 from app.api.common.models.region import Region
 from app.api.common.models.city import City
+from app.api.common.services.gazetteer import invalidate_gazetteer
 
 
-class CountryAdmin(ModelView, model=Country):
+class GazetteerInvalidationMixin:
+    """Правки справочника из админки сразу сбрасывают автодополнение и деревья фильтра городов"""
+
+    async def after_model_change(self, data, model, is_created, request):
+        await invalidate_gazetteer()
+
+    async def after_model_delete(self, model, request):
+        await invalidate_gazetteer()
+
+
+class CountryAdmin(GazetteerInvalidationMixin, ModelView, model=Country):
     name = "Страна"
     name_plural = "Страны"
     icon = "fa-solid fa-globe"
@@ -21,7 +32,7 @@ class CountryAdmin(ModelView, model=Country):
     page_size_options = [10, 25, 50, 100]
 
 
-class FederalDistrictAdmin(ModelView, model=FederalDistrict):
+class FederalDistrictAdmin(GazetteerInvalidationMixin, ModelView, model=FederalDistrict):
     name = "Федеральный округ"
     name_plural = "Федеральные округа"
     icon = "fa-solid fa-map"
@@ -44,7 +55,7 @@ class FederalDistrictAdmin(ModelView, model=FederalDistrict):
     page_size_options = [10, 25, 50, 100]
 
 
-class RegionAdmin(ModelView, model=Region):
+class RegionAdmin(GazetteerInvalidationMixin, ModelView, model=Region):
     name = "Регион"
     name_plural = "Регионы"
     icon = "fa-solid fa-building"
@@ -67,7 +78,7 @@ class RegionAdmin(ModelView, model=Region):
     page_size_options = [10, 25, 50, 100]
 
 
-class CityAdmin(ModelView, model=City):
+class CityAdmin(GazetteerInvalidationMixin, ModelView, model=City):
     name = "Город"
     name_plural = "Города"
     icon = "fa-solid fa-city"
@@ -87,7 +98,8 @@ class CityAdmin(ModelView, model=City):
     ]
     form_columns = [
         City.name, City.country_id, City.region_id, City.federal_district_id,
-        City.population, City.is_million_city, City.is_regional_center, City.is_active
+        City.population, City.is_million_city, City.is_regional_center,
+        City.latitude, City.longitude, City.is_active
     ]
     page_size = 50
     page_size_options = [10, 25, 50, 100, 200]
@@ -139,6 +139,13 @@ class AuthService:
                 await self.db.refresh(user_to_update)
                 
                 logger.info(f"✅ Activated employee {employee.id} for user {user_to_update.id}, updated user data")
+                try:
+                    from app.api.chats.websocket_manager import chat_manager
+
+                    # Сменилась компания — presence-набор чатов перечитается при следующем ping
+                    await chat_manager.mark_presence_stale(user_to_update.id)
+                except Exception as e:
+                    logger.warning(f"Presence resync mark failed for user {user_to_update.id}: {e}")
                 logger.info(f"✅ Final user company_id: {user_to_update.company_id}, position: {user_to_update.position}")
             else:
                 logger.error(f"❌ User {updated_user.id} not found for update")
@@ -0,0 +1,288 @@
+"""
+Backplane для чата: рассылка WS-событий и присутствие между воркерами/контейнерами.
+
+Каждый воркер держит свои сокеты локально, а события чата публикует в общий канал.
+Остальные воркеры получают событие и доставляют его своим подключениям.
+"""
+import asyncio
+import json
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set
+
+from app_logging.logger import logger
+
+EventHandler = Callable[[dict], Awaitable[None]]
+LocalUsersProvider = Callable[[], Iterable[int]]
+
+
+def _default(obj):
+    isoformat = getattr(obj, "isoformat", None)
+    if isoformat is not None:
+        return isoformat()
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+
+class ChatBackplane:
+    """Backplane без межпроцессного обмена: только текущий воркер (поведение по умолчанию)."""
+
+    def __init__(self, worker_id: Optional[str] = None):
+        self.worker_id = worker_id or uuid.uuid4().hex
+
+    async def start(self, handler: EventHandler, local_users: LocalUsersProvider) -> None:
+        return None
+
+    async def stop(self) -> None:
+        return None
+
+    async def publish(self, event: dict) -> None:
+        return None
+
+    async def mark_online(self, user_id: int) -> None:
+        return None
+
+    async def mark_offline(self, user_id: int) -> None:
+        return None
+
+    async def online_user_ids(self, user_ids: Iterable[int]) -> Set[int]:
+        """Пользователи из user_ids, онлайн на других воркерах."""
+        return set()
+
+
+class InMemoryBackplaneHub:
+    """Общая «шина» для нескольких InMemoryBackplane в одном процессе (тесты, dev)."""
+
+    def __init__(self):
+        self.handlers: Dict[str, EventHandler] = {}
+        # {user_id: {worker_id}}
+        self.presence: Dict[int, Set[str]] = {}
+
+
+class InMemoryBackplane(ChatBackplane):
+    """Backplane поверх InMemoryBackplaneHub: эмулирует несколько воркеров без Redis."""
+
+    def __init__(self, hub: Optional[InMemoryBackplaneHub] = None, worker_id: Optional[str] = None):
+        super().__init__(worker_id)
+        self.hub = hub or InMemoryBackplaneHub()
+
+    async def start(self, handler: EventHandler, local_users: LocalUsersProvider) -> None:
+        self.hub.handlers[self.worker_id] = handler
+
+    async def stop(self) -> None:
+        self.hub.handlers.pop(self.worker_id, None)
+        for workers in self.hub.presence.values():
+            workers.discard(self.worker_id)
+
+    async def publish(self, event: dict) -> None:
+        # Сериализация как у Redis: получатели видят ровно то, что ушло бы по сети
+        payload = json.loads(json.dumps(event, default=_default))
+        for worker_id, handler in list(self.hub.handlers.items()):
+            if worker_id == self.worker_id:
+                continue
+            try:
+                await handler(payload)
+            except Exception as e:
+                logger.error("In-memory backplane handler error (worker %s): %s", worker_id, e)
+
+    async def mark_online(self, user_id: int) -> None:
+        self.hub.presence.setdefault(user_id, set()).add(self.worker_id)
+
+    async def mark_offline(self, user_id: int) -> None:
+        workers = self.hub.presence.get(user_id)
+        if workers is None:
+            return
+        workers.discard(self.worker_id)
+        if not workers:
+            self.hub.presence.pop(user_id, None)
+
+    async def online_user_ids(self, user_ids: Iterable[int]) -> Set[int]:
+        return {
+            user_id
+            for user_id in user_ids
+            if self.hub.presence.get(user_id, set()) - {self.worker_id}
+        }
+
+
+class RedisBackplane(ChatBackplane):
+    """
+    Redis pub/sub для событий + sorted set на пользователя для присутствия.
+
+    Присутствие: ZSET chat:presence:{user_id}, member = worker_id, score = время истечения.
+    Воркер периодически продлевает записи своих онлайн-пользователей; записи упавшего
+    воркера истекают сами через presence_ttl секунд.
+    """
+
+    CHANNEL = "chat:events"
+    PRESENCE_KEY = "chat:presence:{user_id}"
+
+    def __init__(
+        self,
+        worker_id: Optional[str] = None,
+        presence_ttl: int = 90,
+        redis_url: Optional[str] = None,
+    ):
+        super().__init__(worker_id)
+        self.presence_ttl = presence_ttl
+        self.redis_url = redis_url
+        self.client = None
+        self._handler: Optional[EventHandler] = None
+        self._local_users: Optional[LocalUsersProvider] = None
+        self._listener_task: Optional[asyncio.Task] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    def _presence_key(self, user_id: int) -> str:
+        return self.PRESENCE_KEY.format(user_id=user_id)
+
+    async def start(self, handler: EventHandler, local_users: LocalUsersProvider) -> None:
+        import redis.asyncio as redis
+
+        from app.core.config import settings
+
+        url = self.redis_url or f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}"
+        # Без socket_timeout: подписка висит на чтении сколько угодно долго
+        self.client = redis.from_url(
+            url,
+            encoding="utf-8",
+            decode_responses=True,
+            socket_connect_timeout=0.5,
+        )
+        self._handler = handler
+        self._local_users = local_users
+        self._listener_task = asyncio.create_task(self._listen())
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        logger.info("Chat Redis backplane started (worker %s)", self.worker_id)
+
+    async def stop(self) -> None:
+        for task in (self._listener_task, self._heartbeat_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._listener_task = None
+        self._heartbeat_task = None
+        if self.client is not None:
+            try:
+                for user_id in list(self._local_users() if self._local_users else []):
+                    await self.client.zrem(self._presence_key(user_id), self.worker_id)
+            except Exception:
+                pass
+            try:
+                await self.client.close()
+            except Exception:
+                pass
+            self.client = None
+
+    async def _listen(self) -> None:
+        backoff = 1.0
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(self.CHANNEL)
+                backoff = 1.0
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message is None or message.get("type") != "message":
+                        continue
+                    try:
+                        event = json.loads(message["data"])
+                    except (TypeError, ValueError):
+                        continue
+                    if event.get("origin") == self.worker_id:
+                        continue
+                    try:
+                        await self._handler(event)
+                    except Exception as e:
+                        logger.error("Chat backplane handler error: %s", e)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Chat backplane subscription lost: %s (retry in %.0fs)", e, backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+
+    async def _heartbeat(self) -> None:
+        interval = max(1.0, self.presence_ttl / 3)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                user_ids = list(self._local_users())
+                if not user_ids:
+                    continue
+                expires_at = time.time() + self.presence_ttl
+                pipe = self.client.pipeline(transaction=False)
+                for user_id in user_ids:
+                    key = self._presence_key(user_id)
+                    pipe.zadd(key, {self.worker_id: expires_at})
+                    pipe.expire(key, self.presence_ttl * 2)
+                await pipe.execute()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Chat presence heartbeat failed: %s", e)
+
+    async def publish(self, event: dict) -> None:
+        if self.client is None:
+            return
+        try:
+            payload = dict(event, origin=self.worker_id)
+            await self.client.publish(self.CHANNEL, json.dumps(payload, default=_default))
+        except Exception as e:
+            logger.warning("Chat backplane publish failed: %s", e)
+
+    async def mark_online(self, user_id: int) -> None:
+        if self.client is None:
+            return
+        key = self._presence_key(user_id)
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.zadd(key, {self.worker_id: time.time() + self.presence_ttl})
+            pipe.expire(key, self.presence_ttl * 2)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning("Chat presence mark_online failed for user %s: %s", user_id, e)
+
+    async def mark_offline(self, user_id: int) -> None:
+        if self.client is None:
+            return
+        try:
+            await self.client.zrem(self._presence_key(user_id), self.worker_id)
+        except Exception as e:
+            logger.warning("Chat presence mark_offline failed for user %s: %s", user_id, e)
+
+    async def online_user_ids(self, user_ids: Iterable[int]) -> Set[int]:
+        user_ids = list(user_ids)
+        if self.client is None or not user_ids:
+            return set()
+        now = time.time()
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for user_id in user_ids:
+                pipe.zrangebyscore(self._presence_key(user_id), now, "+inf")
+            results = await pipe.execute()
+        except Exception as e:
+            logger.warning("Chat presence lookup failed: %s", e)
+            return set()
+        return {
+            user_id
+            for user_id, workers in zip(user_ids, results)
+            if any(worker != self.worker_id for worker in workers or [])
+        }
+
+
+def create_backplane(kind: str, presence_ttl: int = 90) -> ChatBackplane:
+    """Backplane по настройке CHAT_BACKPLANE: redis | memory | local."""
+    kind = (kind or "local").strip().lower()
+    if kind == "redis":
+        return RedisBackplane(presence_ttl=presence_ttl)
+    if kind == "memory":
+        return InMemoryBackplane()
+    return ChatBackplane()
@@ -1,6 +1,6 @@
-from typing import List, Optional
+from typing import List, Optional, Set
 
-from sqlalchemy import and_, select, func
+from sqlalchemy import and_, or_, select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
@@ -40,6 +40,7 @@ class ChatRepository:
                 participant.user_id = user_id
                 await self.db.commit()
                 await self.db.refresh(participant)
+                await self._notify_participant_added(chat_id, company_id, user_id)
             return participant
 
         return await self.add_participant(chat_id, company_id, user_id, is_admin)
@@ -56,8 +57,20 @@ class ChatRepository:
         self.db.add(participant)
         await self.db.commit()
         await self.db.refresh(participant)
+        await self._notify_participant_added(chat_id, company_id, user_id)
         return participant
 
+    async def _notify_participant_added(self, chat_id: int, company_id: int, user_id: int) -> None:
+        """Обновить presence-наборы чатов онлайн-пользователей без перечитывания из БД."""
+        try:
+            from app.api.chats.websocket_manager import chat_manager
+
+            await chat_manager.on_participant_added(chat_id, company_id, user_id)
+        except Exception as exc:
+            from app_logging.logger import logger
+
+            logger.warning("Presence update failed for chat %s: %s", chat_id, exc)
+
     def _participant_options(self):
         return (
             joinedload(Chat.participants).joinedload(ChatParticipant.company),
@@ -97,6 +110,15 @@ class ChatRepository:
 
         return chats
 
+    async def get_user_chat_ids(self, user_id: int, company_id: Optional[int] = None) -> Set[int]:
+        """Только ID чатов пользователя/компании — без загрузки участников."""
+        condition = ChatParticipant.user_id == user_id
+        if company_id is not None:
+            condition = or_(condition, ChatParticipant.company_id == company_id)
+        stmt = select(ChatParticipant.chat_id).where(condition).distinct()
+        result = await self.db.execute(stmt)
+        return set(result.scalars().all())
+
     async def get_company_chats(self, company_id: int) -> List[Chat]:
         """Получает все чаты компании"""
         stmt = select(Chat).join(ChatParticipant).where(
@@ -1,17 +1,30 @@
 import json
-import os
 from datetime import datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, WebSocket, WebSocketDisconnect, Response
+from fastapi.responses import RedirectResponse, StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.authentication.dependencies import token_data_dep, current_user_dep
 from app.api.authentication.models import User
+from app.api.chats.repositories.chat_repository import ChatRepository
 from app.api.chats.schemas.chat import ChatCreate, ChatResponse, ChatListResponse
 from app.api.chats.schemas.chat_participant import ChatParticipantResponse
+from app.api.chats.services.attachments import (
+    AttachmentTooLargeError,
+    attachment_public_url,
+    is_s3_attachment,
+    s3_key_from_path,
+    store_chat_attachment,
+)
 from app.api.chats.services.chat_service import ChatService
+from app.api.chats.services.message_history import (
+    decode_history_cursor,
+    is_chat_member,
+    load_history_page,
+)
 from app.api.chats.websocket_manager import chat_manager
 from app.api.company.models.company import Company
 from app.api.messages.models.message import Message
@@ -107,6 +120,12 @@ async def get_user_chats(
     return chats
 
 
+@router.get("/ws/metrics", response_model=dict)
+async def get_websocket_metrics(token_data: token_data_dep):
+    """Метрики исходящих WS-очередей текущего воркера (глубина очередей, задержка отправки)."""
+    return chat_manager.metrics_snapshot()
+
+
 @router.get("/{chat_id}", response_model=ChatResponse)
 async def get_chat_by_id(
         chat_id: int,
@@ -200,7 +219,7 @@ async def get_chat_messages(
     stmt = select(Message).where(Message.chat_id == chat_id)
     if before_id is not None:
         stmt = stmt.where(Message.id < before_id)
-    stmt = stmt.order_by(Message.created_at.desc()).limit(limit)
+    stmt = stmt.order_by(Message.chat_id.desc(), Message.id.desc()).limit(limit)
     result = await db.execute(stmt)
     messages = list(reversed(result.scalars().all()))
     return [
@@ -210,7 +229,7 @@ async def get_chat_messages(
             "sender_company_id": m.sender_company_id,
             "sender_user_id": m.sender_user_id,
             "content": m.content,
-            "file_path": settings.public_file_url(m.file_path),
+            "file_path": attachment_public_url(m.file_path, m.chat_id, m.id),
             "file_name": m.file_name,
             "file_size": m.file_size,
             "file_type": m.file_type,
@@ -222,6 +241,31 @@ async def get_chat_messages(
     ]
 
 
+@router.get("/{chat_id}/history")
+async def get_chat_message_history(
+        chat_id: int,
+        db: async_db_dep,
+        current_user: current_user_dep,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+):
+    """
+    История сообщений с непрозрачным курсором (прокрутка вверх).
+    Ответ: {"items": [...от старых к новым...], "next_cursor": str | null, "has_more": bool}.
+    """
+    if not await is_chat_member(db, chat_id, current_user.id, current_user.company_id):
+        raise HTTPException(status_code=403, detail="Access denied: not a chat participant")
+    before_id = None
+    if cursor:
+        try:
+            before_id = decode_history_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    limit = min(max(1, limit), 200)
+    body = await load_history_page(db, chat_id, before_id, limit)
+    return Response(content=body, media_type="application/json")
+
+
 @router.get("/{chat_id}/files", response_model=List[dict])
 async def get_chat_files(
         chat_id: int,
@@ -238,7 +282,7 @@ async def get_chat_files(
         {
             "message_id": m.id,
             "name": m.file_name,
-            "url": m.file_path,
+            "url": attachment_public_url(m.file_path, chat_id, m.id) if is_s3_attachment(m.file_path) else m.file_path,
             "type": m.file_type,
             "size": m.file_size,
             "created_at": m.created_at,
@@ -247,6 +291,37 @@ async def get_chat_files(
     ]
 
 
+@router.get("/{chat_id}/files/{message_id}/download")
+async def download_chat_file(
+        chat_id: int,
+        message_id: int,
+        db: async_db_dep,
+        current_user: current_user_dep,
+):
+    """Скачать вложение сообщения: редирект на presigned URL (S3), поток из хранилища или /uploads/..."""
+    if not await is_chat_member(db, chat_id, current_user.id, current_user.company_id):
+        raise HTTPException(status_code=403, detail="Access denied: not a chat participant")
+    file_path = await db.scalar(
+        select(Message.file_path).where(Message.id == message_id, Message.chat_id == chat_id)
+    )
+    if not file_path:
+        raise HTTPException(status_code=404, detail="File not found")
+    if not is_s3_attachment(file_path):
+        return RedirectResponse(url=settings.public_file_url(file_path), status_code=307)
+    from app.core.storage import get_storage
+
+    storage = get_storage()
+    key = s3_key_from_path(file_path)
+    url = await storage.presigned_download_url(key)
+    if url is not None:
+        return RedirectResponse(url=url, status_code=307)
+    try:
+        obj = await storage.open(key)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+    return StreamingResponse(obj.chunks, media_type=obj.content_type or "application/octet-stream")
+
+
 @router.get("/{chat_id}/participants", response_model=List[ChatParticipantResponse])
 async def get_chat_participants(
         chat_id: int,
@@ -310,21 +385,17 @@ async def send_message(
     file_type = None
 
     if file:
-        # Создаем директорию для файлов, если её нет
-        upload_dir = "uploads/chat_files"
-        os.makedirs(upload_dir, exist_ok=True)
-
-        # Генерируем уникальное имя файла
+        # Имя для отображения; хранится файл под хэшем содержимого (дедупликация)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        file_extension = os.path.splitext(file.filename)[1] if file.filename else ""
         file_name = f"{timestamp}_{file.filename}" if file.filename else f"{timestamp}_file"
-        file_path = os.path.join(upload_dir, file_name)
 
-        # Сохраняем файл
-        with open(file_path, "wb") as buffer:
-            content_file = await file.read()
-            buffer.write(content_file)
-            file_size = len(content_file)
+        # Потоковая запись чанками с проверкой лимита, без блокировки event loop
+        try:
+            stored = await store_chat_attachment(file)
+        except AttachmentTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        file_path = stored.file_path
+        file_size = stored.file_size
 
         file_type = file.content_type or "application/octet-stream"
 
@@ -352,7 +423,7 @@ async def send_message(
         "sender_company_id": message.sender_company_id,
         "sender_user_id": message.sender_user_id,
         "content": message.content,
-        "file_path": settings.public_file_url(message.file_path),
+        "file_path": attachment_public_url(message.file_path, message.chat_id, message.id),
         "file_name": message.file_name,
         "file_size": message.file_size,
         "file_type": message.file_type,
@@ -384,6 +455,15 @@ async def send_message(
     return message_data
 
 
+async def _load_presence_chat_ids(user_id: int) -> tuple[set[int], Optional[int]]:
+    """ID чатов пользователя и его компания — лёгкий запрос без загрузки участников."""
+    async for db in get_async_db():
+        company_id = await db.scalar(select(User.company_id).where(User.id == user_id))
+        chat_ids = await ChatRepository(db).get_user_chat_ids(user_id, company_id)
+        return chat_ids, company_id
+    return set(), None
+
+
 @router.websocket("/presence/ws")
 async def presence_websocket_endpoint(websocket: WebSocket):
     """Глобальный WebSocket: пользователь онлайн на сайте (не только внутри чата)."""
@@ -401,16 +481,8 @@ async def presence_websocket_endpoint(websocket: WebSocket):
             await websocket.close(code=4001, reason="Invalid token")
             return
 
-        chat_ids: set[int] = set()
-        async for db in get_async_db():
-            chat_service = ChatService(db)
-            user = await db.get(User, user_id)
-            company_id = user.company_id if user else None
-            chats = await chat_service.get_user_chats(user_id, company_id)
-            chat_ids = {chat.id for chat in chats}
-            break
-
-        await chat_manager.connect_presence(websocket, user_id, chat_ids)
+        chat_ids, company_id = await _load_presence_chat_ids(user_id)
+        await chat_manager.connect_presence(websocket, user_id, chat_ids, company_id)
 
         while True:
             try:
@@ -418,16 +490,13 @@ async def presence_websocket_endpoint(websocket: WebSocket):
                 message_data = json.loads(data)
 
                 if message_data.get("type") == "ping":
-                    async for db in get_async_db():
-                        chat_service = ChatService(db)
-                        user = await db.get(User, user_id)
-                        company_id = user.company_id if user else None
-                        chats = await chat_service.get_user_chats(user_id, company_id)
-                        chat_manager.update_presence_chat_ids(
-                            user_id, {chat.id for chat in chats}
-                        )
-                        break
-                    await websocket.send_text(json.dumps({"type": "pong"}))
+                    # Набор чатов поддерживается событиями; БД — только как редкая сверка
+                    if chat_manager.presence_needs_resync(
+                        user_id, settings.CHAT_PRESENCE_RESYNC_SECONDS
+                    ):
+                        chat_ids, company_id = await _load_presence_chat_ids(user_id)
+                        chat_manager.update_presence_chat_ids(user_id, chat_ids, company_id)
+                    await chat_manager.send_personal_message({"type": "pong"}, websocket)
             except WebSocketDisconnect:
                 break
             except Exception as e:
@@ -438,7 +507,7 @@ async def presence_websocket_endpoint(websocket: WebSocket):
         logger.error("Presence WebSocket connection error: %s", e)
     finally:
         if user_id is not None:
-            chat_manager.disconnect_presence(user_id)
+            chat_manager.disconnect_presence(user_id, websocket)
 
 
 @router.websocket("/{chat_id}/ws")
@@ -489,8 +558,8 @@ async def websocket_endpoint(websocket: WebSocket, chat_id: int):
                     await chat_manager.send_typing_indicator(chat_id, user_id, is_typing)
 
                 elif message_type == "ping":
-                    # Отвечаем на ping
-                    await websocket.send_text(json.dumps({"type": "pong"}))
+                    # Отвечаем на ping (через очередь сокета, чтобы не конкурировать с рассылкой)
+                    await chat_manager.send_personal_message({"type": "pong"}, websocket)
 
             except WebSocketDisconnect:
                 break
@@ -503,7 +572,7 @@ async def websocket_endpoint(websocket: WebSocket, chat_id: int):
     finally:
         # Отключаем от чата
         if 'user_id' in locals() and 'chat_id' in locals():
-            chat_manager.disconnect(chat_id, user_id)
+            chat_manager.disconnect(chat_id, user_id, websocket)
 
 
 @router.get("/{chat_id}/online-status", response_model=dict)
@@ -518,7 +587,7 @@ async def get_chat_online_status(
 
     # Получаем список онлайн пользователей (presence на сайте или WS конкретного чата)
     participant_user_ids = {participant.user_id for participant in chat.participants}
-    online_user_ids = chat_manager.get_online_users_in_chat(chat_id, participant_user_ids)
+    online_user_ids = await chat_manager.get_online_users_in_chat(chat_id, participant_user_ids)
 
     # Формируем ответ с онлайн статусом для каждого участника
     participants_status = {}
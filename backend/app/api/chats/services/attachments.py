@@ -0,0 +1,130 @@
+"""
+Вложения чата: потоковая запись без блокировки event loop.
+
+Файл читается из UploadFile чанками, по ходу считается SHA-256 и проверяется лимит
+размера. Итоговое имя — хэш содержимого, поэтому один и тот же PDF, пересланный
+в много чатов, хранится один раз (локально или в S3).
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+import aiofiles
+from fastapi import UploadFile
+
+from app.core.config import settings
+from app_logging.logger import logger
+
+CHAT_FILES_DIR = "uploads/chat_files"
+S3_PATH_PREFIX = "s3://"
+CHUNK_SIZE = 1024 * 1024
+
+
+class AttachmentTooLargeError(ValueError):
+    pass
+
+
+@dataclass
+class StoredAttachment:
+    file_path: str
+    file_size: int
+    sha256: str
+
+
+def _safe_extension(filename: Optional[str]) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    if not ext or len(ext) > 16 or not ext[1:].isalnum():
+        return ""
+    return ext
+
+
+async def _stream_to_temp(upload: UploadFile, max_bytes: int) -> tuple[str, int, str]:
+    tmp_dir = os.path.join(CHAT_FILES_DIR, ".tmp")
+    await asyncio.to_thread(os.makedirs, tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as out:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise AttachmentTooLargeError(
+                        f"Файл больше допустимого размера ({max_bytes // (1024 * 1024)} МБ)"
+                    )
+                hasher.update(chunk)
+                await out.write(chunk)
+    except BaseException:
+        await _remove_quietly(tmp_path)
+        raise
+    return tmp_path, size, hasher.hexdigest()
+
+
+async def _remove_quietly(path: str) -> None:
+    try:
+        await asyncio.to_thread(os.remove, path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning("Failed to remove temp attachment %s: %s", path, e)
+
+
+async def _store_local(tmp_path: str, digest: str, ext: str) -> str:
+    target_dir = os.path.join(CHAT_FILES_DIR, digest[:2])
+    target = os.path.join(target_dir, f"{digest}{ext}")
+    await asyncio.to_thread(os.makedirs, target_dir, exist_ok=True)
+    if await asyncio.to_thread(os.path.exists, target):
+        await _remove_quietly(tmp_path)
+    else:
+        await asyncio.to_thread(os.replace, tmp_path, target)
+    return target
+
+
+async def _store_s3(tmp_path: str, digest: str, ext: str, content_type: Optional[str]) -> str:
+    from app.core.s3 import build_key
+    from app.core.storage import get_storage
+
+    storage = get_storage()
+    key = build_key(settings.CHAT_FILES_S3_PREFIX, digest[:2], f"{digest}{ext}")
+    try:
+        if not await storage.exists(key):
+            await storage.upload_file(key, tmp_path, content_type)
+    finally:
+        await _remove_quietly(tmp_path)
+    return f"{S3_PATH_PREFIX}{key}"
+
+
+async def store_chat_attachment(upload: UploadFile, max_bytes: Optional[int] = None) -> StoredAttachment:
+    """Сохранить вложение; AttachmentTooLargeError — если превышен лимит."""
+    if max_bytes is None:
+        max_bytes = settings.CHAT_MAX_ATTACHMENT_BYTES
+    tmp_path, size, digest = await _stream_to_temp(upload, max_bytes)
+    ext = _safe_extension(upload.filename)
+    if settings.CHAT_FILES_STORAGE == "s3" and settings.STORAGE_ENABLED:
+        file_path = await _store_s3(tmp_path, digest, ext, upload.content_type)
+    else:
+        file_path = await _store_local(tmp_path, digest, ext)
+    return StoredAttachment(file_path=file_path, file_size=size, sha256=digest)
+
+
+def is_s3_attachment(file_path: Optional[str]) -> bool:
+    return bool(file_path) and file_path.startswith(S3_PATH_PREFIX)
+
+
+def s3_key_from_path(file_path: str) -> str:
+    return file_path[len(S3_PATH_PREFIX):]
+
+
+def attachment_public_url(file_path: Optional[str], chat_id: int, message_id: int) -> Optional[str]:
+    """URL вложения для клиента: локальный /uploads/... или API-скачивание для S3."""
+    if not file_path:
+        return None
+    if is_s3_attachment(file_path):
+        return f"{settings.API_V1_STR}/chats/{chat_id}/files/{message_id}/download"
+    return settings.public_file_url(file_path)
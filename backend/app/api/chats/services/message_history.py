@@ -0,0 +1,131 @@
+"""
+История сообщений чата с курсором.
+
+Порядок — (chat_id, id) по убыванию, его обслуживает составной индекс
+ix_messages_chat_id_id, поэтому стоимость страницы не зависит от глубины прокрутки.
+Строки выбираются колонками (без ORM-объектов) и сразу собираются в JSON.
+"""
+import base64
+import binascii
+import json
+from typing import Optional
+
+from sqlalchemy import and_, exists, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.chats.models.chat_participant import ChatParticipant
+from app.api.chats.services.attachments import attachment_public_url
+from app.api.messages.models.message import Message
+from app.core.ttl_cache import cache_get, cache_set
+
+_CURSOR_PREFIX = "m1:"
+_MEMBERSHIP_TTL = 60
+
+_HISTORY_COLUMNS = (
+    Message.id,
+    Message.chat_id,
+    Message.sender_company_id,
+    Message.sender_user_id,
+    Message.content,
+    Message.file_path,
+    Message.file_name,
+    Message.file_size,
+    Message.file_type,
+    Message.is_read,
+    Message.created_at,
+    Message.updated_at,
+)
+
+
+def encode_history_cursor(message_id: int) -> str:
+    raw = f"{_CURSOR_PREFIX}{int(message_id)}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> int:
+    """ID сообщения, до которого (не включая) отдаётся следующая страница."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+    if not raw.startswith(_CURSOR_PREFIX):
+        raise ValueError("Invalid cursor")
+    try:
+        message_id = int(raw[len(_CURSOR_PREFIX):])
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    if message_id <= 0:
+        raise ValueError("Invalid cursor")
+    return message_id
+
+
+def _membership_cache_key(chat_id: int, user_id: int, company_id: Optional[int]) -> str:
+    return f"chat:member:{chat_id}:{user_id}:{company_id or 0}"
+
+
+async def is_chat_member(
+    db: AsyncSession,
+    chat_id: int,
+    user_id: int,
+    company_id: Optional[int],
+) -> bool:
+    """Участник ли пользователь (или его компания) чата; положительный ответ кэшируется."""
+    cache_key = _membership_cache_key(chat_id, user_id, company_id)
+    if await cache_get(cache_key):
+        return True
+    condition = ChatParticipant.user_id == user_id
+    if company_id is not None:
+        condition = or_(condition, ChatParticipant.company_id == company_id)
+    stmt = select(exists().where(and_(ChatParticipant.chat_id == chat_id, condition)))
+    is_member = bool(await db.scalar(stmt))
+    if is_member:
+        await cache_set(cache_key, True, ttl=_MEMBERSHIP_TTL)
+    return is_member
+
+
+def _row_to_json(row) -> str:
+    return json.dumps(
+        {
+            "id": row.id,
+            "chat_id": row.chat_id,
+            "sender_company_id": row.sender_company_id,
+            "sender_user_id": row.sender_user_id,
+            "content": row.content,
+            "file_path": attachment_public_url(row.file_path, row.chat_id, row.id),
+            "file_name": row.file_name,
+            "file_size": row.file_size,
+            "file_type": row.file_type,
+            "is_read": row.is_read,
+            "created_at": row.created_at.isoformat() if row.created_at else None,
+            "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+        },
+        ensure_ascii=False,
+    )
+
+
+async def load_history_page(
+    db: AsyncSession,
+    chat_id: int,
+    before_id: Optional[int],
+    limit: int,
+) -> bytes:
+    """
+    Страница истории в виде готового JSON:
+    {"items": [...от старых к новым...], "next_cursor": str | null, "has_more": bool}.
+    """
+    stmt = select(*_HISTORY_COLUMNS).where(Message.chat_id == chat_id)
+    if before_id is not None:
+        stmt = stmt.where(Message.id < before_id)
+    stmt = stmt.order_by(Message.chat_id.desc(), Message.id.desc()).limit(limit + 1)
+    rows = (await db.execute(stmt)).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_history_cursor(rows[-1].id) if has_more and rows else None
+    items = ",".join(_row_to_json(row) for row in reversed(rows))
+    return (
+        '{"items":[' + items + '],'
+        f'"next_cursor":{json.dumps(next_cursor)},'
+        f'"has_more":{json.dumps(has_more)}' + "}"
+    ).encode("utf-8")
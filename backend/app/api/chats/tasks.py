@@ -4,7 +4,7 @@ from __future__ import annotations
 import asyncio
 from typing import Optional
 
-from app.celery_app import celery_app
+from app.celery_app import celery_app, run_async
 from app_logging.logger import logger
 
 
@@ -48,7 +48,7 @@ def notify_message_email(
     content: Optional[str] = None,
     file_name: Optional[str] = None,
 ) -> None:
-    asyncio.run(
+    run_async(
         _notify_async(chat_id, sender_user_id, sender_company_id, content, file_name)
     )
 
@@ -1,10 +1,14 @@
 import asyncio
 import datetime
 import json
-from typing import Dict, Set, Optional
+import time
+from typing import Any, Dict, Set, Optional
 
 from fastapi import WebSocket
 
+from app.api.chats.backplane import ChatBackplane
+from app.api.chats.ws_sender import DROPPABLE_EVENT_TYPES, ChatSendMetrics, SocketSender
+from app.core.config import settings
 from app_logging.logger import logger
 
 
@@ -14,8 +18,17 @@ def json_default(obj):
     raise TypeError(f"Type {type(obj)} not serializable")
 
 
+def serialize_event(message: dict) -> str:
+    return json.dumps(message, default=json_default)
+
+
 class ChatWebSocketManager:
-    def __init__(self):
+    def __init__(
+        self,
+        backplane: Optional[ChatBackplane] = None,
+        send_queue_size: int = 256,
+        send_timeout: float = 10.0,
+    ):
         # {chat_id: {user_id: WebSocket}}
         self.chat_connections: Dict[int, Dict[int, WebSocket]] = {}
         # {user_id: {chat_id: WebSocket}}
@@ -24,12 +37,128 @@ class ChatWebSocketManager:
         self.presence_connections: Dict[int, WebSocket] = {}
         # Чаты пользователя для рассылки presence-событий
         self.user_presence_chat_ids: Dict[int, Set[int]] = {}
+        # Обратный индекс: {chat_id: {user_id}} presence-подключений, подписанных на чат
+        self.chat_presence_user_ids: Dict[int, Set[int]] = {}
+        # Компания presence-пользователя и обратный индекс {company_id: {user_id}}
+        self.presence_user_company_ids: Dict[int, Optional[int]] = {}
+        self.company_presence_user_ids: Dict[int, Set[int]] = {}
+        # Когда набор чатов presence-пользователя последний раз сверялся с БД
+        self._presence_synced_at: Dict[int, float] = {}
+        # Пользователи, чей набор чатов нужно перечитать (сменилась компания и т.п.)
+        self._presence_stale: Set[int] = set()
+        # Межворкерная рассылка и присутствие; по умолчанию — только этот процесс
+        self.backplane: ChatBackplane = backplane or ChatBackplane()
+        # Исходящие очереди: {id(websocket): SocketSender}
+        self._senders: Dict[int, SocketSender] = {}
+        self.send_queue_size = send_queue_size
+        self.send_timeout = send_timeout
+        self.metrics = ChatSendMetrics()
+
+    async def start(self, backplane: Optional[ChatBackplane] = None) -> None:
+        """Подключить backplane (вызывается при старте приложения)."""
+        if backplane is not None:
+            await self.backplane.stop()
+            self.backplane = backplane
+        await self.backplane.start(self._handle_backplane_event, self._local_online_user_ids)
+
+    async def stop(self) -> None:
+        try:
+            await asyncio.wait_for(self.flush(), timeout=5)
+        except asyncio.TimeoutError:
+            pass
+        await self.backplane.stop()
+
+    async def flush(self) -> None:
+        """Дождаться отправки всего, что уже стоит в исходящих очередях."""
+        await asyncio.gather(*(sender.join() for sender in list(self._senders.values())))
 
-    def _is_user_online_anywhere(self, user_id: int) -> bool:
+    def metrics_snapshot(self) -> Dict[str, Any]:
+        return self.metrics.snapshot(self._senders)
+
+    def _register_sender(self, websocket: WebSocket, on_close) -> SocketSender:
+        self._drop_sender(websocket)
+        sender = SocketSender(
+            websocket,
+            self.metrics,
+            on_close,
+            max_queue=self.send_queue_size,
+            send_timeout=self.send_timeout,
+        )
+        self._senders[id(websocket)] = sender
+        return sender
+
+    def _drop_sender(self, websocket: Optional[WebSocket]) -> None:
+        if websocket is None:
+            return
+        sender = self._senders.pop(id(websocket), None)
+        if sender is not None:
+            sender.stop()
+
+    def _enqueue(self, websocket: WebSocket, text: str, droppable: bool = False) -> bool:
+        sender = self._senders.get(id(websocket))
+        if sender is None or sender.closed:
+            return False
+        return sender.enqueue(text, droppable=droppable)
+
+    def _local_online_user_ids(self) -> Set[int]:
+        return set(self.presence_connections) | set(self.user_connections)
+
+    def _is_user_online_locally(self, user_id: int) -> bool:
         if user_id in self.presence_connections:
             return True
         return bool(self.user_connections.get(user_id))
 
+    async def _is_user_online_anywhere(self, user_id: int) -> bool:
+        """Онлайн на этом воркере или на любом другом (через backplane)."""
+        if self._is_user_online_locally(user_id):
+            return True
+        return user_id in await self.backplane.online_user_ids([user_id])
+
+    async def _handle_backplane_event(self, event: dict) -> None:
+        """Событие от другого воркера: доставить только своим локальным сокетам."""
+        kind = event.get("kind")
+        if kind == "participant_added":
+            self._apply_participant_added(
+                int(event["chat_id"]), event.get("company_id"), event.get("user_id")
+            )
+            return
+        if kind == "presence_stale":
+            self._presence_stale.add(int(event["user_id"]))
+            return
+        if kind != "chat_event":
+            return
+        participant_user_ids = event.get("participant_user_ids")
+        await self._deliver_chat_event(
+            int(event["chat_id"]),
+            event["message"],
+            exclude_user_id=event.get("exclude_user_id"),
+            participant_user_ids=(
+                set(participant_user_ids) if participant_user_ids is not None else None
+            ),
+            include_presence=bool(event.get("include_presence", True)),
+        )
+
+    async def _publish_chat_event(
+        self,
+        chat_id: int,
+        message: dict,
+        exclude_user_id: Optional[int],
+        participant_user_ids: Optional[Set[int]],
+        include_presence: bool,
+    ) -> None:
+        await self.backplane.publish(
+            {
+                "kind": "chat_event",
+                "chat_id": chat_id,
+                "message": message,
+                "exclude_user_id": exclude_user_id,
+                "participant_user_ids": (
+                    sorted(participant_user_ids) if participant_user_ids is not None else None
+                ),
+                "include_presence": include_presence,
+            }
+        )
+
     async def _broadcast_chat_event(
         self,
         chat_id: int,
@@ -37,22 +166,146 @@ class ChatWebSocketManager:
         exclude_user_id: Optional[int] = None,
         participant_user_ids: Optional[Set[int]] = None,
     ):
-        """Событие чата — подписчикам WS чата и presence-подключениям участников."""
-        await self.broadcast_to_chat(chat_id, message, exclude_user_id=exclude_user_id)
+        """Событие чата — подписчикам WS чата и presence-подключениям участников на всех воркерах."""
+        await self._deliver_chat_event(
+            chat_id,
+            message,
+            exclude_user_id=exclude_user_id,
+            participant_user_ids=participant_user_ids,
+        )
+        await self._publish_chat_event(
+            chat_id,
+            message,
+            exclude_user_id,
+            participant_user_ids,
+            include_presence=True,
+        )
+
+    async def _deliver_chat_event(
+        self,
+        chat_id: int,
+        message: dict,
+        exclude_user_id: Optional[int] = None,
+        participant_user_ids: Optional[Set[int]] = None,
+        include_presence: bool = True,
+    ):
+        """Доставка события подключениям текущего воркера (сериализация — один раз)."""
+        text = serialize_event(message)
+        droppable = message.get("type") in DROPPABLE_EVENT_TYPES
+        self._enqueue_to_chat(chat_id, text, exclude_user_id, droppable=droppable)
+        if not include_presence:
+            return
 
-        for user_id, websocket in list(self.presence_connections.items()):
+        # Стоимость — O(участников чата), а не O(всех онлайн-пользователей)
+        if participant_user_ids is not None:
+            recipients = participant_user_ids
+        else:
+            recipients = self.chat_presence_user_ids.get(chat_id, ())
+        for user_id in list(recipients):
             if exclude_user_id and user_id == exclude_user_id:
                 continue
-            if participant_user_ids is not None:
-                if user_id not in participant_user_ids:
-                    continue
-            elif chat_id not in self.user_presence_chat_ids.get(user_id, set()):
+            websocket = self.presence_connections.get(user_id)
+            if websocket is None:
                 continue
-            await self.send_personal_message(message, websocket)
-
-    def update_presence_chat_ids(self, user_id: int, chat_ids: Set[int]) -> None:
+            self._enqueue(websocket, text, droppable=droppable)
+
+    def _set_presence_chat_ids(self, user_id: int, chat_ids: Set[int]) -> None:
+        """Обновить чаты presence-пользователя и обратный индекс (только разница)."""
+        old_ids = self.user_presence_chat_ids.get(user_id, set())
+        new_ids = set(chat_ids)
+        for chat_id in old_ids - new_ids:
+            subscribers = self.chat_presence_user_ids.get(chat_id)
+            if subscribers is not None:
+                subscribers.discard(user_id)
+                if not subscribers:
+                    del self.chat_presence_user_ids[chat_id]
+        for chat_id in new_ids - old_ids:
+            self.chat_presence_user_ids.setdefault(chat_id, set()).add(user_id)
+        self.user_presence_chat_ids[user_id] = new_ids
+
+    def _set_presence_company(self, user_id: int, company_id: Optional[int]) -> None:
+        old_company_id = self.presence_user_company_ids.get(user_id)
+        if old_company_id is not None and old_company_id != company_id:
+            users = self.company_presence_user_ids.get(old_company_id)
+            if users is not None:
+                users.discard(user_id)
+                if not users:
+                    del self.company_presence_user_ids[old_company_id]
+        if company_id is not None:
+            self.company_presence_user_ids.setdefault(company_id, set()).add(user_id)
+        self.presence_user_company_ids[user_id] = company_id
+
+    def _clear_presence_chat_ids(self, user_id: int) -> Set[int]:
+        chat_ids = self.user_presence_chat_ids.get(user_id, set())
+        self._set_presence_chat_ids(user_id, set())
+        self.user_presence_chat_ids.pop(user_id, None)
+        self._set_presence_company(user_id, None)
+        self.presence_user_company_ids.pop(user_id, None)
+        self._presence_synced_at.pop(user_id, None)
+        self._presence_stale.discard(user_id)
+        return chat_ids
+
+    def update_presence_chat_ids(
+        self,
+        user_id: int,
+        chat_ids: Set[int],
+        company_id: Optional[int] = None,
+    ) -> None:
+        """Полная сверка набора чатов presence-пользователя (результат запроса к БД)."""
         if user_id in self.presence_connections:
-            self.user_presence_chat_ids[user_id] = chat_ids
+            self._set_presence_chat_ids(user_id, chat_ids)
+            self._set_presence_company(user_id, company_id)
+            self._presence_synced_at[user_id] = time.monotonic()
+            self._presence_stale.discard(user_id)
+
+    def presence_needs_resync(self, user_id: int, max_age_seconds: float) -> bool:
+        """Нужно ли перечитать чаты из БД: помечен устаревшим или давно не сверялся."""
+        if user_id in self._presence_stale:
+            return True
+        synced_at = self._presence_synced_at.get(user_id)
+        if synced_at is None:
+            return True
+        return time.monotonic() - synced_at > max_age_seconds
+
+    def _apply_participant_added(
+        self,
+        chat_id: int,
+        company_id: Optional[int],
+        user_id: Optional[int],
+    ) -> None:
+        user_ids: Set[int] = set()
+        if user_id is not None:
+            user_ids.add(int(user_id))
+        if company_id is not None:
+            user_ids |= self.company_presence_user_ids.get(int(company_id), set())
+        for presence_user_id in user_ids:
+            if presence_user_id not in self.presence_connections:
+                continue
+            chat_ids = self.user_presence_chat_ids.get(presence_user_id, set())
+            if chat_id not in chat_ids:
+                self._set_presence_chat_ids(presence_user_id, chat_ids | {chat_id})
+
+    async def on_participant_added(
+        self,
+        chat_id: int,
+        company_id: Optional[int],
+        user_id: Optional[int],
+    ) -> None:
+        """Новый участник чата: добавить чат в presence-наборы пользователя и его компании."""
+        self._apply_participant_added(chat_id, company_id, user_id)
+        await self.backplane.publish(
+            {
+                "kind": "participant_added",
+                "chat_id": chat_id,
+                "company_id": company_id,
+                "user_id": user_id,
+            }
+        )
+
+    async def mark_presence_stale(self, user_id: int) -> None:
+        """Состав чатов пользователя изменился непредсказуемо — перечитать при следующем ping."""
+        self._presence_stale.add(user_id)
+        await self.backplane.publish({"kind": "presence_stale", "user_id": user_id})
 
     async def _notify_user_online(self, user_id: int, chat_ids: Set[int]):
         for chat_id in chat_ids:
@@ -67,7 +320,10 @@ class ChatWebSocketManager:
             )
 
     async def _notify_user_offline_if_needed(self, user_id: int, chat_ids: Set[int]):
-        if self._is_user_online_anywhere(user_id):
+        if self._is_user_online_locally(user_id):
+            return
+        await self.backplane.mark_offline(user_id)
+        if await self._is_user_online_anywhere(user_id):
             return
         for chat_id in chat_ids:
             await self._broadcast_chat_event(
@@ -85,20 +341,26 @@ class ChatWebSocketManager:
         websocket: WebSocket,
         user_id: int,
         chat_ids: Set[int],
+        company_id: Optional[int] = None,
     ):
         """Глобальное подключение: пользователь онлайн на сайте."""
         await websocket.accept()
 
         old_ws = self.presence_connections.get(user_id)
         if old_ws is not None and old_ws is not websocket:
+            self._drop_sender(old_ws)
             try:
                 await old_ws.close()
             except Exception:
                 pass
 
-        was_online = self._is_user_online_anywhere(user_id)
+        was_online = await self._is_user_online_anywhere(user_id)
         self.presence_connections[user_id] = websocket
-        self.user_presence_chat_ids[user_id] = chat_ids
+        self.update_presence_chat_ids(user_id, chat_ids, company_id)
+        self._register_sender(
+            websocket, lambda: self.disconnect_presence(user_id, websocket)
+        )
+        await self.backplane.mark_online(user_id)
 
         logger.info("User %s connected to global presence (%s chats)", user_id, len(chat_ids))
 
@@ -113,8 +375,14 @@ class ChatWebSocketManager:
         if not was_online:
             await self._notify_user_online(user_id, chat_ids)
 
-    def disconnect_presence(self, user_id: int):
-        chat_ids = self.user_presence_chat_ids.pop(user_id, set())
+    def disconnect_presence(self, user_id: int, websocket: Optional[WebSocket] = None):
+        """Отключение presence; websocket — чтобы старое подключение не сняло уже новое."""
+        current = self.presence_connections.get(user_id)
+        if websocket is not None and current is not websocket:
+            self._drop_sender(websocket)
+            return
+        self._drop_sender(current)
+        chat_ids = self._clear_presence_chat_ids(user_id)
         self.presence_connections.pop(user_id, None)
 
         logger.info("User %s disconnected from global presence", user_id)
@@ -125,15 +393,22 @@ class ChatWebSocketManager:
         """Подключение пользователя к конкретному чату (сообщения, typing)."""
         await websocket.accept()
 
-        was_online = self._is_user_online_anywhere(user_id)
+        was_online = await self._is_user_online_anywhere(user_id)
 
         if chat_id not in self.chat_connections:
             self.chat_connections[chat_id] = {}
+        old_ws = self.chat_connections[chat_id].get(user_id)
+        if old_ws is not None and old_ws is not websocket:
+            self._drop_sender(old_ws)
         self.chat_connections[chat_id][user_id] = websocket
+        self._register_sender(
+            websocket, lambda: self.disconnect(chat_id, user_id, websocket)
+        )
 
         if user_id not in self.user_connections:
             self.user_connections[user_id] = {}
         self.user_connections[user_id][chat_id] = websocket
+        await self.backplane.mark_online(user_id)
 
         logger.info("User %s connected to chat %s", user_id, chat_id)
 
@@ -149,8 +424,13 @@ class ChatWebSocketManager:
         if not was_online:
             await self._notify_user_online(user_id, {chat_id})
 
-    def disconnect(self, chat_id: int, user_id: int):
+    def disconnect(self, chat_id: int, user_id: int, websocket: Optional[WebSocket] = None):
         """Отключение пользователя от конкретного чата."""
+        current = self.chat_connections.get(chat_id, {}).get(user_id)
+        if websocket is not None and current is not websocket:
+            self._drop_sender(websocket)
+            return
+        self._drop_sender(current)
         if chat_id in self.chat_connections and user_id in self.chat_connections[chat_id]:
             del self.chat_connections[chat_id][user_id]
             if not self.chat_connections[chat_id]:
@@ -166,39 +446,40 @@ class ChatWebSocketManager:
         asyncio.create_task(self._notify_user_offline_if_needed(user_id, {chat_id}))
 
     async def send_personal_message(self, message: dict, websocket: WebSocket):
+        text = serialize_event(message)
+        if self._enqueue(websocket, text):
+            return
+        if id(websocket) in self._senders:
+            return
+        # Сокет ещё не зарегистрирован в менеджере — отправляем напрямую
         try:
-            await websocket.send_text(json.dumps(message, default=json_default))
+            await websocket.send_text(text)
         except Exception as e:
             logger.error("Error sending personal message: %s", e)
 
+    def _enqueue_to_chat(
+        self,
+        chat_id: int,
+        text: str,
+        exclude_user_id: Optional[int] = None,
+        droppable: bool = False,
+    ) -> None:
+        for user_id, websocket in list(self.chat_connections.get(chat_id, {}).items()):
+            if exclude_user_id and user_id == exclude_user_id:
+                continue
+            self._enqueue(websocket, text, droppable=droppable)
+
     async def broadcast_to_chat(
         self,
         chat_id: int,
         message: dict,
         exclude_user_id: Optional[int] = None,
     ):
+        """Поставить событие в очереди WS чата (без ожидания отправки)."""
         if chat_id not in self.chat_connections:
             return
-
-        disconnected_users = []
-
-        for user_id, websocket in self.chat_connections[chat_id].items():
-            if exclude_user_id and user_id == exclude_user_id:
-                continue
-
-            try:
-                await websocket.send_text(json.dumps(message, default=json_default))
-            except Exception as e:
-                logger.error(
-                    "Error broadcasting to user %s in chat %s: %s",
-                    user_id,
-                    chat_id,
-                    e,
-                )
-                disconnected_users.append(user_id)
-
-        for user_id in disconnected_users:
-            self.disconnect(chat_id, user_id)
+        droppable = message.get("type") in DROPPABLE_EVENT_TYPES
+        self._enqueue_to_chat(chat_id, serialize_event(message), exclude_user_id, droppable)
 
     async def send_message_to_chat(
         self,
@@ -247,19 +528,32 @@ class ChatWebSocketManager:
         }
 
         await self.broadcast_to_chat(chat_id, message, exclude_user_id=user_id)
+        await self._publish_chat_event(
+            chat_id,
+            message,
+            exclude_user_id=user_id,
+            participant_user_ids=None,
+            include_presence=False,
+        )
 
     def is_user_online_in_chat(self, chat_id: int, user_id: int) -> bool:
+        """Онлайн на текущем воркере (presence на сайте или WS этого чата)."""
         if user_id in self.presence_connections:
             return True
         if chat_id in self.chat_connections:
             return user_id in self.chat_connections[chat_id]
         return False
 
-    def get_online_users_in_chat(
+    async def get_online_users_in_chat(
         self,
         chat_id: int,
         participant_user_ids: Optional[Set[int]] = None,
     ) -> Set[int]:
+        """
+        Онлайн-участники чата по всему кластеру.
+        Без participant_user_ids — только подключения текущего воркера (полный список
+        онлайн-пользователей других воркеров не перечисляется).
+        """
         if participant_user_ids is None:
             participant_user_ids = set()
             if chat_id in self.chat_connections:
@@ -268,10 +562,18 @@ class ChatWebSocketManager:
             return participant_user_ids
 
         online: Set[int] = set()
+        remote_candidates: Set[int] = set()
         for user_id in participant_user_ids:
             if self.is_user_online_in_chat(chat_id, user_id):
                 online.add(user_id)
+            else:
+                remote_candidates.add(user_id)
+        if remote_candidates:
+            online |= await self.backplane.online_user_ids(remote_candidates)
         return online
 
 
-chat_manager = ChatWebSocketManager()
+chat_manager = ChatWebSocketManager(
+    send_queue_size=settings.CHAT_WS_SEND_QUEUE_SIZE,
+    send_timeout=settings.CHAT_WS_SEND_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,175 @@
+"""
+Исходящая очередь на каждый WebSocket чата.
+
+Рассылка только кладёт уже сериализованный текст в очередь сокета, отправкой занимается
+отдельная задача-писатель. Медленный клиент не тормозит остальных получателей
+и HTTP-запрос, породивший событие.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from app_logging.logger import logger
+
+# События, которые можно выбросить при переполнении очереди без потери смысла
+DROPPABLE_EVENT_TYPES = frozenset({"typing_indicator"})
+
+
+class ChatSendMetrics:
+    """Счётчики исходящих WS-отправок (на процесс)."""
+
+    def __init__(self):
+        self.enqueued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.slow_disconnects = 0
+        self.send_errors = 0
+        self.max_queue_depth = 0
+        self.send_latency_total = 0.0
+        self.send_latency_max = 0.0
+        self.delivery_latency_total = 0.0
+        self.delivery_latency_max = 0.0
+
+    def observe_send(self, send_seconds: float, delivery_seconds: float) -> None:
+        self.sent += 1
+        self.send_latency_total += send_seconds
+        self.send_latency_max = max(self.send_latency_max, send_seconds)
+        self.delivery_latency_total += delivery_seconds
+        self.delivery_latency_max = max(self.delivery_latency_max, delivery_seconds)
+
+    def snapshot(self, senders: Dict[int, "SocketSender"]) -> Dict[str, Any]:
+        depths = [sender.depth for sender in senders.values()]
+        sent = self.sent or 1
+        return {
+            "connections": len(depths),
+            "queued_total": sum(depths),
+            "queue_depth_current_max": max(depths, default=0),
+            "queue_depth_max": self.max_queue_depth,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "slow_disconnects": self.slow_disconnects,
+            "send_errors": self.send_errors,
+            "send_latency_avg_ms": round(self.send_latency_total / sent * 1000, 3),
+            "send_latency_max_ms": round(self.send_latency_max * 1000, 3),
+            "delivery_latency_avg_ms": round(self.delivery_latency_total / sent * 1000, 3),
+            "delivery_latency_max_ms": round(self.delivery_latency_max * 1000, 3),
+        }
+
+
+class SocketSender:
+    """
+    Ограниченная очередь + писатель для одного WebSocket.
+
+    При переполнении: новое droppable-событие выбрасывается; для важного события сначала
+    вытесняется самое старое droppable-событие из очереди, а если таких нет — клиент
+    считается медленным и отключается (on_close).
+    """
+
+    def __init__(
+        self,
+        websocket,
+        metrics: ChatSendMetrics,
+        on_close: Callable[[], None],
+        max_queue: int = 256,
+        send_timeout: float = 10.0,
+    ):
+        self.websocket = websocket
+        self.metrics = metrics
+        self.on_close = on_close
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        # (текст, droppable, время постановки)
+        self._queue: Deque[Tuple[str, bool, float]] = deque()
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._closed = False
+        self._task: Optional[asyncio.Task] = asyncio.create_task(self._run())
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def enqueue(self, text: str, droppable: bool = False) -> bool:
+        if self._closed:
+            return False
+        if len(self._queue) >= self.max_queue:
+            if droppable:
+                self.metrics.dropped += 1
+                return False
+            if not self._evict_droppable():
+                self.metrics.slow_disconnects += 1
+                logger.warning("Slow WebSocket consumer: queue full (%s), disconnecting", self.max_queue)
+                self._fail()
+                return False
+        self._queue.append((text, droppable, time.monotonic()))
+        self.metrics.enqueued += 1
+        self.metrics.max_queue_depth = max(self.metrics.max_queue_depth, len(self._queue))
+        self._idle.clear()
+        self._wakeup.set()
+        return True
+
+    def _evict_droppable(self) -> bool:
+        for index, (_, droppable, _) in enumerate(self._queue):
+            if droppable:
+                del self._queue[index]
+                self.metrics.dropped += 1
+                return True
+        return False
+
+    async def _run(self) -> None:
+        while True:
+            if not self._queue:
+                self._idle.set()
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            text, _, enqueued_at = self._queue.popleft()
+            started = time.monotonic()
+            try:
+                await asyncio.wait_for(self.websocket.send_text(text), timeout=self.send_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.metrics.send_errors += 1
+                logger.error("Error sending WebSocket message: %s", e)
+                self._fail()
+                return
+            finished = time.monotonic()
+            self.metrics.observe_send(finished - started, finished - enqueued_at)
+
+    def _fail(self) -> None:
+        if self._closed:
+            return
+        self.stop()
+        try:
+            self.on_close()
+        except Exception as e:
+            logger.error("WebSocket close callback failed: %s", e)
+        asyncio.create_task(self._close_socket())
+
+    async def _close_socket(self) -> None:
+        try:
+            await self.websocket.close()
+        except Exception:
+            pass
+
+    async def join(self) -> None:
+        """Дождаться, пока очередь будет отправлена (или писатель остановлен)."""
+        if self._closed:
+            return
+        await self._idle.wait()
+
+    def stop(self) -> None:
+        self._closed = True
+        self._queue.clear()
+        self._idle.set()
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        self._task = None
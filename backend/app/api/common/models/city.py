@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, ForeignKey, func
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from typing import Optional, TYPE_CHECKING
 
@@ -23,6 +23,8 @@ class City(Base):
     population: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # Население для фильтрации
     is_million_city: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)  # Город-миллионник
     is_regional_center: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)  # Региональный центр
+    latitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True)  # Для поиска транспорта по радиусу
+    longitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
     created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), onupdate=func.now(), nullable=True)
@@ -1,219 +1,124 @@
 """
 Repository для работы с данными о городах и их фильтрации
 """
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, func, and_, or_
 from app.db.base import AsyncSessionLocal
 from app.api.common.models.country import Country
 from app.api.common.models.federal_district import FederalDistrict
 from app.api.common.models.region import Region
 from app.api.common.models.city import City
-from app.api.company.models.company import Company
+from app.api.company.models.company import BusinessType, Company
 from app.api.products.models.product import Product, ProductType
+from app_logging.logger import logger
 
 
 class CitiesFilterRepository:
     """Repository для получения данных о городах с количеством товаров"""
-    
+
+    @staticmethod
+    def _cities_query(count_column):
+        """
+        Города вместе с регионом, округом и страной одним запросом — раньше их
+        догружали тремя отдельными запросами (каждый в своей сессии).
+        """
+        return (
+            select(
+                City.id.label('city_id'),
+                City.name.label('city_name'),
+                Region.id.label('region_id'),
+                Region.name.label('region_name'),
+                Region.code.label('region_code'),
+                FederalDistrict.id.label('federal_district_id'),
+                FederalDistrict.name.label('federal_district_name'),
+                FederalDistrict.code.label('federal_district_code'),
+                Country.id.label('country_id'),
+                Country.name.label('country_name'),
+                Country.code.label('country_code'),
+                count_column.label('products_count')
+            )
+            .join(Region, City.region_id == Region.id)
+            .join(FederalDistrict, City.federal_district_id == FederalDistrict.id)
+            .join(Country, City.country_id == Country.id)
+            .join(Company, City.id == Company.city_id)
+            .group_by(City.id, Region.id, FederalDistrict.id, Country.id)
+        )
+
+    @staticmethod
+    async def _fetch_cities(query, label: str):
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(query)
+            cities_data = {row.city_id: {
+                'id': row.city_id,
+                'name': row.city_name,
+                'region_id': row.region_id,
+                'region_name': row.region_name,
+                'region_code': row.region_code,
+                'federal_district_id': row.federal_district_id,
+                'federal_district_name': row.federal_district_name,
+                'federal_district_code': row.federal_district_code,
+                'country_id': row.country_id,
+                'country_name': row.country_name,
+                'country_code': row.country_code,
+                'products_count': row.products_count
+            } for row in result}
+        logger.debug("Cities with %s: %s", label, len(cities_data))
+        return cities_data
+
     @staticmethod
     async def get_cities_with_products_count():
         """Получить города с количеством товаров через JOIN"""
-        async with AsyncSessionLocal() as db:
-            # Получаем города с количеством товаров через JOIN
-            # Считаем только товары (type=GOOD), исключая услуги
-            cities_with_products = await db.execute(
-                select(
-                    City.id.label('city_id'),
-                    City.name.label('city_name'),
-                    City.region_id,
-                    City.federal_district_id,
-                    City.country_id,
-                    func.count(Product.id).label('products_count')
-                )
-                .join(Company, City.id == Company.city_id)
-                .join(Product, Company.id == Product.company_id)
-                .where(
-                    and_(
-                        Product.type == ProductType.GOOD,  # Только товары!
-                        Product.is_deleted == False,
-                        Product.is_hidden == False,
-                        City.is_active == True,
-                        Company.is_active == True
-                    )
-                )
-                .group_by(
-                    City.id,
-                    City.name,
-                    City.region_id,
-                    City.federal_district_id,
-                    City.country_id
+        # Считаем только товары (type=GOOD), исключая услуги
+        query = (
+            CitiesFilterRepository._cities_query(func.count(Product.id))
+            .join(Product, Company.id == Product.company_id)
+            .where(
+                and_(
+                    Product.type == ProductType.GOOD,  # Только товары!
+                    Product.is_deleted == False,
+                    Product.is_hidden == False,
+                    City.is_active == True,
+                    Company.is_active == True
                 )
             )
-            
-            # Создаем словарь городов с количеством товаров
-            cities_data = {}
-            for row in cities_with_products:
-                cities_data[row.city_id] = {
-                    'id': row.city_id,
-                    'name': row.city_name,
-                    'region_id': row.region_id,
-                    'federal_district_id': row.federal_district_id,
-                    'country_id': row.country_id,
-                    'products_count': row.products_count
-                }
-            
-            print(f"🏙️ Найдено городов с товарами: {len(cities_data)}")
-            if cities_data:
-                city_example = list(cities_data.values())[0]
-                print(f"📊 Пример: {city_example['name']} - {city_example['products_count']} товаров")
-            
-            return cities_data
-    
+        )
+        return await CitiesFilterRepository._fetch_cities(query, "products")
+
     @staticmethod
     async def get_cities_with_companies_count():
         """Получить города с количеством компаний-производителей товаров (по business_type)"""
-        async with AsyncSessionLocal() as db:
-            from app.api.company.models.company import BusinessType
-            from sqlalchemy import or_
-            
-            # Получаем города с количеством компаний через JOIN по city_id
-            cities_with_companies = await db.execute(
-                select(
-                    City.id.label('city_id'),
-                    City.name.label('city_name'),
-                    City.region_id,
-                    City.federal_district_id,
-                    City.country_id,
-                    func.count(func.distinct(Company.id)).label('companies_count')
-                )
-                .join(Company, City.id == Company.city_id)  # JOIN по city_id
-                .where(
-                    and_(
-                        or_(
-                            Company.business_type == BusinessType.GOODS,
-                            Company.business_type == BusinessType.BOTH
-                        ),
-                        Company.is_active == True,
-                        City.is_active == True
-                    )
-                )
-                .group_by(
-                    City.id,
-                    City.name,
-                    City.region_id,
-                    City.federal_district_id,
-                    City.country_id
+        query = (
+            CitiesFilterRepository._cities_query(func.count(func.distinct(Company.id)))
+            .where(
+                and_(
+                    or_(
+                        Company.business_type == BusinessType.GOODS,
+                        Company.business_type == BusinessType.BOTH
+                    ),
+                    Company.is_active == True,
+                    City.is_active == True
                 )
             )
-            
-            # Создаем словарь городов с количеством компаний
-            cities_data = {}
-            for row in cities_with_companies:
-                cities_data[row.city_id] = {
-                    'id': row.city_id,
-                    'name': row.city_name,
-                    'region_id': row.region_id,
-                    'federal_district_id': row.federal_district_id,
-                    'country_id': row.country_id,
-                    'companies_count': row.companies_count,
-                    'products_count': row.companies_count
-                }
-            
-            print(f"🏙️ Найдено городов с компаниями: {len(cities_data)}")
-            if cities_data:
-                city_example = list(cities_data.values())[0]
-                print(f"📊 Пример: {city_example['name']} - {city_example['companies_count']} компаний")
-            
-            return cities_data
-    
+        )
+        cities_data = await CitiesFilterRepository._fetch_cities(query, "companies")
+        for city in cities_data.values():
+            city['companies_count'] = city['products_count']
+        return cities_data
+
     @staticmethod
     async def get_cities_with_services_count():
         """Получить города с количеством компаний-поставщиков услуг (по business_type)"""
-        async with AsyncSessionLocal() as db:
-            # Получаем города с количеством компаний-поставщиков услуг
-            # Подсчитываем компании с business_type = SERVICES или BOTH
-            from app.api.company.models.company import Company, BusinessType
-            from sqlalchemy import or_
-            
-            cities_with_services = await db.execute(
-                select(
-                    City.id.label('city_id'),
-                    City.name.label('city_name'),
-                    City.region_id,
-                    City.federal_district_id,
-                    City.country_id,
-                    func.count(func.distinct(Company.id)).label('products_count')
-                )
-                .join(Company, City.id == Company.city_id)
-                .where(
-                    and_(
-                        or_(
-                            Company.business_type == BusinessType.SERVICES,
-                            Company.business_type == BusinessType.BOTH
-                        ),
-                        City.is_active == True,
-                        Company.is_active == True
-                    )
-                )
-                .group_by(
-                    City.id,
-                    City.name,
-                    City.region_id,
-                    City.federal_district_id,
-                    City.country_id
+        # Подсчитываем компании с business_type = SERVICES или BOTH
+        query = (
+            CitiesFilterRepository._cities_query(func.count(func.distinct(Company.id)))
+            .where(
+                and_(
+                    or_(
+                        Company.business_type == BusinessType.SERVICES,
+                        Company.business_type == BusinessType.BOTH
+                    ),
+                    City.is_active == True,
+                    Company.is_active == True
                 )
             )
-            
-            cities_data = {}
-            for row in cities_with_services:
-                cities_data[row.city_id] = {
-                    'id': row.city_id,
-                    'name': row.city_name,
-                    'region_id': row.region_id,
-                    'federal_district_id': row.federal_district_id,
-                    'country_id': row.country_id,
-                    'products_count': row.products_count
-                }
-            
-            print(f"🏙️ Найдено городов с поставщиками услуг: {len(cities_data)}")
-            if cities_data:
-                city_example = list(cities_data.values())[0]
-                print(f"📊 Пример: {city_example['name']} - {city_example['products_count']} поставщиков услуг")
-            
-            return cities_data
-    
-    @staticmethod
-    async def get_regions_by_ids(region_ids):
-        """Получить регионы по списку ID"""
-        async with AsyncSessionLocal() as db:
-            if region_ids:
-                result = await db.execute(
-                    select(Region)
-                    .where(Region.id.in_(region_ids))
-                )
-                return result.scalars().all()
-            return []
-    
-    @staticmethod
-    async def get_federal_districts_by_ids(fd_ids):
-        """Получить федеральные округа по списку ID"""
-        async with AsyncSessionLocal() as db:
-            if fd_ids:
-                result = await db.execute(
-                    select(FederalDistrict)
-                    .where(FederalDistrict.id.in_(fd_ids))
-                )
-                return result.scalars().all()
-            return []
-    
-    @staticmethod
-    async def get_countries_by_ids(country_ids):
-        """Получить страны по списку ID"""
-        async with AsyncSessionLocal() as db:
-            if country_ids:
-                result = await db.execute(
-                    select(Country)
-                    .where(Country.id.in_(country_ids))
-                )
-                return result.scalars().all()
-            return []
-
+        )
+        return await CitiesFilterRepository._fetch_cities(query, "services")
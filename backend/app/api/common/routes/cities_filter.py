@@ -1,139 +1,56 @@
-from fastapi import APIRouter, HTTPException
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Request, Response
 from app.api.common.services.cities_filter_service import CitiesFilterService
+from app.api.common.services.location_tree_snapshots import location_tree_snapshots
+from app_logging.logger import logger
 
 router = APIRouter()
 
-# Простой in-memory кэш
-_cache_data = None
-_cache_timestamp = None
-CACHE_TTL = 60  # 60 секунд
-
-
-# Кэши для разных типов
-_cache_products = None
-_cache_services = None
-_cache_companies = None
-_timestamps = {}
-
-
-async def _get_tree_response(location_tree):
-    """Формирует стандартный ответ с деревом"""
-    total_cities = sum(
-        len(region["cities"])
-        for country in location_tree
-        for fd in country["federal_districts"]
-        for region in fd["regions"]
-    )
-    
-    return {
-        "countries": location_tree,
-        "total_countries": len(location_tree),
-        "total_federal_districts": sum(len(country["federal_districts"]) for country in location_tree),
-        "total_regions": sum(
-            len(fd["regions"])
-            for country in location_tree
-            for fd in country["federal_districts"]
-        ),
-        "total_cities": total_cities
-    }
 
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {value.strip().removeprefix("W/") for value in header.split(",")}
+    return etag in candidates or "*" in candidates
 
-@router.get("/products")
-async def get_products_cities_filter_tree():
-    """Получить дерево локаций с количеством товаров"""
-    global _cache_products, _timestamps
-    
-    cache_key = "products"
+
+async def _tree_response(request: Request, kind: str) -> Response:
+    """Отдаёт снапшот дерева; при совпадении If-None-Match — 304 без тела"""
     try:
-        # Проверяем кэш
-        if cache_key in _timestamps:
-            age = (datetime.now() - _timestamps[cache_key]).total_seconds()
-            if age < CACHE_TTL and _cache_products:
-                print("✅ Products данные из кэша")
-                return _cache_products
-        
-        print("🔄 Загрузка данных о товарах из БД...")
-        location_tree = await CitiesFilterService.build_products_location_tree()
-        response = await _get_tree_response(location_tree)
-        
-        _cache_products = response
-        _timestamps[cache_key] = datetime.now()
-        print(f"✅ Products данные сохранены в кэш")
-        
-        return response
+        snapshot = await location_tree_snapshots.get(kind)
     except Exception as e:
-        print(f"❌ Ошибка в products: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Failed to build %s location tree", kind)
         raise HTTPException(status_code=500, detail=str(e))
 
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
+
+@router.get("/products")
+async def get_products_cities_filter_tree(request: Request):
+    """Получить дерево локаций с количеством товаров"""
+    return await _tree_response(request, "products")
+
 
 @router.get("/services")
-async def get_services_cities_filter_tree():
+async def get_services_cities_filter_tree(request: Request):
     """Получить дерево локаций с количеством услуг"""
-    global _cache_services, _timestamps
-    
-    cache_key = "services"
-    try:
-        # Проверяем кэш
-        if cache_key in _timestamps:
-            age = (datetime.now() - _timestamps[cache_key]).total_seconds()
-            if age < CACHE_TTL and _cache_services:
-                print("✅ Services данные из кэша")
-                return _cache_services
-        
-        print("🔄 Загрузка данных об услугах из БД...")
-        location_tree = await CitiesFilterService.build_services_location_tree()
-        response = await _get_tree_response(location_tree)
-        
-        _cache_services = response
-        _timestamps[cache_key] = datetime.now()
-        print(f"✅ Services данные сохранены в кэш")
-        
-        return response
-    except Exception as e:
-        print(f"❌ Ошибка в services: {e}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _tree_response(request, "services")
 
 
 @router.get("/companies")
-async def get_companies_cities_filter_tree():
+async def get_companies_cities_filter_tree(request: Request):
     """Получить дерево локаций с количеством компаний"""
-    global _cache_companies, _timestamps
-    
-    cache_key = "companies"
-    try:
-        # Проверяем кэш
-        if cache_key in _timestamps:
-            age = (datetime.now() - _timestamps[cache_key]).total_seconds()
-            if age < CACHE_TTL and _cache_companies:
-                print("✅ Companies данные из кэша")
-                return _cache_companies
-        
-        print("🔄 Загрузка данных о компаниях из БД...")
-        location_tree = await CitiesFilterService.build_companies_location_tree()
-        response = await _get_tree_response(location_tree)
-        
-        _cache_companies = response
-        _timestamps[cache_key] = datetime.now()
-        print(f"✅ Companies данные сохранены в кэш")
-        
-        return response
-    except Exception as e:
-        print(f"❌ Ошибка в companies: {e}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _tree_response(request, "companies")
 
 
 @router.get("/")
-async def get_cities_filter_tree():
+async def get_cities_filter_tree(request: Request):
     """Получить полное дерево локаций (по умолчанию - компании)"""
     # По умолчанию возвращаем компании
-    return await get_companies_cities_filter_tree()
+    return await _tree_response(request, "companies")
 
 
 @router.get("/cities-stats")
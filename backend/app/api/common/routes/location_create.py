@@ -17,6 +17,7 @@ from app.api.common.schemas.location import (
     CityCreate,
     LocationCreateResponse
 )
+from app.api.common.services.gazetteer import invalidate_gazetteer
 from app.db.base import AsyncSessionLocal
 from app_logging.logger import logger
 
@@ -60,6 +61,7 @@ async def create_country(
         db.add(new_country)
         await db.commit()
         await db.refresh(new_country)
+        await invalidate_gazetteer()
         
         logger.info(f"Создана новая страна: id={new_country.id}, код={new_country.code}, название='{new_country.name}', пользователь_id={current_user.id}")
         
@@ -124,6 +126,7 @@ async def create_federal_district(
         db.add(new_district)
         await db.commit()
         await db.refresh(new_district)
+        await invalidate_gazetteer()
         
         logger.info(f"Создан новый федеральный округ: id={new_district.id}, код={new_district.code}, название='{new_district.name}', страна={district_data.country_code}, пользователь_id={current_user.id}")
         
@@ -206,6 +209,7 @@ async def create_region(
         db.add(new_region)
         await db.commit()
         await db.refresh(new_region)
+        await invalidate_gazetteer()
         
         federal_district_info = f" федеральный_округ={region_data.federal_district_code}" if federal_district else ""
         logger.info(f"Создан новый регион: id={new_region.id}, код={new_region.code}, название='{new_region.name}', страна={region_data.country_code}{federal_district_info}, пользователь_id={current_user.id}")
@@ -302,12 +306,15 @@ async def create_city(
             population=city_data.population,
             is_million_city=city_data.is_million_city,
             is_regional_center=city_data.is_regional_center,
+            latitude=city_data.latitude,
+            longitude=city_data.longitude,
             is_active=True
         )
         
         db.add(new_city)
         await db.commit()
         await db.refresh(new_city)
+        await invalidate_gazetteer()
         
         federal_district_info = f" федеральный_округ={city_data.federal_district_code}" if federal_district else ""
         logger.info(f"Создан новый город: id={new_city.id}, название='{new_city.name}', регион='{city_data.region_name}', страна={city_data.country_code}{federal_district_info}, население={city_data.population}, пользователь_id={current_user.id}")
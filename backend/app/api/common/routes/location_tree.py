@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import List, Optional
@@ -9,8 +9,15 @@ from app.db.base import AsyncSessionLocal
 from app.api.common.models.country import Country
 from app.api.common.models.federal_district import FederalDistrict
 from app.api.common.models.region import Region
-from app.api.common.models.city import City
-from app.api.common.schemas.location import LocationItem, LocationResponse
+from app.api.common.routes.cities_filter import _etag_matches
+from app.api.common.schemas.location import (
+    LocationItem,
+    LocationResponse,
+    LocationSuggestion,
+    LocationSuggestionResponse,
+)
+from app.api.common.services.gazetteer import gazetteer_store
+from app.core.config import settings
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -131,102 +138,43 @@ async def get_cities(
     search: Optional[str] = Query(default=None, description="Поиск по названию города"),
     million_cities_only: bool = Query(False, description="Только города-миллионники"),
     regional_centers_only: bool = Query(False, description="Только региональные центры"),
-    db = Depends(get_db)
+    limit: Optional[int] = Query(
+        default=None,
+        ge=1,
+        le=settings.GAZETTEER_MAX_RESULTS,
+        description="Сколько городов вернуть (с search — по умолчанию GAZETTEER_SEARCH_LIMIT)",
+    ),
 ):
-    """Получить список городов по стране, региону и федеральному округу"""
-    print(f"🔍 Запрос городов: country_code={country_code}, region_code={region_code}, federal_district_code={federal_district_code}, search={search}")
+    """Получить список городов по стране, региону и федеральному округу.
+
+    Ищет по справочнику в памяти: без search — по алфавиту, с search — по релевантности
+    (начало названия, начало слова, подстрока, похожие с опечаткой) и населению.
+    total — сколько городов подошло всего, items ограничены limit.
+    """
     try:
-        # Сначала получаем страну (сначала по коду, потом по названию)
-        country_result = await db.execute(
-            select(Country).where(Country.code == country_code, Country.is_active == True)
-        )
-        country = country_result.scalar_one_or_none()
-        
-        # Если не нашли по коду, пробуем найти по названию (для обратной совместимости)
-        if not country:
-            country_result = await db.execute(
-                select(Country).where(Country.name == country_code, Country.is_active == True)
-            )
-            country = country_result.scalar_one_or_none()
-        
+        gazetteer = await gazetteer_store.get()
+        country = gazetteer.resolve_country(country_code)
         if not country:
             return LocationResponse(items=[], total=0)
-        
-        logger.info(f"🔍 DEBUG: Найдена страна {country.name} с ID {country.id}")
-        
-        # Строим запрос
-        query = select(City).where(City.country_id == country.id, City.is_active == True)
-        
-        # Если указан регион, фильтруем по нему
-        if region_code:
-            # Сначала пробуем найти по коду
-            region_result = await db.execute(
-                select(Region)
-                .where(Region.code == region_code, Region.is_active == True)
-            )
-            region = region_result.scalar_one_or_none()
-            
-            # Если не нашли по коду, пробуем найти по названию (для обратной совместимости)
-            if not region:
-                region_result = await db.execute(
-                    select(Region)
-                    .where(Region.name == region_code, Region.is_active == True)
-                )
-                region = region_result.scalar_one_or_none()
-            
-            if region:
-                query = query.where(City.region_id == region.id)
-                logger.info(f"🔍 DEBUG: Найден регион {region.name} с ID {region.id}")
-            else:
-                logger.warning(f"❌ DEBUG: Регион с кодом/названием {region_code} не найден")
-        
-        # Если указан федеральный округ, фильтруем по нему
-        if federal_district_code and isinstance(federal_district_code, str):
-            # Сначала пробуем найти по коду
-            fd_result = await db.execute(
-                select(FederalDistrict)
-                .where(FederalDistrict.code == federal_district_code, FederalDistrict.is_active == True)
-            )
-            federal_district = fd_result.scalar_one_or_none()
-            
-            # Если не нашли по коду, пробуем найти по названию (для обратной совместимости)
-            if not federal_district:
-                fd_result = await db.execute(
-                    select(FederalDistrict)
-                    .where(FederalDistrict.name == federal_district_code, FederalDistrict.is_active == True)
-                )
-                federal_district = fd_result.scalar_one_or_none()
-            
-            if federal_district:
-                query = query.where(City.federal_district_id == federal_district.id)
-                logger.info(f"🔍 DEBUG: Найден федеральный округ {federal_district.name} с ID {federal_district.id}")
-            else:
-                logger.warning(f"❌ DEBUG: Федеральный округ с кодом/названием {federal_district_code} не найден")
-        
-        # Фильтры по типу города
-        if million_cities_only:
-            query = query.where(City.is_million_city == True)
-        
-        if regional_centers_only:
-            query = query.where(City.is_regional_center == True)
-        
-        # Поиск по названию
-        if search:
-            query = query.where(City.name.ilike(f"%{search}%"))
-        
-        query = query.order_by(City.name)
-        result = await db.execute(query)
-        cities = result.scalars().all()
-        
-        logger.info(f"🔍 DEBUG: Найдено {len(cities)} городов")
-        if cities:
-            logger.info(f"🔍 DEBUG: Первые 3 города: {[city.name for city in cities[:3]]}")
-        
-        items = [{"label": city.name, "value": city.name} for city in cities]
-        
+
+        # Ненайденный регион/округ не сужает выборку — как и раньше
+        region = gazetteer.resolve_region(region_code)
+        federal_district = gazetteer.resolve_federal_district(federal_district_code)
+        if limit is None:
+            limit = settings.GAZETTEER_SEARCH_LIMIT if search else settings.GAZETTEER_MAX_RESULTS
+
+        cities, total = gazetteer.search(
+            search,
+            country_id=country.id,
+            region_id=region.id if region else None,
+            federal_district_id=federal_district.id if federal_district else None,
+            million_cities_only=million_cities_only,
+            regional_centers_only=regional_centers_only,
+            limit=limit,
+        )
         return LocationResponse(
-            items=items,
-            total=len(items)
+            items=[{"label": city.name, "value": city.name} for city in cities],
+            total=total
         )
     except HTTPException:
         raise
@@ -234,83 +182,59 @@ async def get_cities(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/autocomplete", response_model=LocationSuggestionResponse)
+async def autocomplete_cities(
+    q: str = Query(..., min_length=1, max_length=100, description="Начало или часть названия города"),
+    country_code: Optional[str] = Query(default=None, description="Код страны (по умолчанию — все страны)"),
+    limit: int = Query(10, ge=1, le=50, description="Сколько подсказок вернуть"),
+):
+    """Подсказки для полей «Откуда/Куда»: «Город, Регион, Страна», крупные города выше."""
+    try:
+        gazetteer = await gazetteer_store.get()
+        country_id = None
+        if country_code:
+            country = gazetteer.resolve_country(country_code)
+            if not country:
+                return LocationSuggestionResponse(items=[], total=0)
+            country_id = country.id
+
+        cities, total = gazetteer.search(q, country_id=country_id, limit=limit)
+        items = []
+        for city in cities:
+            region = gazetteer.regions.get(city.region_id)
+            country = gazetteer.countries.get(city.country_id)
+            items.append(LocationSuggestion(
+                label=city.label,
+                value=city.name,
+                id=city.id,
+                city=city.name,
+                region=region.name if region else None,
+                country=country.name if country else None,
+                population=city.population,
+            ))
+        return LocationSuggestionResponse(items=items, total=total)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/location-tree", response_model=dict)
-async def get_location_tree(db = Depends(get_db)):
-    """Получить полное дерево локаций для фронтенда"""
+async def get_location_tree(request: Request):
+    """Получить полное дерево локаций для фронтенда.
+
+    Тело собирается из справочника в памяти и хранится готовым (в том числе сжатым gzip),
+    ETag меняется при любой правке локаций; при совпадении If-None-Match — 304 без тела.
+    """
     try:
-        # Получаем все страны с их федеральными округами, регионами и городами
-        countries_result = await db.execute(
-            select(Country).where(Country.is_active == True).order_by(Country.name)
-        )
-        countries = countries_result.scalars().all()
-        
-        location_tree = []
-        
-        for country in countries:
-            country_data = {
-                "id": country.id,
-                "code": country.code,
-                "name": country.name,
-                "federal_districts": []
-            }
-            
-            # Получаем федеральные округа для страны
-            fd_result = await db.execute(
-                select(FederalDistrict)
-                .where(FederalDistrict.country_id == country.id, FederalDistrict.is_active == True)
-                .order_by(FederalDistrict.name)
-            )
-            federal_districts = fd_result.scalars().all()
-            
-            for fd in federal_districts:
-                fd_data = {
-                    "id": fd.id,
-                    "name": fd.name,
-                    "code": fd.code,
-                    "regions": []
-                }
-                
-                # Получаем регионы для федерального округа
-                regions_result = await db.execute(
-                    select(Region)
-                    .where(Region.federal_district_id == fd.id, Region.is_active == True)
-                    .order_by(Region.name)
-                )
-                regions = regions_result.scalars().all()
-                
-                for region in regions:
-                    region_data = {
-                        "id": region.id,
-                        "name": region.name,
-                        "code": region.code,
-                        "cities": []
-                    }
-                    
-                    # Получаем города для региона
-                    cities_result = await db.execute(
-                        select(City)
-                        .where(City.region_id == region.id, City.is_active == True)
-                        .order_by(City.name)
-                    )
-                    cities = cities_result.scalars().all()
-                    
-                    for city in cities:
-                        city_data = {
-                            "id": city.id,
-                            "name": city.name,
-                            "population": city.population,
-                            "is_million_city": city.is_million_city,
-                            "is_regional_center": city.is_regional_center
-                        }
-                        region_data["cities"].append(city_data)
-                    
-                    fd_data["regions"].append(region_data)
-                
-                country_data["federal_districts"].append(fd_data)
-            
-            location_tree.append(country_data)
-        
-        return {"countries": location_tree}
-        
+        tree = (await gazetteer_store.get()).location_tree()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+    headers = {"ETag": tree.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if _etag_matches(request, tree.etag):
+        return Response(status_code=304, headers=headers)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=tree.gzip_body, media_type="application/json", headers=headers)
+    return Response(content=tree.body, media_type="application/json", headers=headers)
@@ -33,6 +33,8 @@ class CityCreate(BaseModel):
     population: Optional[int] = Field(None, description="Население города", ge=0)
     is_million_city: bool = Field(False, description="Город-миллионник")
     is_regional_center: bool = Field(False, description="Региональный центр")
+    latitude: Optional[float] = Field(None, description="Широта", ge=-90, le=90)
+    longitude: Optional[float] = Field(None, description="Долгота", ge=-180, le=180)
 
 
 class LocationCreateResponse(BaseModel):
@@ -103,3 +105,18 @@ class CitySearchResponse(BaseModel):
     """Модель ответа для поиска городов"""
     items: List[CityInfo] = Field(..., description="Список найденных городов")
     total: int = Field(..., description="Общее количество найденных городов")
+
+
+class LocationSuggestion(LocationItem):
+    """Подсказка автодополнения: label — «Город, Регион, Страна», value — название города"""
+    id: int = Field(..., description="ID города")
+    city: str = Field(..., description="Название города")
+    region: Optional[str] = Field(None, description="Название региона")
+    country: Optional[str] = Field(None, description="Название страны")
+    population: Optional[int] = Field(None, description="Население города")
+
+
+class LocationSuggestionResponse(BaseModel):
+    """Модель ответа автодополнения городов"""
+    items: List[LocationSuggestion] = Field(..., description="Подсказки в порядке релевантности")
+    total: int = Field(..., description="Сколько всего городов подошло под запрос")
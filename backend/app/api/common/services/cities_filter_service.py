@@ -9,111 +9,76 @@ class CitiesFilterService:
     """Service для агрегации данных о городах"""
     
     @staticmethod
-    async def _build_tree_from_cities_data(cities_data):
-        """Вспомогательный метод для построения дерева из данных городов"""
+    def _build_tree_from_cities_data(cities_data):
+        """
+        Построить дерево страна → округ → регион → город за один проход по городам.
+        Узлы и суммы товаров собираются группировкой по id; порядок — по названию,
+        чтобы одинаковые данные давали одинаковый ответ (и ETag снапшота).
+        """
         if not cities_data:
             return []
-        
-        # Получаем уникальные ID для регионов, округов и стран
-        region_ids = list(set([c['region_id'] for c in cities_data.values()]))
-        fd_ids = list(set([c['federal_district_id'] for c in cities_data.values()]))
-        country_ids = list(set([c['country_id'] for c in cities_data.values()]))
-        
-        # Получаем связанные данные
-        regions = await CitiesFilterRepository.get_regions_by_ids(region_ids)
-        federal_districts = await CitiesFilterRepository.get_federal_districts_by_ids(fd_ids)
-        countries = await CitiesFilterRepository.get_countries_by_ids(country_ids)
-        
-        # Создаем маппинги для быстрого доступа
-        regions_dict = {r.id: r for r in regions}
-        fds_dict = {fd.id: fd for fd in federal_districts}
-        countries_dict = {c.id: c for c in countries}
-        
-        # Строим дерево
-        location_tree = []
-        
-        for country_id, country in countries_dict.items():
-            country_data = {
-                "id": country.id,
-                "code": country.code,
-                "name": country.name,
-                "federal_districts": [],
-                "products_count": 0
-            }
-            
-            # Находим федеральные округа для этой страны
-            for fd_id in fd_ids:
-                city_info = next((c for c in cities_data.values() if c['federal_district_id'] == fd_id), None)
-                if not city_info or city_info['country_id'] != country_id:
-                    continue
-                
-                fd = fds_dict.get(fd_id)
-                if not fd:
-                    continue
-                    
-                fd_data = {
-                    "id": fd.id,
-                    "name": fd.name,
-                    "code": fd.code,
-                    "regions": [],
+
+        countries = {}
+        for city in sorted(cities_data.values(), key=lambda c: (c['name'], c['id'])):
+            country = countries.get(city['country_id'])
+            if country is None:
+                country = countries[city['country_id']] = {
+                    "id": city['country_id'],
+                    "code": city['country_code'],
+                    "name": city['country_name'],
+                    "federal_districts": {},
                     "products_count": 0
                 }
-                
-                # Находим регионы для этого округа
-                for region_id in region_ids:
-                    city_info = next((c for c in cities_data.values() if c['region_id'] == region_id), None)
-                    if not city_info or city_info['federal_district_id'] != fd_id:
-                        continue
-                    
-                    region = regions_dict.get(region_id)
-                    if not region:
-                        continue
-                    
-                    region_data = {
-                        "id": region.id,
-                        "name": region.name,
-                        "code": region.code,
-                        "cities": [],
-                        "products_count": 0
-                    }
-                    
-                    # Добавляем города с количеством товаров
-                    for city_id, city_info in cities_data.items():
-                        if city_info['region_id'] == region_id:
-                            region_data["cities"].append({
-                                "id": city_info['id'],
-                                "name": city_info['name'],
-                                "products_count": city_info['products_count']
-                            })
-                            # Суммируем количество товаров для региона
-                            region_data["products_count"] += city_info['products_count']
-                    
-                    if region_data["cities"]:
-                        fd_data["regions"].append(region_data)
-                        # Суммируем количество товаров для федерального округа
-                        fd_data["products_count"] += region_data["products_count"]
-                
-                if fd_data["regions"]:
-                    country_data["federal_districts"].append(fd_data)
-                    # Суммируем количество товаров для страны
-                    country_data["products_count"] += fd_data["products_count"]
-            
-            if country_data["federal_districts"]:
-                location_tree.append(country_data)
-        
+            fd = country["federal_districts"].get(city['federal_district_id'])
+            if fd is None:
+                fd = country["federal_districts"][city['federal_district_id']] = {
+                    "id": city['federal_district_id'],
+                    "name": city['federal_district_name'],
+                    "code": city['federal_district_code'],
+                    "regions": {},
+                    "products_count": 0
+                }
+            region = fd["regions"].get(city['region_id'])
+            if region is None:
+                region = fd["regions"][city['region_id']] = {
+                    "id": city['region_id'],
+                    "name": city['region_name'],
+                    "code": city['region_code'],
+                    "cities": [],
+                    "products_count": 0
+                }
+
+            region["cities"].append({
+                "id": city['id'],
+                "name": city['name'],
+                "products_count": city['products_count']
+            })
+            region["products_count"] += city['products_count']
+            fd["products_count"] += city['products_count']
+            country["products_count"] += city['products_count']
+
+        def by_name(nodes):
+            return sorted(nodes, key=lambda node: (node["name"], node["id"]))
+
+        location_tree = []
+        for country in by_name(countries.values()):
+            for fd in country["federal_districts"].values():
+                fd["regions"] = by_name(fd["regions"].values())
+            country["federal_districts"] = by_name(country["federal_districts"].values())
+            location_tree.append(country)
         return location_tree
-    
+
     @staticmethod
     async def build_products_location_tree():
         """Построить дерево локаций с количеством товаров"""
         cities_data = await CitiesFilterRepository.get_cities_with_products_count()
-        return await CitiesFilterService._build_tree_from_cities_data(cities_data)
+        return CitiesFilterService._build_tree_from_cities_data(cities_data)
     
     @staticmethod
     async def build_services_location_tree():
         """Построить дерево локаций с количеством услуг"""
         cities_data = await CitiesFilterRepository.get_cities_with_services_count()
-        return await CitiesFilterService._build_tree_from_cities_data(cities_data)
+        return CitiesFilterService._build_tree_from_cities_data(cities_data)
     
     @staticmethod
     async def build_companies_location_tree():
@@ -144,7 +109,7 @@ class CitiesFilterService:
             }]
         
         # Обычная иерархическая структура
-        return await CitiesFilterService._build_tree_from_cities_data(cities_result)
+        return CitiesFilterService._build_tree_from_cities_data(cities_result)
     
     @staticmethod
     async def build_location_tree():
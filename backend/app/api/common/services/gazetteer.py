@@ -0,0 +1,446 @@
+"""
+Справочник локаций в памяти процесса (страны, округа, регионы, города) для автодополнения.
+
+Справочник почти не меняется, а поля «Откуда/Куда» дёргают поиск городов на каждое
+нажатие клавиши, поэтому всё читается из БД одним проходом (по запросу на таблицу)
+и дальше ищется в памяти:
+- префиксный индекс — отсортированный список нормализованных названий и слов названия,
+  поиск префикса — bisect (компактная замена trie на тех же операциях);
+- триграммный индекс — для подстрок и опечаток, ранжирование по сходству как в pg_trgm.
+Порядок: точное совпадение, начало названия, начало слова, подстрока, похожие; внутри
+группы — по населению. Результат всегда ограничен лимитом.
+Из тех же данных собирается полное дерево локаций (/locations/location-tree): JSON и его
+gzip считаются один раз на загрузку справочника, ETag — хэш тела.
+
+Запись локаций вызывает invalidate_gazetteer(): в Redis пишется новое поколение, и каждый
+воркер перечитывает справочник, сверяясь с Redis не чаще раза в GAZETTEER_CHECK_INTERVAL
+секунд; заодно помечаются устаревшими деревья фильтра городов (location_tree_snapshots).
+Правки в обход API и админки (SQL) подхватываются не позже GAZETTEER_RELOAD_INTERVAL.
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import math
+import re
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from operator import attrgetter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+
+from app.api.common.models.city import City
+from app.api.common.models.country import Country
+from app.api.common.models.federal_district import FederalDistrict
+from app.api.common.models.region import Region
+from app.core.config import settings
+from app.db import base as db_base
+from app_logging.logger import logger
+
+GENERATION_KEY = "gazetteer:generation"
+# Ниже этого сходства триграмм кандидат не считается совпадением (порог pg_trgm по умолчанию)
+TRIGRAM_THRESHOLD = 0.3
+
+# Ранги совпадения: чем меньше, тем выше в выдаче
+RANK_EXACT, RANK_NAME_PREFIX, RANK_WORD_PREFIX, RANK_SUBSTRING, RANK_SIMILAR = range(5)
+
+EARTH_RADIUS_KM = 6371.0
+EARTH_KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+_SEPARATORS = re.compile(r"[\s\-–—.,()]+")
+
+
+def normalize(value: Optional[str]) -> str:
+    """Нижний регистр, ё -> е, дефисы и знаки препинания -> пробел."""
+    if not value:
+        return ""
+    return _SEPARATORS.sub(" ", value.lower().replace("ё", "е")).strip()
+
+
+def trigrams(norm: str) -> set:
+    """Триграммы слов с отступами, как в pg_trgm: «  слово »."""
+    result = set()
+    for word in norm.split():
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def _distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние по большому кругу (haversine)."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class GazetteerArea(NamedTuple):
+    id: int
+    code: str
+    name: str
+    country_id: Optional[int]
+    federal_district_id: Optional[int] = None  # только у регионов
+
+
+class LocationTreeBody(NamedTuple):
+    """Готовый ответ /locations/location-tree: JSON, его gzip и ETag (хэш тела)."""
+    etag: str
+    body: bytes
+    gzip_body: bytes
+
+
+class GazetteerCity(NamedTuple):
+    id: int
+    name: str
+    country_id: int
+    region_id: int
+    federal_district_id: Optional[int]
+    population: Optional[int]
+    is_million_city: bool
+    is_regional_center: bool
+    label: str  # «Город, Регион, Страна»
+    norm: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+
+class Gazetteer:
+    """Неизменяемый индекс справочника; пересобирается целиком при изменениях."""
+
+    def __init__(
+        self,
+        countries: Iterable[GazetteerArea],
+        federal_districts: Iterable[GazetteerArea],
+        regions: Iterable[GazetteerArea],
+        cities: Iterable[tuple],
+    ):
+        self.countries = {area.id: area for area in countries}
+        self.federal_districts = {area.id: area for area in federal_districts}
+        self.regions = {area.id: area for area in regions}
+
+        self.cities: List[GazetteerCity] = []
+        for row in sorted(cities, key=lambda row: normalize(row.name)):
+            region = self.regions.get(row.region_id)
+            country = self.countries.get(row.country_id)
+            label = ", ".join(part for part in (row.name, region and region.name, country and country.name) if part)
+            self.cities.append(GazetteerCity(
+                row.id,
+                row.name,
+                row.country_id,
+                row.region_id,
+                row.federal_district_id,
+                row.population,
+                bool(row.is_million_city),
+                bool(row.is_regional_center),
+                label,
+                normalize(row.name),
+                row.latitude,
+                row.longitude,
+            ))
+        self.cities_by_id = {city.id: city for city in self.cities}
+
+        prefix_entries: List[Tuple[str, int, int]] = []
+        self._trigrams: Dict[str, List[int]] = defaultdict(list)
+        self._trigram_counts: List[int] = []
+        for index, city in enumerate(self.cities):
+            prefix_entries.append((city.norm, RANK_NAME_PREFIX, index))
+            for word in city.norm.split()[1:]:
+                prefix_entries.append((word, RANK_WORD_PREFIX, index))
+            grams = trigrams(city.norm)
+            self._trigram_counts.append(len(grams))
+            for gram in grams:
+                self._trigrams[gram].append(index)
+        prefix_entries.sort()
+        self._prefix_keys = [entry[0] for entry in prefix_entries]
+        self._prefix_entries = prefix_entries
+
+        self._cities_by_country: Dict[int, List[int]] = defaultdict(list)
+        self._cities_by_norm: Dict[str, List[GazetteerCity]] = defaultdict(list)
+        for index, city in enumerate(self.cities):
+            self._cities_by_country[city.country_id].append(index)
+            self._cities_by_norm[city.norm].append(city)
+        self._regions_by_norm: Dict[str, List[GazetteerArea]] = defaultdict(list)
+        for region in self.regions.values():
+            self._regions_by_norm[normalize(region.name)].append(region)
+
+        # Города с координатами по широте — для выборки в радиусе через bisect
+        located = sorted((city.latitude, city.id) for city in self.cities if city.latitude is not None and city.longitude is not None)
+        self._latitudes = [latitude for latitude, _ in located]
+        self._located_ids = [city_id for _, city_id in located]
+
+        self._location_tree: Optional[LocationTreeBody] = None
+
+    @staticmethod
+    def _resolve(areas: Dict[int, GazetteerArea], value: Optional[str]) -> Optional[GazetteerArea]:
+        """Сначала по коду, потом по названию (обратная совместимость старых клиентов)."""
+        if not value:
+            return None
+        for area in areas.values():
+            if area.code == value:
+                return area
+        for area in areas.values():
+            if area.name == value:
+                return area
+        return None
+
+    def resolve_country(self, value: Optional[str]) -> Optional[GazetteerArea]:
+        return self._resolve(self.countries, value)
+
+    def resolve_region(self, value: Optional[str]) -> Optional[GazetteerArea]:
+        return self._resolve(self.regions, value)
+
+    def resolve_federal_district(self, value: Optional[str]) -> Optional[GazetteerArea]:
+        return self._resolve(self.federal_districts, value)
+
+    def resolve_place(self, name: Optional[str]) -> Tuple[List[GazetteerCity], List[GazetteerArea]]:
+        """Города и регионы с таким названием (без учёта регистра, ё и дефисов)."""
+        norm = normalize(name)
+        return list(self._cities_by_norm.get(norm, ())), list(self._regions_by_norm.get(norm, ()))
+
+    def cities_near(self, city: GazetteerCity, radius_km: float) -> List[GazetteerCity]:
+        """Города не дальше radius_km от city (по прямой); без координат — только сам город."""
+        if city.latitude is None or city.longitude is None:
+            return [city]
+        delta = radius_km / EARTH_KM_PER_DEGREE
+        start = bisect_left(self._latitudes, city.latitude - delta)
+        end = bisect_right(self._latitudes, city.latitude + delta)
+        result = []
+        for city_id in self._located_ids[start:end]:
+            other = self.cities_by_id[city_id]
+            if _distance_km(city.latitude, city.longitude, other.latitude, other.longitude) <= radius_km:
+                result.append(other)
+        return result
+
+    def location_tree(self) -> LocationTreeBody:
+        """Дерево страна -> округ -> регион -> город; собирается за один проход при первом запросе."""
+        if self._location_tree is not None:
+            return self._location_tree
+
+        by_name = attrgetter("name")
+        cities_by_region: Dict[int, list] = defaultdict(list)
+        for city in sorted(self.cities, key=by_name):
+            cities_by_region[city.region_id].append({
+                "id": city.id,
+                "name": city.name,
+                "population": city.population,
+                "is_million_city": city.is_million_city,
+                "is_regional_center": city.is_regional_center,
+            })
+        regions_by_district: Dict[int, list] = defaultdict(list)
+        for region in sorted(self.regions.values(), key=by_name):
+            regions_by_district[region.federal_district_id].append({
+                "id": region.id,
+                "name": region.name,
+                "code": region.code,
+                "cities": cities_by_region.get(region.id, []),
+            })
+        districts_by_country: Dict[int, list] = defaultdict(list)
+        for district in sorted(self.federal_districts.values(), key=by_name):
+            districts_by_country[district.country_id].append({
+                "id": district.id,
+                "name": district.name,
+                "code": district.code,
+                "regions": regions_by_district.get(district.id, []),
+            })
+        tree = [
+            {
+                "id": country.id,
+                "code": country.code,
+                "name": country.name,
+                "federal_districts": districts_by_country.get(country.id, []),
+            }
+            for country in sorted(self.countries.values(), key=by_name)
+        ]
+
+        body = json.dumps({"countries": tree}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self._location_tree = LocationTreeBody(etag, body, gzip.compress(body, compresslevel=9, mtime=0))
+        return self._location_tree
+
+    def _match(self, query: str) -> Dict[int, tuple]:
+        """Индекс города -> ключ сортировки (ранг, -сходство) для всех совпадений с запросом."""
+        matches: Dict[int, tuple] = {}
+        start = bisect_left(self._prefix_keys, query)
+        for key, rank, index in self._prefix_entries[start:]:
+            if not key.startswith(query):
+                break
+            if rank == RANK_NAME_PREFIX and self.cities[index].norm == query:
+                rank = RANK_EXACT
+            if index not in matches or matches[index][0] > rank:
+                matches[index] = (rank, 0.0)
+
+        query_grams = trigrams(query)
+        if len(query) < 3 or not query_grams:
+            return matches
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self._trigrams.get(gram, ()))
+        for index, common in shared.items():
+            if index in matches:
+                continue
+            similarity = common / (len(query_grams) + self._trigram_counts[index] - common)
+            if query in self.cities[index].norm:
+                matches[index] = (RANK_SUBSTRING, -similarity)
+            elif similarity >= TRIGRAM_THRESHOLD:
+                matches[index] = (RANK_SIMILAR, -similarity)
+        return matches
+
+    def search(
+        self,
+        search: Optional[str] = None,
+        *,
+        country_id: Optional[int] = None,
+        region_id: Optional[int] = None,
+        federal_district_id: Optional[int] = None,
+        million_cities_only: bool = False,
+        regional_centers_only: bool = False,
+        limit: int,
+    ) -> Tuple[List[GazetteerCity], int]:
+        """(первые limit городов, сколько всего подошло). Без search — по алфавиту, иначе по релевантности."""
+
+        def _accept(city: GazetteerCity) -> bool:
+            return (
+                (country_id is None or city.country_id == country_id)
+                and (region_id is None or city.region_id == region_id)
+                and (federal_district_id is None or city.federal_district_id == federal_district_id)
+                and (not million_cities_only or city.is_million_city)
+                and (not regional_centers_only or city.is_regional_center)
+            )
+
+        query = normalize(search)
+        if not query:
+            candidates = self._cities_by_country.get(country_id, []) if country_id is not None else range(len(self.cities))
+            found = [self.cities[index] for index in candidates if _accept(self.cities[index])]
+            return found[:limit], len(found)
+
+        ranked = [
+            (sort_key, -(self.cities[index].population or 0), index)
+            for index, sort_key in self._match(query).items()
+            if _accept(self.cities[index])
+        ]
+        ranked.sort()
+        return [self.cities[index] for _, _, index in ranked[:limit]], len(ranked)
+
+
+async def _load() -> Gazetteer:
+    async with db_base.AsyncSessionLocal() as session:
+        countries = await session.execute(
+            select(Country.id, Country.code, Country.name).where(Country.is_active == True)
+        )
+        federal_districts = await session.execute(
+            select(FederalDistrict.id, FederalDistrict.code, FederalDistrict.name, FederalDistrict.country_id)
+            .where(FederalDistrict.is_active == True)
+        )
+        regions = await session.execute(
+            select(Region.id, Region.code, Region.name, Region.country_id, Region.federal_district_id)
+            .where(Region.is_active == True)
+        )
+        cities = await session.execute(
+            select(
+                City.id,
+                City.name,
+                City.country_id,
+                City.region_id,
+                City.federal_district_id,
+                City.population,
+                City.is_million_city,
+                City.is_regional_center,
+                City.latitude,
+                City.longitude,
+            ).where(City.is_active == True)
+        )
+        return Gazetteer(
+            [GazetteerArea(row.id, row.code, row.name, None) for row in countries],
+            [GazetteerArea(*row) for row in federal_districts],
+            [GazetteerArea(*row) for row in regions],
+            list(cities),
+        )
+
+
+async def _redis():
+    try:
+        from app.core.cache import redis_cache
+
+        await redis_cache.connect()
+        return redis_cache if redis_cache.redis_client else None
+    except Exception:
+        return None
+
+
+class GazetteerStore:
+    """Текущий Gazetteer процесса: загрузка при первом запросе (или на старте), перечитывание по поколению."""
+
+    def __init__(self):
+        self._gazetteer: Optional[Gazetteer] = None
+        self._generation: Optional[str] = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _shared_generation(self) -> Optional[str]:
+        cache = await _redis()
+        if cache is None:
+            return None
+        value = await cache.get(GENERATION_KEY)
+        return str(value) if value is not None else None
+
+    @property
+    def current(self) -> Optional[Gazetteer]:
+        """Уже загруженный справочник без обращения к БД (для синхронного кода)."""
+        return self._gazetteer
+
+    async def get(self) -> Gazetteer:
+        now = time.time()
+        if self._gazetteer is not None and now - self._loaded_at < settings.GAZETTEER_RELOAD_INTERVAL:
+            if now - self._checked_at < settings.GAZETTEER_CHECK_INTERVAL:
+                return self._gazetteer
+            self._checked_at = now
+            generation = await self._shared_generation()
+            if generation is None or generation == self._generation:
+                return self._gazetteer
+        return await self.reload()
+
+    async def reload(self) -> Gazetteer:
+        """Перечитать справочник (один запрос к БД на процесс, даже при одновременных вызовах)."""
+        loaded_at = self._loaded_at
+        async with self._lock:
+            if self._gazetteer is not None and self._loaded_at != loaded_at:
+                return self._gazetteer
+            generation = await self._shared_generation()
+            started = time.time()
+            gazetteer = await _load()
+            self._gazetteer, self._generation = gazetteer, generation
+            self._loaded_at = self._checked_at = time.time()
+            logger.info(
+                "Gazetteer loaded: %s cities in %.0f ms", len(gazetteer.cities), (time.time() - started) * 1000
+            )
+            return gazetteer
+
+    async def invalidate(self) -> None:
+        self._loaded_at = 0.0
+        cache = await _redis()
+        if cache is not None:
+            await cache.set(GENERATION_KEY, str(time.time_ns()), expire=settings.GAZETTEER_RELOAD_INTERVAL * 24)
+
+
+gazetteer_store = GazetteerStore()
+
+
+async def invalidate_gazetteer() -> None:
+    """Сбросить справочник во всех воркерах после записи стран/округов/регионов/городов.
+
+    Деревья фильтра городов строятся по тем же названиям, связям и is_active — они
+    помечаются устаревшими здесь же.
+    """
+    # Отложенный импорт: снапшоты тянут app.db.base, а справочник нужен моделям ТС
+    from app.api.common.services.location_tree_snapshots import mark_location_trees_dirty
+
+    try:
+        await gazetteer_store.invalidate()
+    except Exception as e:
+        logger.warning("Failed to invalidate gazetteer: %s", e)
+    await mark_location_trees_dirty()
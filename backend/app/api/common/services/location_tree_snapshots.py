@@ -0,0 +1,192 @@
+"""
+Предрасчитанные снапшоты деревьев фильтра городов (товары / услуги / компании).
+
+Снапшот — готовое тело JSON-ответа, его версия и ETag (хэш тела). Хранится в Redis
+(общий для воркеров) и в памяти процесса. Записи товаров и компаний не пересчитывают
+дерево сразу, а помечают его «грязным» (mark_location_trees_dirty); Celery beat
+раз в минуту пересобирает только грязные деревья (refresh_dirty_location_trees).
+Если воркера Celery нет, запрос сам пересоберёт дерево, когда оно пробудет грязным
+дольше LOCATION_TREE_MAX_STALENESS секунд. Без Redis всё живёт в пределах процесса.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from app.api.common.services.cities_filter_service import CitiesFilterService
+from app.core.config import settings
+from app_logging.logger import logger
+
+LOCATION_TREE_KINDS = ("products", "services", "companies")
+
+_BUILDERS = {
+    "products": CitiesFilterService.build_products_location_tree,
+    "services": CitiesFilterService.build_services_location_tree,
+    "companies": CitiesFilterService.build_companies_location_tree,
+}
+
+
+class LocationTreeSnapshot(NamedTuple):
+    version: int
+    etag: str
+    body: bytes
+    built_at: float
+
+
+def _tree_response(location_tree: list) -> dict:
+    """Формирует стандартный ответ с деревом"""
+    return {
+        "countries": location_tree,
+        "total_countries": len(location_tree),
+        "total_federal_districts": sum(len(country["federal_districts"]) for country in location_tree),
+        "total_regions": sum(
+            len(fd["regions"])
+            for country in location_tree
+            for fd in country["federal_districts"]
+        ),
+        "total_cities": sum(
+            len(region["cities"])
+            for country in location_tree
+            for fd in country["federal_districts"]
+            for region in fd["regions"]
+        ),
+    }
+
+
+def _snapshot_key(kind: str) -> str:
+    return f"cities_filter:tree:{kind}"
+
+
+def _etag_key(kind: str) -> str:
+    return f"cities_filter:tree:{kind}:etag"
+
+
+def _dirty_key(kind: str) -> str:
+    return f"cities_filter:dirty:{kind}"
+
+
+async def _redis():
+    try:
+        from app.core.cache import redis_cache
+
+        await redis_cache.connect()
+        return redis_cache if redis_cache.redis_client else None
+    except Exception:
+        return None
+
+
+class LocationTreeSnapshots:
+    def __init__(self):
+        # kind -> (снапшот, когда сверяли ETag с Redis)
+        self._local: Dict[str, tuple] = {}
+        self._local_dirty: Dict[str, float] = {}
+        self._locks = {kind: asyncio.Lock() for kind in LOCATION_TREE_KINDS}
+
+    async def _dirty_since(self, kind: str) -> Optional[float]:
+        cache = await _redis()
+        if cache is not None:
+            value = await cache.get(_dirty_key(kind))
+            return float(value) if value is not None else None
+        return self._local_dirty.get(kind)
+
+    async def _load_shared(self, kind: str) -> Optional[LocationTreeSnapshot]:
+        cache = await _redis()
+        if cache is None:
+            return None
+        local = self._local.get(kind)
+        etag = await cache.get(_etag_key(kind))
+        if etag is None:
+            return None
+        if local is not None and local[0].etag == etag:
+            return local[0]
+        data = await cache.get(_snapshot_key(kind))
+        if not data:
+            return None
+        return LocationTreeSnapshot(data["version"], data["etag"], data["body"].encode("utf-8"), data["built_at"])
+
+    async def get(self, kind: str) -> LocationTreeSnapshot:
+        """Текущий снапшот; при отсутствии или слишком долгой «грязности» — пересборка."""
+        local = self._local.get(kind)
+        if local is not None and time.time() - local[1] < settings.LOCATION_TREE_LOCAL_TTL:
+            snapshot = local[0]
+        else:
+            snapshot = await self._load_shared(kind) or (local[0] if local else None)
+            if snapshot is not None:
+                self._local[kind] = (snapshot, time.time())
+
+        if snapshot is not None:
+            dirty_since = await self._dirty_since(kind)
+            if dirty_since is None or time.time() - dirty_since < settings.LOCATION_TREE_MAX_STALENESS:
+                return snapshot
+        return await self.rebuild(kind)
+
+    async def rebuild(self, kind: str) -> LocationTreeSnapshot:
+        """Пересобрать дерево (одно построение на процесс, даже при одновременных запросах)."""
+        async with self._locks[kind]:
+            dirty_since = await self._dirty_since(kind)
+            local = self._local.get(kind)
+            # Пока ждали блокировку, дерево мог собрать соседний запрос
+            if local is not None and local[0].built_at > (dirty_since or 0) and time.time() - local[1] < 1:
+                return local[0]
+
+            started = time.time()
+            tree = await _BUILDERS[kind]()
+            body = json.dumps(_tree_response(tree), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+            previous = local[0] if local else await self._load_shared(kind)
+            version = previous.version + (previous.etag != etag) if previous else 1
+            snapshot = LocationTreeSnapshot(version, etag, body, started)
+
+            self._local[kind] = (snapshot, time.time())
+            cache = await _redis()
+            if cache is not None:
+                ttl = settings.LOCATION_TREE_SNAPSHOT_TTL
+                await cache.set(
+                    _snapshot_key(kind),
+                    {"version": version, "etag": etag, "body": body.decode("utf-8"), "built_at": started},
+                    expire=ttl,
+                )
+                await cache.set(_etag_key(kind), etag, expire=ttl)
+                # Сбрасываем флаг, только если за время сборки не было новых изменений
+                if dirty_since is not None and dirty_since == await self._dirty_since(kind):
+                    await cache.delete(_dirty_key(kind))
+            elif self._local_dirty.get(kind) == dirty_since:
+                self._local_dirty.pop(kind, None)
+            logger.info("Location tree %s rebuilt: version %s, %s bytes", kind, version, len(body))
+            return snapshot
+
+    async def mark_dirty(self, kinds: Iterable[str]) -> None:
+        now = time.time()
+        cache = await _redis()
+        for kind in kinds:
+            # Держим время первого изменения — от него отсчитывается допустимая задержка
+            if cache is not None:
+                if await cache.get(_dirty_key(kind)) is None:
+                    await cache.set(_dirty_key(kind), now, expire=settings.LOCATION_TREE_SNAPSHOT_TTL)
+            else:
+                self._local_dirty.setdefault(kind, now)
+
+    async def refresh_dirty(self) -> List[str]:
+        refreshed = []
+        for kind in LOCATION_TREE_KINDS:
+            if await self._dirty_since(kind) is not None:
+                await self.rebuild(kind)
+                refreshed.append(kind)
+        return refreshed
+
+
+location_tree_snapshots = LocationTreeSnapshots()
+
+
+async def mark_location_trees_dirty(kinds: Iterable[str] = LOCATION_TREE_KINDS) -> None:
+    """Пометить деревья устаревшими после записи товаров/компаний."""
+    try:
+        await location_tree_snapshots.mark_dirty(kinds)
+    except Exception as e:
+        logger.warning("Failed to mark location trees dirty: %s", e)
+
+
+async def refresh_dirty_location_trees() -> List[str]:
+    """Пересобрать только изменившиеся деревья; вызывается Celery beat, годится и для тестов."""
+    return await location_tree_snapshots.refresh_dirty()
@@ -0,0 +1,8 @@
+from app.api.common.services.location_tree_snapshots import refresh_dirty_location_trees
+from app.celery_app import celery_app, run_async
+
+
+@celery_app.task(name="cities_filter.refresh_location_trees")
+def refresh_location_trees_task() -> list:
+    """Пересобрать снапшоты деревьев фильтра городов, изменившиеся с прошлого запуска."""
+    return run_async(refresh_dirty_location_trees())
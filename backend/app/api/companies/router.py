@@ -6,6 +6,7 @@ from app.api.companies.dependencies import companies_repository_dep
 from app.api.companies.schemas.companies import CompaniesResponse, PaginationInfo
 from app.api.company.schemas.company import CompanyResponse, ShortCompanyResponse, CompanyStatisticsResponse
 from app.api.company.schemas.filters import CompanyFilterRequest
+from app.core.pagination import InvalidCursorError, catalog_total, keyset_query, split_page
 
 router = APIRouter(tags=["companies"])
 
@@ -277,33 +278,44 @@ async def search_companies_with_filters(
         )
     
     # Базовый запрос
-    base_query = select(Company).options(
-        selectinload(Company.officials)
-    ).where(and_(*conditions)).order_by(Company.registration_date.desc())
+    base_query = select(Company).where(and_(*conditions))
     
-    # Подсчёт total
-    count_query = select(func.count(Company.id)).where(and_(*conditions))
-    count_result = await companies_repository.session.execute(count_query)
-    total_count = count_result.scalar()
+    # total из кэша/оценки, точный COUNT(*) — только по exact_total
+    total_count, total_is_estimate = await catalog_total(
+        companies_repository.session, base_query.with_only_columns(Company.id), filter_request.exact_total
+    )
     
-    # Применяем пагинацию
+    # Пагинация: keyset по (registration_date, id) при cursor, иначе прежний OFFSET
     offset = filter_request.skip
-    paginated_query = base_query.offset(offset).limit(filter_request.limit)
+    try:
+        paginated_query = keyset_query(
+            base_query, [Company.registration_date, Company.id], filter_request.cursor, filter_request.limit
+        )
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not filter_request.cursor:
+        paginated_query = paginated_query.offset(offset)
     
     # Выполняем запрос
-    result = await companies_repository.session.execute(paginated_query)
-    companies = result.scalars().all()
+    result = await companies_repository.session.execute(
+        paginated_query.options(selectinload(Company.officials))
+    )
+    companies, next_cursor = split_page(
+        list(result.scalars().all()), filter_request.limit, lambda company: (company.registration_date, company.id)
+    )
     
     # Вычисляем общее количество страниц
     total_pages = (total_count + filter_request.limit - 1) // filter_request.limit
     
     return CompaniesResponse(
-        data=list(companies),
+        data=companies,
         pagination=PaginationInfo(
             total=total_count,
             page=offset // filter_request.limit + 1,
             perPage=filter_request.limit,
-            totalPages=total_pages
+            totalPages=total_pages,
+            nextCursor=next_cursor,
+            totalIsEstimate=total_is_estimate
         )
     )
 
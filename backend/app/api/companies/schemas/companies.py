@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel, Field, ConfigDict
 
@@ -50,6 +50,8 @@ class PaginationInfo(BaseModel):
     page: int
     per_page: int = Field(..., alias="perPage")
     total_pages: int = Field(..., alias="totalPages")
+    next_cursor: Optional[str] = Field(None, alias="nextCursor")
+    total_is_estimate: bool = Field(False, alias="totalIsEstimate")
 
 
 class CompaniesResponse(BaseModel):
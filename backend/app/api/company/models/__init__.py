@@ -2,7 +2,7 @@ from .announcement import Announcement
 from .company import Company, TradeActivity, BusinessType
 from .official import CompanyOfficial
 from .fill_address import CompanyFillAddress, FillAddressKind
-from .fleet import CompanyVehicle, CompanyDriver
+from .fleet import CompanyVehicle, CompanyDriver, VehicleRoutePoint
 
 __all__ = [
 	"Company",
@@ -11,6 +11,7 @@ __all__ = [
 	"FillAddressKind",
 	"CompanyVehicle",
 	"CompanyDriver",
+	"VehicleRoutePoint",
 	"Announcement",
 	"TradeActivity",
 	"BusinessType",
@@ -1,7 +1,7 @@
 from datetime import datetime, date
 from typing import TYPE_CHECKING, Optional
 
-from sqlalchemy import String, ForeignKey, Boolean, DateTime, Float, JSON
+from sqlalchemy import String, ForeignKey, Boolean, DateTime, Float, Index, JSON, event, inspect
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base_class import Base
@@ -46,6 +46,42 @@ class CompanyVehicle(Base):
 	company: Mapped["Company"] = relationship("Company", backref="vehicles")
 
 
+class VehicleRoutePoint(Base):
+	"""Точка маршрута ТС (Откуда/Куда), приведённая к городу/региону справочника.
+
+	Ведётся из CompanyVehicle.from_locations / to_locations при каждой их записи
+	(app/api/company/services/vehicle_routes.py); поиск транспорта выбирает ТС по индексам
+	этой таблицы, а не разбором JSON в Python.
+	"""
+
+	__tablename__ = "company_vehicle_route_points"
+	__table_args__ = (
+		Index("ix_vehicle_route_points_city", "direction", "city_id", "vehicle_id"),
+		Index("ix_vehicle_route_points_region", "direction", "region_id", "vehicle_id"),
+		Index("ix_vehicle_route_points_name", "direction", "name_key", "vehicle_id"),
+	)
+
+	vehicle_id: Mapped[int] = mapped_column(
+		ForeignKey("company_vehicles.id", ondelete="CASCADE"), nullable=False, index=True
+	)
+	direction: Mapped[str] = mapped_column(String(4), nullable=False)  # "from" / "to"
+	name_key: Mapped[str] = mapped_column(String(200), nullable=False)  # Нормализованное название
+	# Город маршрута; NULL при region_id — весь регион
+	city_id: Mapped[Optional[int]] = mapped_column(ForeignKey("cities.id", ondelete="SET NULL"), nullable=True)
+	region_id: Mapped[Optional[int]] = mapped_column(ForeignKey("regions.id", ondelete="SET NULL"), nullable=True)
+
+
+@event.listens_for(CompanyVehicle, "after_insert")
+@event.listens_for(CompanyVehicle, "after_update")
+def _sync_route_points(mapper, connection, vehicle: CompanyVehicle) -> None:
+	attrs = inspect(vehicle).attrs
+	if not (attrs.from_locations.history.has_changes() or attrs.to_locations.history.has_changes()):
+		return
+	from app.api.company.services.vehicle_routes import write_route_points
+
+	write_route_points(connection, vehicle)
+
+
 class CompanyDriver(Base):
 	"""Водитель компании (ЛК → Водители)."""
 
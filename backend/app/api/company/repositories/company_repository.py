@@ -12,6 +12,7 @@ from sqlalchemy.orm import selectinload
 
 from app.api.company.models.company import Company
 from app.api.company.schemas.company import CompanyCreate, CompanyUpdate, CompanyCreateInactive
+from app.api.products.services.cache_service import invalidate_catalog_caches
 
 logger = logging.getLogger(__name__)
 
@@ -98,6 +99,8 @@ class CompanyRepository:
         )
         self.session.add(company)
         await self.session.commit()
+        # Локация и активность компании входят в локации и фасеты каталога
+        await invalidate_catalog_caches()
         await self.session.refresh(company)
         return company
 
@@ -190,6 +193,7 @@ class CompanyRepository:
             )
 
         await self.session.commit()
+        await invalidate_catalog_caches()
         return await self.get_by_id(company_id)
 
     async def activate_company(self, company_id: int) -> Optional[Company]:
@@ -200,6 +204,7 @@ class CompanyRepository:
             .values(is_active=True)
         )
         await self.session.commit()
+        await invalidate_catalog_caches()
         return await self.get_by_id(company_id)
 
     async def delete(self, company_id: int) -> bool:
@@ -207,6 +212,7 @@ class CompanyRepository:
             delete(Company).where(Company.id == company_id)
         )
         await self.session.commit()
+        await invalidate_catalog_caches()
         return result.rowcount > 0
 
     async def update_logo(self, company_id: int, logo_url: str) -> Optional[Company]:
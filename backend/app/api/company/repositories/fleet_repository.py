@@ -4,7 +4,9 @@ from typing import Optional, Sequence
 from sqlalchemy import select, update, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.company.models.fleet import CompanyVehicle, CompanyDriver
+from app.api.common.services.gazetteer import gazetteer_store
+from app.api.company.models.fleet import CompanyVehicle, CompanyDriver, VehicleRoutePoint
+from app.api.shipments.search_cache import invalidate_transport_search
 from app.api.company.schemas.fleet import (
 	CompanyVehicleCreate,
 	CompanyVehicleUpdate,
@@ -32,10 +34,13 @@ class CompanyVehicleRepository:
 		return result.scalar_one_or_none()
 
 	async def create(self, data: CompanyVehicleCreate, company_id: int) -> CompanyVehicle:
+		# Точки маршрута пишутся при flush и приводятся к справочнику локаций
+		await gazetteer_store.get()
 		row = CompanyVehicle(company_id=company_id, **data.model_dump())
 		self.session.add(row)
 		await self.session.commit()
 		await self.session.refresh(row)
+		await invalidate_transport_search()
 		return row
 
 	async def update(self, vehicle_id: int, data: CompanyVehicleUpdate) -> Optional[CompanyVehicle]:
@@ -44,19 +49,23 @@ class CompanyVehicleRepository:
 			return None
 		payload = data.model_dump(exclude_unset=True)
 		if payload:
-			payload["updated_at"] = datetime.utcnow()
-			await self.session.execute(
-				update(CompanyVehicle).where(CompanyVehicle.id == vehicle_id).values(**payload)
-			)
+			# Через объект, а не UPDATE: изменение маршрута переписывает точки при flush
+			await gazetteer_store.get()
+			for field, value in payload.items():
+				setattr(row, field, value)
+			row.updated_at = datetime.utcnow()
 			await self.session.commit()
+			await invalidate_transport_search()
 		return await self.get_by_id(vehicle_id)
 
 	async def delete(self, vehicle_id: int) -> bool:
 		row = await self.get_by_id(vehicle_id)
 		if not row:
 			return False
+		await self.session.execute(delete(VehicleRoutePoint).where(VehicleRoutePoint.vehicle_id == vehicle_id))
 		await self.session.execute(delete(CompanyVehicle).where(CompanyVehicle.id == vehicle_id))
 		await self.session.commit()
+		await invalidate_transport_search()
 		return True
 
 
@@ -38,6 +38,9 @@ class ProductFilterRequest(BaseModel):
     in_stock: Optional[bool] = None
     skip: int = Field(0, ge=0)
     limit: int = Field(20, ge=1, le=100)
+    # Keyset-пагинация: next_cursor из прошлого ответа вместо skip
+    cursor: Optional[str] = None
+    exact_total: bool = False
 
 
 class ServiceFilterRequest(BaseModel):
@@ -52,6 +55,9 @@ class ServiceFilterRequest(BaseModel):
     in_stock: Optional[bool] = None
     skip: int = Field(0, ge=0)
     limit: int = Field(20, ge=1, le=100)
+    # Keyset-пагинация: next_cursor из прошлого ответа вместо skip
+    cursor: Optional[str] = None
+    exact_total: bool = False
 
 
 class CompanyFilterRequest(BaseModel):
@@ -65,3 +71,6 @@ class CompanyFilterRequest(BaseModel):
     city: Optional[str] = None
     skip: int = Field(0, ge=0)
     limit: int = Field(20, ge=1, le=100)
+    # Keyset-пагинация: nextCursor из прошлого ответа вместо skip
+    cursor: Optional[str] = None
+    exact_total: bool = False
@@ -0,0 +1,190 @@
+"""
+Индекс маршрутов ТС для поиска транспорта.
+
+Откуда/Куда у ТС — список {"name": ...} (можно с city_id / region_id). При записи ТС каждая
+точка приводится к справочнику локаций: город (city_id и его region_id), регион целиком
+(region_id без city_id) или, если название не распознано, только нормализованное имя.
+Точки лежат в company_vehicle_route_points с индексами по (direction, city_id | region_id |
+name_key), и поиск выбирает ТС пересечением множеств: id в точках «откуда» и в точках «куда».
+
+Точка ТС подходит под точку запроса, если:
+- это тот же город, или ТС ездит по всему региону запрошенного города;
+- запрошен регион, а точка ТС — любой его город или весь регион;
+- совпадают нормализованные названия, если название запроса справочник не распознал;
+- точка ТС не распознана (свободный текст вроде «Москва и МО» или ещё не проиндексирована),
+  и её название и название из запроса входят одно в другое — как прежнее сравнение подстрок;
+- при radius_km запрошенный город дополняется городами в радиусе (координаты из cities).
+"""
+from typing import Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import and_, delete, false, func, insert, literal, or_, select
+
+from app.api.common.services.gazetteer import Gazetteer, gazetteer_store, normalize
+from app.api.company.models.fleet import CompanyVehicle, VehicleRoutePoint
+from app.api.shipments.search_cache import invalidate_transport_search
+from app.db import base as db_base
+
+_REINDEX_BATCH = 500
+# Короче — слишком общие обрывки («мо», «с») совпадали бы с любым запросом
+_MIN_TEXT_MATCH = 3
+
+
+def _as_int(value) -> Optional[int]:
+	try:
+		return int(value) if value is not None else None
+	except (TypeError, ValueError):
+		return None
+
+
+def route_points(
+	vehicle_id: int,
+	direction: str,
+	locations: Optional[Iterable],
+	gazetteer: Optional[Gazetteer],
+) -> List[dict]:
+	"""Строки company_vehicle_route_points для одного направления маршрута ТС."""
+	rows = {}
+	for location in locations or []:
+		if not isinstance(location, dict):
+			continue
+		name_key = normalize(str(location.get("name") or ""))[:200]
+		city_id, region_id = _as_int(location.get("city_id")), _as_int(location.get("region_id"))
+		places = []
+		if city_id is not None or region_id is not None:
+			city = gazetteer.cities_by_id.get(city_id) if gazetteer is not None else None
+			places.append((city_id, city.region_id if city else region_id))
+		elif gazetteer is not None:
+			cities, regions = gazetteer.resolve_place(name_key)
+			places.extend((city.id, city.region_id) for city in cities)
+			places.extend((None, region.id) for region in regions)
+		if not name_key and not places:
+			continue
+		for place_city_id, place_region_id in places or [(None, None)]:
+			rows[(place_city_id, place_region_id, name_key)] = {
+				"vehicle_id": vehicle_id,
+				"direction": direction,
+				"name_key": name_key,
+				"city_id": place_city_id,
+				"region_id": place_region_id,
+			}
+	return list(rows.values())
+
+
+def _vehicle_points(vehicle, gazetteer: Optional[Gazetteer]) -> List[dict]:
+	return [
+		*route_points(vehicle.id, "from", vehicle.from_locations, gazetteer),
+		*route_points(vehicle.id, "to", vehicle.to_locations, gazetteer),
+	]
+
+
+def write_route_points(connection, vehicle: CompanyVehicle) -> None:
+	"""Переписать точки маршрута ТС в той же транзакции (вызывается из flush).
+
+	Справочник берётся уже загруженный: если его ещё нет в процессе, точки сохраняются
+	только с названиями и получают id при ночной переиндексации.
+	"""
+	connection.execute(delete(VehicleRoutePoint).where(VehicleRoutePoint.vehicle_id == vehicle.id))
+	rows = _vehicle_points(vehicle, gazetteer_store.current)
+	if rows:
+		connection.execute(insert(VehicleRoutePoint), rows)
+
+
+async def reindex_vehicle_routes() -> int:
+	"""Пересчитать точки маршрутов всех ТС по текущему справочнику; возвращает число ТС."""
+	gazetteer = await gazetteer_store.get()
+	total, last_id = 0, 0
+	async with db_base.AsyncSessionLocal() as session:
+		while True:
+			vehicles = (await session.execute(
+				select(CompanyVehicle.id, CompanyVehicle.from_locations, CompanyVehicle.to_locations)
+				.where(CompanyVehicle.id > last_id)
+				.order_by(CompanyVehicle.id)
+				.limit(_REINDEX_BATCH)
+			)).all()
+			if not vehicles:
+				await invalidate_transport_search()
+				return total
+			vehicle_ids = [vehicle.id for vehicle in vehicles]
+			await session.execute(delete(VehicleRoutePoint).where(VehicleRoutePoint.vehicle_id.in_(vehicle_ids)))
+			rows = [row for vehicle in vehicles for row in _vehicle_points(vehicle, gazetteer)]
+			if rows:
+				await session.execute(insert(VehicleRoutePoint), rows)
+			await session.commit()
+			total += len(vehicles)
+			last_id = vehicle_ids[-1]
+
+
+class RouteFilter(NamedTuple):
+	"""Точки одного направления запроса, приведённые к справочнику."""
+	city_ids: frozenset
+	city_region_ids: frozenset  # Регионы запрошенных городов — для ТС «по всему региону»
+	region_ids: frozenset  # Регионы, запрошенные целиком
+	name_keys: frozenset  # Названия, не распознанные справочником, — точное совпадение
+	text_keys: frozenset  # Все запрошенные названия — подстрокой по нераспознанным точкам ТС
+
+
+def route_filter(
+	locations: Iterable[dict],
+	gazetteer: Gazetteer,
+	radius_km: Optional[float] = None,
+) -> RouteFilter:
+	city_ids, city_region_ids, region_ids, name_keys, text_keys = set(), set(), set(), set(), set()
+	for location in locations:
+		name_key = normalize(str(location.get("name") or ""))
+		city_id, region_id = _as_int(location.get("city_id")), _as_int(location.get("region_id"))
+		if city_id is not None:
+			cities = [gazetteer.cities_by_id[city_id]] if city_id in gazetteer.cities_by_id else []
+			city_ids.add(city_id)
+			text_keys.update(city.norm for city in cities)
+		elif region_id is not None:
+			cities = []
+			region_ids.add(region_id)
+			if region_id in gazetteer.regions:
+				text_keys.add(normalize(gazetteer.regions[region_id].name))
+		else:
+			cities, regions = gazetteer.resolve_place(name_key)
+			region_ids.update(region.id for region in regions)
+			# По имени сравниваем, только если оно не привело к id: иначе «Советск» из запроса
+			# совпал бы с ТС из всех одноимённых городов
+			if name_key and not cities and not regions:
+				name_keys.add(name_key)
+		if name_key:
+			text_keys.add(name_key)
+		if radius_km:
+			cities = [near for city in cities for near in gazetteer.cities_near(city, radius_km)]
+		city_ids.update(city.id for city in cities)
+		city_region_ids.update(city.region_id for city in cities)
+	return RouteFilter(
+		frozenset(city_ids),
+		frozenset(city_region_ids),
+		frozenset(region_ids),
+		frozenset(name_keys),
+		frozenset(text_keys),
+	)
+
+
+def route_condition(direction: str, route: RouteFilter):
+	"""Условие на CompanyVehicle: есть точка маршрута direction, подходящая под route."""
+	point = VehicleRoutePoint
+	matches = []
+	if route.name_keys:
+		matches.append(point.name_key.in_(route.name_keys))
+	if route.city_ids:
+		matches.append(point.city_id.in_(route.city_ids))
+	if route.city_region_ids:
+		matches.append(and_(point.city_id.is_(None), point.region_id.in_(route.city_region_ids)))
+	if route.region_ids:
+		matches.append(point.region_id.in_(route.region_ids))
+	if route.text_keys:
+		# Свободный текст ТС, который справочник не распознал («Москва и МО»): как прежде,
+		# подстрока в обе стороны; таких точек мало, поэтому LIKE без индекса допустим
+		text = []
+		for key in route.text_keys:
+			text.append(point.name_key.contains(key, autoescape=True))
+			text.append(and_(func.length(point.name_key) >= _MIN_TEXT_MATCH, literal(key).contains(point.name_key)))
+		matches.append(and_(point.city_id.is_(None), point.region_id.is_(None), or_(*text)))
+	if not matches:
+		return false()
+	return CompanyVehicle.id.in_(
+		select(point.vehicle_id).where(point.direction == direction, or_(*matches))
+	)
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import TYPE_CHECKING, Optional
 
-from sqlalchemy import String, ForeignKey, Text, DateTime, Boolean
+from sqlalchemy import String, ForeignKey, Text, DateTime, Boolean, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base_class import Base
@@ -14,6 +14,10 @@ if TYPE_CHECKING:
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # История чата с курсором: WHERE chat_id = ? AND id < ? ORDER BY chat_id, id DESC
+        Index("ix_messages_chat_id_id", "chat_id", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id"), nullable=False)
@@ -32,6 +32,8 @@ class Product(Base):
     unit_of_measurement: Mapped[str] = mapped_column(String(100))
     net_weight: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
     gross_weight: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    # В PostgreSQL есть ещё search_vector (tsvector, GENERATED ALWAYS — см. миграцию f2a3b4c5d6e7):
+    # в модели не объявлена, запросы обращаются к ней через services/full_text_search.py
 
     # Timestamps
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -1,12 +1,14 @@
 from typing import Optional, List, Tuple
 
-from sqlalchemy import select, and_, func
+from sqlalchemy import select, and_, or_, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.api.company.models.company import Company
 from app.api.products.models.product import Product, ProductType
 from app.api.products.schemas.products import ProductsResponse, ProductListItem, PaginationInfo
+from app.api.products.services.full_text_search import ProductTextSearch, supports_full_text
+from app.core.pagination import CatalogPage, catalog_total, keyset_query, split_page
 
 
 class CompanyProductsRepository:
@@ -55,6 +57,25 @@ class CompanyProductsRepository:
         result = await self.session.execute(query)
         return result.scalar_one_or_none()
 
+    async def get_by_articles_or_slugs(self, articles: List[str], slugs: List[str]) -> List[Product]:
+        """Все активные продукты с любым из артикулов или slug'ов — одним запросом (для checkout)."""
+        conditions = []
+        if articles:
+            conditions.append(Product.article.in_(articles))
+        if slugs:
+            conditions.append(Product.slug.in_(slugs))
+        if not conditions:
+            return []
+        query = select(Product).where(
+            and_(
+                or_(*conditions),
+                Product.is_deleted == False,
+                Product.is_hidden == False
+            )
+        )
+        result = await self.session.execute(query)
+        return list(result.scalars().all())
+
     async def get_by_company_id_and_slug(
         self, company_id: int, slug: str
     ) -> Optional[Product]:
@@ -70,6 +91,30 @@ class CompanyProductsRepository:
         result = await self.session.execute(query)
         return result.scalar_one_or_none()
 
+    async def _catalog_page(
+            self,
+            query,
+            skip: int,
+            limit: int,
+            cursor: Optional[str] = None,
+            exact_total: bool = False
+    ) -> CatalogPage:
+        """
+        Страница каталога: новые сверху, по (created_at, id).
+        С cursor — keyset от последней строки прошлой страницы, без него — прежний OFFSET skip.
+        """
+        total, total_is_estimate = await catalog_total(
+            self.session, query.with_only_columns(Product.id), exact_total
+        )
+        query = keyset_query(query, [Product.created_at, Product.id], cursor, limit)
+        if not cursor:
+            query = query.offset(skip)
+        result = await self.session.execute(query.options(selectinload(Product.company)))
+        products, next_cursor = split_page(
+            list(result.scalars().all()), limit, lambda product: (product.created_at, product.id)
+        )
+        return CatalogPage(products, total, total_is_estimate, next_cursor)
+
     async def get_by_company_id(
             self,
             company_id: int,
@@ -106,46 +151,32 @@ class CompanyProductsRepository:
             company_slug: str,
             skip: int = 0,
             limit: int = 100,
-            include_hidden: bool = False
-    ) -> Tuple[List[Product], int]:
+            include_hidden: bool = False,
+            cursor: Optional[str] = None,
+            exact_total: bool = False
+    ) -> CatalogPage:
         """Получить все продукты компании по slug с пагинацией"""
         # Базовые условия
-        conditions = [Product.is_deleted == False]
+        conditions = [Product.is_deleted == False, Company.slug == company_slug]
         
         if not include_hidden:
             conditions.append(Product.is_hidden == False)
 
-        # Получаем общее количество с join на компанию
-        count_query = (
-            select(func.count(Product.id))
-            .join(Company, Product.company_id == Company.id)
-            .where(and_(*conditions))
-            .where(Company.slug == company_slug)
-        )
-        count_result = await self.session.execute(count_query)
-        total = count_result.scalar()
-
-        # Получаем продукты с пагинацией
         query = (
             select(Product)
-            .options(selectinload(Product.company))
             .join(Company, Product.company_id == Company.id)
             .where(and_(*conditions))
-            .where(Company.slug == company_slug)
-            .offset(skip)
-            .limit(limit)
         )
-        result = await self.session.execute(query)
-        products = result.scalars().all()
-
-        return list(products), total
+        return await self._catalog_page(query, skip, limit, cursor, exact_total)
 
     async def get_all_products(
             self,
             skip: int = 0,
             limit: int = 100,
-            include_hidden: bool = False
-    ) -> Tuple[List[Product], int]:
+            include_hidden: bool = False,
+            cursor: Optional[str] = None,
+            exact_total: bool = False
+    ) -> CatalogPage:
         """Получить все продукты всех компаний с пагинацией"""
         # Базовые условия
         conditions = [Product.is_deleted == False]
@@ -153,19 +184,8 @@ class CompanyProductsRepository:
         if not include_hidden:
             conditions.append(Product.is_hidden == False)
 
-        # Получаем общее количество
-        count_query = select(func.count(Product.id)).where(and_(*conditions))
-        count_result = await self.session.execute(count_query)
-        total = count_result.scalar()
-
-        # Получаем продукты с пагинацией
-        query = select(Product).options(
-            selectinload(Product.company)
-        ).where(and_(*conditions)).offset(skip).limit(limit)
-        result = await self.session.execute(query)
-        products = result.scalars().all()
-
-        return list(products), total
+        query = select(Product).where(and_(*conditions))
+        return await self._catalog_page(query, skip, limit, cursor, exact_total)
 
     async def get_all_services(
             self,
@@ -201,8 +221,10 @@ class CompanyProductsRepository:
             self,
             skip: int = 0,
             limit: int = 100,
-            include_hidden: bool = False
-    ) -> Tuple[List[Product], int]:
+            include_hidden: bool = False,
+            cursor: Optional[str] = None,
+            exact_total: bool = False
+    ) -> CatalogPage:
         """Получить все услуги всех компаний с пагинацией и загруженными данными компании"""
         # Базовые условия
         conditions = [
@@ -213,21 +235,8 @@ class CompanyProductsRepository:
         if not include_hidden:
             conditions.append(Product.is_hidden == False)
 
-        # Получаем общее количество напрямую из БД без JOIN
-        # Используем прямой SQL чтобы избежать cartesian product
-        from sqlalchemy import text
-        count_sql = text("SELECT COUNT(*) FROM products WHERE type = 'SERVICE' AND is_deleted = false AND is_hidden = false")
-        count_result = await self.session.execute(count_sql)
-        total = count_result.scalar()
-
-        # Получаем услуги с пагинацией
-        query = select(Product).options(
-            selectinload(Product.company)
-        ).where(and_(*conditions)).offset(skip).limit(limit)
-        result = await self.session.execute(query)
-        services = result.scalars().all()
-
-        return list(services), total
+        query = select(Product).where(and_(*conditions))
+        return await self._catalog_page(query, skip, limit, cursor, exact_total)
 
     async def get_all_goods(
             self,
@@ -273,8 +282,10 @@ class CompanyProductsRepository:
             self,
             skip: int = 0,
             limit: int = 100,
-            include_hidden: bool = False
-    ) -> Tuple[List[Product], int]:
+            include_hidden: bool = False,
+            cursor: Optional[str] = None,
+            exact_total: bool = False
+    ) -> CatalogPage:
         """Получить все товары всех компаний с пагинацией и загруженными данными компании"""
         # Базовые условия
         conditions = [
@@ -285,19 +296,8 @@ class CompanyProductsRepository:
         if not include_hidden:
             conditions.append(Product.is_hidden == False)
 
-        # Получаем общее количество
-        count_query = select(func.count(Product.id)).where(and_(*conditions))
-        count_result = await self.session.execute(count_query)
-        total = count_result.scalar()
-
-        # Получаем товары с пагинацией
-        query = select(Product).options(
-            selectinload(Product.company)
-        ).where(and_(*conditions)).offset(skip).limit(limit)
-        result = await self.session.execute(query)
-        goods = result.scalars().all()
-
-        return list(goods), total
+        query = select(Product).where(and_(*conditions))
+        return await self._catalog_page(query, skip, limit, cursor, exact_total)
 
     async def get_services_by_company_id(
             self,
@@ -368,37 +368,37 @@ class CompanyProductsRepository:
             search_term: str,
             skip: int = 0,
             limit: int = 100,
-            include_hidden: bool = False
-    ) -> Tuple[List[Product], int]:
-        """Поиск продуктов по названию или описанию"""
-        from sqlalchemy import or_
+            include_hidden: bool = False,
+            cursor: Optional[str] = None,
+            exact_total: bool = False
+    ) -> CatalogPage:
+        """Поиск продуктов по названию, артикулу или описанию (по релевантности)"""
+        text_search = ProductTextSearch(search_term, supports_full_text(self.session))
 
         # Базовые условия
         conditions = [
             Product.is_deleted == False,
-            or_(
-                Product.name.ilike(f"%{search_term}%"),
-                Product.description.ilike(f"%{search_term}%"),
-                Product.article.ilike(f"%{search_term}%")
-            )
+            text_search.condition()
         ]
         
         if not include_hidden:
             conditions.append(Product.is_hidden == False)
 
-        # Получаем общее количество
-        count_query = select(func.count(Product.id.distinct())).where(and_(*conditions))
-        count_result = await self.session.execute(count_query)
-        total = count_result.scalar()
-
-        # Получаем продукты с пагинацией
-        query = select(Product).options(
-            selectinload(Product.company)
-        ).where(and_(*conditions)).offset(skip).limit(limit)
-        result = await self.session.execute(query)
-        products = result.scalars().all()
+        query = select(Product).where(and_(*conditions))
+        rank = text_search.rank()
+        if rank is None:
+            return await self._catalog_page(query, skip, limit, cursor, exact_total)
 
-        return list(products), total
+        # Курсор по (релевантность, id): ранг пересчитывается в условии keyset
+        total, total_is_estimate = await catalog_total(
+            self.session, query.with_only_columns(Product.id), exact_total
+        )
+        query = keyset_query(query.add_columns(rank.label("rank")), [rank, Product.id], cursor, limit)
+        if not cursor:
+            query = query.offset(skip)
+        result = await self.session.execute(query.options(selectinload(Product.company)))
+        rows, next_cursor = split_page(list(result.all()), limit, lambda row: (row.rank, row[0].id))
+        return CatalogPage([row[0] for row in rows], total, total_is_estimate, next_cursor)
 
     async def get_products_by_price_range(
             self,
@@ -10,6 +10,7 @@ from app.api.authentication.models.user import User
 from app.api.company.models.company import Company
 from app.api.products.models.product import Product, ProductType
 from app.api.products.schemas.product import ProductCreate, ProductUpdate
+from app.api.products.services.cache_service import invalidate_catalog_caches
 
 
 class MyProductsRepository:
@@ -157,6 +158,7 @@ class MyProductsRepository:
 
         self.session.add(product)
         await self.session.commit()
+        await invalidate_catalog_caches(location_trees=("products",))
         await self.session.refresh(product)
         return product
 
@@ -186,6 +188,7 @@ class MyProductsRepository:
         )
 
         await self.session.commit()
+        await invalidate_catalog_caches(location_trees=("products",))
         return await self.get_by_id(product_id, user_id)
 
     async def partial_update(self, product_id: int, product_data: ProductUpdate, user_id: int) -> Optional[Product]:
@@ -214,6 +217,7 @@ class MyProductsRepository:
         )
 
         await self.session.commit()
+        await invalidate_catalog_caches(location_trees=("products",))
         return await self.get_by_id(product_id, user_id)
 
     async def delete(self, product_id: int, user_id: int) -> bool:
@@ -234,6 +238,7 @@ class MyProductsRepository:
             .values(is_deleted=True)
         )
         await self.session.commit()
+        await invalidate_catalog_caches(location_trees=("products",))
         return result.rowcount > 0
 
     async def hard_delete(self, product_id: int, user_id: int) -> bool:
@@ -251,6 +256,7 @@ class MyProductsRepository:
             delete(Product).where(Product.id == product_id)
         )
         await self.session.commit()
+        await invalidate_catalog_caches(location_trees=("products",))
         return result.rowcount > 0
 
     async def toggle_hidden(self, product_id: int, user_id: int) -> Optional[Product]:
@@ -271,6 +277,7 @@ class MyProductsRepository:
             .values(is_hidden=new_hidden_state)
         )
         await self.session.commit()
+        await invalidate_catalog_caches(location_trees=("products",))
         return await self.get_by_id(product_id, user_id)
 
     async def update_images(self, product_id: int, images: List[str], user_id: int) -> Optional[Product]:
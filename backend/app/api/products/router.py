@@ -24,6 +24,7 @@ from app.api.products.schemas.product import (
 from app.api.products.services.cache_service import product_location_cache
 from app.api.products.services.filter_service import FilterService
 from app.api.products.services.search_service import ProductSearchService
+from app.core.pagination import InvalidCursorError
 
 owner_router = APIRouter(
     tags=["products"],
@@ -265,6 +266,24 @@ async def get_service_filters(
     return await filter_service.get_service_filters()
 
 
+@public_router.post("/filters", response_model=ProductFiltersResponse, tags=["search"])
+async def get_product_filters_for_search(
+        filter_request: ProductFilterRequest,
+        filter_service: Annotated[FilterService, Depends(get_filter_service)]
+):
+    """Фильтры для товаров с учётом текущего поиска (тело как у POST /search)"""
+    return await filter_service.get_product_filters(filter_request)
+
+
+@public_router.post("/services/filters", response_model=ServiceFiltersResponse, tags=["search"])
+async def get_service_filters_for_search(
+        filter_request: ServiceFilterRequest,
+        filter_service: Annotated[FilterService, Depends(get_filter_service)]
+):
+    """Фильтры для услуг с учётом текущего поиска (тело как у POST /services/search)"""
+    return await filter_service.get_service_filters(filter_request)
+
+
 @public_router.get("/cities-count", response_model=CitiesProductCountResponse)
 async def get_cities_product_count(
         filter_service: Annotated[FilterService, Depends(get_filter_service)],
@@ -281,10 +300,15 @@ async def get_all_products(
         product_service: product_service_dep,
         skip: int = Query(0, ge=0),
         limit: int = Query(100, ge=1, le=1000),
-        include_hidden: bool = Query(False)
+        include_hidden: bool = Query(False),
+        cursor: Optional[str] = Query(None, description="Курсор из next_cursor прошлой страницы (вместо skip)"),
+        exact_total: bool = Query(False, description="Точный COUNT(*) вместо кэшированного/оценочного total")
 ):
     """Получить все продукты всех компаний"""
-    return await product_service.get_all_products(skip, limit, include_hidden)
+    try:
+        return await product_service.get_all_products(skip, limit, include_hidden, cursor, exact_total)
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @public_router.get("/services", response_model=ServiceListWithCompanyResponse)
@@ -292,10 +316,17 @@ async def get_all_services(
         product_service: product_service_dep,
         skip: int = Query(0, ge=0),
         limit: int = Query(100, ge=1, le=1000),
-        include_hidden: bool = Query(False)
+        include_hidden: bool = Query(False),
+        cursor: Optional[str] = Query(None, description="Курсор из next_cursor прошлой страницы (вместо skip)"),
+        exact_total: bool = Query(False, description="Точный COUNT(*) вместо кэшированного/оценочного total")
 ):
     """Получить все услуги всех компаний"""
-    return await product_service.get_all_services_with_company(skip, limit, include_hidden)
+    try:
+        return await product_service.get_all_services_with_company(
+            skip, limit, include_hidden, cursor, exact_total
+        )
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @public_router.get("/goods", response_model=ProductListWithCompanyResponse)
@@ -303,10 +334,17 @@ async def get_all_goods(
         product_service: product_service_dep,
         skip: int = Query(0, ge=0),
         limit: int = Query(100, ge=1, le=1000),
-        include_hidden: bool = Query(False)
+        include_hidden: bool = Query(False),
+        cursor: Optional[str] = Query(None, description="Курсор из next_cursor прошлой страницы (вместо skip)"),
+        exact_total: bool = Query(False, description="Точный COUNT(*) вместо кэшированного/оценочного total")
 ):
     """Получить все товары всех компаний"""
-    return await product_service.get_all_goods_with_company(skip, limit, include_hidden)
+    try:
+        return await product_service.get_all_goods_with_company(
+            skip, limit, include_hidden, cursor, exact_total
+        )
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @public_router.get("/company/{company_slug}", response_model=ProductListPublicResponse)
@@ -315,12 +353,17 @@ async def get_products_by_company_id(
         product_service: product_service_dep,
         skip: int = Query(0, ge=0),
         limit: int = Query(100, ge=1, le=1000),
-        include_hidden: bool = Query(False)
+        include_hidden: bool = Query(False),
+        cursor: Optional[str] = Query(None, description="Курсор из next_cursor прошлой страницы (вместо skip)"),
+        exact_total: bool = Query(False, description="Точный COUNT(*) вместо кэшированного/оценочного total")
 ):
     """Получить все продукты конкретной компании"""
-    return await product_service.get_products_by_company_slug(
-        company_slug, skip, limit, include_hidden
-    )
+    try:
+        return await product_service.get_products_by_company_slug(
+            company_slug, skip, limit, include_hidden, cursor, exact_total
+        )
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @public_router.get("/company/{company_id}/services", response_model=ProductListPublicResponse)
@@ -381,10 +424,15 @@ async def search_products(
         q: str = Query(..., min_length=1, description="Search term"),
         skip: int = Query(0, ge=0),
         limit: int = Query(100, ge=1, le=1000),
-        include_hidden: bool = Query(False)
+        include_hidden: bool = Query(False),
+        cursor: Optional[str] = Query(None, description="Курсор из next_cursor прошлой страницы (вместо skip)"),
+        exact_total: bool = Query(False, description="Точный COUNT(*) вместо кэшированного/оценочного total")
 ):
     """Поиск продуктов по названию или описанию"""
-    return await product_service.search_products(q, skip, limit, include_hidden)
+    try:
+        return await product_service.search_products(q, skip, limit, include_hidden, cursor, exact_total)
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @public_router.get("/price-range", response_model=ProductListResponse)
@@ -421,7 +469,10 @@ async def search_products_with_filters(
         search_service: Annotated[ProductSearchService, Depends(get_search_service)]
 ):
     """Поиск товаров с фильтрацией"""
-    return await search_service.search_products(filter_request)
+    try:
+        return await search_service.search_products(filter_request)
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @public_router.post("/services/search", response_model=ProductListResponse, tags=["search"])
@@ -430,7 +481,10 @@ async def search_services_with_filters(
         search_service: Annotated[ProductSearchService, Depends(get_search_service)]
 ):
     """Поиск услуг с фильтрацией"""
-    return await search_service.search_services(filter_request)
+    try:
+        return await search_service.search_services(filter_request)
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 # Endpoints для управления кэшем
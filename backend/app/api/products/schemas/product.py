@@ -60,6 +60,8 @@ class ProductResponse(ProductBase):
     company_id: int
     created_at: datetime
     updated_at: datetime
+    # Фрагмент name/description с подсветкой <mark>…</mark> — только в результатах поиска
+    highlight: Optional[str] = None
 
     @computed_field
     def images(self) -> List[str]:
@@ -96,6 +98,10 @@ class ProductListResponse(BaseModel):
     total: int
     page: int
     per_page: int
+    # Курсор следующей страницы (параметр cursor); None — страниц больше нет
+    next_cursor: Optional[str] = None
+    # total из кэша или оценки планировщика; точное значение — с exact_total=true
+    total_is_estimate: bool = False
 
 
 class ProductWithCompanyResponse(ProductBase):
@@ -124,6 +130,8 @@ class ProductListPublicResponse(BaseModel):
     total: int
     page: int
     per_page: int
+    next_cursor: Optional[str] = None
+    total_is_estimate: bool = False
 
 
 class ServiceWithCompanyResponse(ProductBase):
@@ -152,6 +160,8 @@ class ProductListWithCompanyResponse(BaseModel):
     total: int
     page: int
     per_page: int
+    next_cursor: Optional[str] = None
+    total_is_estimate: bool = False
 
 
 class ServiceListWithCompanyResponse(BaseModel):
@@ -159,3 +169,5 @@ class ServiceListWithCompanyResponse(BaseModel):
     total: int
     page: int
     per_page: int
+    next_cursor: Optional[str] = None
+    total_is_estimate: bool = False
@@ -1,212 +1,126 @@
-import asyncio
-from datetime import datetime, timedelta
-from typing import Dict, Set, Any
+from typing import Dict, List, Set
 
-from sqlalchemy import select, text
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.company.models.company import Company
-from app.api.products.models.product import Product, ProductType
+from app.api.common.services.location_tree_snapshots import LOCATION_TREE_KINDS, mark_location_trees_dirty
+from app.api.products.services.facet_cache import invalidate_catalog_facets
+from app.core.config import settings
+from app.core.shared_cache import SharedCache
+
+LOCATION_LEVELS = ("countries", "federal_districts", "regions", "cities")
+
+_PRODUCT_LOCATIONS_SQL = """
+    SELECT DISTINCT
+        c.country as country_name,
+        c.federal_district as federal_district_name,
+        c.region as region_name,
+        c.city as city_name
+    FROM products p
+    JOIN companies c ON p.company_id = c.id
+    WHERE p.type = :product_type
+        AND p.is_deleted = false
+        AND p.is_hidden = false
+        AND c.is_active = true
+        AND c.country IS NOT NULL
+        AND c.country != ''
+"""
+
+_COMPANY_LOCATIONS_SQL = """
+    SELECT DISTINCT
+        c.country as country_name,
+        c.federal_district as federal_district_name,
+        c.region as region_name,
+        c.city as city_name
+    FROM companies c
+    WHERE c.is_active = true
+        AND c.country IS NOT NULL
+        AND c.country != ''
+"""
 
 
 class ProductLocationCache:
-    """Кэш для хранения связей продуктов с локациями"""
+    """
+    Кэш для хранения связей продуктов с локациями.
+
+    Общий для всех воркеров (Redis + память процесса), сбрасывается явно при записи товаров
+    и компаний (invalidate_catalog_caches). Одновременные промахи по одному ключу выполняют
+    один запрос; устаревшее значение отдаётся сразу, а пересчитывается в фоне.
+    """
 
     def __init__(self):
-        self._cache: Dict[str, Any] = {}
-        self._cache_timestamps: Dict[str, datetime] = {}
-        self._cache_duration = timedelta(minutes=20)
-        self._lock = asyncio.Lock()
-
-    def _is_cache_valid(self, cache_key: str) -> bool:
-        """Проверяет, действителен ли кэш"""
-        if cache_key not in self._cache_timestamps:
-            return False
-        return datetime.now() - self._cache_timestamps[cache_key] < self._cache_duration
-
-    def _get_cache(self, cache_key: str) -> Any:
-        """Получает данные из кэша"""
-        if self._is_cache_valid(cache_key):
-            return self._cache.get(cache_key)
-        return None
-
-    def _set_cache(self, cache_key: str, data: Any) -> None:
-        """Сохраняет данные в кэш"""
-        self._cache[cache_key] = data
-        self._cache_timestamps[cache_key] = datetime.now()
+        self._cache = SharedCache(
+            "catalog:locations",
+            settings.PRODUCT_LOCATION_CACHE_TTL,
+            settings.PRODUCT_LOCATION_CACHE_STALE_TTL,
+        )
+
+    @staticmethod
+    async def _load(session: AsyncSession, sql: str, params: dict) -> Dict[str, List[str]]:
+        result = await session.execute(text(sql), params)
+        locations: Dict[str, Set[str]] = {level: set() for level in LOCATION_LEVELS}
+        for row in result.fetchall():
+            if row.country_name:
+                locations['countries'].add(row.country_name)
+            if row.federal_district_name:
+                locations['federal_districts'].add(row.federal_district_name)
+            if row.region_name:
+                locations['regions'].add(row.region_name)
+            if row.city_name:
+                locations['cities'].add(row.city_name)
+        # В Redis хранится JSON, поэтому списки; наружу отдаём множества, как раньше
+        return {level: sorted(values) for level, values in locations.items()}
+
+    async def _get(self, cache_key: str, session: AsyncSession, sql: str, params: dict) -> Dict[str, Set[str]]:
+        async def load_with_own_session() -> Dict[str, List[str]]:
+            # Фоновый пересчёт переживает запрос, поэтому сессия запроса ему не подходит
+            from app.db.base import AsyncSessionLocal
+
+            async with AsyncSessionLocal() as own_session:
+                return await self._load(own_session, sql, params)
+
+        data = await self._cache.get_or_load(
+            cache_key, lambda: self._load(session, sql, params), load_with_own_session
+        )
+        return {level: set(data.get(level, [])) for level in LOCATION_LEVELS}
 
     async def get_product_locations(self, session: AsyncSession) -> Dict[str, Set[str]]:
         """Получает кэшированные связи продуктов с локациями"""
-        cache_key = "product_locations"
-        cached_data = self._get_cache(cache_key)
-        if cached_data:
-            return cached_data
-
-        async with self._lock:
-            # Проверяем еще раз после получения блокировки
-            cached_data = self._get_cache(cache_key)
-            if cached_data:
-                return cached_data
-
-            # Получаем все товары с их компаниями и локациями из старых полей
-            query = text("""
-                SELECT DISTINCT 
-                    c.country as country_name,
-                    c.federal_district as federal_district_name,
-                    c.region as region_name,
-                    c.city as city_name
-                FROM products p
-                JOIN companies c ON p.company_id = c.id
-                WHERE p.type = 'GOOD' 
-                    AND p.is_deleted = false 
-                    AND p.is_hidden = false
-                    AND c.is_active = true
-                    AND c.country IS NOT NULL
-                    AND c.country != ''
-            """)
-
-            result = await session.execute(query)
-            locations_data = result.fetchall()
-
-            # Создаем связи продукт -> локации
-            product_locations = {
-                'countries': set(),
-                'federal_districts': set(),
-                'regions': set(),
-                'cities': set()
-            }
-
-            for row in locations_data:
-                if row.country_name:
-                    product_locations['countries'].add(row.country_name)
-                if row.federal_district_name:
-                    product_locations['federal_districts'].add(row.federal_district_name)
-                if row.region_name:
-                    product_locations['regions'].add(row.region_name)
-                if row.city_name:
-                    product_locations['cities'].add(row.city_name)
-
-            self._set_cache(cache_key, product_locations)
-            return product_locations
+        return await self._get("product_locations", session, _PRODUCT_LOCATIONS_SQL, {"product_type": "GOOD"})
 
     async def get_service_locations(self, session: AsyncSession) -> Dict[str, Set[str]]:
         """Получает кэшированные связи услуг с локациями"""
-        cache_key = "service_locations"
-        cached_data = self._get_cache(cache_key)
-        if cached_data:
-            return cached_data
-
-        async with self._lock:
-            # Проверяем еще раз после получения блокировки
-            cached_data = self._get_cache(cache_key)
-            if cached_data:
-                return cached_data
-
-            # Получаем все услуги с их компаниями и локациями из старых полей
-            query = text("""
-                SELECT DISTINCT 
-                    c.country as country_name,
-                    c.federal_district as federal_district_name,
-                    c.region as region_name,
-                    c.city as city_name
-                FROM products p
-                JOIN companies c ON p.company_id = c.id
-                WHERE p.type = 'SERVICE' 
-                    AND p.is_deleted = false 
-                    AND p.is_hidden = false
-                    AND c.is_active = true
-                    AND c.country IS NOT NULL
-                    AND c.country != ''
-            """)
-
-            result = await session.execute(query)
-            locations_data = result.fetchall()
-
-            # Создаем связи услуга -> локации
-            service_locations = {
-                'countries': set(),
-                'federal_districts': set(),
-                'regions': set(),
-                'cities': set()
-            }
-
-            for row in locations_data:
-                if row.country_name:
-                    service_locations['countries'].add(row.country_name)
-                if row.federal_district_name:
-                    service_locations['federal_districts'].add(row.federal_district_name)
-                if row.region_name:
-                    service_locations['regions'].add(row.region_name)
-                if row.city_name:
-                    service_locations['cities'].add(row.city_name)
-
-            self._set_cache(cache_key, service_locations)
-            return service_locations
+        return await self._get("service_locations", session, _PRODUCT_LOCATIONS_SQL, {"product_type": "SERVICE"})
 
     async def get_company_locations(self, session: AsyncSession) -> Dict[str, Set[str]]:
         """Получает кэшированные локации компаний"""
-        cache_key = "company_locations"
-        cached_data = self._get_cache(cache_key)
-        if cached_data:
-            return cached_data
-
-        async with self._lock:
-            # Проверяем еще раз после получения блокировки
-            cached_data = self._get_cache(cache_key)
-            if cached_data:
-                return cached_data
-
-            # Получаем все активные компании с локациями из прямых полей
-            query = text("""
-                SELECT DISTINCT 
-                    c.country as country_name,
-                    c.federal_district as federal_district_name,
-                    c.region as region_name,
-                    c.city as city_name
-                FROM companies c
-                WHERE c.is_active = true
-                    AND c.country IS NOT NULL
-                    AND c.country != ''
-            """)
-
-            result = await session.execute(query)
-            locations_data = result.fetchall()
-
-            # Создаем связи компания -> локации
-            company_locations = {
-                'countries': set(),
-                'federal_districts': set(),
-                'regions': set(),
-                'cities': set()
-            }
-
-            for row in locations_data:
-                if row.country_name:
-                    company_locations['countries'].add(row.country_name)
-                if row.federal_district_name:
-                    company_locations['federal_districts'].add(row.federal_district_name)
-                if row.region_name:
-                    company_locations['regions'].add(row.region_name)
-                if row.city_name:
-                    company_locations['cities'].add(row.city_name)
-
-            self._set_cache(cache_key, company_locations)
-            return company_locations
+        return await self._get("company_locations", session, _COMPANY_LOCATIONS_SQL, {})
 
     async def clear_cache(self) -> None:
-        """Очищает весь кэш"""
-        async with self._lock:
-            self._cache.clear()
-            self._cache_timestamps.clear()
+        """Очищает весь кэш (во всех воркерах)"""
+        await self._cache.invalidate()
 
     async def refresh_cache(self, session: AsyncSession) -> None:
         """Обновляет весь кэш"""
-        async with self._lock:
-            await self.clear_cache()
-            await self.get_product_locations(session)
-            await self.get_service_locations(session)
-            await self.get_company_locations(session)
+        # Без общей блокировки: раньше refresh_cache держал lock и звал clear_cache, которому нужен тот же lock
+        await self.clear_cache()
+        await self.get_product_locations(session)
+        await self.get_service_locations(session)
+        await self.get_company_locations(session)
+
+    def metrics(self) -> dict:
+        return self._cache.metrics()
 
 
 # Глобальный экземпляр кэша
 product_location_cache = ProductLocationCache()
+
+
+async def invalidate_catalog_caches(location_trees=LOCATION_TREE_KINDS) -> None:
+    """
+    Сбросить локации и фасеты каталога после записи товаров/услуг или компаний
+    и пометить затронутые деревья фильтра городов к пересборке.
+    """
+    await product_location_cache.clear_cache()
+    await invalidate_catalog_facets()
+    await mark_location_trees_dirty(location_trees)
@@ -0,0 +1,16 @@
+"""
+Кэш фасетов каталога (счётчики по стране/округу/региону/городу для боковой панели).
+
+Построен на SharedCache: ключ включает «поколение» каталога из Redis, invalidate_catalog_facets()
+записывает новое поколение, и все воркеры со следующего запроса считают фасеты заново —
+удалять ключи по шаблону не нужно, старые истекают сами.
+"""
+from app.core.config import settings
+from app.core.shared_cache import SharedCache
+
+catalog_facet_cache = SharedCache("catalog:facets", settings.CATALOG_FACETS_CACHE_TTL)
+
+
+async def invalidate_catalog_facets() -> None:
+    """Сбросить фасеты после изменения товаров/услуг или локации компании."""
+    await catalog_facet_cache.invalidate()
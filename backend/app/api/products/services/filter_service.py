@@ -1,36 +1,104 @@
-from typing import List
+import hashlib
+import json
+from typing import List, Optional
 
 from sqlalchemy import and_, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.company.models.company import Company
+from app.api.company.schemas.filters import ProductFilterRequest, ServiceFilterRequest
 from app.api.products.models.product import Product, ProductType
 from app.api.products.schemas.filters import FilterItem, ProductFiltersResponse, ServiceFiltersResponse
-from app.api.products.services.cache_service import product_location_cache
+from app.api.products.services.facet_cache import catalog_facet_cache
+from app.api.products.services.full_text_search import ProductTextSearch, supports_full_text
+
+
+# (поле ответа, колонка компании, поле фильтра в запросе)
+LOCATION_FACETS = (
+    ("countries", Company.country, "country"),
+    ("federal_districts", Company.federal_district, "federal_district"),
+    ("regions", Company.region, "region"),
+    ("cities", Company.city, "city"),
+)
+# Фильтры запроса, влияющие на фасеты (skip/limit — нет)
+FACET_FILTER_FIELDS = ("search", "cities", "country", "federal_district", "region", "city", "min_price", "max_price")
 
 
 class FilterService:
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def _counts_by_column(self, product_type: ProductType, column) -> dict[str, int]:
-        """Один GROUP BY вместо N отдельных COUNT."""
+    async def _facet_rows(self, product_type: ProductType, filter_request=None) -> list[list]:
+        """
+        Один проход по products × companies: GROUP BY на уровне города, все уровни
+        (страна → город) сворачиваются из этих строк в Python. Фильтры по локации
+        сюда не входят — они применяются при свёртке (см. _count_facets).
+        """
+        conditions = [
+            Product.type == product_type,
+            Product.is_deleted == False,
+            Product.is_hidden == False,
+        ]
+        if filter_request is not None:
+            if filter_request.search and filter_request.search.strip():
+                conditions.append(
+                    ProductTextSearch(filter_request.search, supports_full_text(self.session)).condition()
+                )
+            if filter_request.min_price is not None:
+                conditions.append(Product.price >= filter_request.min_price)
+            if filter_request.max_price is not None:
+                conditions.append(Product.price <= filter_request.max_price)
+
+        group_columns = [Company.is_active, Company.city_id] + [column for _, column, _ in LOCATION_FACETS]
         query = (
-            select(column, func.count(Product.id))
+            select(*group_columns, func.count(Product.id))
             .join(Company, Product.company_id == Company.id)
-            .where(
-                and_(
-                    Product.type == product_type,
-                    Product.is_deleted == False,
-                    Product.is_hidden == False,
-                    column.isnot(None),
-                    column != "",
-                )
-            )
-            .group_by(column)
+            .where(and_(*conditions))
+            .group_by(*group_columns)
         )
         result = await self.session.execute(query)
-        return {str(name): int(count) for name, count in result.all() if name}
+        return [list(row) for row in result.all()]
+
+    @staticmethod
+    def _labels(rows: list[list]) -> dict[str, set]:
+        """Значения фильтров — локации активных компаний с заполненной страной (как в product_location_cache)."""
+        labels = {name: set() for name, _, _ in LOCATION_FACETS}
+        for is_active, _, country, *locations, _ in rows:
+            if not is_active or not country:
+                continue
+            for (name, _, _), value in zip(LOCATION_FACETS, [country, *locations]):
+                if value:
+                    labels[name].add(value)
+        return labels
+
+    @staticmethod
+    def _count_facets(rows: list[list], filter_request=None) -> dict[str, dict[str, int]]:
+        """
+        Счётчики по каждому уровню. Как в боковой панели магазина: у уровня учитываются
+        выбранные значения остальных уровней, но не его собственное — иначе в списке
+        осталась бы только выбранная страна/город.
+        """
+        selected = {}
+        if filter_request is not None:
+            for _, _, field in LOCATION_FACETS:
+                value = getattr(filter_request, field, None)
+                if value:
+                    selected[field] = value
+        city_ids = set(getattr(filter_request, "cities", None) or [])
+
+        counts = {name: {} for name, _, _ in LOCATION_FACETS}
+        for _, city_id, *locations, count in rows:
+            values = dict(zip((field for _, _, field in LOCATION_FACETS), locations))
+            for name, _, field in LOCATION_FACETS:
+                value = values[field]
+                if not value:
+                    continue
+                if any(values[other] != wanted for other, wanted in selected.items() if other != field):
+                    continue
+                if city_ids and field != "city" and city_id not in city_ids:
+                    continue
+                counts[name][str(value)] = counts[name].get(str(value), 0) + int(count)
+        return counts
 
     def _items(self, names: set, counts: dict[str, int]) -> List[FilterItem]:
         return [
@@ -38,31 +106,47 @@ class FilterService:
             for name in sorted(names)
         ]
 
-    async def get_product_filters(self) -> ProductFiltersResponse:
-        locations = await product_location_cache.get_product_locations(self.session)
-        country_counts = await self._counts_by_column(ProductType.GOOD, Company.country)
-        district_counts = await self._counts_by_column(ProductType.GOOD, Company.federal_district)
-        region_counts = await self._counts_by_column(ProductType.GOOD, Company.region)
-        city_counts = await self._counts_by_column(ProductType.GOOD, Company.city)
-        return ProductFiltersResponse(
-            countries=self._items(locations["countries"], country_counts),
-            federal_districts=self._items(locations["federal_districts"], district_counts),
-            regions=self._items(locations["regions"], region_counts),
-            cities=self._items(locations["cities"], city_counts),
-        )
+    async def _facets(self, product_type: ProductType, filter_request=None) -> dict:
+        filters = {}
+        if filter_request is not None:
+            filters = {
+                field: getattr(filter_request, field, None)
+                for field in FACET_FILTER_FIELDS
+                if getattr(filter_request, field, None) not in (None, "", [])
+            }
+        digest = hashlib.sha1(json.dumps(filters, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+        cache_key = f"{product_type.name}:{digest}"
+        cached = await catalog_facet_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-    async def get_service_filters(self) -> ServiceFiltersResponse:
-        locations = await product_location_cache.get_service_locations(self.session)
-        country_counts = await self._counts_by_column(ProductType.SERVICE, Company.country)
-        district_counts = await self._counts_by_column(ProductType.SERVICE, Company.federal_district)
-        region_counts = await self._counts_by_column(ProductType.SERVICE, Company.region)
-        city_counts = await self._counts_by_column(ProductType.SERVICE, Company.city)
-        return ServiceFiltersResponse(
-            countries=self._items(locations["countries"], country_counts),
-            federal_districts=self._items(locations["federal_districts"], district_counts),
-            regions=self._items(locations["regions"], region_counts),
-            cities=self._items(locations["cities"], city_counts),
-        )
+        # Поиск и цена сужают выборку строк; фильтры по локации — только свёртку
+        narrows_rows = any(field in filters for field in ("search", "min_price", "max_price"))
+        labels_key = f"{product_type.name}:labels"
+        labels = await catalog_facet_cache.get(labels_key)
+        rows = None
+        if labels is None:
+            base_rows = await self._facet_rows(product_type)
+            labels = {name: sorted(values) for name, values in self._labels(base_rows).items()}
+            await catalog_facet_cache.set(labels_key, labels)
+            if not narrows_rows:
+                rows = base_rows
+        if rows is None:
+            rows = await self._facet_rows(product_type, filter_request if narrows_rows else None)
+
+        counts = self._count_facets(rows, filter_request if filters else None)
+        facets = {
+            name: [item.model_dump() for item in self._items(set(labels[name]), counts[name])]
+            for name, _, _ in LOCATION_FACETS
+        }
+        await catalog_facet_cache.set(cache_key, facets)
+        return facets
+
+    async def get_product_filters(self, filter_request: Optional[ProductFilterRequest] = None) -> ProductFiltersResponse:
+        return ProductFiltersResponse(**await self._facets(ProductType.GOOD, filter_request))
+
+    async def get_service_filters(self, filter_request: Optional[ServiceFilterRequest] = None) -> ServiceFiltersResponse:
+        return ServiceFiltersResponse(**await self._facets(ProductType.SERVICE, filter_request))
 
     async def get_cities_product_count(self, product_type: ProductType) -> List[dict]:
         query = select(
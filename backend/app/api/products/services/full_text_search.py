@@ -0,0 +1,75 @@
+"""
+Полнотекстовый поиск по товарам и услугам.
+
+В PostgreSQL поиск идёт по колонке products.search_vector (tsvector, русская морфология,
+генерируется самой БД из name/article/description — отдельно синхронизировать её при
+создании/изменении товара не нужно) с GIN-индексом, плюс нечёткое совпадение по триграммам
+(pg_trgm) для опечаток в названии и артикуле. Результаты ранжируются по релевантности,
+в ответ добавляется фрагмент с подсветкой найденного.
+
+На других СУБД (SQLite в тестах) — прежний поиск через ILIKE.
+"""
+from typing import Optional
+
+from sqlalchemy import ColumnElement, Float, func, literal, literal_column, or_
+from sqlalchemy.dialects.postgresql import REGCONFIG, TSVECTOR
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.products.models.product import Product
+
+SEARCH_CONFIG = "russian"
+# Нечёткий поиск по триграммам только для запросов от 3 символов: короче — сплошной шум
+FUZZY_MIN_LENGTH = 3
+HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxWords=25, MinWords=8, MaxFragments=2"
+
+product_search_vector = literal_column("products.search_vector", type_=TSVECTOR)
+
+
+def supports_full_text(session: AsyncSession) -> bool:
+    return session.bind.dialect.name == "postgresql"
+
+
+class ProductTextSearch:
+    """Условие, ранг и подсветка для поисковой строки."""
+
+    def __init__(self, term: str, full_text: bool):
+        self.term = term.strip()
+        self.full_text = full_text
+        self._config = literal(SEARCH_CONFIG, type_=REGCONFIG)
+
+    @property
+    def _ts_query(self):
+        # websearch_to_tsquery понимает "фразы", OR и -исключения и не падает на спецсимволах
+        return func.websearch_to_tsquery(self._config, self.term)
+
+    @property
+    def _fuzzy(self) -> bool:
+        return len(self.term) >= FUZZY_MIN_LENGTH
+
+    def condition(self) -> ColumnElement[bool]:
+        if not self.full_text:
+            pattern = f"%{self.term}%"
+            return or_(
+                Product.name.ilike(pattern),
+                Product.description.ilike(pattern),
+                Product.article.ilike(pattern),
+            )
+        conditions = [product_search_vector.bool_op("@@")(self._ts_query)]
+        if self._fuzzy:
+            conditions.append(Product.name.bool_op("%")(self.term))
+            conditions.append(Product.article.ilike(f"%{self.term}%"))
+        return or_(*conditions)
+
+    def rank(self) -> Optional[ColumnElement[float]]:
+        if not self.full_text:
+            return None
+        rank = func.ts_rank_cd(product_search_vector, self._ts_query, type_=Float)
+        if self._fuzzy:
+            rank = rank + func.similarity(Product.name, self.term, type_=Float)
+        return rank
+
+    def headline(self) -> Optional[ColumnElement[str]]:
+        if not self.full_text:
+            return None
+        document = Product.name + literal(". ") + func.coalesce(Product.description, "")
+        return func.ts_headline(self._config, document, self._ts_query, HEADLINE_OPTIONS)
@@ -301,41 +301,49 @@ class ProductService:
             company_slug: str,
             skip: int = 0,
             limit: int = 100,
-            include_hidden: bool = False
+            include_hidden: bool = False,
+            cursor: Optional[str] = None,
+            exact_total: bool = False
     ) -> ProductListPublicResponse:
         """Получить все продукты компании с пагинацией"""
-        products, total = await self.company_products_repo.get_by_company_slug(
-            company_slug, skip, limit, include_hidden
+        page = await self.company_products_repo.get_by_company_slug(
+            company_slug, skip, limit, include_hidden, cursor, exact_total
         )
 
         from app.api.products.schemas.product import ProductPublicItemResponse
-        product_responses = [ProductPublicItemResponse.model_validate(product) for product in products]
+        product_responses = [ProductPublicItemResponse.model_validate(product) for product in page.items]
 
         return ProductListPublicResponse(
             products=product_responses,
-            total=total,
+            total=page.total,
             page=skip // limit + 1,
-            per_page=limit
+            per_page=limit,
+            next_cursor=page.next_cursor,
+            total_is_estimate=page.total_is_estimate
         )
 
     async def get_all_products(
             self,
             skip: int = 0,
             limit: int = 100,
-            include_hidden: bool = False
+            include_hidden: bool = False,
+            cursor: Optional[str] = None,
+            exact_total: bool = False
     ) -> ProductListResponse:
         """Получить все продукты всех компаний с пагинацией"""
-        products, total = await self.company_products_repo.get_all_products(
-            skip, limit, include_hidden
+        page = await self.company_products_repo.get_all_products(
+            skip, limit, include_hidden, cursor, exact_total
         )
 
-        product_responses = [_safe_model_validate(product) for product in products]
+        product_responses = [_safe_model_validate(product) for product in page.items]
 
         return ProductListResponse(
             products=product_responses,
-            total=total,
+            total=page.total,
             page=skip // limit + 1,
-            per_page=limit
+            per_page=limit,
+            next_cursor=page.next_cursor,
+            total_is_estimate=page.total_is_estimate
         )
 
     async def get_all_services(
@@ -362,15 +370,17 @@ class ProductService:
             self,
             skip: int = 0,
             limit: int = 100,
-            include_hidden: bool = False
+            include_hidden: bool = False,
+            cursor: Optional[str] = None,
+            exact_total: bool = False
     ) -> ServiceListWithCompanyResponse:
         """Получить все услуги всех компаний с пагинацией и названием компании"""
-        services, total = await self.company_products_repo.get_all_services_with_company(
-            skip, limit, include_hidden
+        page = await self.company_products_repo.get_all_services_with_company(
+            skip, limit, include_hidden, cursor, exact_total
         )
 
         services_responses = []
-        for service in services:
+        for service in page.items:
             # Обрабатываем characteristics - если это словарь, преобразуем в список
             characteristics = _safe_characteristics(service.characteristics)
             
@@ -397,9 +407,11 @@ class ProductService:
 
         return ServiceListWithCompanyResponse(
             products=services_responses,
-            total=total,
+            total=page.total,
             page=skip // limit + 1,
-            per_page=limit
+            per_page=limit,
+            next_cursor=page.next_cursor,
+            total_is_estimate=page.total_is_estimate
         )
 
     async def get_all_goods(
@@ -426,15 +438,17 @@ class ProductService:
             self,
             skip: int = 0,
             limit: int = 100,
-            include_hidden: bool = False
+            include_hidden: bool = False,
+            cursor: Optional[str] = None,
+            exact_total: bool = False
     ) -> ProductListWithCompanyResponse:
         """Получить все товары всех компаний с пагинацией и названием компании"""
-        goods, total = await self.company_products_repo.get_all_goods_with_company(
-            skip, limit, include_hidden
+        page = await self.company_products_repo.get_all_goods_with_company(
+            skip, limit, include_hidden, cursor, exact_total
         )
 
         goods_responses = []
-        for good in goods:
+        for good in page.items:
             # Обрабатываем characteristics - если это словарь, преобразуем в список
             characteristics = _safe_characteristics(good.characteristics)
             
@@ -461,9 +475,11 @@ class ProductService:
 
         return ProductListWithCompanyResponse(
             products=goods_responses,
-            total=total,
+            total=page.total,
             page=skip // limit + 1,
-            per_page=limit
+            per_page=limit,
+            next_cursor=page.next_cursor,
+            total_is_estimate=page.total_is_estimate
         )
 
     async def get_services_by_company_id(
@@ -513,20 +529,24 @@ class ProductService:
             search_term: str,
             skip: int = 0,
             limit: int = 100,
-            include_hidden: bool = False
+            include_hidden: bool = False,
+            cursor: Optional[str] = None,
+            exact_total: bool = False
     ) -> ProductListResponse:
         """Поиск продуктов по названию или описанию"""
-        products, total = await self.company_products_repo.search_products(
-            search_term, skip, limit, include_hidden
+        page = await self.company_products_repo.search_products(
+            search_term, skip, limit, include_hidden, cursor, exact_total
         )
 
-        product_responses = [_safe_model_validate(product) for product in products]
+        product_responses = [_safe_model_validate(product) for product in page.items]
 
         return ProductListResponse(
             products=product_responses,
-            total=total,
+            total=page.total,
             page=skip // limit + 1,
-            per_page=limit
+            per_page=limit,
+            next_cursor=page.next_cursor,
+            total_is_estimate=page.total_is_estimate
         )
 
     async def get_products_by_price_range(
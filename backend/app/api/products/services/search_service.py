@@ -1,4 +1,6 @@
-from sqlalchemy import select, and_, func, or_
+from typing import Optional
+
+from sqlalchemy import select, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
@@ -6,6 +8,8 @@ from app.api.company.models.company import Company
 from app.api.company.schemas.filters import ProductFilterRequest, ServiceFilterRequest
 from app.api.products.models.product import Product, ProductType
 from app.api.products.schemas.product import ProductResponse, ProductListResponse
+from app.api.products.services.full_text_search import ProductTextSearch, supports_full_text
+from app.core.pagination import catalog_total, keyset_query, split_page
 
 
 def _safe_model_validate(product):
@@ -25,98 +29,85 @@ class ProductSearchService:
 
     async def search_products(self, filter_request: ProductFilterRequest) -> ProductListResponse:
         """Поиск товаров с фильтрацией"""
-        # Базовый запрос
-        base_conditions = [
-            Product.type == ProductType.GOOD,
-            Product.is_deleted == False,
-            Product.is_hidden == False
-        ]
-        conditions = await self._get_conditions(filter_request)
-        all_conditions = base_conditions + conditions
-
-        # Основной запрос
-        query = (
-            select(Product)
-            .options(selectinload(Product.company))
-            .join(Company, Product.company_id == Company.id)
-            .where(and_(*all_conditions))
-        )
-
-        # Подсчёт total
-        count_query = (
-            select(func.count(Product.id))
-            .join(Company, Product.company_id == Company.id)
-            .where(and_(*all_conditions))
-        )
-        count_result = await self.session.execute(count_query)
-        total = count_result.scalar()
-
-        # Получаем продукты с пагинацией
-        query = query.offset(filter_request.skip).limit(filter_request.limit)
-        result = await self.session.execute(query)
-        products = result.scalars().all()
-
-        # Преобразуем в response
-        product_responses = [_safe_model_validate(product) for product in products]
-
-        return ProductListResponse(
-            products=product_responses,
-            total=total,
-            page=filter_request.skip // filter_request.limit + 1,
-            per_page=filter_request.limit
-        )
+        return await self._search(ProductType.GOOD, filter_request)
 
     async def search_services(self, filter_request: ServiceFilterRequest) -> ProductListResponse:
         """Поиск услуг с фильтрацией"""
+        return await self._search(ProductType.SERVICE, filter_request)
+
+    def _text_search(self, filter_request) -> Optional[ProductTextSearch]:
+        if filter_request.search and filter_request.search.strip():
+            return ProductTextSearch(filter_request.search, supports_full_text(self.session))
+        return None
+
+    async def _search(self, product_type: ProductType, filter_request) -> ProductListResponse:
+        """
+        Страница поиска: total через catalog_total (кэш/оценка, точно — по exact_total),
+        keyset по (релевантность, id) при поиске по тексту или (created_at, id) без него.
+        С cursor — от последней строки прошлой страницы, без него — прежний OFFSET skip.
+        """
+        # Базовый запрос
         base_conditions = [
-            Product.type == ProductType.SERVICE,
+            Product.type == product_type,
             Product.is_deleted == False,
             Product.is_hidden == False
         ]
         conditions = await self._get_conditions(filter_request)
         all_conditions = base_conditions + conditions
 
-        query = (
-            select(Product)
-            .options(selectinload(Product.company))
-            .join(Company, Product.company_id == Company.id)
-            .where(and_(*all_conditions))
-        )
-
-        count_query = (
-            select(func.count(Product.id))
+        rows_query = (
+            select(Product.id)
             .join(Company, Product.company_id == Company.id)
             .where(and_(*all_conditions))
         )
-        count_result = await self.session.execute(count_query)
-        total = count_result.scalar()
-
-        query = query.offset(filter_request.skip).limit(filter_request.limit)
+        total, total_is_estimate = await catalog_total(self.session, rows_query, filter_request.exact_total)
+
+        # Основной запрос: при поиске по тексту — по убыванию релевантности, с подсветкой
+        text_search = self._text_search(filter_request)
+        rank = text_search.rank() if text_search else None
+        headline = text_search.headline() if text_search else None
+        query = rows_query.with_only_columns(Product).options(selectinload(Product.company))
+        if headline is not None:
+            query = query.add_columns(headline.label("highlight"))
+        if rank is not None:
+            # Ранг пересчитывается в условии keyset
+            order_by = [rank, Product.id]
+            query = query.add_columns(rank.label("rank"))
+            key = lambda row: (row.rank, row[0].id)
+        else:
+            order_by = [Product.created_at, Product.id]
+            key = lambda row: (row[0].created_at, row[0].id)
+        query = keyset_query(query, order_by, filter_request.cursor, filter_request.limit)
+        if not filter_request.cursor:
+            query = query.offset(filter_request.skip)
         result = await self.session.execute(query)
-        services = result.scalars().all()
+        rows, next_cursor = split_page(list(result.all()), filter_request.limit, key)
 
-        service_responses = [_safe_model_validate(service) for service in services]
+        # Преобразуем в response
+        product_responses = []
+        for row in rows:
+            response = _safe_model_validate(row[0])
+            if headline is not None:
+                response.highlight = row.highlight
+            product_responses.append(response)
 
         return ProductListResponse(
-            products=service_responses,
+            products=product_responses,
             total=total,
             page=filter_request.skip // filter_request.limit + 1,
-            per_page=filter_request.limit
+            per_page=filter_request.limit,
+            next_cursor=next_cursor,
+            total_is_estimate=total_is_estimate,
         )
 
     async def _get_conditions(self, filter_request):
         """Формирует условия для фильтрации"""
         conditions = []
 
-        # Поиск по названию
-        if filter_request.search:
-            search_term = f"%{filter_request.search}%"
-            conditions.append(
-                or_(
-                    Product.name.ilike(search_term),
-                    Product.description.ilike(search_term)
-                )
-            )
+        # Поиск по названию, артикулу и описанию
+        text_search = self._text_search(filter_request)
+        if text_search is not None:
+            conditions.append(text_search.condition())
 
         # Фильтр по городам (массив ID городов)
         if filter_request.cities:
@@ -2,7 +2,7 @@ import enum
 from datetime import datetime
 from typing import Optional, List, TYPE_CHECKING
 
-from sqlalchemy import String, Enum, ForeignKey, Text, DateTime, Boolean, Float, JSON, Integer, UniqueConstraint
+from sqlalchemy import String, Enum, ForeignKey, Text, DateTime, Boolean, Float, JSON, Index, Integer, UniqueConstraint, text, true
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base_class import Base
@@ -42,11 +42,28 @@ if TYPE_CHECKING:
 class Order(Base):
 	"""Заказ - основная сущность для документооборота"""
 	__tablename__ = "orders"
+	__table_args__ = (
+		# Списки сделок и выборка latest по id — только по строкам is_latest
+		Index(
+			"ix_orders_buyer_latest", "buyer_company_id", "updated_at", "id",
+			postgresql_where=text("is_latest"), sqlite_where=text("is_latest"),
+		),
+		Index(
+			"ix_orders_seller_latest", "seller_company_id", "updated_at", "id",
+			postgresql_where=text("is_latest"), sqlite_where=text("is_latest"),
+		),
+		Index("ix_orders_id_latest", "id", postgresql_where=text("is_latest"), sqlite_where=text("is_latest")),
+	)
 
 	# Technical row PK + stable business id
 	row_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True, nullable=False)
 	id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
 	version: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+	# Последняя версия сделки; переключается при создании/удалении версии (DealRepository)
+	is_latest: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True, server_default=true())
+	# Copy-on-write позиций: row_id версии, чьи order_items использует эта версия (NULL — свои позиции).
+	# Всегда указывает на более раннюю версию-владельца, поэтому удаление последней версии его не трогает.
+	items_row_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, index=True)
 
 	# Основная информация
 	buyer_order_number: Mapped[str] = mapped_column(String(20), nullable=False)  # Номер заказа покупателя (00000)
@@ -140,18 +157,48 @@ class Order(Base):
 	buyer_company: Mapped["Company"] = relationship("Company", foreign_keys=[buyer_company_id], backref="buyer_orders")
 	seller_company: Mapped["Company"] = relationship("Company", foreign_keys=[seller_company_id], backref="seller_orders")
 	order_items: Mapped[List["OrderItem"]] = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
+	shared_items: Mapped[List["OrderItem"]] = relationship(
+		"OrderItem",
+		primaryjoin="foreign(OrderItem.order_row_id) == Order.items_row_id",
+		viewonly=True,
+		order_by="OrderItem.position",
+	)
 	order_history: Mapped[List["OrderHistory"]] = relationship("OrderHistory", back_populates="order", cascade="all, delete-orphan")
 
+	@property
+	def version_items(self) -> List["OrderItem"]:
+		"""Позиции этой версии: собственные или общие с версией items_row_id."""
+		return self.shared_items if self.items_row_id is not None else self.order_items
+
 	def __str__(self):
 		return f"Заказ {self.buyer_order_number}"
 
 
+class DocumentCounter(Base):
+	"""Счётчик номеров документов: компания × тип документа × год.
+
+	Следующий номер выдаётся одним UPDATE ... RETURNING по строке счётчика (строка
+	блокируется до конца транзакции — параллельные заказы одного продавца не получают
+	одинаковый номер, а откат транзакции возвращает номер, так что пропусков нет).
+	company_id = 0 и year = 0 — глобальные счётчики (id сделок без последовательности в БД).
+	"""
+	__tablename__ = "document_counters"
+	__table_args__ = (
+		UniqueConstraint("company_id", "doc_type", "year", name="uq_document_counters_company_type_year"),
+	)
+
+	company_id: Mapped[int] = mapped_column(Integer, nullable=False)
+	doc_type: Mapped[str] = mapped_column(String(32), nullable=False)  # buyer_order | seller_order | bill | contract | supply_contract | deal_id
+	year: Mapped[int] = mapped_column(Integer, nullable=False)
+	last_value: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
 class OrderItem(Base):
     """Позиция в заказе"""
     __tablename__ = "order_items"
 
     # Связь с заказом
-    order_row_id: Mapped[int] = mapped_column(ForeignKey("orders.row_id", ondelete="CASCADE"), nullable=False)
+    order_row_id: Mapped[int] = mapped_column(ForeignKey("orders.row_id", ondelete="CASCADE"), nullable=False, index=True)
     
     # Информация о продукте
     product_id: Mapped[Optional[int]] = mapped_column(ForeignKey("products.id"), nullable=True)  # Может быть null для ручного ввода
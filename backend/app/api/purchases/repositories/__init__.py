@@ -1,12 +1,14 @@
 from typing import Optional, List, Tuple, Any, Dict
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func, desc, extract
+from sqlalchemy import select, and_, or_, func, desc, update
 from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from datetime import date, datetime, timezone
 import enum
 import json
 
 from app.api.purchases.models import Order, OrderItem, OrderHistory, OrderDocument, UnitOfMeasurement, OrderStatus, OrderType
+from app.api.purchases.repositories.document_counters import DocumentCounterRepository
 from app.api.purchases.schemas import DealCreate, DealUpdate
 from app.api.purchases.utils.total_amount_word import format_total_amount_word
 from app.api.purchases.deal_bill_defaults import (
@@ -16,8 +18,28 @@ from app.api.purchases.deal_bill_defaults import (
 	default_contract_terms_text_offer,
 )
 from app.api.company.models.company import Company
+from app.core.pagination import CatalogPage, catalog_total, keyset_query, split_page
 from app_logging.logger import logger
 
+# Колонки карточки в списках сделок покупателя/продавца
+_DEAL_SUMMARY_COLUMNS = (
+	Order.id,
+	Order.version,
+	Order.buyer_company_id,
+	Order.seller_company_id,
+	Order.buyer_order_number,
+	Order.seller_order_number,
+	Order.status,
+	Order.total_amount,
+	Order.total_amount_excl_vat,
+	Order.created_at,
+	Order.updated_at,
+)
+
+
+# Позиции версии: собственные и общие (copy-on-write, Order.version_items)
+_ITEMS_LOADERS = (selectinload(Order.order_items), selectinload(Order.shared_items))
+
 
 def _utc_now() -> datetime:
 	"""Naive UTC timestamp for DateTime columns without timezone=True."""
@@ -36,166 +58,221 @@ class DealRepository:
 
     async def create_order(self, order_data: DealCreate, buyer_company_id: int) -> Order:
         """Создание нового заказа"""
-        logger.debug("Начинаем создание заказа для покупателя %s", buyer_company_id)
-        
+        orders = await self.create_orders([order_data], buyer_company_id)
+        return orders[0]
+
+    async def create_orders(
+        self,
+        orders_data: List[DealCreate],
+        buyer_company_id: int,
+        products_by_article: Optional[Dict[str, Any]] = None,
+    ) -> List[Order]:
+        """Создание нескольких заказов одного покупателя одной транзакцией.
+
+        Заказы, позиции и история вставляются пакетными INSERT ... RETURNING, номера
+        и id сделок выдаются один раз на компанию, каталожные позиции берутся из
+        products_by_article или одним запросом по всем артикулам.
+        """
+        if not orders_data:
+            return []
+        logger.debug("Создаём %s заказов для покупателя %s", len(orders_data), buyer_company_id)
+
         try:
-            seller_company = await self.get_company_by_id(order_data.seller_company_id)
-
-            # Генерируем номера заказов для покупателя и продавца (ежегодное обнуление)
-            logger.debug("Генерируем номер заказа для покупателя %s", buyer_company_id)
-            buyer_order_number = await self._generate_order_number(buyer_company_id, "buyer")
-            logger.debug("Номер покупателя: %s", buyer_order_number)
-
-            logger.debug("Генерируем номер заказа для продавца %s", order_data.seller_company_id)
-            seller_order_number = await self._generate_order_number(order_data.seller_company_id, "seller")
-            logger.debug("Номер продавца: %s", seller_order_number)
-
-            # Создаем заказ (version starts at 1 for a new deal id)
-            logger.debug("Создаем объект Order")
-            seller_production_address = (
-                (getattr(seller_company, "production_address", None) or "")
-                if seller_company
-                else ""
-            )
-            _ct_contract = default_contract_terms_text_contract(
-                payment_terms_contract=DEFAULT_BILL_PAYMENT_TERMS_DAYS,
-                delivery_terms_contract=DEFAULT_BILL_DELIVERY_TERMS_DAYS,
-            )
-            _ct_offer = default_contract_terms_text_offer(
-                payment_terms_offer=DEFAULT_BILL_PAYMENT_TERMS_DAYS,
-                production_address=seller_production_address,
-            )
-            order = Order(
-                id=await self._generate_deal_id(),
-                version=1,
-                buyer_order_number=buyer_order_number,
-                seller_order_number=seller_order_number,
-                buyer_company_id=buyer_company_id,
-                seller_company_id=order_data.seller_company_id,
-                seller_vat_rate=seller_company.vat_rate if seller_company else None,
-                deal_type=OrderType(order_data.deal_type.value),
-                status=OrderStatus.ACTIVE,
-                comments=order_data.comments,
-                payment_terms_contract=DEFAULT_BILL_PAYMENT_TERMS_DAYS,
-                delivery_terms_contract=DEFAULT_BILL_DELIVERY_TERMS_DAYS,
-                payment_terms_offer=DEFAULT_BILL_PAYMENT_TERMS_DAYS,
-                contract_terms_text_contract=_ct_contract,
-                contract_terms_text_offer=_ct_offer,
-            )
-            
-            logger.debug("Добавляем заказ в сессию")
-            self.session.add(order)
-            logger.debug("Выполняем flush для получения ID")
-            await self.session.flush()  # Получаем ID заказа
-            logger.debug("Получен ID заказа: %s", order.id)
-            
-            # Добавляем позиции заказа
-            logger.debug("Добавляем %s позиций заказа", len(order_data.items))
-            total_amount = 0
-
-            from app.api.products.repositories.company_products_repository import CompanyProductsRepository
-            products_repo = CompanyProductsRepository(self.session)
-
-            for i, item_data in enumerate(order_data.items, 1):
-                position = item_data.position if item_data.position else i
-
-                # Если article указан, получаем данные из БД
-                product_id = None
-                if item_data.article:
-                    product = await products_repo.get_by_article(item_data.article)
-                    if not product:
-                        raise ValueError(f"Product with article '{item_data.article}' not found")
-
-                    product_id = product.id
-                    # Используем данные из БД
-                    product_name = product.name
-                    product_slug = product.slug
-                    product_description = product.description
-                    product_article = product.article
-                    logo_url = (product.images[0] if (product.images and len(product.images) > 0) else None)
-                    unit_of_measurement = product.unit_of_measurement or "шт"
-                    price = product.price if product.price is not None else 0.0
-                    quantity = item_data.quantity
+            from sqlalchemy import insert
+            from app.api.products.models.product import Product
+
+            seller_ids = sorted({order_data.seller_company_id for order_data in orders_data})
+            sellers_result = await self.session.execute(select(Company).where(Company.id.in_(seller_ids)))
+            sellers = {company.id: company for company in sellers_result.scalars().all()}
+
+            products_by_article = dict(products_by_article or {})
+            missing_articles = {
+                item.article
+                for order_data in orders_data
+                for item in order_data.items
+                if item.article and item.article not in products_by_article
+            }
+            if missing_articles:
+                products_result = await self.session.execute(
+                    select(Product).where(
+                        and_(
+                            Product.article.in_(missing_articles),
+                            Product.is_deleted == False,
+                            Product.is_hidden == False,
+                        )
+                    )
+                )
+                for product in products_result.scalars().all():
+                    products_by_article.setdefault(product.article, product)
+
+            # Номера заказов (ежегодное обнуление) и id сделок — по одному инкременту счётчика на компанию.
+            # Строки счётчиков блокируются в одном глобальном порядке (company_id, doc_type), а не в
+            # порядке корзины: иначе два checkout с продавцами A, B и B, A ждут друг друга до дедлока.
+            # Счётчик id сделок (company_id = 0 в SQLite) — первым.
+            deal_ids = await self._generate_deal_ids(len(orders_data))
+            reservations = [(buyer_company_id, "buyer_order", len(orders_data))] + [
+                (
+                    seller_id,
+                    "seller_order",
+                    sum(1 for order_data in orders_data if order_data.seller_company_id == seller_id),
+                )
+                for seller_id in seller_ids
+            ]
+            buyer_numbers: List[str] = []
+            seller_numbers: Dict[int, List[str]] = {}
+            for company_id, doc_type, count in sorted(reservations):
+                if doc_type == "buyer_order":
+                    buyer_numbers = await self._generate_order_numbers(company_id, "buyer", count)
                 else:
-                    # Ручной ввод - используем данные из запроса
-                    if not item_data.product_name:
-                        raise ValueError("product_name is required when article is not specified")
-                    if not item_data.price:
-                        raise ValueError("price is required when article is not specified")
-                    if not item_data.unit_of_measurement:
-                        raise ValueError("unit_of_measurement is required when article is not specified")
-
-                    product_name = item_data.product_name
-                    product_slug = item_data.product_slug
-                    product_description = item_data.product_description
-                    product_article = item_data.product_article
-                    logo_url = item_data.logo_url
-                    unit_of_measurement = item_data.unit_of_measurement
-                    price = item_data.price
-                    quantity = item_data.quantity
+                    seller_numbers[company_id] = await self._generate_order_numbers(company_id, "seller", count)
+
+            order_rows: List[dict] = []
+            items_per_order: List[List[dict]] = []
+            for index, order_data in enumerate(orders_data):
+                seller_company = sellers.get(order_data.seller_company_id)
+                seller_production_address = (
+                    (getattr(seller_company, "production_address", None) or "")
+                    if seller_company
+                    else ""
+                )
 
-                amount = quantity * price
-                total_amount += amount
-
-                logger.debug("Обрабатываем позицию %s: %s (qty=%s, price=%s)", position, product_name, quantity, price)
-
-                order_item = OrderItem(
-                    order_row_id=order.row_id,
-                    product_id=product_id,
-                    product_name=product_name,
-                    product_slug=product_slug,
-                    product_description=product_description,
-                    product_article=product_article,
-                    product_type=None,
-                    logo_url=logo_url,
-                    quantity=quantity,
-                    unit_of_measurement=unit_of_measurement,
-                    price=price,
-                    amount=amount,
-                    position=position
+                item_rows = []
+                total_amount = 0
+                for i, item_data in enumerate(order_data.items, 1):
+                    position = item_data.position if item_data.position else i
+
+                    # Если article указан, получаем данные из БД
+                    product_id = None
+                    if item_data.article:
+                        product = products_by_article.get(item_data.article)
+                        if not product:
+                            raise ValueError(f"Product with article '{item_data.article}' not found")
+
+                        product_id = product.id
+                        # Используем данные из БД
+                        product_name = product.name
+                        product_slug = product.slug
+                        product_description = product.description
+                        product_article = product.article
+                        logo_url = (product.images[0] if (product.images and len(product.images) > 0) else None)
+                        unit_of_measurement = product.unit_of_measurement or "шт"
+                        price = product.price if product.price is not None else 0.0
+                    else:
+                        # Ручной ввод - используем данные из запроса
+                        if not item_data.product_name:
+                            raise ValueError("product_name is required when article is not specified")
+                        if not item_data.price:
+                            raise ValueError("price is required when article is not specified")
+                        if not item_data.unit_of_measurement:
+                            raise ValueError("unit_of_measurement is required when article is not specified")
+
+                        product_name = item_data.product_name
+                        product_slug = item_data.product_slug
+                        product_description = item_data.product_description
+                        product_article = item_data.product_article
+                        logo_url = item_data.logo_url
+                        unit_of_measurement = item_data.unit_of_measurement
+                        price = item_data.price
+
+                    quantity = item_data.quantity
+                    amount = quantity * price
+                    total_amount += amount
+                    item_rows.append({
+                        "product_id": product_id,
+                        "product_name": product_name,
+                        "product_slug": product_slug,
+                        "product_description": product_description,
+                        "product_article": product_article,
+                        "product_type": None,
+                        "logo_url": logo_url,
+                        "quantity": quantity,
+                        "unit_of_measurement": unit_of_measurement,
+                        "price": price,
+                        "amount": amount,
+                        "position": position,
+                    })
+
+                total_amount = float(total_amount)
+                seller_vat_rate = seller_company.vat_rate if seller_company else None
+                # Новая сделка всегда с НДС в сумме (amount_with_vat_rate по умолчанию True)
+                amount_vat_rate = self._calculate_amount_vat_rate(total_amount, seller_vat_rate or 0, True)
+                order_total = total_amount + amount_vat_rate
+                order_rows.append({
+                    "id": deal_ids[index],
+                    "version": 1,
+                    "is_latest": True,
+                    "buyer_order_number": buyer_numbers[index],
+                    "seller_order_number": seller_numbers[order_data.seller_company_id].pop(0),
+                    "buyer_company_id": buyer_company_id,
+                    "seller_company_id": order_data.seller_company_id,
+                    "seller_vat_rate": seller_vat_rate,
+                    "deal_type": OrderType(order_data.deal_type.value),
+                    "status": OrderStatus.ACTIVE,
+                    "comments": order_data.comments,
+                    "payment_terms_contract": DEFAULT_BILL_PAYMENT_TERMS_DAYS,
+                    "delivery_terms_contract": DEFAULT_BILL_DELIVERY_TERMS_DAYS,
+                    "payment_terms_offer": DEFAULT_BILL_PAYMENT_TERMS_DAYS,
+                    "contract_terms_text_contract": default_contract_terms_text_contract(
+                        payment_terms_contract=DEFAULT_BILL_PAYMENT_TERMS_DAYS,
+                        delivery_terms_contract=DEFAULT_BILL_DELIVERY_TERMS_DAYS,
+                    ),
+                    "contract_terms_text_offer": default_contract_terms_text_offer(
+                        payment_terms_offer=DEFAULT_BILL_PAYMENT_TERMS_DAYS,
+                        production_address=seller_production_address,
+                    ),
+                    "amount_with_vat_rate": True,
+                    "amount_vat_rate": amount_vat_rate,
+                    "total_amount_excl_vat": total_amount,
+                    "total_amount": order_total,
+                    "total_amount_word": format_total_amount_word(order_total),
+                })
+                items_per_order.append(item_rows)
+
+            row_ids = (
+                await self.session.execute(
+                    insert(Order).returning(Order.row_id, sort_by_parameter_order=True),
+                    order_rows,
                 )
-                logger.debug("Добавляем позицию в сессию")
-                self.session.add(order_item)
+            ).scalars().all()
 
-            total_amount = float(total_amount)
+            all_items = [
+                {**item_row, "order_row_id": row_id}
+                for row_id, item_rows in zip(row_ids, items_per_order)
+                for item_row in item_rows
+            ]
+            if all_items:
+                await self.session.execute(insert(OrderItem), all_items)
 
-            vat_rate = order.seller_vat_rate if order.seller_vat_rate is not None else ((seller_company.vat_rate or 0) if seller_company else 0)
-            order.amount_vat_rate = self._calculate_amount_vat_rate(total_amount, vat_rate, order.amount_with_vat_rate)
-            order.total_amount_excl_vat = total_amount
-            order.total_amount = total_amount + order.amount_vat_rate if order.amount_with_vat_rate else total_amount
-            self._sync_total_amount_word(order)
-            logger.debug("Общая сумма заказа: %s", total_amount)
-            
             # Записываем в историю
-            logger.debug("Добавляем запись в историю")
-            self._add_order_history(
-                order.row_id,
-                buyer_company_id,
-                "created",
-                "Заказ создан покупателем",
-                None,
-                order_data.dict()
+            await self.session.execute(
+                insert(OrderHistory),
+                [
+                    {
+                        "order_row_id": row_id,
+                        "changed_by_company_id": buyer_company_id,
+                        "change_type": "created",
+                        "change_description": "Заказ создан покупателем",
+                        "new_data": DealRepository._to_json_serializable(order_data.dict()),
+                    }
+                    for row_id, order_data in zip(row_ids, orders_data)
+                ],
             )
-            
-            logger.debug("Выполняем commit")
+
             await self.session.commit()
-            logger.debug("Заказ успешно создан с ID %s", order.id)
-            
-            # Перезагружаем заказ с связанными данными
-            logger.debug("Перезагружаем заказ с связанными данными")
-            reloaded_order = await self.get_order_by_id(order.id, buyer_company_id)
-            return reloaded_order
-            
+            logger.debug("Заказы созданы: %s", deal_ids)
+
+            # Перезагружаем заказы со связанными данными одним запросом
+            return await self.get_orders_by_ids(deal_ids, buyer_company_id)
+
         except Exception as e:
-            logger.exception("Ошибка в create_order: %s (тип: %s)", e, type(e).__name__)
+            logger.exception("Ошибка в create_orders: %s (тип: %s)", e, type(e).__name__)
             raise
 
     async def get_order_by_id_only(self, order_id: int) -> Optional[Order]:
         """Получение latest-версии заказа по ID без проверки доступа (для различения 404/403)."""
         query = (
             select(Order)
-            .where(Order.id == order_id)
-            .order_by(desc(Order.version))
+            .where(Order.id == order_id, Order.is_latest.is_(True))
             .limit(1)
         )
         result = await self.session.execute(query)
@@ -207,7 +284,7 @@ class DealRepository:
         """Получение конкретной версии заказа по deal ID и version с проверкой доступа."""
         query = (
             select(Order)
-            .options(selectinload(Order.order_items), selectinload(Order.order_history))
+            .options(*_ITEMS_LOADERS, selectinload(Order.order_history))
             .where(
                 and_(
                     Order.id == order_id,
@@ -228,7 +305,7 @@ class DealRepository:
         query = (
             select(Order)
             .options(
-                selectinload(Order.order_items),
+                *_ITEMS_LOADERS,
                 selectinload(Order.order_history),
                 selectinload(Order.seller_company),
                 selectinload(Order.buyer_company),
@@ -236,13 +313,13 @@ class DealRepository:
             .where(
                 and_(
                     Order.id == order_id,
+                    Order.is_latest.is_(True),
                     or_(
                         Order.buyer_company_id == company_id,
                         Order.seller_company_id == company_id,
                     ),
                 )
             )
-            .order_by(desc(Order.version))
             .limit(1)
         )
         result = await self.session.execute(query)
@@ -255,30 +332,18 @@ class DealRepository:
             return []
 
         unique_ids = list(dict.fromkeys(order_ids))
-        latest_subquery = (
-            select(Order.id.label("deal_id"), func.max(Order.version).label("max_version"))
+        query = (
+            select(Order)
             .where(
                 Order.id.in_(unique_ids),
+                Order.is_latest.is_(True),
                 or_(
                     Order.buyer_company_id == company_id,
                     Order.seller_company_id == company_id,
                 ),
             )
-            .group_by(Order.id)
-            .subquery()
-        )
-
-        query = (
-            select(Order)
-            .join(
-                latest_subquery,
-                and_(
-                    Order.id == latest_subquery.c.deal_id,
-                    Order.version == latest_subquery.c.max_version,
-                ),
-            )
             .options(
-                selectinload(Order.order_items),
+                *_ITEMS_LOADERS,
                 selectinload(Order.order_history),
                 selectinload(Order.seller_company),
                 selectinload(Order.buyer_company),
@@ -289,81 +354,68 @@ class DealRepository:
         order_by_id = {order.id: order for order in orders}
         return [order_by_id[oid] for oid in unique_ids if oid in order_by_id]
 
-    async def get_buyer_orders(self, company_id: int, skip: int = 0, limit: int = 100) -> Tuple[List[Order], int]:
-        """Получение latest-версий заказов покупателя."""
-        # Общее количество (distinct deals)
-        count_query = select(func.count(func.distinct(Order.id))).where(Order.buyer_company_id == company_id)
-        count_result = await self.session.execute(count_query)
-        total = count_result.scalar()
-
-        latest_subquery = (
-            select(Order.id.label("deal_id"), func.max(Order.version).label("max_version"))
-            .where(Order.buyer_company_id == company_id)
-            .group_by(Order.id)
-            .subquery()
-        )
+    async def _latest_orders_page(
+        self,
+        party_column,
+        counterparty_column,
+        company_id: int,
+        skip: int,
+        limit: int,
+        cursor: Optional[str],
+        exact_total: bool,
+    ) -> CatalogPage:
+        """
+        Страница списка сделок: только latest-версии (is_latest, частичные индексы
+        ix_orders_*_latest) и только колонки карточки списка — без позиций и истории.
+        Порядок — по (updated_at, id); с cursor — keyset, без него — прежний OFFSET skip.
+        """
+        base_query = select(Order.row_id).where(party_column == company_id, Order.is_latest.is_(True))
+        total, total_is_estimate = await catalog_total(self.session, base_query, exact_total)
 
         query = (
-            select(Order)
-            .join(
-                latest_subquery,
-                and_(
-                    Order.id == latest_subquery.c.deal_id,
-                    Order.version == latest_subquery.c.max_version,
-                ),
+            select(
+                *_DEAL_SUMMARY_COLUMNS,
+                func.coalesce(Company.name, "Unknown").label("counterparty_name"),
+                Company.inn.label("counterparty_inn"),
+                Company.phone.label("counterparty_phone"),
             )
-            .options(
-                selectinload(Order.order_items),
-                selectinload(Order.seller_company),
-                selectinload(Order.buyer_company),
-            )
-            .order_by(desc(Order.updated_at))
-            .offset(skip)
-            .limit(limit)
+            .outerjoin(Company, Company.id == counterparty_column)
+            .where(party_column == company_id, Order.is_latest.is_(True))
         )
-
+        query = keyset_query(query, [Order.updated_at, Order.id], cursor, limit)
+        if not cursor:
+            query = query.offset(skip)
         result = await self.session.execute(query)
-        orders = result.scalars().all()
-
-        return list(orders), total
-
-    async def get_seller_orders(self, company_id: int, skip: int = 0, limit: int = 100) -> Tuple[List[Order], int]:
-        """Получение latest-версий заказов продавца."""
-        # Общее количество (distinct deals)
-        count_query = select(func.count(func.distinct(Order.id))).where(Order.seller_company_id == company_id)
-        count_result = await self.session.execute(count_query)
-        total = count_result.scalar()
-
-        latest_subquery = (
-            select(Order.id.label("deal_id"), func.max(Order.version).label("max_version"))
-            .where(Order.seller_company_id == company_id)
-            .group_by(Order.id)
-            .subquery()
+        rows, next_cursor = split_page(
+            [dict(row) for row in result.mappings().all()], limit, lambda row: (row["updated_at"], row["id"])
         )
+        return CatalogPage(rows, total, total_is_estimate, next_cursor)
 
-        query = (
-            select(Order)
-            .join(
-                latest_subquery,
-                and_(
-                    Order.id == latest_subquery.c.deal_id,
-                    Order.version == latest_subquery.c.max_version,
-                ),
-            )
-            .options(
-                selectinload(Order.order_items),
-                selectinload(Order.seller_company),
-                selectinload(Order.buyer_company),
-            )
-            .order_by(desc(Order.updated_at))
-            .offset(skip)
-            .limit(limit)
+    async def get_buyer_orders(
+        self,
+        company_id: int,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        exact_total: bool = False,
+    ) -> CatalogPage:
+        """Сводки latest-версий заказов покупателя (counterparty_* — поставщик)."""
+        return await self._latest_orders_page(
+            Order.buyer_company_id, Order.seller_company_id, company_id, skip, limit, cursor, exact_total
         )
 
-        result = await self.session.execute(query)
-        orders = result.scalars().all()
-
-        return list(orders), total
+    async def get_seller_orders(
+        self,
+        company_id: int,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        exact_total: bool = False,
+    ) -> CatalogPage:
+        """Сводки latest-версий заказов продавца (counterparty_* — покупатель)."""
+        return await self._latest_orders_page(
+            Order.seller_company_id, Order.buyer_company_id, company_id, skip, limit, cursor, exact_total
+        )
 
     async def delete_order(self, order_id: int, company_id: int) -> bool:
         """Удаление всех версий заказа."""
@@ -400,9 +452,24 @@ class DealRepository:
             return None
         deleted_version = order.version
         await self.session.delete(order)
+        await self.session.flush()
+        # Latest снова становится предыдущая версия
+        previous_version = (
+            select(func.max(Order.version)).where(Order.id == order_id).scalar_subquery()
+        )
+        await self._set_latest_flag(
+            and_(Order.id == order_id, Order.version == previous_version), True
+        )
         await self.session.commit()
         return deleted_version
 
+    async def _set_latest_flag(self, condition, is_latest: bool) -> None:
+        """Переключить is_latest без onupdate: updated_at версии не трогаем — по нему сортируются списки."""
+        table = Order.__table__
+        await self.session.execute(
+            update(table).where(condition).values(is_latest=is_latest, updated_at=table.c.updated_at)
+        )
+
     async def infer_proposed_by_company_id(self, order: Order) -> Optional[int]:
         """Определяет инициатора версии по явному полю или записи в истории."""
         if order.proposed_by_company_id is not None:
@@ -482,8 +549,8 @@ class DealRepository:
         return f"n:{(item.product_name or '').strip().lower()}"
 
     def _compute_order_diff(self, baseline: Order, proposed: Order) -> dict:
-        baseline_map = {self._item_match_key(i): i for i in baseline.order_items}
-        proposed_map = {self._item_match_key(i): i for i in proposed.order_items}
+        baseline_map = {self._item_match_key(i): i for i in baseline.version_items}
+        proposed_map = {self._item_match_key(i): i for i in proposed.version_items}
         items: List[dict] = []
 
         def _line_payload(item: OrderItem, status: str, changed_fields: List[str]) -> dict:
@@ -548,12 +615,24 @@ class DealRepository:
         }
 
     async def create_new_order_version(self, order_id: int, company_id: int) -> Optional[Order]:
-        """Создание новой версии заказа по latest snapshot."""
-        latest_order = await self.get_order_by_id(order_id, company_id)
+        """Создание новой версии заказа по latest snapshot (без копирования позиций)."""
+        result = await self.session.execute(
+            select(Order).where(
+                Order.id == order_id,
+                Order.is_latest.is_(True),
+                or_(
+                    Order.buyer_company_id == company_id,
+                    Order.seller_company_id == company_id,
+                ),
+            )
+        )
+        latest_order = result.scalar_one_or_none()
         if not latest_order:
             return None
 
         new_version = latest_order.version + 1
+        await self._set_latest_flag(Order.row_id == latest_order.row_id, False)
+        set_committed_value(latest_order, "is_latest", False)
         new_order = Order(
             id=latest_order.id,
             version=new_version,
@@ -598,29 +677,14 @@ class DealRepository:
             buyer_accepted_at=None,
             seller_accepted_at=None,
             rejected_by_company_id=None,
+            is_latest=True,
+            # Позиции не копируются: новая версия ссылается на позиции версии-владельца
+            items_row_id=latest_order.items_row_id or latest_order.row_id,
         )
 
         self.session.add(new_order)
         await self.session.flush()
 
-        for item in latest_order.order_items:
-            cloned_item = OrderItem(
-                order_row_id=new_order.row_id,
-                product_id=item.product_id,
-                product_name=item.product_name,
-                product_slug=item.product_slug,
-                product_description=item.product_description,
-                product_article=item.product_article,
-                product_type=item.product_type,
-                logo_url=item.logo_url,
-                quantity=item.quantity,
-                unit_of_measurement=item.unit_of_measurement,
-                price=item.price,
-                amount=item.amount,
-                position=item.position,
-            )
-            self.session.add(cloned_item)
-
         self._add_order_history(
             new_order.row_id,
             company_id,
@@ -788,69 +852,21 @@ class DealRepository:
 
         # Обновляем позиции если нужно
         if order_data.items is not None:
-            from app.api.products.repositories.company_products_repository import CompanyProductsRepository
-            products_repo = CompanyProductsRepository(self.session)
-
-            # Заменяем позиции: очищаем связь (delete-orphan удалит строки в БД), затем добавляем только новые
-            order.order_items.clear()
-            await self.session.flush()
-
-            total_amount = 0
-            for i, item_data in enumerate(order_data.items, 1):
-                # Если article указан, получаем данные из БД
-                product_id = None
-                if item_data.article:
-                    product = await products_repo.get_by_article(item_data.article)
-                    if not product:
-                        raise ValueError(f"Product with article '{item_data.article}' not found")
-
-                    product_id = product.id
-                    # Используем данные из БД
-                    product_name = product.name
-                    product_slug = product.slug
-                    product_description = product.description
-                    product_article = product.article
-                    logo_url = (product.images[0] if (product.images and len(product.images) > 0) else None)
-                    unit_of_measurement = product.unit_of_measurement or "шт"
-                    price = product.price if product.price is not None else 0.0
+            item_rows = await self._resolve_item_rows(order_data.items)
+            if [self._item_content(row) for row in item_rows] != [
+                self._item_content(item) for item in order.version_items
+            ]:
+                if order.items_row_id is not None:
+                    # Copy-on-write: общие позиции не трогаем, версия получает собственные
+                    order.items_row_id = None
                 else:
-                    # Ручной ввод - используем данные из запроса (price может быть 0 при обновлении)
-                    if not item_data.product_name:
-                        raise ValueError("product_name is required when article is not specified")
-                    if item_data.price is None:
-                        raise ValueError("price is required when article is not specified")
-                    if not item_data.unit_of_measurement:
-                        raise ValueError("unit_of_measurement is required when article is not specified")
-
-                    product_name = item_data.product_name
-                    product_slug = item_data.product_slug or None
-                    product_description = item_data.product_description or None
-                    product_article = item_data.product_article or None
-                    logo_url = item_data.logo_url or None
-                    unit_of_measurement = item_data.unit_of_measurement or "шт"
-                    price = float(item_data.price)
-
-                amount = item_data.quantity * price
-                total_amount += amount
-
-                order_item = OrderItem(
-                    order_row_id=order.row_id,
-                    product_id=product_id,
-                    product_name=product_name,
-                    product_slug=product_slug,
-                    product_description=product_description,
-                    product_article=product_article,
-                    product_type=None,
-                    logo_url=logo_url,
-                    quantity=item_data.quantity,
-                    unit_of_measurement=unit_of_measurement,
-                    price=price,
-                    amount=amount,
-                    position=i
-                )
-                order.order_items.append(order_item)
+                    # Заменяем позиции: очищаем связь (delete-orphan удалит строки в БД), затем добавляем только новые
+                    order.order_items.clear()
+                    await self.session.flush()
+                for row in item_rows:
+                    order.order_items.append(OrderItem(order_row_id=order.row_id, **row))
 
-            total_amount = float(total_amount)
+            total_amount = float(sum(row["amount"] for row in item_rows))
 
             seller_company = await self.get_company_by_id(order.seller_company_id)
             vat_rate = order.seller_vat_rate if order.seller_vat_rate is not None else ((seller_company.vat_rate or 0) if seller_company else 0)
@@ -889,13 +905,15 @@ class DealRepository:
             "amount_with_vat_rate": getattr(order, "amount_with_vat_rate", True),
         }
         
+        # В историю — только изменившиеся поля
+        changed_fields = [key for key, value in new_data.items() if old_data.get(key) != value]
         self._add_order_history(
             order.row_id,
             company_id,
             "updated",
             "Заказ обновлен",
-            old_data,
-            new_data
+            {key: old_data[key] for key in changed_fields},
+            {key: new_data[key] for key in changed_fields},
         )
         
         await self.session.commit()
@@ -903,6 +921,89 @@ class DealRepository:
         reloaded = await self.get_order_by_id(order_id, company_id)
         return reloaded if reloaded else order
 
+    # Поля позиции, по которым версии считаются одинаковыми (created_at/updated_at не важны)
+    _ITEM_CONTENT_FIELDS = (
+        "product_id",
+        "product_name",
+        "product_slug",
+        "product_description",
+        "product_article",
+        "product_type",
+        "logo_url",
+        "quantity",
+        "unit_of_measurement",
+        "price",
+        "amount",
+        "position",
+    )
+
+    @classmethod
+    def _item_content(cls, item) -> tuple:
+        if isinstance(item, dict):
+            return tuple(item.get(field) for field in cls._ITEM_CONTENT_FIELDS)
+        return tuple(getattr(item, field) for field in cls._ITEM_CONTENT_FIELDS)
+
+    async def _resolve_item_rows(self, items: list) -> List[dict]:
+        """Позиции из DealUpdate.items в колонки OrderItem; каталожные артикулы — одним запросом."""
+        from app.api.products.repositories.company_products_repository import CompanyProductsRepository
+
+        articles = sorted({item.article for item in items if item.article})
+        products = await CompanyProductsRepository(self.session).get_by_articles_or_slugs(articles, [])
+        products_by_article = {}
+        for product in products:
+            products_by_article.setdefault(product.article, product)
+
+        rows: List[dict] = []
+        for i, item_data in enumerate(items, 1):
+            # Если article указан, получаем данные из БД
+            product_id = None
+            if item_data.article:
+                product = products_by_article.get(item_data.article)
+                if not product:
+                    raise ValueError(f"Product with article '{item_data.article}' not found")
+
+                product_id = product.id
+                # Используем данные из БД
+                product_name = product.name
+                product_slug = product.slug
+                product_description = product.description
+                product_article = product.article
+                logo_url = (product.images[0] if (product.images and len(product.images) > 0) else None)
+                unit_of_measurement = product.unit_of_measurement or "шт"
+                price = product.price if product.price is not None else 0.0
+            else:
+                # Ручной ввод - используем данные из запроса (price может быть 0 при обновлении)
+                if not item_data.product_name:
+                    raise ValueError("product_name is required when article is not specified")
+                if item_data.price is None:
+                    raise ValueError("price is required when article is not specified")
+                if not item_data.unit_of_measurement:
+                    raise ValueError("unit_of_measurement is required when article is not specified")
+
+                product_name = item_data.product_name
+                product_slug = item_data.product_slug or None
+                product_description = item_data.product_description or None
+                product_article = item_data.product_article or None
+                logo_url = item_data.logo_url or None
+                unit_of_measurement = item_data.unit_of_measurement or "шт"
+                price = float(item_data.price)
+
+            rows.append({
+                "product_id": product_id,
+                "product_name": product_name,
+                "product_slug": product_slug,
+                "product_description": product_description,
+                "product_article": product_article,
+                "product_type": None,
+                "logo_url": logo_url,
+                "quantity": item_data.quantity,
+                "unit_of_measurement": unit_of_measurement,
+                "price": price,
+                "amount": item_data.quantity * price,
+                "position": i,
+            })
+        return rows
+
     async def add_document(self, order_id: int, document_data: dict, file_path: str, company_id: int) -> Optional[OrderDocument]:
         """Добавление документа к заказу"""
         order = await self.get_order_by_id(order_id, company_id)
@@ -1015,6 +1116,13 @@ class DealRepository:
         result = await self.session.execute(query)
         return result.scalar_one_or_none()
 
+    async def get_companies_by_ids(self, company_ids: List[int]) -> List[Company]:
+        """Компании по списку ID одним запросом"""
+        if not company_ids:
+            return []
+        result = await self.session.execute(select(Company).where(Company.id.in_(company_ids)))
+        return list(result.scalars().all())
+
     async def get_company_with_officials(self, company_id: int) -> Optional[Company]:
         """Получение компании по ID с загрузкой должностных лиц"""
         query = select(Company).options(selectinload(Company.officials)).where(Company.id == company_id)
@@ -1126,116 +1234,91 @@ class DealRepository:
         result = await self.session.execute(query)
         return list(result.scalars().all())
 
-    async def _generate_order_number(self, company_id: int, order_type: str) -> str:
-        """Генерация номера заказа (маска 00001, ежегодное обнуление).
+    @staticmethod
+    def _year_range(year: int) -> Tuple[datetime, datetime]:
+        return datetime(year, 1, 1), datetime(year + 1, 1, 1)
+
+    async def _last_issued_number(self, column, date_col, *conditions) -> int:
+        """Последний номер в данных до появления счётчика — только для его инициализации."""
+        start, end = self._year_range(datetime.now(timezone.utc).year)
+        query = select(func.max(column)).where(
+            and_(column.isnot(None), date_col >= start, date_col < end, *conditions)
+        )
+        max_number = (await self.session.execute(query)).scalar()
+        if max_number:
+            try:
+                return int("".join(filter(str.isdigit, max_number)))
+            except (ValueError, AttributeError):
+                return 0
+        return 0
+
+    async def _next_document_numbers(
+        self, company_id: int, doc_type: str, column, date_col, filter_col, count: int = 1
+    ) -> List[str]:
+        """count номеров подряд по счётчику company × doc_type × год (маска 00001, ежегодное обнуление)."""
+        values = await DocumentCounterRepository(self.session).next_values(
+            company_id,
+            doc_type,
+            datetime.now(timezone.utc).year,
+            count,
+            seed=lambda: self._last_issued_number(column, date_col, filter_col == company_id),
+        )
+        return [f"{value:05d}" for value in values]
+
+    async def _generate_order_numbers(self, company_id: int, order_type: str, count: int) -> List[str]:
+        """Номера заказов (маска 00001, ежегодное обнуление).
 
-        order_type: "buyer" — max(buyer_order_number) по buyer_company_id;
-                   "seller" — max(seller_order_number) по seller_company_id.
+        order_type: "buyer" — счётчик buyer_order по buyer_company_id;
+                   "seller" — счётчик seller_order по seller_company_id.
         """
-        current_year = datetime.now(timezone.utc).year
         if order_type == "buyer":
-            col = Order.buyer_order_number
-            filter_col = Order.buyer_company_id
-        else:
-            col = Order.seller_order_number
-            filter_col = Order.seller_company_id
-
-        query = select(func.max(col)).where(
-            and_(filter_col == company_id, extract("year", Order.created_at) == current_year)
+            return await self._next_document_numbers(
+                company_id, "buyer_order", Order.buyer_order_number, Order.created_at, Order.buyer_company_id, count
+            )
+        return await self._next_document_numbers(
+            company_id, "seller_order", Order.seller_order_number, Order.created_at, Order.seller_company_id, count
         )
-        result = await self.session.execute(query)
-        max_number = result.scalar()
 
-        if max_number:
-            try:
-                number_part = int("".join(filter(str.isdigit, max_number)))
-                next_number = number_part + 1
-            except (ValueError, AttributeError):
-                next_number = 1
-        else:
-            next_number = 1
+    async def _generate_order_number(self, company_id: int, order_type: str) -> str:
+        """Генерация номера заказа (маска 00001, ежегодное обнуление)."""
+        return (await self._generate_order_numbers(company_id, order_type, 1))[0]
 
-        return f"{next_number:05d}"
+    async def _last_deal_id(self) -> int:
+        result = await self.session.execute(select(func.max(Order.id)))
+        return result.scalar() or 0
+
+    async def _generate_deal_ids(self, count: int) -> List[int]:
+        """Новые business deal id (стабильные для всех версий) — из последовательности."""
+        return await DocumentCounterRepository(self.session).next_deal_ids(count, seed=self._last_deal_id)
 
     async def _generate_deal_id(self) -> int:
         """Генерация нового business deal id (стабильный для всех версий)."""
-        query = select(func.max(Order.id))
-        result = await self.session.execute(query)
-        max_id = result.scalar()
-        return (max_id or 0) + 1
+        return (await self._generate_deal_ids(1))[0]
 
     async def _generate_bill_number(self, seller_company_id: int) -> str:
         """Генерация номера счета на оплату (маска 00001, ежегодное обнуление)."""
-        current_year = datetime.now(timezone.utc).year
-        # Используем bill_date если есть, иначе created_at
-        date_col = func.coalesce(Order.bill_date, Order.created_at)
-        query = (
-            select(func.max(Order.bill_number))
-            .where(Order.seller_company_id == seller_company_id)
-            .where(Order.bill_number.isnot(None))
-            .where(extract("year", date_col) == current_year)
+        # Для старых данных используем bill_date если есть, иначе created_at
+        numbers = await self._next_document_numbers(
+            seller_company_id, "bill", Order.bill_number,
+            func.coalesce(Order.bill_date, Order.created_at), Order.seller_company_id,
         )
-        result = await self.session.execute(query)
-        max_number = result.scalar()
-
-        if max_number:
-            try:
-                number_part = int("".join(filter(str.isdigit, max_number)))
-                next_number = number_part + 1
-            except (ValueError, AttributeError):
-                next_number = 1
-        else:
-            next_number = 1
-
-        return f"{next_number:05d}"
+        return numbers[0]
 
     async def _generate_supply_contract_number(self, seller_company_id: int) -> str:
         """Генерация номера договора поставки (маска 00001, ежегодное обнуление)."""
-        current_year = datetime.now(timezone.utc).year
-        date_col = func.coalesce(Order.supply_contracts_date, Order.created_at)
-        query = (
-            select(func.max(Order.supply_contracts_number))
-            .where(Order.seller_company_id == seller_company_id)
-            .where(Order.supply_contracts_number.isnot(None))
-            .where(extract("year", date_col) == current_year)
+        numbers = await self._next_document_numbers(
+            seller_company_id, "supply_contract", Order.supply_contracts_number,
+            func.coalesce(Order.supply_contracts_date, Order.created_at), Order.seller_company_id,
         )
-        result = await self.session.execute(query)
-        max_number = result.scalar()
-
-        if max_number:
-            try:
-                number_part = int("".join(filter(str.isdigit, max_number)))
-                next_number = number_part + 1
-            except (ValueError, AttributeError):
-                next_number = 1
-        else:
-            next_number = 1
-
-        return f"{next_number:05d}"
+        return numbers[0]
 
     async def _generate_contract_number(self, seller_company_id: int) -> str:
         """Генерация номера договора (маска 00001, ежегодное обнуление)."""
-        current_year = datetime.now(timezone.utc).year
-        date_col = func.coalesce(Order.contract_date, Order.created_at)
-        query = (
-            select(func.max(Order.contract_number))
-            .where(Order.seller_company_id == seller_company_id)
-            .where(Order.contract_number.isnot(None))
-            .where(extract("year", date_col) == current_year)
+        numbers = await self._next_document_numbers(
+            seller_company_id, "contract", Order.contract_number,
+            func.coalesce(Order.contract_date, Order.created_at), Order.seller_company_id,
         )
-        result = await self.session.execute(query)
-        max_number = result.scalar()
-
-        if max_number:
-            try:
-                number_part = int("".join(filter(str.isdigit, max_number)))
-                next_number = number_part + 1
-            except (ValueError, AttributeError):
-                next_number = 1
-        else:
-            next_number = 1
-
-        return f"{next_number:05d}"
+        return numbers[0]
 
     async def assign_bill(
         self,
@@ -0,0 +1,75 @@
+"""Атомарные счётчики номеров документов и id сделок (таблица document_counters, последовательность orders_deal_id_seq)."""
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.purchases.models import DocumentCounter
+
+# PostgreSQL-последовательность id сделок (alembic b4c5d6e7f8a9); в SQLite — глобальный счётчик
+DEAL_ID_SEQUENCE = "orders_deal_id_seq"
+DEAL_ID_COUNTER = "deal_id"
+
+Seed = Callable[[], Awaitable[int]]
+
+
+class DocumentCounterRepository:
+	def __init__(self, session: AsyncSession):
+		self.session = session
+
+	@property
+	def _dialect(self) -> str:
+		return self.session.bind.dialect.name
+
+	async def next_values(
+		self,
+		company_id: int,
+		doc_type: str,
+		year: int,
+		count: int = 1,
+		seed: Optional[Seed] = None,
+	) -> List[int]:
+		"""Зарезервировать count подряд идущих номеров.
+
+		Обычно — один UPDATE ... RETURNING. Если строки счётчика ещё нет (первый документ
+		года или данные до появления счётчиков), seed() отдаёт последний выданный номер,
+		и строка вставляется через INSERT ... ON CONFLICT DO UPDATE — гонка двух первых
+		документов разрешается тем же инкрементом.
+		"""
+		if count <= 0:
+			return []
+		table = DocumentCounter.__table__
+		key = (
+			(table.c.company_id == company_id)
+			& (table.c.doc_type == doc_type)
+			& (table.c.year == year)
+		)
+		result = await self.session.execute(
+			update(table).where(key).values(last_value=table.c.last_value + count).returning(table.c.last_value)
+		)
+		last = result.scalar_one_or_none()
+		if last is None:
+			start = await seed() if seed is not None else 0
+			dialect_insert = postgresql.insert if self._dialect == "postgresql" else sqlite.insert
+			stmt = dialect_insert(table).values(
+				company_id=company_id, doc_type=doc_type, year=year, last_value=start + count
+			)
+			stmt = stmt.on_conflict_do_update(
+				index_elements=[table.c.company_id, table.c.doc_type, table.c.year],
+				set_={"last_value": table.c.last_value + count},
+			).returning(table.c.last_value)
+			last = (await self.session.execute(stmt)).scalar_one()
+		return list(range(last - count + 1, last + 1))
+
+	async def next_deal_ids(self, count: int, seed: Optional[Seed] = None) -> List[int]:
+		"""id новых сделок: nextval() в PostgreSQL (без блокировок, возможны пропуски), иначе — счётчик."""
+		if count <= 0:
+			return []
+		if self._dialect == "postgresql":
+			result = await self.session.execute(
+				text(f"SELECT nextval('{DEAL_ID_SEQUENCE}') FROM generate_series(1, :n)"), {"n": count}
+			)
+			return [row[0] for row in result]
+		return await self.next_values(0, DEAL_ID_COUNTER, 0, count, seed)
+
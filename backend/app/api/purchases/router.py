@@ -1,11 +1,12 @@
 from typing import Annotated, List, Literal, Optional
 import asyncio
-from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, Form, Query, status, Path, Body
-from fastapi.responses import RedirectResponse, Response
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, File, UploadFile, Form, Query, status, Path, Body
+from fastapi.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 
 from app.db.dependencies import async_db_dep
 from app.core.config import settings
+from app.core.pagination import InvalidCursorError
 from app.api.authentication.dependencies import get_current_user
 from app_logging.logger import logger
 from app.api.authentication.models.user import User
@@ -22,7 +23,7 @@ from app.api.purchases.services.supply_contract import SupplyContractAlreadyExis
 from app.api.purchases.models import SupplyContractTemplateType
 from app.api.purchases.schemas import (
     DealCreate, DealUpdate, DealResponse, DealListResponse,
-    DealIdsBody,
+    DealIdsBody, DealDocumentsExportRequest, DealDocumentsExportJobResponse,
     BuyerDealResponse, SellerDealResponse, DocumentUpload, DocumentResponse,
     CheckoutRequest, CheckoutItem, CheckoutResponse,
     DocumentNumberDateRequest, BillResponse, ContractResponse, SupplyContractNumberResponse,
@@ -49,14 +50,23 @@ from app.api.purchases.services.docx_template_service import (
 	ORDER_DOCX_FILENAME,
 	SUPPLY_CONTRACT_DOCX_FILENAME,
 	DocxTemplateRenderError,
-	render_docx_bytes,
 	resolve_docx_template_path,
 )
+from app.api.purchases.services.docx_render_pool import DocxRenderQueueFullError
 from app.api.purchases.services.gotenberg_pdf_service import (
 	PdfConversionFailedError,
 	PdfConversionNotConfiguredError,
 	convert_docx_bytes_to_pdf,
 )
+from app.api.purchases.services.render_cache import get_render_cache, render_deal_docx
+from app.api.purchases.services.document_export import (
+	build_export_to_storage,
+	create_export_job,
+	export_archive_name,
+	get_export_job,
+	job_public_view,
+	stream_export_zip,
+)
 
 router = APIRouter(
 	tags=["purchases", "orders", "deals", "documents", "business"],
@@ -94,13 +104,14 @@ _OPENAPI_PDF_BINARY = {
 _OPENAPI_GEN_DOCX_ERRORS = {
 	404: {"description": "Компания не найдена, сделка не найдена или нет доступа"},
 	500: {"description": "Файл шаблона .docx на сервере отсутствует"},
+	503: {"description": "Очередь рендера документов переполнена (Retry-After)"},
 }
 
 _OPENAPI_GEN_PDF_ERRORS = {
 	**_OPENAPI_GEN_DOCX_ERRORS,
 	413: {"description": "DOCX превышает GOTENBERG_MAX_DOCX_BYTES"},
 	502: {"description": "Gotenberg недоступен или ошибка конвертации"},
-	503: {"description": "Не задан GOTENBERG_URL — выдача PDF отключена"},
+	503: {"description": "Не задан GOTENBERG_URL или очередь рендера переполнена"},
 }
 
 # Пример полного DealResponse для OpenAPI / Swagger (bill с contract_terms_contract / contract_terms_text_contract)
@@ -247,12 +258,23 @@ async def create_deal(
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+def _set_deal_list_headers(response: Response, page) -> None:
+    """Курсор следующей страницы и total — в заголовках, тело списка не меняется."""
+    response.headers["X-Total-Count"] = str(page.total)
+    if page.total_is_estimate:
+        response.headers["X-Total-Is-Estimate"] = "true"
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+
+
 @router.get("/buyer/deals", response_model=List[BuyerDealResponse], tags=["buyer", "orders", "list"])
 async def get_buyer_deals(
     current_user: Annotated[User, Depends(get_current_user)],
     deal_service: deal_service_dep_annotated,
+    response: Response,
     skip: int = Query(0, ge=0),
-    limit: int = Query(50, ge=1, le=100)
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Курсор из X-Next-Cursor прошлой страницы (вместо skip)")
 ):
     """
     Получение заказов покупателя
@@ -264,37 +286,32 @@ async def get_buyer_deals(
     if not company:
         raise HTTPException(status_code=404, detail="Company not found for this user")
     
-    deals, total = await deal_service.get_buyer_deals(company.id, skip, limit)
+    try:
+        page = await deal_service.get_buyer_deals(company.id, skip, limit, cursor)
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    _set_deal_list_headers(response, page)
     
     # Преобразуем в формат для покупателя
-    buyer_deals = []
-    for deal in deals:
-        buyer_deals.append(BuyerDealResponse(
-            id=deal.id,
-            version=deal.version,
-            buyer_company_id=deal.buyer_company_id,
-            seller_company_id=deal.seller_company_id,
-            buyer_order_number=deal.buyer_order_number,
-            seller_order_number=deal.seller_order_number,
-            status=deal.status,
-            total_amount=deal.total_amount,
-            total_amount_excl_vat=getattr(deal, "total_amount_excl_vat", 0.0),
-            created_at=deal.created_at,
-            updated_at=deal.updated_at,
-            supplier_name=deal.seller_company.name if deal.seller_company else "Unknown",
-            supplier_inn=deal.seller_company.inn if deal.seller_company else None,
-            supplier_phone=deal.seller_company.phone if deal.seller_company else None
-        ))
-    
-    return buyer_deals
+    return [
+        BuyerDealResponse(
+            **{key: value for key, value in row.items() if not key.startswith("counterparty_")},
+            supplier_name=row["counterparty_name"],
+            supplier_inn=row["counterparty_inn"],
+            supplier_phone=row["counterparty_phone"],
+        )
+        for row in page.items
+    ]
 
 
 @router.get("/seller/deals", response_model=List[SellerDealResponse], tags=["seller", "orders", "list"])
 async def get_seller_deals(
     current_user: Annotated[User, Depends(get_current_user)],
     deal_service: deal_service_dep_annotated,
+    response: Response,
     skip: int = Query(0, ge=0),
-    limit: int = Query(50, ge=1, le=100)
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Курсор из X-Next-Cursor прошлой страницы (вместо skip)")
 ):
     """
     Получение заказов продавца
@@ -306,29 +323,22 @@ async def get_seller_deals(
     if not company:
         raise HTTPException(status_code=404, detail="Company not found for this user")
     
-    deals, total = await deal_service.get_seller_deals(company.id, skip, limit)
+    try:
+        page = await deal_service.get_seller_deals(company.id, skip, limit, cursor)
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    _set_deal_list_headers(response, page)
     
     # Преобразуем в формат для продавца
-    seller_deals = []
-    for deal in deals:
-        seller_deals.append(SellerDealResponse(
-            id=deal.id,
-            version=deal.version,
-            buyer_company_id=deal.buyer_company_id,
-            seller_company_id=deal.seller_company_id,
-            buyer_order_number=deal.buyer_order_number,
-            seller_order_number=deal.seller_order_number,
-            status=deal.status,
-            total_amount=deal.total_amount,
-            total_amount_excl_vat=getattr(deal, "total_amount_excl_vat", 0.0),
-            created_at=deal.created_at,
-            updated_at=deal.updated_at,
-            buyer_name=deal.buyer_company.name if deal.buyer_company else "Unknown",
-            buyer_inn=deal.buyer_company.inn if deal.buyer_company else None,
-            buyer_phone=deal.buyer_company.phone if deal.buyer_company else None
-        ))
-    
-    return seller_deals
+    return [
+        SellerDealResponse(
+            **{key: value for key, value in row.items() if not key.startswith("counterparty_")},
+            buyer_name=row["counterparty_name"],
+            buyer_inn=row["counterparty_inn"],
+            buyer_phone=row["counterparty_phone"],
+        )
+        for row in page.items
+    ]
 
 
 @router.post(
@@ -363,6 +373,123 @@ async def get_deals_by_ids(
     return deals
 
 
+@router.post(
+    "/deals/documents/export",
+    tags=["documents", "generated", "batch"],
+    summary="Пакетная выгрузка документов нескольких сделок (ZIP)",
+    description=(
+        "Сделки загружаются одним запросом, документы рендерятся параллельно. "
+        "`delivery=stream` — ZIP сразу в ответе (заголовок `X-Export-Job-Id` для опроса прогресса); "
+        "`delivery=storage` — 202 и задача, архив появится в хранилище, ссылка — в статусе задачи. "
+        "Ошибки отдельных документов не прерывают выгрузку и перечислены в `errors.txt` внутри архива."
+    ),
+    responses={
+        200: {"description": "ZIP-архив (delivery=stream)", "content": {"application/zip": {}}},
+        202: {"description": "Задача создана (delivery=storage)", "model": DealDocumentsExportJobResponse},
+        404: {"description": "Компания не найдена или ни одной доступной сделки"},
+        503: {"description": "Не задан GOTENBERG_URL (format=pdf) или хранилище (delivery=storage)"},
+    },
+)
+async def export_deal_documents(
+    body: DealDocumentsExportRequest,
+    background_tasks: BackgroundTasks,
+    current_user: Annotated[User, Depends(get_current_user)],
+    deal_service: deal_service_dep_annotated,
+):
+    company = await deal_service.get_company_by_user_id(current_user.id)
+    if not company:
+        raise HTTPException(status_code=404, detail="Company not found for this user")
+    if body.format == "pdf" and not (settings.GOTENBERG_URL and str(settings.GOTENBERG_URL).strip()):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="PDF conversion is not configured (set GOTENBERG_URL)",
+        )
+    if body.delivery == "storage" and not settings.STORAGE_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="S3 storage is not configured.",
+        )
+
+    deals = await deal_service.get_deals_by_ids(body.deal_ids, company.id)
+    if not deals:
+        raise HTTPException(status_code=404, detail="Deals not found or access denied")
+    found_ids = {deal.id for deal in deals}
+    missing_ids = [deal_id for deal_id in dict.fromkeys(body.deal_ids) if deal_id not in found_ids]
+    document_types = list(dict.fromkeys(body.documents))
+    filename = export_archive_name(body.format)
+    job = await create_export_job(company.id, len(deals) * len(document_types), filename)
+
+    if body.delivery == "storage":
+        background_tasks.add_task(build_export_to_storage, deals, document_types, body.format, job, missing_ids)
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=job_public_view(job))
+    return StreamingResponse(
+        stream_export_zip(deals, document_types, body.format, job, missing_ids),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Export-Job-Id": job["job_id"],
+        },
+    )
+
+
+async def _get_company_export_job(job_id: str, current_user: User, deal_service: DealService) -> dict:
+    company = await deal_service.get_company_by_user_id(current_user.id)
+    if not company:
+        raise HTTPException(status_code=404, detail="Company not found for this user")
+    job = await get_export_job(job_id)
+    if not job or job.get("company_id") != company.id:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job
+
+
+@router.get(
+    "/deals/documents/export/{job_id}",
+    response_model=DealDocumentsExportJobResponse,
+    tags=["documents", "generated", "batch"],
+    summary="Статус пакетной выгрузки документов",
+)
+async def get_deal_documents_export(
+    job_id: str,
+    current_user: Annotated[User, Depends(get_current_user)],
+    deal_service: deal_service_dep_annotated,
+):
+    job = await _get_company_export_job(job_id, current_user, deal_service)
+    download_url = None
+    if job["status"] == "done" and job.get("storage_key"):
+        from app.core.storage import get_storage
+
+        download_url = await get_storage().presigned_download_url(job["storage_key"])
+        if download_url is None:
+            download_url = f"{settings.API_V1_STR}/purchases/deals/documents/export/{job_id}/download"
+    return job_public_view(job, download_url)
+
+
+@router.get(
+    "/deals/documents/export/{job_id}/download",
+    tags=["documents", "generated", "batch"],
+    summary="Скачать готовый архив пакетной выгрузки (delivery=storage)",
+    responses={200: {"content": {"application/zip": {}}}, 404: {"description": "Задача не найдена или архив не готов"}},
+)
+async def download_deal_documents_export(
+    job_id: str,
+    current_user: Annotated[User, Depends(get_current_user)],
+    deal_service: deal_service_dep_annotated,
+):
+    job = await _get_company_export_job(job_id, current_user, deal_service)
+    if job["status"] != "done" or not job.get("storage_key"):
+        raise HTTPException(status_code=404, detail="Export archive is not ready")
+    from app.core.storage import get_storage
+
+    try:
+        obj = await get_storage().open(job["storage_key"])
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Export archive not found in storage")
+    headers = {"Content-Disposition": f'attachment; filename="{job.get("filename") or "export.zip"}"'}
+    if obj.content_length is not None:
+        headers["Content-Length"] = str(obj.content_length)
+    return StreamingResponse(obj.chunks, media_type="application/zip", headers=headers)
+
+
 @router.get(
     "/deals/{deal_id}",
     response_model=DealResponse,
@@ -775,7 +902,7 @@ async def upload_document(
     Загрузка документа к заказу в S3.
     Требует настройки S3 (Cloudflare R2, MinIO или AWS S3).
     """
-    if not settings.S3_ENABLED:
+    if not settings.STORAGE_ENABLED:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="S3 storage is not configured. Set S3_BUCKET, S3_ACCESS_KEY, S3_SECRET_KEY (and optionally S3_ENDPOINT_URL for R2/MinIO).",
@@ -789,15 +916,14 @@ async def upload_document(
     except OnlySellerCanModifyDealError:
         raise HTTPException(status_code=403, detail="Only seller can modify deal documents")
 
-    content = await file.read()
-    from app.core.s3 import upload_document as s3_upload_document
+    from app.core.s3 import build_document_key
+    from app.core.storage import get_storage
 
+    # Файл не читается в память целиком: SpooledTemporaryFile уходит в хранилище потоком
     try:
-        file_path = await asyncio.to_thread(
-            s3_upload_document,
-            deal_id,
-            file.filename or "document",
-            content,
+        file_path = await get_storage().upload_fileobj(
+            build_document_key(deal_id, file.filename or "document"),
+            file.file,
             file.content_type,
         )
     except Exception as e:
@@ -885,7 +1011,7 @@ async def _serve_deal_docx(
 	context = build_deal_docx_context(deal)
 	template_path = resolve_docx_template_path(template_filename)
 	try:
-		content = await asyncio.to_thread(render_docx_bytes, template_path, context)
+		content = await render_deal_docx(deal.id, deal.version, template_path, context)
 	except FileNotFoundError:
 		logger.exception("Missing DOCX template: %s", template_path)
 		raise HTTPException(
@@ -898,6 +1024,12 @@ async def _serve_deal_docx(
 			status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
 			detail=f"DOCX template render error ({template_filename}): {exc}",
 		) from None
+	except DocxRenderQueueFullError:
+		raise HTTPException(
+			status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+			detail="Document rendering is busy, retry later",
+			headers={"Retry-After": "5"},
+		) from None
 	filename = f"{attachment_prefix}-deal-{deal.id}.docx"
 	return Response(
 		content=content,
@@ -1048,8 +1180,15 @@ async def _serve_deal_pdf(
 		)
 	context = build_deal_docx_context(deal)
 	template_path = resolve_docx_template_path(template_filename)
+	cache = get_render_cache()
 	try:
-		docx_bytes = await asyncio.to_thread(render_docx_bytes, template_path, context)
+		pdf_key = None
+		pdf_bytes = None
+		if cache is not None:
+			pdf_key = await asyncio.to_thread(cache.make_key, deal.id, deal.version, template_path, context, "pdf")
+			pdf_bytes = await cache.get(pdf_key)
+		if pdf_bytes is None:
+			docx_bytes = await render_deal_docx(deal.id, deal.version, template_path, context)
 	except FileNotFoundError:
 		logger.exception("Missing DOCX template: %s", template_path)
 		raise HTTPException(
@@ -1062,6 +1201,14 @@ async def _serve_deal_pdf(
 			status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
 			detail=f"DOCX template render error ({template_filename}): {exc}",
 		) from None
+	except DocxRenderQueueFullError:
+		raise HTTPException(
+			status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+			detail="Document rendering is busy, retry later",
+			headers={"Retry-After": "5"},
+		) from None
+	if pdf_bytes is not None:
+		return _pdf_attachment_response(pdf_bytes, attachment_prefix, deal.id)
 	try:
 		pdf_bytes = await convert_docx_bytes_to_pdf(
 			docx_bytes,
@@ -1080,7 +1227,13 @@ async def _serve_deal_pdf(
 		) from None
 	except ValueError as e:
 		raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e)) from e
-	filename = f"{attachment_prefix}-deal-{deal.id}.pdf"
+	if pdf_key is not None:
+		await cache.put(pdf_key, pdf_bytes)
+	return _pdf_attachment_response(pdf_bytes, attachment_prefix, deal.id)
+
+
+def _pdf_attachment_response(pdf_bytes: bytes, attachment_prefix: str, deal_id: int) -> Response:
+	filename = f"{attachment_prefix}-deal-{deal_id}.pdf"
 	return Response(
 		content=pdf_bytes,
 		media_type="application/pdf",
@@ -1088,6 +1241,17 @@ async def _serve_deal_pdf(
 	)
 
 
+@router.get("/render-cache/metrics", tags=["documents", "generated"])
+async def get_render_cache_metrics(
+	current_user: Annotated[User, Depends(get_current_user)],
+):
+	"""Попадания/промахи кэша сгенерированных документов (на процесс)."""
+	cache = get_render_cache()
+	if cache is None:
+		return {"enabled": False}
+	return {"enabled": True, **cache.metrics()}
+
+
 @router.get(
 	"/deals/{deal_id}/documents/order.pdf",
 	tags=["documents", "pdf", "generated"],
@@ -1230,7 +1394,7 @@ async def download_document(
     deal_service: deal_service_dep_annotated = ...,
 ):
     """Скачать документ: stream=True — через backend, иначе presigned URL."""
-    if not settings.S3_ENABLED:
+    if not settings.STORAGE_ENABLED:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="S3 storage is not configured.",
@@ -1242,25 +1406,25 @@ async def download_document(
     if not doc or not doc.document_file_path:
         raise HTTPException(status_code=404, detail="Document not found or has no file")
 
-    if stream:
-        import asyncio
-        from app.core.s3 import get_document_content
+    from app.core.storage import get_storage
 
-        content, content_type = await asyncio.to_thread(
-            get_document_content, doc.document_file_path
-        )
+    storage = get_storage()
+    url = None if stream else await storage.presigned_download_url(doc.document_file_path)
+    if url is None:
+        try:
+            obj = await storage.open(doc.document_file_path)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Document file not found in storage")
         filename = doc.document_file_path.split("/")[-1] if "/" in doc.document_file_path else "document"
-        return Response(
-            content=content,
-            media_type=content_type or "application/octet-stream",
-            headers={
-                "Content-Disposition": f'attachment; filename="{filename}"',
-            },
+        headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+        if obj.content_length is not None:
+            headers["Content-Length"] = str(obj.content_length)
+        return StreamingResponse(
+            obj.chunks,
+            media_type=obj.content_type or "application/octet-stream",
+            headers=headers,
         )
 
-    from app.core.s3 import get_presigned_download_url
-
-    url = get_presigned_download_url(doc.document_file_path)
     if redirect:
         return RedirectResponse(url=url, status_code=status.HTTP_302_FOUND)
     return {"url": url}
@@ -1289,11 +1453,11 @@ async def delete_document(
     doc = await deal_service.get_document(deal_id, document_id, company.id)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
-    if settings.S3_ENABLED and doc.document_file_path:
-        from app.core.s3 import delete_document as s3_delete_document
+    if settings.STORAGE_ENABLED and doc.document_file_path:
+        from app.core.storage import get_storage
 
         try:
-            s3_delete_document(doc.document_file_path)
+            await get_storage().delete(doc.document_file_path)
         except Exception:
             pass
     try:
@@ -1487,7 +1651,8 @@ async def create_supply_contract(
 async def create_order_from_checkout(
     checkout_data: CheckoutRequest,
     current_user: Annotated[User, Depends(get_current_user)],
-    deal_service: deal_service_dep_annotated
+    deal_service: deal_service_dep_annotated,
+    background_tasks: BackgroundTasks,
 ):
     """
     Создание заказов из корзины
@@ -1508,6 +1673,7 @@ async def create_order_from_checkout(
         checkout_dict,
         company.id,
         buyer_user_id=current_user.id,
+        background_tasks=background_tasks,
     )
     if not deals:
         raise HTTPException(status_code=400, detail="Failed to create order from checkout")
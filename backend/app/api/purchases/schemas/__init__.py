@@ -168,6 +168,42 @@ class DealIdsBody(BaseModel):
 	model_config = {"json_schema_extra": {"examples": [{"ids": [1, 2, 3]}]}}
 
 
+DealExportDocumentType = Literal["order", "bill", "bill-contract", "bill-offer", "supply-contract"]
+
+
+class DealDocumentsExportRequest(BaseModel):
+	"""Пакетная выгрузка сгенерированных документов нескольких сделок одним ZIP."""
+	deal_ids: List[int] = Field(..., min_length=1, max_length=500, description="ID сделок (последние версии)")
+	documents: List[DealExportDocumentType] = Field(
+		default_factory=lambda: ["bill"],
+		min_length=1,
+		description="Какие документы положить в архив для каждой сделки",
+	)
+	format: Literal["pdf", "docx"] = Field("pdf", description="pdf — через Gotenberg, docx — шаблон как есть")
+	delivery: Literal["stream", "storage"] = Field(
+		"stream",
+		description="stream — ZIP в ответе; storage — фоновая сборка в хранилище, ссылка в статусе задачи",
+	)
+
+	model_config = {
+		"json_schema_extra": {
+			"examples": [{"deal_ids": [1, 2, 3], "documents": ["bill", "supply-contract"], "format": "pdf", "delivery": "stream"}]
+		}
+	}
+
+
+class DealDocumentsExportJobResponse(BaseModel):
+	"""Состояние пакетной выгрузки документов."""
+	job_id: str
+	status: Literal["pending", "running", "done", "failed"]
+	total: int
+	done: int = 0
+	failed: int = 0
+	errors: List[str] = Field(default_factory=list)
+	filename: Optional[str] = None
+	download_url: Optional[str] = None
+
+
 class ContractItem(BaseModel):
 	"""Элемент договора в массиве contract"""
 	model_config = {"extra": "ignore", "from_attributes": True}
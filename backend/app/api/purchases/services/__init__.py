@@ -1,4 +1,6 @@
-from typing import Optional, List, Tuple
+from typing import Optional, List
+from fastapi import BackgroundTasks
+from sqlalchemy import inspect as sa_inspect
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.purchases.repositories import DealRepository
@@ -23,8 +25,13 @@ from app.api.purchases.schemas import (
 )
 from app.api.purchases.models import Order, OrderItem, OrderDocument, OrderType
 from app.api.company.models.company import Company
-from app.api.products.models.product import Product
-from app.api.products.repositories.company_products_repository import CompanyProductsRepository
+from app.api.purchases.services.checkout_catalog import CheckoutCatalog
+from app.api.purchases.services.checkout_chat_notify import (
+	notify_seller_about_checkout_order,
+	notify_sellers_about_checkout,
+)
+from app.api.purchases.services.render_cache import invalidate_deal_documents
+from app.core.pagination import CatalogPage
 from app_logging.logger import logger
 
 
@@ -171,35 +178,24 @@ class DealService:
 			return []
 
 		orders = await self.repository.get_orders_by_ids(deal_ids, company_id)
-		if not orders:
-			return []
-
-		company_ids: set[int] = set()
-		for order in orders:
-			company_ids.add(order.buyer_company_id)
-			company_ids.add(order.seller_company_id)
-		owner_names = await self.repository.get_company_owner_names(list(company_ids))
-
-		result: List[DealResponse] = []
-		for order in orders:
-			deal = await self._order_to_deal_response(
-				order, company_id, owner_names=owner_names,
-			)
-			result.append(deal)
-		return result
+		return await self._orders_to_deal_responses(orders, company_id)
 
 	async def has_deal_access(self, deal_id: int, company_id: int) -> bool:
 		"""Проверка существования сделки и доступа без тяжелой сериализации."""
 		order = await self.repository.get_order_by_id(deal_id, company_id)
 		return order is not None
 
-	async def get_buyer_deals(self, company_id: int, skip: int = 0, limit: int = 100) -> Tuple[List[Order], int]:
-		"""Получение заказов покупателя"""
-		return await self.repository.get_buyer_orders(company_id, skip, limit)
+	async def get_buyer_deals(
+		self, company_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+	) -> CatalogPage:
+		"""Получение заказов покупателя (сводки latest-версий)"""
+		return await self.repository.get_buyer_orders(company_id, skip, limit, cursor)
 
-	async def get_seller_deals(self, company_id: int, skip: int = 0, limit: int = 100) -> Tuple[List[Order], int]:
-		"""Получение заказов продавца"""
-		return await self.repository.get_seller_orders(company_id, skip, limit)
+	async def get_seller_deals(
+		self, company_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+	) -> CatalogPage:
+		"""Получение заказов продавца (сводки latest-версий)"""
+		return await self.repository.get_seller_orders(company_id, skip, limit, cursor)
 
 	async def update_deal(self, deal_id: int, deal_data: DealUpdate, company_id: int) -> Optional[DealResponse]:
 		"""Обновление сделки"""
@@ -212,6 +208,7 @@ class DealService:
 			order = await self.repository.update_order(deal_id, deal_data, company_id)
 			if not order:
 				return None
+			await invalidate_deal_documents(deal_id)
 			return await self._order_to_deal_response(order, company_id)
 		except (OnlySellerCanModifyDealError, BuyerOrderUpdateForbiddenError):
 			raise
@@ -243,6 +240,7 @@ class DealService:
 				if updated_order:
 					order = updated_order
 
+			await invalidate_deal_documents(deal_id)
 			return await self._order_to_deal_response(order, company_id)
 		except (OnlySellerCanModifyDealError, BuyerOrderUpdateForbiddenError):
 			raise
@@ -257,6 +255,8 @@ class DealService:
 			if not await self._ensure_seller_on_deal(deal_id, company_id):
 				return False
 			deleted = await self.repository.delete_order(deal_id, company_id)
+			if deleted:
+				await invalidate_deal_documents(deal_id)
 			return deleted
 		except OnlySellerCanModifyDealError:
 			raise
@@ -273,7 +273,9 @@ class DealService:
 				return None
 			if not await self.repository._ensure_counterparty_can_review(order, company_id):
 				raise DealChangeReviewForbiddenError()
-			return await self.repository.delete_last_order_version(deal_id, company_id)
+			result = await self.repository.delete_last_order_version(deal_id, company_id)
+			await invalidate_deal_documents(deal_id)
+			return result
 		except DealChangeReviewForbiddenError:
 			raise
 		except Exception as e:
@@ -294,6 +296,7 @@ class DealService:
 			order = await self.repository.accept_order_changes(deal_id, company_id)
 			if not order:
 				return None
+			await invalidate_deal_documents(deal_id)
 			return await self._order_to_deal_response(order, company_id)
 		except Exception as e:
 			await self.session.rollback()
@@ -381,13 +384,73 @@ class DealService:
 		owner_names: Optional[dict[int, str]] = None,
 	) -> DealResponse:
 		"""Преобразование Order в DealResponse с учетом роли компании (buyer/seller)"""
-		logger.debug("_order_to_deal_response для заказа %s", order.id)
+		deals = await self._orders_to_deal_responses([order], company_id, owner_names=owner_names)
+		return deals[0]
+
+	async def _orders_to_deal_responses(
+		self,
+		orders: List[Order],
+		company_id: Optional[int] = None,
+		owner_names: Optional[dict[int, str]] = None,
+	) -> List[DealResponse]:
+		"""
+		DealResponse для пачки заказов: компании, владельцы и договоры поставки загружаются
+		фиксированным числом запросов на всю пачку, сборка ответов — без обращений к БД.
+		"""
+		if not orders:
+			return []
+		from app.api.purchases.supply_contract_sync import (
+			load_supply_contract_entities,
+			supply_contract_in_deal_response,
+		)
+
+		company_ids = {cid for order in orders for cid in (order.buyer_company_id, order.seller_company_id)}
+		# Компании — из eager load (без lazy load в async), недостающие одним запросом
+		companies: dict[int, Company] = {}
+		for order in orders:
+			unloaded = sa_inspect(order).unloaded
+			for relation in ("buyer_company", "seller_company"):
+				company = None if relation in unloaded else getattr(order, relation)
+				if company is not None:
+					companies[company.id] = company
+		missing_ids = company_ids - companies.keys()
+		if missing_ids:
+			companies.update(
+				(company.id, company) for company in await self.repository.get_companies_by_ids(list(missing_ids))
+			)
+		if owner_names is None:
+			owner_names = await self.repository.get_company_owner_names(list(company_ids))
+		supply_contracts = await load_supply_contract_entities(self.session, orders)
+
+		return [
+			self._assemble_deal_response(
+				order,
+				company_id,
+				companies.get(order.buyer_company_id),
+				companies.get(order.seller_company_id),
+				owner_names,
+				supply_contract_in_deal_response(order, supply_contracts.get(order.row_id)),
+			)
+			for order in orders
+		]
+
+	def _assemble_deal_response(
+		self,
+		order: Order,
+		company_id: Optional[int],
+		buyer_company: Optional[Company],
+		seller_company: Optional[Company],
+		owner_names: dict[int, str],
+		supply_contract_obj: SupplyContractInDealResponse,
+	) -> DealResponse:
+		"""Сборка DealResponse из заранее загруженных данных (без запросов к БД)."""
+		logger.debug("_assemble_deal_response для заказа %s", order.id)
 		
 		try:
 			# Преобразуем позиции заказа
-			logger.debug("Обрабатываем %s позиций заказа", len(order.order_items))
+			logger.debug("Обрабатываем %s позиций заказа", len(order.version_items))
 			items = []
-			for item in order.order_items:
+			for item in order.version_items:
 				# Рассчитываем сумму если она не задана
 				amount = item.amount if hasattr(item, 'amount') and item.amount else item.quantity * item.price
 				
@@ -408,32 +471,8 @@ class DealService:
 					updated_at=item.updated_at
 				))
 		
-			# Информация о компаниях — из eager load или отдельным запросом
-			logger.debug("Загружаем компании")
-			buyer_company = getattr(order, "buyer_company", None)
-			seller_company = getattr(order, "seller_company", None)
-			if buyer_company is None:
-				logger.debug("Загружаем компанию покупателя %s", order.buyer_company_id)
-				buyer_company = await self.repository.get_company_by_id(order.buyer_company_id)
-			if seller_company is None:
-				logger.debug("Загружаем компанию продавца %s", order.seller_company_id)
-				seller_company = await self.repository.get_company_by_id(order.seller_company_id)
-
-			def _owner_name(cid: int) -> str:
-				if owner_names and cid in owner_names:
-					return owner_names[cid] or ""
-				return ""
-
-			buyer_owner_name = (
-				_owner_name(order.buyer_company_id)
-				if owner_names is not None
-				else (await self.repository.get_company_owner_name(order.buyer_company_id) if buyer_company else "")
-			)
-			seller_owner_name = (
-				_owner_name(order.seller_company_id)
-				if owner_names is not None
-				else (await self.repository.get_company_owner_name(order.seller_company_id) if seller_company else "")
-			)
+			buyer_owner_name = owner_names.get(order.buyer_company_id) or ""
+			seller_owner_name = owner_names.get(order.seller_company_id) or ""
 
 			def _make_company_info(company, owner_name: str, vat_rate_override: Optional[int] = None) -> CompanyInDealResponse:
 				return CompanyInDealResponse(
@@ -515,10 +554,6 @@ class DealService:
 				buyer_details_check=getattr(order, "bill_buyer_details_check", True),
 				officials=officials_list,
 			)
-			from app.api.purchases.supply_contract_sync import build_supply_contract_in_deal_response
-
-			supply_contract_obj = await build_supply_contract_in_deal_response(self.session, order)
-
 			contract_list = []
 			if order.contract_number or order.contract_date:
 				contract_list.append(
@@ -558,86 +593,29 @@ class DealService:
 			)
 
 		except Exception as e:
-			logger.exception("Ошибка в _order_to_deal_response для заказа %s: %s (тип: %s)", order.id, e, type(e).__name__)
+			logger.exception("Ошибка в _assemble_deal_response для заказа %s: %s (тип: %s)", order.id, e, type(e).__name__)
 			raise
 
-	async def _resolve_catalog_product_for_checkout(
-		self,
-		products_repo: CompanyProductsRepository,
-		seller_company_id: int,
-		item: dict,
-	) -> Optional[Product]:
-		"""Каталожная позиция: сначала article, при промахе — slug внутри компании продавца (старые клиенты с Number(article))."""
-		raw_art = item.get("article")
-		if raw_art is not None and str(raw_art).strip() != "":
-			p = await products_repo.get_by_article(str(raw_art).strip())
-			if p:
-				return p
-		slug = item.get("slug")
-		if slug and str(slug).strip() and seller_company_id:
-			return await products_repo.get_by_company_id_and_slug(
-				int(seller_company_id), str(slug).strip()
-			)
-		return None
-
-	async def _resolve_order_type_for_checkout_item(
-		self,
-		products_repo: CompanyProductsRepository,
-		seller_company_id: int,
-		item: dict,
-		catalog_product: Optional[Product] = None,
-	) -> OrderType:
-		"""Тип заказа по productType из корзины или типу позиции в каталоге."""
-		raw_type = item.get("productType")
-		if raw_type is not None and str(raw_type).strip():
-			if str(raw_type).strip() == "Услуга":
-				return OrderType.SERVICES
-			return OrderType.GOODS
-
-		if catalog_product is None:
-			catalog_product = await self._resolve_catalog_product_for_checkout(
-				products_repo, seller_company_id, item
-			)
-		if catalog_product and catalog_product.type:
-			from app.api.products.models.product import ProductType
-
-			if catalog_product.type == ProductType.SERVICE:
-				return OrderType.SERVICES
-		return OrderType.GOODS
-
-	async def _resolve_seller_id_for_checkout_item(
-		self,
-		products_repo: CompanyProductsRepository,
-		item: dict,
-	) -> tuple[Optional[int], Optional[Product]]:
-		"""Продавец: из companyId в корзине или по slug товара в каталоге."""
-		seller_id = item.get("companyId")
-		catalog_product: Optional[Product] = None
-
-		slug = item.get("slug")
-		if slug and str(slug).strip():
-			catalog_product = await products_repo.get_by_slug(str(slug).strip())
-
-		if seller_id is None and catalog_product:
-			seller_id = catalog_product.company_id
-
-		if seller_id is None:
-			return None, catalog_product
-
-		return int(seller_id), catalog_product
-
 	async def create_deals_from_checkout(
-		self, checkout_data: dict, buyer_company_id: int, buyer_user_id: int | None = None
+		self,
+		checkout_data: dict,
+		buyer_company_id: int,
+		buyer_user_id: int | None = None,
+		background_tasks: Optional[BackgroundTasks] = None,
 	) -> List[DealResponse]:
-		"""Создание заказов из корзины: группировка по продавцу и типу (товары / услуги)."""
+		"""Создание заказов из корзины: группировка по продавцу и типу (товары / услуги).
+
+		Все article/slug корзины разрешаются одним запросом, заказы всех групп создаются
+		одной транзакцией. Уведомления продавцам в чат уходят после ответа, если передан
+		background_tasks, иначе — сразу после создания заказов.
+		"""
 		try:
+			items = checkout_data.get("items", [])
+			catalog = await CheckoutCatalog.load(self.session, items)
 			groups: dict[tuple[int, OrderType], dict] = {}
 
-			for item in checkout_data.get("items", []):
-				products_repo = CompanyProductsRepository(self.session)
-				seller_id, catalog_product = await self._resolve_seller_id_for_checkout_item(
-					products_repo, item
-				)
+			for item in items:
+				seller_id, slug_product = catalog.seller_for(item)
 				if seller_id is None:
 					logger.warning(
 						"Checkout: не удалось определить продавца для позиции slug=%s",
@@ -645,9 +623,8 @@ class DealService:
 					)
 					continue
 
-				order_type = await self._resolve_order_type_for_checkout_item(
-					products_repo, seller_id, item, catalog_product=catalog_product
-				)
+				catalog_product = catalog.product_for(seller_id, item)
+				order_type = catalog.order_type_for(item, slug_product or catalog_product)
 				key = (seller_id, order_type)
 				if key not in groups:
 					groups[key] = {
@@ -655,20 +632,12 @@ class DealService:
 						"order_type": order_type,
 						"items": [],
 					}
-				groups[key]["items"].append(item)
+				groups[key]["items"].append((item, catalog_product))
 
-			created_deals: List[DealResponse] = []
+			deals_data: List[DealCreate] = []
 			for group in groups.values():
-				products_repo = CompanyProductsRepository(self.session)
-				seller_id = group["seller_company_id"]
-				order_type: OrderType = group["order_type"]
-
 				deal_items = []
-				for i, item in enumerate(group["items"], 1):
-					catalog_product = await self._resolve_catalog_product_for_checkout(
-						products_repo, seller_id, item
-					)
-
+				for i, (item, catalog_product) in enumerate(group["items"], 1):
 					deal_item: dict = {
 						"quantity": item.get("quantity"),
 						"position": i,
@@ -693,41 +662,41 @@ class DealService:
 
 					deal_items.append(deal_item)
 
-				from app.api.purchases.schemas import OrderTypeSchema
-
-				deal_data = DealCreate(
-					seller_company_id=seller_id,
-					deal_type=OrderTypeSchema(order_type.value),
+				deals_data.append(DealCreate(
+					seller_company_id=group["seller_company_id"],
+					deal_type=OrderTypeSchema(group["order_type"].value),
 					items=deal_items,
 					comments=checkout_data.get("comments"),
-				)
+				))
 
-				order = await self.repository.create_order(deal_data, buyer_company_id)
-				if buyer_user_id:
-					from app.api.purchases.services.checkout_chat_notify import (
-						notify_seller_about_checkout_order,
-					)
+			orders = await self.repository.create_orders(
+				deals_data, buyer_company_id, products_by_article=catalog.by_article
+			)
 
-					product_names = [
-						str(item.get("productName") or "").strip()
-						for item in group["items"]
-						if str(item.get("productName") or "").strip()
-					]
-					await notify_seller_about_checkout_order(
-						self.session,
+			if buyer_user_id:
+				notifications = [
+					dict(
 						buyer_company_id=buyer_company_id,
 						buyer_user_id=buyer_user_id,
-						seller_company_id=seller_id,
+						seller_company_id=order.seller_company_id,
 						deal_id=order.id,
 						seller_order_number=order.seller_order_number,
-						order_type=order_type,
-						product_names=product_names,
+						order_type=order.deal_type,
+						product_names=[
+							str(item.get("productName") or "").strip()
+							for item, _ in group["items"]
+							if str(item.get("productName") or "").strip()
+						],
 					)
-				created_deals.append(
-					await self._order_to_deal_response(order, buyer_company_id)
-				)
-
-			return created_deals
+					for order, group in zip(orders, groups.values())
+				]
+				if background_tasks is not None:
+					background_tasks.add_task(notify_sellers_about_checkout, notifications)
+				else:
+					for notification in notifications:
+						await notify_seller_about_checkout_order(self.session, **notification)
+
+			return await self._orders_to_deal_responses(orders, buyer_company_id)
 
 		except Exception as e:
 			await self.session.rollback()
@@ -0,0 +1,77 @@
+"""Каталожные позиции корзины: все article/slug одним запросом, дальше — разрешение в памяти."""
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.products.models.product import Product, ProductType
+from app.api.products.repositories.company_products_repository import CompanyProductsRepository
+from app.api.purchases.models import OrderType
+
+
+def _clean(value) -> str:
+	return str(value).strip() if value is not None else ""
+
+
+class CheckoutCatalog:
+	"""Индексы каталога по артикулу и slug для одной корзины."""
+
+	def __init__(self, products: Iterable[Product]):
+		self.by_article: dict[str, Product] = {}
+		self._by_slug: dict[str, list[Product]] = defaultdict(list)
+		for product in products:
+			if product.article:
+				self.by_article.setdefault(product.article, product)
+			if product.slug:
+				self._by_slug[product.slug].append(product)
+
+	@classmethod
+	async def load(cls, session: AsyncSession, items: list[dict]) -> "CheckoutCatalog":
+		articles = {_clean(item.get("article")) for item in items} - {""}
+		slugs = {_clean(item.get("slug")) for item in items} - {""}
+		products = await CompanyProductsRepository(session).get_by_articles_or_slugs(
+			sorted(articles), sorted(slugs)
+		)
+		return cls(products)
+
+	def seller_for(self, item: dict) -> tuple[Optional[int], Optional[Product]]:
+		"""Продавец: из companyId в корзине или по slug товара в каталоге."""
+		catalog_product = None
+		slug = _clean(item.get("slug"))
+		if slug:
+			matches = self._by_slug.get(slug, [])
+			# slug уникален только внутри компании — по нему одному продавца не угадываем
+			if len(matches) == 1:
+				catalog_product = matches[0]
+
+		seller_id = item.get("companyId")
+		if seller_id is None and catalog_product:
+			seller_id = catalog_product.company_id
+		if seller_id is None:
+			return None, catalog_product
+		return int(seller_id), catalog_product
+
+	def product_for(self, seller_company_id: int, item: dict) -> Optional[Product]:
+		"""Каталожная позиция: сначала article, при промахе — slug внутри компании продавца (старые клиенты с Number(article))."""
+		article = _clean(item.get("article"))
+		if article and article in self.by_article:
+			return self.by_article[article]
+		slug = _clean(item.get("slug"))
+		if slug and seller_company_id:
+			return next(
+				(p for p in self._by_slug.get(slug, []) if p.company_id == int(seller_company_id)),
+				None,
+			)
+		return None
+
+	@staticmethod
+	def order_type_for(item: dict, catalog_product: Optional[Product]) -> OrderType:
+		"""Тип заказа по productType из корзины или типу позиции в каталоге."""
+		raw_type = _clean(item.get("productType"))
+		if raw_type:
+			return OrderType.SERVICES if raw_type == "Услуга" else OrderType.GOODS
+		if catalog_product and catalog_product.type == ProductType.SERVICE:
+			return OrderType.SERVICES
+		return OrderType.GOODS
@@ -1,7 +1,7 @@
 """Уведомление продавца в чате при создании заказа из checkout (§2.2)."""
 from __future__ import annotations
 
-from typing import Iterable
+from typing import Iterable, List
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -53,3 +53,12 @@ async def notify_seller_about_checkout_order(
             deal_id,
             exc,
         )
+
+
+async def notify_sellers_about_checkout(notifications: List[dict]) -> None:
+    """Фоновая рассылка по заказам checkout: своя сессия, сессия запроса к этому моменту закрыта."""
+    from app.db.base import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as session:
+        for notification in notifications:
+            await notify_seller_about_checkout_order(session, **notification)
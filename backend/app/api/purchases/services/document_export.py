@@ -0,0 +1,290 @@
+"""
+Пакетная выгрузка сгенерированных документов сделок в ZIP.
+
+Сделки загружаются одним запросом (DealService.get_deals_by_ids), документы рендерятся
+параллельно с ограничением DOC_EXPORT_CONCURRENCY (docxtpl в пуле процессов, PDF — Gotenberg)
+и пишутся в архив по мере готовности. Архив либо отдаётся потоком в ответе, либо
+собирается в фоне и кладётся в хранилище; прогресс виден по job_id в обоих режимах.
+"""
+from __future__ import annotations
+
+import asyncio
+import tempfile
+import time
+import uuid
+import zipfile
+from collections import OrderedDict
+from typing import AsyncIterator, Iterable, List, Optional
+
+from app.api.purchases.deal_docx_context import build_deal_docx_context
+from app.api.purchases.schemas import DealResponse
+from app.api.purchases.services.docx_template_service import (
+	BILL_CONTRACT_DOCX_FILENAME,
+	BILL_DOCX_FILENAME,
+	BILL_OFFER_DOCX_FILENAME,
+	ORDER_DOCX_FILENAME,
+	SUPPLY_CONTRACT_DOCX_FILENAME,
+	resolve_docx_template_path,
+)
+from app.api.purchases.services.gotenberg_pdf_service import convert_docx_bytes_to_pdf
+from app.api.purchases.services.render_cache import get_render_cache, render_deal_docx
+from app.core.config import settings
+from app_logging.logger import logger
+
+# Тип документа в запросе → файл шаблона (как у эндпоинтов /deals/{id}/documents/<тип>.docx|pdf)
+EXPORT_DOCUMENT_TEMPLATES = {
+	"order": ORDER_DOCX_FILENAME,
+	"bill": BILL_DOCX_FILENAME,
+	"bill-contract": BILL_CONTRACT_DOCX_FILENAME,
+	"bill-offer": BILL_OFFER_DOCX_FILENAME,
+	"supply-contract": SUPPLY_CONTRACT_DOCX_FILENAME,
+}
+
+EXPORT_JOB_KEY = "purchases:export:{job_id}"
+EXPORT_JOB_TTL = 24 * 3600
+EXPORT_STORAGE_PREFIX = "exports"
+
+_FINISHED_STATUSES = ("done", "failed")
+_LOCAL_FINISHED_MAX = 1000
+
+# Задачи, которые выполняет этот процесс: {job_id: состояние}; готовые отсюда уходят
+_local_jobs: dict[str, dict] = {}
+# Готовые задачи, которые не удалось записать в Redis (без Redis); ограничены по числу и EXPORT_JOB_TTL
+_finished_jobs: "OrderedDict[str, dict]" = OrderedDict()
+
+
+async def _store_job(job: dict) -> bool:
+	"""Записать состояние в Redis; False, если Redis недоступен."""
+	try:
+		from app.core.cache import redis_cache
+
+		# Напрямую в Redis (не ttl_cache): прогресс читают другие воркеры, локальная копия у них устарела бы
+		await redis_cache.set(EXPORT_JOB_KEY.format(job_id=job["job_id"]), job, expire=EXPORT_JOB_TTL)
+		# RedisCache.set глотает ошибки и сбрасывает клиента
+		return redis_cache.redis_client is not None
+	except Exception:
+		return False
+
+
+def _remember_finished(job: dict) -> None:
+	_finished_jobs[job["job_id"]] = job
+	_finished_jobs.move_to_end(job["job_id"])
+	expired_before = time.time() - EXPORT_JOB_TTL
+	while _finished_jobs:
+		oldest = next(iter(_finished_jobs.values()))
+		if len(_finished_jobs) <= _LOCAL_FINISHED_MAX and oldest["updated_at"] >= expired_before:
+			break
+		_finished_jobs.popitem(last=False)
+
+
+async def _save_job(job: dict) -> None:
+	job["updated_at"] = time.time()
+	job_id = job["job_id"]
+	if job["status"] not in _FINISHED_STATUSES:
+		_local_jobs[job_id] = job
+		await _store_job(job)
+		return
+	# Готовая задача живёт в Redis (EXPORT_JOB_TTL); локально — только если Redis недоступен
+	_local_jobs.pop(job_id, None)
+	if not await _store_job(job):
+		_remember_finished(job)
+
+
+async def get_export_job(job_id: str) -> Optional[dict]:
+	job = _local_jobs.get(job_id)
+	if job is not None:
+		return job
+	try:
+		from app.core.cache import redis_cache
+
+		job = await redis_cache.get(EXPORT_JOB_KEY.format(job_id=job_id))
+	except Exception:
+		job = None
+	if job is None:
+		job = _finished_jobs.get(job_id)
+		if job is not None and job["updated_at"] < time.time() - EXPORT_JOB_TTL:
+			_finished_jobs.pop(job_id, None)
+			return None
+	return job
+
+
+async def create_export_job(company_id: int, total: int, filename: str) -> dict:
+	job = {
+		"job_id": uuid.uuid4().hex,
+		"company_id": company_id,
+		"status": "pending",
+		"total": total,
+		"done": 0,
+		"failed": 0,
+		"errors": [],
+		"filename": filename,
+		"storage_key": None,
+	}
+	await _save_job(job)
+	return job
+
+
+def export_archive_name(fmt: str) -> str:
+	return f"deal-documents-{time.strftime('%Y%m%d-%H%M%S')}-{fmt}.zip"
+
+
+async def render_deal_document(deal: DealResponse, document_type: str, fmt: str) -> bytes:
+	"""Один документ сделки (.docx или .pdf) через кэш рендера."""
+	template_path = resolve_docx_template_path(EXPORT_DOCUMENT_TEMPLATES[document_type])
+	context = build_deal_docx_context(deal)
+	if fmt == "docx":
+		return await render_deal_docx(deal.id, deal.version, template_path, context)
+	cache = get_render_cache()
+	pdf_key = None
+	if cache is not None:
+		pdf_key = await asyncio.to_thread(cache.make_key, deal.id, deal.version, template_path, context, "pdf")
+		cached = await cache.get(pdf_key)
+		if cached is not None:
+			return cached
+	docx_bytes = await render_deal_docx(deal.id, deal.version, template_path, context)
+	pdf_bytes = await convert_docx_bytes_to_pdf(docx_bytes, source_filename=f"{document_type}.docx")
+	if pdf_key is not None:
+		await cache.put(pdf_key, pdf_bytes)
+	return pdf_bytes
+
+
+class _ZipSink:
+	"""Несжимаемый поток для zipfile: копит записанное, откуда его забирает генератор ответа."""
+
+	def __init__(self):
+		self._chunks: list[bytes] = []
+
+	def write(self, data) -> int:
+		self._chunks.append(bytes(data))
+		return len(data)
+
+	def flush(self) -> None:
+		return None
+
+	def drain(self) -> bytes:
+		data = b"".join(self._chunks)
+		self._chunks.clear()
+		return data
+
+
+async def _render_all(
+	deals: List[DealResponse],
+	document_types: Iterable[str],
+	fmt: str,
+	job: dict,
+) -> AsyncIterator[tuple[str, Optional[bytes], Optional[str]]]:
+	"""(имя в архиве, содержимое | None, ошибка | None) в порядке готовности."""
+	slots = asyncio.Semaphore(max(1, settings.DOC_EXPORT_CONCURRENCY))
+
+	async def one(deal: DealResponse, document_type: str):
+		name = f"{deal.id}/{document_type}-deal-{deal.id}.{fmt}"
+		async with slots:
+			try:
+				return name, await render_deal_document(deal, document_type, fmt), None
+			except Exception as e:
+				logger.warning("Export: deal %s %s.%s failed: %s", deal.id, document_type, fmt, e)
+				return name, None, f"{name}: {e.__class__.__name__}: {e}"
+
+	tasks = [asyncio.create_task(one(deal, document_type)) for deal in deals for document_type in document_types]
+	try:
+		for future in asyncio.as_completed(tasks):
+			name, content, error = await future
+			if error is None:
+				job["done"] += 1
+			else:
+				job["failed"] += 1
+				job["errors"].append(error)
+			await _save_job(job)
+			yield name, content, error
+	finally:
+		for task in tasks:
+			task.cancel()
+
+
+def _write_entry(archive: zipfile.ZipFile, name: str, content: bytes) -> None:
+	# PDF/DOCX уже сжаты — храним без повторного сжатия
+	archive.writestr(zipfile.ZipInfo(name, date_time=time.localtime()[:6]), content, compress_type=zipfile.ZIP_STORED)
+
+
+def _write_report(archive: zipfile.ZipFile, job: dict, missing_deal_ids: List[int]) -> None:
+	lines = list(job["errors"])
+	lines.extend(f"deal {deal_id}: not found or access denied" for deal_id in missing_deal_ids)
+	if lines:
+		archive.writestr("errors.txt", "\n".join(lines) + "\n")
+
+
+async def stream_export_zip(
+	deals: List[DealResponse],
+	document_types: List[str],
+	fmt: str,
+	job: dict,
+	missing_deal_ids: List[int],
+) -> AsyncIterator[bytes]:
+	"""ZIP потоком: каждый документ уходит клиенту сразу после рендера."""
+	job["status"] = "running"
+	await _save_job(job)
+	sink = _ZipSink()
+	try:
+		with zipfile.ZipFile(sink, mode="w") as archive:
+			async for name, content, _ in _render_all(deals, document_types, fmt, job):
+				if content is not None:
+					_write_entry(archive, name, content)
+				data = sink.drain()
+				if data:
+					yield data
+			_write_report(archive, job, missing_deal_ids)
+		data = sink.drain()
+		if data:
+			yield data
+		job["status"] = "done"
+	except BaseException:
+		job["status"] = "failed"
+		raise
+	finally:
+		await _save_job(job)
+
+
+async def build_export_to_storage(
+	deals: List[DealResponse],
+	document_types: List[str],
+	fmt: str,
+	job: dict,
+	missing_deal_ids: List[int],
+) -> None:
+	"""Фоновая сборка ZIP во временный файл и загрузка в хранилище (STORAGE_BACKEND)."""
+	from app.core.storage import get_storage
+
+	job["status"] = "running"
+	await _save_job(job)
+	try:
+		with tempfile.TemporaryFile() as tmp:
+			with zipfile.ZipFile(tmp, mode="w") as archive:
+				async for name, content, _ in _render_all(deals, document_types, fmt, job):
+					if content is not None:
+						await asyncio.to_thread(_write_entry, archive, name, content)
+				_write_report(archive, job, missing_deal_ids)
+			tmp.seek(0)
+			key = f"{EXPORT_STORAGE_PREFIX}/{job['company_id']}/{job['job_id']}.zip"
+			await get_storage().upload_fileobj(key, tmp, "application/zip")
+		job["storage_key"] = key
+		job["status"] = "done"
+	except Exception as e:
+		logger.exception("Export job %s failed: %s", job["job_id"], e)
+		job["status"] = "failed"
+		job["errors"].append(f"{e.__class__.__name__}: {e}")
+	finally:
+		await _save_job(job)
+
+
+def job_public_view(job: dict, download_url: Optional[str] = None) -> dict:
+	return {
+		"job_id": job["job_id"],
+		"status": job["status"],
+		"total": job["total"],
+		"done": job["done"],
+		"failed": job["failed"],
+		"errors": job["errors"][:100],
+		"filename": job.get("filename"),
+		"download_url": download_url,
+	}
+
@@ -0,0 +1,115 @@
+"""
+Рендер .docx в отдельных процессах.
+
+docxtpl (Jinja + lxml + zip) — чистая CPU-работа: в потоке она делит GIL с event loop,
+и массовая генерация счетов тормозит весь API. Здесь рендер уходит в ProcessPoolExecutor
+с ограниченным числом задач в работе и лимитом очереди: при переполнении запрос сразу
+получает DocxRenderQueueFullError (→ 503), а не висит в очереди.
+"""
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Optional
+
+from app.api.purchases.services.docx_template_service import render_docx_bytes, template_registry
+from app.core.config import settings
+from app_logging.logger import logger
+
+
+class DocxRenderQueueFullError(Exception):
+	"""Слишком много документов ждут рендера — повторить позже."""
+
+
+def _init_worker() -> None:
+	# Шаблоны разбираются и компилируются один раз при старте процесса
+	template_registry.warm_up()
+
+
+class DocxRenderPool:
+	def __init__(self, workers: int, max_queue: int):
+		self.workers = workers
+		self.max_queue = max_queue
+		self._executor: Optional[ProcessPoolExecutor] = None
+		self._slots: Optional[asyncio.Semaphore] = None
+		self._slots_loop: Optional[asyncio.AbstractEventLoop] = None
+		self._waiting = 0
+		self.rendered = 0
+		self.rejected = 0
+
+	@property
+	def waiting(self) -> int:
+		return self._waiting
+
+	def _get_executor(self) -> ProcessPoolExecutor:
+		if self._executor is None:
+			# spawn: fork процесса с запущенным event loop и потоками небезопасен
+			self._executor = ProcessPoolExecutor(
+				max_workers=self.workers,
+				mp_context=multiprocessing.get_context("spawn"),
+				initializer=_init_worker,
+			)
+		return self._executor
+
+	def _get_slots(self) -> asyncio.Semaphore:
+		loop = asyncio.get_running_loop()
+		if self._slots is None or self._slots_loop is not loop:
+			# Не больше двух задач на процесс: остальные ждут здесь, где виден размер очереди
+			self._slots = asyncio.Semaphore(self.workers * 2)
+			self._slots_loop = loop
+		return self._slots
+
+	async def render(self, template_path: Path, context: dict) -> bytes:
+		if self.workers <= 0:
+			return await asyncio.to_thread(render_docx_bytes, template_path, context)
+		slots = self._get_slots()
+		if slots.locked() and self._waiting >= self.max_queue:
+			self.rejected += 1
+			raise DocxRenderQueueFullError(f"DOCX render queue is full ({self.max_queue})")
+		self._waiting += 1
+		try:
+			await slots.acquire()
+		finally:
+			self._waiting -= 1
+		try:
+			loop = asyncio.get_running_loop()
+			try:
+				content = await loop.run_in_executor(self._get_executor(), render_docx_bytes, template_path, context)
+			except BrokenProcessPool:
+				logger.error("DOCX render pool is broken, restarting it and rendering in a thread")
+				self._reset_executor()
+				content = await asyncio.to_thread(render_docx_bytes, template_path, context)
+			self.rendered += 1
+			return content
+		finally:
+			slots.release()
+
+	def _reset_executor(self) -> None:
+		executor, self._executor = self._executor, None
+		if executor is not None:
+			executor.shutdown(wait=False, cancel_futures=True)
+
+	def shutdown(self) -> None:
+		self._reset_executor()
+		self._slots = None
+		self._slots_loop = None
+
+	def metrics(self) -> dict:
+		return {
+			"workers": self.workers,
+			"waiting": self._waiting,
+			"max_queue": self.max_queue,
+			"rendered": self.rendered,
+			"rejected": self.rejected,
+		}
+
+
+docx_render_pool = DocxRenderPool(settings.DOCX_RENDER_WORKERS, settings.DOCX_RENDER_MAX_QUEUE)
+
+
+async def render_docx_async(template_path: Path, context: dict) -> bytes:
+	"""render_docx_bytes в пуле процессов (или в потоке при DOCX_RENDER_WORKERS=0)."""
+	return await docx_render_pool.render(template_path, context)
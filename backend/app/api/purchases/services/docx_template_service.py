@@ -1,11 +1,16 @@
 """Рендер шаблонов .docx через docxtpl."""
 from __future__ import annotations
 
+import os
+import re
+import threading
+from importlib.metadata import PackageNotFoundError, version
 from io import BytesIO
 from pathlib import Path
+from typing import Callable, Optional
 
 from docxtpl import DocxTemplate
-from jinja2 import TemplateSyntaxError, UndefinedError
+from jinja2 import Template, TemplateSyntaxError, UndefinedError
 
 from app.core.config import settings
 
@@ -25,6 +30,167 @@ class DocxTemplateRenderError(Exception):
 	"""Ошибка Jinja/docxtpl при рендере шаблона .docx."""
 
 
+# Строковые свойства документа, которые docxtpl тоже прогоняет через Jinja (render_properties)
+_RENDERED_CORE_PROPERTIES = ("author", "comments", "identifier", "language", "subject", "title")
+
+
+class _PreparedTemplate:
+	"""
+	Шаблон, подготовленный один раз: байты файла и скомпилированные Jinja-шаблоны частей
+	(тело, колонтитулы). Для каждого рендера заново разбирается только DOM из байтов
+	в памяти — docxtpl изменяет документ при рендере, переиспользовать его нельзя.
+	"""
+
+	def __init__(self, path: Path, mtime_ns: int, size: int, data: bytes):
+		self.path = path
+		self.mtime_ns = mtime_ns
+		self.size = size
+		self.data = data
+		# {partname | "core:<свойство>": (Template, encoding)}
+		self.parts: dict[str, tuple[Template, str]] = {}
+		self.lock = threading.Lock()
+
+
+# _CompiledDocxTemplate переопределяет внутренние методы docxtpl (build_xml, render_properties,
+# build_headers_footers_xml) и повторяет render_xml_part — сверено с этими версиями.
+# На других рендерим обычным DocxTemplate.render, без кэша скомпилированных частей.
+_COMPILED_DOCXTPL_VERSIONS = ("0.18.",)
+
+
+def _docxtpl_version() -> str:
+	try:
+		return version("docxtpl")
+	except PackageNotFoundError:
+		return ""
+
+
+COMPILED_TEMPLATES_SUPPORTED = _docxtpl_version().startswith(_COMPILED_DOCXTPL_VERSIONS)
+
+
+class _CompiledDocxTemplate(DocxTemplate):
+	"""DocxTemplate, который берёт скомпилированные части из _PreparedTemplate вместо patch_xml + compile."""
+
+	def __init__(self, prepared: _PreparedTemplate):
+		super().__init__(BytesIO(prepared.data))
+		self._prepared = prepared
+
+	def _part_template(self, part, build_source: Callable[[], tuple[str, str]]) -> Template:
+		key = str(part.partname)
+		cached = self._prepared.parts.get(key)
+		if cached is None:
+			src_xml, encoding = build_source()
+			# Та же предобработка, что в DocxTemplate.render_xml_part
+			src_xml = re.sub(r"<w:p([ >])", r"\n<w:p\1", src_xml)
+			cached = (Template(src_xml), encoding)
+			with self._prepared.lock:
+				self._prepared.parts.setdefault(key, cached)
+		return cached[0]
+
+	def _render_part(self, template: Template, part, context) -> str:
+		self.current_rendering_part = part
+		dst_xml = template.render(context)
+		dst_xml = re.sub(r"\n<w:p([ >])", r"<w:p\1", dst_xml)
+		dst_xml = (
+			dst_xml.replace("{_{", "{{")
+			.replace("}_}", "}}")
+			.replace("{_%", "{%")
+			.replace("%_}", "%}")
+		)
+		return self.resolve_listing(dst_xml)
+
+	def _body_template(self) -> Template:
+		return self._part_template(self.docx._part, lambda: (self.patch_xml(self.get_xml()), "utf-8"))
+
+	def _header_footer_template(self, part) -> tuple[Template, str]:
+		def build_source():
+			xml = self.get_part_xml(part)
+			return self.patch_xml(xml), self.get_headers_footers_encoding(xml)
+
+		template = self._part_template(part, build_source)
+		return template, self._prepared.parts[str(part.partname)][1]
+
+	def compile_parts(self) -> None:
+		"""Скомпилировать все части шаблона без рендера (прогрев)."""
+		self.render_init()
+		self._body_template()
+		for uri in (self.HEADER_URI, self.FOOTER_URI):
+			for _, part in self.get_headers_footers(uri):
+				self._header_footer_template(part)
+
+	def build_xml(self, context, jinja_env=None):
+		if jinja_env is not None:
+			return super().build_xml(context, jinja_env)
+		return self._render_part(self._body_template(), self.docx._part, context)
+
+	def render_properties(self, context, jinja_env=None) -> None:
+		if jinja_env is not None:
+			return super().render_properties(context, jinja_env)
+		core = self.docx.core_properties
+		for prop in _RENDERED_CORE_PROPERTIES:
+			key = f"core:{prop}"
+			cached = self._prepared.parts.get(key)
+			if cached is None:
+				cached = (Template(getattr(core, prop)), "")
+				with self._prepared.lock:
+					self._prepared.parts.setdefault(key, cached)
+			setattr(core, prop, cached[0].render(context))
+
+	def build_headers_footers_xml(self, context, uri, jinja_env=None):
+		if jinja_env is not None:
+			yield from super().build_headers_footers_xml(context, uri, jinja_env)
+			return
+		for rel_key, part in self.get_headers_footers(uri):
+			template, encoding = self._header_footer_template(part)
+			yield rel_key, self._render_part(template, part, context).encode(encoding)
+
+
+class DocxTemplateRegistry:
+	"""
+	Подготовленные шаблоны на процесс. Файл перечитывается, только если изменились
+	mtime или размер — правка шаблона на сервере подхватывается без перезапуска.
+	"""
+
+	def __init__(self):
+		self._templates: dict[str, _PreparedTemplate] = {}
+		self._lock = threading.Lock()
+
+	def get(self, template_path: Path) -> _PreparedTemplate:
+		try:
+			stat = os.stat(template_path)
+		except FileNotFoundError:
+			raise FileNotFoundError(f"DOCX template not found: {template_path}") from None
+		key = str(template_path)
+		prepared = self._templates.get(key)
+		if prepared is not None and prepared.mtime_ns == stat.st_mtime_ns and prepared.size == stat.st_size:
+			return prepared
+		prepared = _PreparedTemplate(Path(template_path), stat.st_mtime_ns, stat.st_size, Path(template_path).read_bytes())
+		with self._lock:
+			self._templates[key] = prepared
+		return prepared
+
+	def warm_up(self, directory: Optional[Path] = None) -> int:
+		"""Подготовить все шаблоны каталога заранее (старт воркера). Возвращает их число."""
+		directory = Path(directory or settings.DOCX_TEMPLATES_DIR)
+		count = 0
+		for path in sorted(directory.glob("*.docx")):
+			try:
+				prepared = self.get(path)
+				if COMPILED_TEMPLATES_SUPPORTED:
+					_CompiledDocxTemplate(prepared).compile_parts()
+				count += 1
+			except Exception:
+				# Битый шаблон не должен мешать старту: ошибка всплывёт при рендере
+				continue
+		return count
+
+	def clear(self) -> None:
+		with self._lock:
+			self._templates.clear()
+
+
+template_registry = DocxTemplateRegistry()
+
+
 def render_docx_bytes(template_path: Path, context: dict) -> bytes:
 	"""
 	Подставляет context в шаблон и возвращает готовый .docx как bytes.
@@ -32,10 +198,11 @@ def render_docx_bytes(template_path: Path, context: dict) -> bytes:
 		FileNotFoundError: если файла шаблона нет.
 		DocxTemplateRenderError: синтаксис Jinja или undefined в шаблоне.
 	"""
-	if not template_path.is_file():
-		raise FileNotFoundError(f"DOCX template not found: {template_path}")
-
-	tpl = DocxTemplate(str(template_path))
+	prepared = template_registry.get(template_path)
+	if COMPILED_TEMPLATES_SUPPORTED:
+		tpl = _CompiledDocxTemplate(prepared)
+	else:
+		tpl = DocxTemplate(BytesIO(prepared.data))
 	try:
 		tpl.render(context)
 	except (TemplateSyntaxError, UndefinedError, IndexError, KeyError, TypeError) as exc:
@@ -0,0 +1,252 @@
+"""
+Кэш сгенерированных документов сделки (.docx / .pdf).
+
+Ключ — версия сделки + хэш файла шаблона + хэш контекста, поэтому одинаковые входные
+данные всегда дают один и тот же файл: повторные скачивания не трогают docxtpl и Gotenberg.
+Основной уровень — локальный каталог с LRU-вытеснением по размеру; при
+DOC_RENDER_CACHE_SHARED файлы дополнительно кладутся в общее хранилище (S3),
+чтобы результат переиспользовали остальные воркеры.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Optional
+
+from app.core.config import settings
+from app_logging.logger import logger
+
+SHARED_PREFIX = "render_cache"
+
+
+def _json_default(value: Any) -> str:
+	isoformat = getattr(value, "isoformat", None)
+	if isoformat is not None:
+		return isoformat()
+	return str(value)
+
+
+def hash_context(context: dict) -> str:
+	payload = json.dumps(context, sort_keys=True, ensure_ascii=False, default=_json_default)
+	return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DocumentRenderCache:
+	def __init__(self, root: Path, max_bytes: int, shared: bool = False):
+		self.root = Path(root)
+		self.max_bytes = max_bytes
+		self.shared = shared
+		self.hits = 0
+		self.shared_hits = 0
+		self.misses = 0
+		self.stores = 0
+		self.evictions = 0
+		self.invalidations = 0
+		self._lock = threading.Lock()
+		self._total_bytes: Optional[int] = None
+		# {путь: (mtime_ns, size, sha256)} — чтобы не перечитывать шаблон на каждый запрос
+		self._template_hashes: dict[str, tuple[int, int, str]] = {}
+
+	def template_hash(self, template_path: Path) -> str:
+		"""sha256 файла шаблона; FileNotFoundError, если шаблона нет."""
+		stat = os.stat(template_path)
+		cached = self._template_hashes.get(str(template_path))
+		if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+			return cached[2]
+		digest = hashlib.sha256(Path(template_path).read_bytes()).hexdigest()
+		self._template_hashes[str(template_path)] = (stat.st_mtime_ns, stat.st_size, digest)
+		return digest
+
+	def make_key(self, deal_id: int, version: int, template_path: Path, context: dict, kind: str) -> str:
+		template_digest = self.template_hash(template_path)[:16]
+		return f"{deal_id}/v{version}-{template_digest}-{hash_context(context)}.{kind}"
+
+	def _path(self, key: str) -> Path:
+		return self.root / key
+
+	def _scan_total(self) -> int:
+		total = 0
+		if self.root.is_dir():
+			for dirpath, _, files in os.walk(self.root):
+				for name in files:
+					try:
+						total += os.path.getsize(os.path.join(dirpath, name))
+					except OSError:
+						pass
+		return total
+
+	def _read_local(self, key: str) -> Optional[bytes]:
+		path = self._path(key)
+		try:
+			data = path.read_bytes()
+		except OSError:
+			return None
+		try:
+			# mtime = время последнего обращения, по нему идёт LRU-вытеснение
+			os.utime(path)
+		except OSError:
+			pass
+		return data
+
+	def _write_local(self, key: str, data: bytes) -> None:
+		path = self._path(key)
+		path.parent.mkdir(parents=True, exist_ok=True)
+		tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+		tmp_path.write_bytes(data)
+		os.replace(tmp_path, path)
+		with self._lock:
+			if self._total_bytes is None:
+				self._total_bytes = self._scan_total()
+			else:
+				self._total_bytes += len(data)
+			over_limit = self._total_bytes > self.max_bytes
+		if over_limit:
+			self._evict()
+
+	def _evict(self) -> None:
+		entries = []
+		for dirpath, _, files in os.walk(self.root):
+			for name in files:
+				full = os.path.join(dirpath, name)
+				try:
+					stat = os.stat(full)
+				except OSError:
+					continue
+				entries.append((stat.st_mtime, stat.st_size, full))
+		entries.sort()
+		total = sum(size for _, size, _ in entries)
+		# Вытесняем до 90% лимита, чтобы не чистить на каждой записи
+		target = int(self.max_bytes * 0.9)
+		for _, size, full in entries:
+			if total <= target:
+				break
+			try:
+				os.remove(full)
+			except OSError:
+				continue
+			total -= size
+			self.evictions += 1
+		with self._lock:
+			self._total_bytes = total
+
+	def _drop_local_deal(self, deal_id: int) -> None:
+		deal_dir = self.root / str(deal_id)
+		if deal_dir.is_dir():
+			shutil.rmtree(deal_dir, ignore_errors=True)
+		with self._lock:
+			self._total_bytes = None
+
+	async def get(self, key: str) -> Optional[bytes]:
+		data = await asyncio.to_thread(self._read_local, key)
+		if data is not None:
+			self.hits += 1
+			return data
+		if self.shared:
+			data = await self._get_shared(key)
+			if data is not None:
+				self.shared_hits += 1
+				await asyncio.to_thread(self._write_local, key, data)
+				return data
+		self.misses += 1
+		return None
+
+	async def put(self, key: str, data: bytes) -> None:
+		try:
+			await asyncio.to_thread(self._write_local, key, data)
+			self.stores += 1
+		except OSError as e:
+			logger.warning("Render cache write failed for %s: %s", key, e)
+		if self.shared:
+			await self._put_shared(key, data)
+
+	async def invalidate_deal(self, deal_id: int) -> None:
+		"""Удалить все закэшированные документы сделки (новая версия, правка, удаление)."""
+		# Копии в общем хранилище не удаляем: ключ содержит хэш контекста и устаревшим
+		# не станет, старые объекты чистит lifecycle-правило бакета
+		self.invalidations += 1
+		await asyncio.to_thread(self._drop_local_deal, deal_id)
+
+	async def _get_shared(self, key: str) -> Optional[bytes]:
+		from app.core.storage import get_storage
+
+		storage = get_storage()
+		try:
+			if not await storage.exists(f"{SHARED_PREFIX}/{key}"):
+				return None
+			obj = await storage.open(f"{SHARED_PREFIX}/{key}")
+			return b"".join([chunk async for chunk in obj.chunks])
+		except Exception as e:
+			logger.warning("Shared render cache read failed for %s: %s", key, e)
+			return None
+
+	async def _put_shared(self, key: str, data: bytes) -> None:
+		from io import BytesIO
+
+		from app.core.storage import get_storage
+
+		try:
+			await get_storage().upload_fileobj(f"{SHARED_PREFIX}/{key}", BytesIO(data))
+		except Exception as e:
+			logger.warning("Shared render cache write failed for %s: %s", key, e)
+
+	def metrics(self) -> dict:
+		lookups = self.hits + self.shared_hits + self.misses
+		return {
+			"hits": self.hits,
+			"shared_hits": self.shared_hits,
+			"misses": self.misses,
+			"hit_ratio": round((self.hits + self.shared_hits) / lookups, 4) if lookups else 0.0,
+			"stores": self.stores,
+			"evictions": self.evictions,
+			"invalidations": self.invalidations,
+			"local_bytes": self._total_bytes,
+			"max_bytes": self.max_bytes,
+		}
+
+
+_render_cache: Optional[DocumentRenderCache] = None
+
+
+def get_render_cache() -> Optional[DocumentRenderCache]:
+	"""Кэш по настройкам DOC_RENDER_CACHE_*; None — кэш выключен."""
+	global _render_cache
+	if not settings.DOC_RENDER_CACHE_ENABLED:
+		return None
+	if _render_cache is None:
+		_render_cache = DocumentRenderCache(
+			settings.DOC_RENDER_CACHE_DIR,
+			settings.DOC_RENDER_CACHE_MAX_BYTES,
+			shared=settings.DOC_RENDER_CACHE_SHARED,
+		)
+	return _render_cache
+
+
+async def invalidate_deal_documents(deal_id: int) -> None:
+	cache = get_render_cache()
+	if cache is None:
+		return
+	try:
+		await cache.invalidate_deal(deal_id)
+	except Exception as e:
+		logger.warning("Render cache invalidation failed for deal %s: %s", deal_id, e)
+
+
+async def render_deal_docx(deal_id: int, version: int, template_path: Path, context: dict) -> bytes:
+	"""Рендер .docx сделки через кэш: тот же шаблон и контекст — готовые байты без docxtpl."""
+	from app.api.purchases.services.docx_render_pool import render_docx_async
+
+	cache = get_render_cache()
+	if cache is None:
+		return await render_docx_async(template_path, context)
+	key = await asyncio.to_thread(cache.make_key, deal_id, version, template_path, context, "docx")
+	content = await cache.get(key)
+	if content is None:
+		content = await render_docx_async(template_path, context)
+		await cache.put(key, content)
+	return content
@@ -3,7 +3,7 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import and_, select
+from sqlalchemy import and_, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
@@ -112,12 +112,52 @@ def _resolve_linked_specification(
 	return specs[-1]
 
 
-async def build_supply_contract_in_deal_response(
+async def load_supply_contract_entities(
 	session: AsyncSession,
+	orders: list[Order],
+) -> dict[int, Optional[SupplyContractModel]]:
+	"""Сущности договоров для пачки заказов (row_id -> entity) — не больше двух запросов на любое N."""
+	options = selectinload(SupplyContractModel.specifications).selectinload(
+		SupplyContractSpecificationModel.spec_items
+	)
+	contract_ids = {order.supply_contract_id for order in orders if order.supply_contract_id}
+	by_id: dict[int, SupplyContractModel] = {}
+	if contract_ids:
+		result = await session.execute(
+			select(SupplyContractModel).options(options).where(SupplyContractModel.id.in_(contract_ids))
+		)
+		by_id = {entity.id: entity for entity in result.scalars().all()}
+
+	# Как в load_order_supply_contract_entity: без привязанного договора — поиск по паре компаний
+	pairs = {
+		(order.buyer_company_id, order.seller_company_id)
+		for order in orders
+		if order.supply_contract_id not in by_id
+	}
+	by_pair: dict[tuple[int, int], SupplyContractModel] = {}
+	if pairs:
+		result = await session.execute(
+			select(SupplyContractModel)
+			.options(options)
+			.where(
+				tuple_(SupplyContractModel.buyer_company_id, SupplyContractModel.seller_company_id).in_(pairs)
+			)
+			.order_by(SupplyContractModel.id)
+		)
+		for entity in result.scalars().all():
+			by_pair.setdefault((entity.buyer_company_id, entity.seller_company_id), entity)
+
+	return {
+		order.row_id: by_id.get(order.supply_contract_id)
+		or by_pair.get((order.buyer_company_id, order.seller_company_id))
+		for order in orders
+	}
+
+
+def supply_contract_in_deal_response(
 	order: Order,
+	entity: Optional[SupplyContractModel],
 ) -> SupplyContractInDealResponse:
-	entity = await load_order_supply_contract_entity(session, order)
-
 	if entity:
 		spec = _resolve_linked_specification(order, entity)
 		number = entity.number or order.supply_contracts_number or ""
@@ -148,6 +188,14 @@ async def build_supply_contract_in_deal_response(
 	)
 
 
+async def build_supply_contract_in_deal_response(
+	session: AsyncSession,
+	order: Order,
+) -> SupplyContractInDealResponse:
+	entity = await load_order_supply_contract_entity(session, order)
+	return supply_contract_in_deal_response(order, entity)
+
+
 async def ensure_supply_contract_entity_for_order(
 	session: AsyncSession,
 	order: Order,
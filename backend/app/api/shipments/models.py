@@ -1,14 +1,28 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, JSON, String, UniqueConstraint
+from sqlalchemy import Boolean, DateTime, ForeignKey, Index, Integer, JSON, String, UniqueConstraint, text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db.base_class import Base
 
 
+# Открытая заявка (passive/active) на пару клиент–перевозчик — не больше одной
+OPEN_REQUEST_PREDICATE = text("status IN ('passive', 'active')")
+
+
 class ShipmentRequest(Base):
 	__tablename__ = "shipment_requests"
+	__table_args__ = (
+		Index(
+			"uq_shipment_requests_open",
+			"client_company_id",
+			"carrier_company_id",
+			unique=True,
+			postgresql_where=OPEN_REQUEST_PREDICATE,
+			sqlite_where=OPEN_REQUEST_PREDICATE,
+		),
+	)
 
 	client_company_id: Mapped[int] = mapped_column(ForeignKey("companies.id", ondelete="CASCADE"), index=True)
 	carrier_company_id: Mapped[int] = mapped_column(ForeignKey("companies.id", ondelete="CASCADE"), index=True)
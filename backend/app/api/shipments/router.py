@@ -1,34 +1,38 @@
-import hashlib
-import json
 from datetime import datetime, timedelta
 
 from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, status
-from sqlalchemy import delete, func, or_, select
+from sqlalchemy import JSON, case, delete, func, literal_column, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import aliased
 
 from app.api.authentication.dependencies import current_user_dep
 from app.api.chats.schemas.chat import ChatCreate
 from app.api.chats.services.chat_service import ChatService
+from app.api.common.services.gazetteer import gazetteer_store
 from app.api.company.models.company import Company, CompanyRelationType, TradeActivity
 from app.api.company.models.fleet import CompanyDriver, CompanyVehicle
 from app.api.company.repositories.company_relations_repository import CompanyRelationsRepository
+from app.api.company.services.vehicle_routes import route_condition, route_filter
 from app.api.purchases.models import Order, OrderStatus
-from app.api.shipments.models import RequestFavorite, Shipment, ShipmentRequest, VehicleFavorite
+from app.api.shipments.models import (
+	OPEN_REQUEST_PREDICATE, RequestFavorite, Shipment, ShipmentRequest, VehicleFavorite,
+)
 from app.api.shipments.schemas import (
 	CargoDetailResponse, CargoUpdate, CompanyBrief, DealUpdate, ShipmentListItem,
 	ShipmentRequestResponse, ShipmentResponse, TransportDetailResponse,
 	TransportSearchFilters, TransportUpdate,
 )
-from app.core.ttl_cache import cache_get, cache_set
+from app.api.shipments.search_cache import search_cache_key, transport_search_cache
 from app.db.base import AsyncSessionLocal
 from app.db.dependencies import async_db_dep
 
 router = APIRouter(tags=["transport"])
 
 _SEARCH_LIMIT = 200
+_SEARCH_BATCH = 500
 _LIST_DEFAULT = 50
 _LIST_MAX = 100
-_SEARCH_CACHE_TTL = 60
+_REQUEST_TTL = timedelta(days=14)
 
 
 def _has_route(filters: TransportSearchFilters) -> bool:
@@ -36,32 +40,12 @@ def _has_route(filters: TransportSearchFilters) -> bool:
 	return bool(filters.from_locations) and bool(filters.to_locations)
 
 
-def _search_cache_key(client_company_id: int, filters: TransportSearchFilters) -> str:
-	payload = filters.model_dump(mode="json")
-	raw = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
-	digest = hashlib.md5(raw.encode()).hexdigest()
-	return f"transport:search:v1:{client_company_id}:{digest}"
-
-
 def _company_id(user) -> int:
 	if not user or not user.company_id:
 		raise HTTPException(status_code=404, detail="Company not found for current user")
 	return user.company_id
 
 
-def _locations_match(vehicle_locations: list, requested_locations: list) -> bool:
-	if not requested_locations:
-		return True
-	if not vehicle_locations:
-		return False
-	requested_names = [str(item.get("name", "")).lower() for item in requested_locations]
-	for vehicle_location in vehicle_locations:
-		vehicle_name = str(vehicle_location.get("name", "")).lower()
-		if any(name and (name in vehicle_name or vehicle_name in name) for name in requested_names):
-			return True
-	return False
-
-
 def _matches(vehicle: CompanyVehicle, filters: TransportSearchFilters) -> bool:
 	if not vehicle.is_active:
 		return False
@@ -91,10 +75,7 @@ def _matches(vehicle: CompanyVehicle, filters: TransportSearchFilters) -> bool:
 		return False
 	if filters.load_date and vehicle.load_date and vehicle.load_date != filters.load_date:
 		return False
-	return (
-		_locations_match(vehicle.from_locations or [], filters.from_locations)
-		and _locations_match(vehicle.to_locations or [], filters.to_locations)
-	)
+	return True
 
 
 def _vehicle_response(vehicle: CompanyVehicle, company: Company) -> dict:
@@ -205,61 +186,178 @@ async def _accept_side_effects(
 			await db.rollback()
 
 
+async def _find_vehicles(db, filters: TransportSearchFilters, exclude_company_id: int | None = None) -> dict:
+	"""Первые _SEARCH_LIMIT подходящих ТС перевозчиков; truncated — подходящих было больше."""
+	stmt = (
+		select(CompanyVehicle, Company)
+		.join(Company, Company.id == CompanyVehicle.company_id)
+		.where(
+			Company.trade_activity.in_([TradeActivity.CARRIER, TradeActivity.FORWARDER]),
+			CompanyVehicle.is_active.is_(True),
+		)
+	)
+	if exclude_company_id is not None:
+		stmt = stmt.where(Company.id != exclude_company_id)
+	if filters.body_types:
+		stmt = stmt.where(CompanyVehicle.body_type.in_(filters.body_types))
+	if filters.partial_load:
+		stmt = stmt.where(CompanyVehicle.partial_load.is_(True))
+		weight = filters.cargo_weight_kg or filters.capacity_min_kg
+		volume = filters.cargo_volume_m3 or filters.volume_min_m3
+		if weight is not None:
+			stmt = stmt.where(CompanyVehicle.partial_load_weight_kg >= weight)
+		if volume is not None:
+			stmt = stmt.where(CompanyVehicle.partial_load_volume_m3 >= volume)
+	else:
+		weight = filters.cargo_weight_kg or filters.capacity_min_kg
+		volume = filters.cargo_volume_m3 or filters.volume_min_m3
+		if weight is not None:
+			stmt = stmt.where((CompanyVehicle.capacity_tons * 1000) >= weight)
+		if volume is not None:
+			stmt = stmt.where(CompanyVehicle.volume_m3 >= volume)
+	if filters.capacity_max_kg is not None:
+		stmt = stmt.where((CompanyVehicle.capacity_tons * 1000) <= filters.capacity_max_kg)
+	if filters.volume_max_m3 is not None:
+		stmt = stmt.where(CompanyVehicle.volume_m3 <= filters.volume_max_m3)
+	if filters.load_date is not None:
+		stmt = stmt.where(
+			or_(CompanyVehicle.load_date.is_(None), CompanyVehicle.load_date == filters.load_date)
+		)
+
+	# Маршрут — по индексу точек маршрута (company_vehicle_route_points), без разбора JSON
+	if filters.from_locations or filters.to_locations:
+		gazetteer = await gazetteer_store.get()
+		for direction, locations in (("from", filters.from_locations), ("to", filters.to_locations)):
+			if locations:
+				stmt = stmt.where(route_condition(direction, route_filter(locations, gazetteer, filters.radius_km)))
+
+	# Способы погрузки и ADR (JSON) проверяются в Python — читаем пачками, пока не наберём лимит
+	stmt = stmt.order_by(CompanyVehicle.id).limit(_SEARCH_BATCH)
+	vehicles = []
+	last_id = 0
+	while len(vehicles) <= _SEARCH_LIMIT:
+		rows = (await db.execute(stmt.where(CompanyVehicle.id > last_id))).all()
+		vehicles.extend(
+			_vehicle_response(vehicle, company) for vehicle, company in rows if _matches(vehicle, filters)
+		)
+		if len(rows) < _SEARCH_BATCH:
+			break
+		last_id = rows[-1][0].id
+	return {"vehicles": vehicles[:_SEARCH_LIMIT], "truncated": len(vehicles) > _SEARCH_LIMIT}
+
+
+# Слияние matched_vehicle_ids в ON CONFLICT: сохранённые id, затем новые, без повторов.
+# Считается по строке, которую держит сам upsert, — параллельный поиск не затирает чужие id.
+_MERGE_VEHICLE_IDS = {
+	"postgresql": """(
+		SELECT coalesce(json_agg(merged.value ORDER BY merged.first_seen), '[]'::json)
+		FROM (
+			SELECT ids.value, min(ids.position) AS first_seen
+			FROM jsonb_array_elements(
+				coalesce(shipment_requests.matched_vehicle_ids::jsonb, '[]'::jsonb)
+				|| excluded.matched_vehicle_ids::jsonb
+			) WITH ORDINALITY AS ids(value, position)
+			GROUP BY ids.value
+		) AS merged
+	)""",
+	"sqlite": """(
+		SELECT json_group_array(merged.value)
+		FROM (
+			SELECT ids.value, min(ids.position) AS first_seen
+			FROM (
+				SELECT value, key AS position FROM json_each(shipment_requests.matched_vehicle_ids)
+				UNION ALL
+				SELECT value, json_array_length(shipment_requests.matched_vehicle_ids) + key
+				FROM json_each(excluded.matched_vehicle_ids)
+			) AS ids
+			GROUP BY ids.value
+			ORDER BY first_seen
+		) AS merged
+	)""",
+}
+
+
+def _open_request_upsert(db, rows: list[dict], update_columns: tuple[str, ...] = ()):
+	"""INSERT ... ON CONFLICT по открытой заявке пары клиент–перевозчик (uq_shipment_requests_open).
+
+	У существующей заявки id ТС сливаются, срок продлевается, если истёк; update_columns
+	дополнительно берутся из вставляемой строки.
+	"""
+	table = ShipmentRequest.__table__
+	dialect = db.bind.dialect.name
+	dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+	stmt = dialect_insert(table).values(rows)
+	return stmt.on_conflict_do_update(
+		index_elements=[table.c.client_company_id, table.c.carrier_company_id],
+		index_where=OPEN_REQUEST_PREDICATE,
+		set_={
+			"matched_vehicle_ids": literal_column(_MERGE_VEHICLE_IDS[dialect], type_=JSON),
+			**{column: stmt.excluded[column] for column in update_columns},
+			"updated_at": stmt.excluded.updated_at,
+			# Действующий срок не сокращаем, истёкший — продлеваем
+			"expires_at": case(
+				(table.c.expires_at >= stmt.excluded.updated_at, table.c.expires_at),
+				else_=stmt.excluded.expires_at,
+			),
+		},
+	)
+
+
+async def _upsert_passive_requests(
+	db,
+	client_company_id: int,
+	by_carrier: dict[int, list[int]],
+	search_filters: dict,
+) -> tuple[int, int]:
+	"""Пассивные заявки найденным перевозчикам одним INSERT ... ON CONFLICT ... RETURNING.
+
+	Открытая (passive/active) заявка на пару клиент–перевозчик одна — uq_shipment_requests_open;
+	повторный поиск дописывает ТС в существующую и продлевает просроченный срок. Слияние идёт
+	в самом ON CONFLICT по сохранённой строке, поэтому одновременные поиски не теряют id ТС.
+	Возвращает (создано, обновлено).
+	"""
+	now = datetime.utcnow()
+	rows = [
+		{
+			"client_company_id": client_company_id,
+			"carrier_company_id": carrier_company_id,
+			"status": "passive",
+			"is_highlighted": False,
+			"search_filters": search_filters,
+			"matched_vehicle_ids": list(dict.fromkeys(vehicle_ids)),
+			"created_at": now,
+			"updated_at": now,
+			"expires_at": now + _REQUEST_TTL,
+		}
+		for carrier_company_id, vehicle_ids in by_carrier.items()
+	]
+
+	stmt = _open_request_upsert(db, rows, ("search_filters",)).returning(ShipmentRequest.__table__.c.created_at)
+	# created_at обновлённой заявки остаётся прежним
+	created = sum(1 for created_at in (await db.execute(stmt)).scalars() if created_at == now)
+	await db.commit()
+	return created, len(rows) - created
+
+
 @router.post("/search")
 async def search_transport(
 	filters: TransportSearchFilters,
 	db: async_db_dep,
 	current_user: current_user_dep,
 ):
-	"""Поиск ТС (кэш ~60с). Пассивные заявки — только если заданы Откуда и Куда."""
+	"""Поиск ТС (общий кэш ~60с). Пассивные заявки — только если заданы Откуда и Куда."""
 	client_company_id = _company_id(current_user)
-	cache_key = _search_cache_key(client_company_id, filters)
-	cached = await cache_get(cache_key)
-	if isinstance(cached, list):
-		vehicles_payload = cached
-	else:
-		stmt = (
-			select(CompanyVehicle, Company)
-			.join(Company, Company.id == CompanyVehicle.company_id)
-			.where(
-				Company.trade_activity.in_([TradeActivity.CARRIER, TradeActivity.FORWARDER]),
-				Company.id != client_company_id,
-				CompanyVehicle.is_active.is_(True),
-			)
-		)
-		if filters.body_types:
-			stmt = stmt.where(CompanyVehicle.body_type.in_(filters.body_types))
-		if filters.partial_load:
-			stmt = stmt.where(CompanyVehicle.partial_load.is_(True))
-			weight = filters.cargo_weight_kg or filters.capacity_min_kg
-			volume = filters.cargo_volume_m3 or filters.volume_min_m3
-			if weight is not None:
-				stmt = stmt.where(CompanyVehicle.partial_load_weight_kg >= weight)
-			if volume is not None:
-				stmt = stmt.where(CompanyVehicle.partial_load_volume_m3 >= volume)
-		else:
-			weight = filters.cargo_weight_kg or filters.capacity_min_kg
-			volume = filters.cargo_volume_m3 or filters.volume_min_m3
-			if weight is not None:
-				stmt = stmt.where((CompanyVehicle.capacity_tons * 1000) >= weight)
-			if volume is not None:
-				stmt = stmt.where(CompanyVehicle.volume_m3 >= volume)
-		if filters.capacity_max_kg is not None:
-			stmt = stmt.where((CompanyVehicle.capacity_tons * 1000) <= filters.capacity_max_kg)
-		if filters.volume_max_m3 is not None:
-			stmt = stmt.where(CompanyVehicle.volume_m3 <= filters.volume_max_m3)
-		if filters.load_date is not None:
-			stmt = stmt.where(
-				or_(CompanyVehicle.load_date.is_(None), CompanyVehicle.load_date == filters.load_date)
-			)
-
-		# Cap candidate set before Python JSON/location matching
-		stmt = stmt.limit(_SEARCH_LIMIT * 3)
-		rows = (await db.execute(stmt)).all()
-		matched = [(vehicle, company) for vehicle, company in rows if _matches(vehicle, filters)]
-		matched = matched[:_SEARCH_LIMIT]
-		vehicles_payload = [_vehicle_response(vehicle, company) for vehicle, company in matched]
-		await cache_set(cache_key, vehicles_payload, ttl=_SEARCH_CACHE_TTL)
+	# Результат перевозчиков общий для всех клиентов; свои ТС клиента убираем после кэша
+	found = await transport_search_cache.get_or_load(
+		search_cache_key(filters), lambda: _find_vehicles(db, filters)
+	)
+	vehicles_payload = [
+		item for item in found["vehicles"] if (item.get("company") or {}).get("id") != client_company_id
+	]
+	if found["truncated"] and len(vehicles_payload) < len(found["vehicles"]):
+		# Лимит заполнен в том числе ТС самого клиента — добираем без общего кэша
+		vehicles_payload = (await _find_vehicles(db, filters, exclude_company_id=client_company_id))["vehicles"]
+	vehicles_payload = vehicles_payload[:_SEARCH_LIMIT]
 
 	requests_created = 0
 	requests_updated = 0
@@ -273,37 +371,10 @@ async def search_transport(
 			if carrier_id is None or vehicle_id is None:
 				continue
 			by_carrier.setdefault(int(carrier_id), []).append(int(vehicle_id))
-
-		now = datetime.utcnow()
-		for carrier_company_id, vehicle_ids in by_carrier.items():
-			existing = (await db.execute(
-				select(ShipmentRequest).where(
-					ShipmentRequest.client_company_id == client_company_id,
-					ShipmentRequest.carrier_company_id == carrier_company_id,
-					ShipmentRequest.status.in_(["passive", "active"]),
-				).order_by(ShipmentRequest.updated_at.desc())
-			)).scalars().first()
-			if existing:
-				merged = list(dict.fromkeys([*(existing.matched_vehicle_ids or []), *vehicle_ids]))
-				existing.matched_vehicle_ids = merged
-				existing.search_filters = filters.model_dump(mode="json")
-				existing.updated_at = now
-				if existing.expires_at is None or existing.expires_at < now:
-					existing.expires_at = now + timedelta(days=14)
-				requests_updated += 1
-			else:
-				db.add(ShipmentRequest(
-					client_company_id=client_company_id,
-					carrier_company_id=carrier_company_id,
-					search_filters=filters.model_dump(mode="json"),
-					matched_vehicle_ids=vehicle_ids,
-					status="passive",
-					is_highlighted=False,
-					expires_at=now + timedelta(days=14),
-				))
-				requests_created += 1
 		if by_carrier:
-			await db.commit()
+			requests_created, requests_updated = await _upsert_passive_requests(
+				db, client_company_id, by_carrier, filters.model_dump(mode="json")
+			)
 
 	return {
 		"vehicles": vehicles_payload,
@@ -336,38 +407,24 @@ async def send_vehicle_request(vehicle_id: int, db: async_db_dep, current_user:
 	if carrier_company_id == company_id:
 		raise HTTPException(status_code=400, detail="Cannot send request to own vehicle")
 
-	existing = (await db.execute(
-		select(ShipmentRequest).where(
-			ShipmentRequest.client_company_id == company_id,
-			ShipmentRequest.carrier_company_id == carrier_company_id,
-			ShipmentRequest.status.in_(["passive", "active"]),
-		).order_by(ShipmentRequest.updated_at.desc())
-	)).scalars().first()
-
+	# Одним upsert, как пассивные заявки поиска: повторная или одновременная отправка попадает
+	# в ту же открытую заявку (uq_shipment_requests_open), а не в IntegrityError
 	now = datetime.utcnow()
-	if existing:
-		ids = list(existing.matched_vehicle_ids or [])
-		if vehicle_id not in ids:
-			ids.append(vehicle_id)
-		existing.matched_vehicle_ids = ids
-		existing.updated_at = now
-		await db.commit()
-		return await activate_request(existing.id, db, current_user)
-
-	request = ShipmentRequest(
-		client_company_id=company_id,
-		carrier_company_id=carrier_company_id,
-		search_filters={},
-		matched_vehicle_ids=[vehicle_id],
-		status="active",
-		is_highlighted=True,
-		activated_at=now,
-		expires_at=now + timedelta(days=14),
-	)
-	db.add(request)
+	stmt = _open_request_upsert(db, [{
+		"client_company_id": company_id,
+		"carrier_company_id": carrier_company_id,
+		"search_filters": {},
+		"matched_vehicle_ids": [vehicle_id],
+		"status": "active",
+		"is_highlighted": True,
+		"activated_at": now,
+		"created_at": now,
+		"updated_at": now,
+		"expires_at": now + _REQUEST_TTL,
+	}]).returning(ShipmentRequest.__table__.c.id)
+	request_id = (await db.execute(stmt)).scalar_one()
 	await db.commit()
-	await db.refresh(request)
-	return request
+	return await activate_request(request_id, db, current_user)
 
 
 @router.get("/requests", response_model=list[ShipmentRequestResponse])
@@ -18,6 +18,8 @@ class TransportSearchFilters(BaseModel):
 	load_date: Optional[date] = None
 	from_locations: list[dict[str, Any]] = Field(default_factory=list)
 	to_locations: list[dict[str, Any]] = Field(default_factory=list)
+	# Города в радиусе от указанных (км, по координатам справочника)
+	radius_km: Optional[float] = Field(default=None, gt=0, le=1000)
 
 
 class CargoUpdate(BaseModel):
@@ -0,0 +1,44 @@
+"""
+Кэш результатов поиска транспорта.
+
+Ключ — только фильтры в каноническом виде (порядок списков, регистр и ё в названиях
+локаций не важны), без компании клиента: одинаковый поиск разных клиентов считается
+один раз, а свои ТС клиента отбрасываются уже после чтения из кэша. Одновременные
+одинаковые поиски ждут один запрос к БД (single-flight SharedCache). Создание, изменение
+и удаление ТС сбрасывают кэш (invalidate_transport_search).
+"""
+import hashlib
+import json
+
+from app.api.common.services.gazetteer import normalize
+from app.api.shipments.schemas import TransportSearchFilters
+from app.core.config import settings
+from app.core.shared_cache import SharedCache
+
+transport_search_cache = SharedCache("transport:search", settings.TRANSPORT_SEARCH_CACHE_TTL)
+
+_SET_FIELDS = ("body_types", "loading_methods", "adr_classes")
+_LOCATION_FIELDS = ("from_locations", "to_locations")
+
+
+def search_cache_key(filters: TransportSearchFilters) -> str:
+	payload = filters.model_dump(mode="json")
+	for field in _SET_FIELDS:
+		payload[field] = sorted(set(payload[field]))
+	for field in _LOCATION_FIELDS:
+		payload[field] = sorted({
+			json.dumps(
+				{**location, "name": normalize(str(location.get("name") or ""))},
+				sort_keys=True,
+				default=str,
+				ensure_ascii=False,
+			)
+			for location in payload[field]
+		})
+	raw = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+	return hashlib.md5(raw.encode()).hexdigest()
+
+
+async def invalidate_transport_search() -> None:
+	"""Сбросить результаты поиска после изменения парка ТС."""
+	await transport_search_cache.invalidate()
@@ -1,10 +1,10 @@
-import asyncio
 from datetime import datetime
 
 from sqlalchemy import delete
 
+from app.api.company.services.vehicle_routes import reindex_vehicle_routes
 from app.api.shipments.models import ShipmentRequest
-from app.celery_app import celery_app
+from app.celery_app import celery_app, run_async
 from app.db.base import AsyncSessionLocal
 
 
@@ -20,4 +20,10 @@ async def purge_expired_requests() -> int:
 
 @celery_app.task(name="shipments.purge_expired_requests")
 def purge_expired_requests_task() -> int:
-	return asyncio.run(purge_expired_requests())
+	return run_async(purge_expired_requests())
+
+
+@celery_app.task(name="shipments.reindex_vehicle_routes")
+def reindex_vehicle_routes_task() -> int:
+	"""Привязать точки маршрутов ТС к справочнику заново (новые города, переименования)."""
+	return run_async(reindex_vehicle_routes())
@@ -1,4 +1,7 @@
+import asyncio
 import os
+from typing import Any, Coroutine
+
 from celery import Celery
 from celery.schedules import crontab
 
@@ -10,6 +13,7 @@ celery_app = Celery(
     include=[
         "app.api.shipments.tasks",
         "app.api.chats.tasks",
+        "app.api.common.tasks",
     ]
 )
 
@@ -35,8 +39,41 @@ celery_app.conf.beat_schedule = {
         "task": "shipments.purge_expired_requests",
         "schedule": crontab(hour=3, minute=0),
     },
+    "reindex-vehicle-routes": {
+        "task": "shipments.reindex_vehicle_routes",
+        "schedule": crontab(hour=3, minute=30),
+    },
+    "refresh-location-tree-snapshots": {
+        "task": "cities_filter.refresh_location_trees",
+        "schedule": 60.0,
+    },
 }
 
+
+def run_async(coro: Coroutine[Any, Any, Any]) -> Any:
+    """Выполнить корутину задачи в новом event loop воркера.
+
+    Каждый asyncio.run() создаёт свой loop, а соединения пула engine и клиент Redis
+    привязаны к loop, в котором открыты. После задачи закрываем их, чтобы следующий
+    запуск открыл заново, а не упал на «attached to a different loop».
+    """
+
+    async def _run() -> Any:
+        from app.core.cache import redis_cache
+        from app.db.base import engine
+
+        try:
+            return await coro
+        finally:
+            await engine.dispose()
+            try:
+                await redis_cache.disconnect()
+            except Exception:
+                redis_cache.redis_client = None
+
+    return asyncio.run(_run())
+
+
 # Настройки для разработки
 if os.getenv("ENVIRONMENT") == "development":
     celery_app.conf.update(
@@ -63,22 +63,39 @@ class RedisCache:
 			self._unavailable_until = time.time() + 60
 			return None
 
-	async def set(self, key: str, value: Any, expire: int = 60):
-		"""Сохранить данные в кэш"""
+	async def set(self, key: str, value: Any, expire: Optional[int] = 60):
+		"""Сохранить данные в кэш (expire=None — без срока жизни)"""
 		try:
 			await self.connect()
 			if not self.redis_client:
 				return
-			await self.redis_client.setex(
+			await self.redis_client.set(
 				key,
-				expire,
 				json.dumps(value, default=str, ensure_ascii=False),
+				ex=expire,
 			)
 		except Exception as e:
 			print(f"⚠️ Ошибка сохранения в кэш: {e}")
 			self.redis_client = None
 			self._unavailable_until = time.time() + 60
 
+	async def add(self, key: str, value: Any) -> bool:
+		"""Сохранить без срока жизни, только если ключа ещё нет (SET NX)"""
+		try:
+			await self.connect()
+			if not self.redis_client:
+				return False
+			return bool(await self.redis_client.set(
+				key,
+				json.dumps(value, default=str, ensure_ascii=False),
+				nx=True,
+			))
+		except Exception as e:
+			print(f"⚠️ Ошибка сохранения в кэш: {e}")
+			self.redis_client = None
+			self._unavailable_until = time.time() + 60
+			return False
+
 	async def delete(self, key: str):
 		"""Удалить данные из кэша"""
 		try:
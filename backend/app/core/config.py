@@ -49,6 +49,19 @@ class Settings(BaseSettings):
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
 
+    # Чат: backplane для рассылки WS-событий между воркерами (redis | memory | local)
+    CHAT_BACKPLANE: str = "redis"
+    CHAT_PRESENCE_TTL_SECONDS: int = 90
+    # Страховочная сверка набора чатов presence-подключения с БД (обычно — по событиям)
+    CHAT_PRESENCE_RESYNC_SECONDS: int = 600
+    # Вложения чата: лимит размера и хранилище (local | s3)
+    CHAT_MAX_ATTACHMENT_BYTES: int = 50 * 1024 * 1024
+    CHAT_FILES_STORAGE: str = "local"
+    CHAT_FILES_S3_PREFIX: str = "chat_files"
+    # Исходящая очередь на WS-подключение и таймаут одной отправки
+    CHAT_WS_SEND_QUEUE_SIZE: int = 256
+    CHAT_WS_SEND_TIMEOUT_SECONDS: float = 10.0
+
     # Настройки фронтенда
     FRONTEND_URL: str = "http://localhost:3000"
     BASE_IMAGE_URL: str = "http://localhost:8000"
@@ -105,6 +118,36 @@ class Settings(BaseSettings):
     GOTENBERG_TIMEOUT_SECONDS: float = 60.0
     GOTENBERG_MAX_DOCX_BYTES: int = 20 * 1024 * 1024
 
+    # Рендер .docx в пуле процессов; 0 — в потоке (dev, тесты)
+    DOCX_RENDER_WORKERS: int = 2
+    DOCX_RENDER_MAX_QUEUE: int = 64  # Сверх этого числа ожидающих рендеров — 503
+    DOC_EXPORT_CONCURRENCY: int = 4  # Документов одной пакетной выгрузки в работе одновременно
+
+    # Каталожные списки (app/core/pagination.py)
+    CATALOG_TOTAL_CACHE_TTL: int = 60  # Сколько секунд переиспользовать total списка
+    CATALOG_EXACT_COUNT_THRESHOLD: int = 10_000  # PostgreSQL: при оценке планировщика выше — COUNT(*) не делаем
+    CATALOG_FACETS_CACHE_TTL: int = 300  # Фасеты боковой панели; сбрасываются при изменении товаров/компаний
+    PRODUCT_LOCATION_CACHE_TTL: int = 1200  # Списки локаций товаров/услуг/компаний (cache_service.py)
+    PRODUCT_LOCATION_CACHE_STALE_TTL: int = 600  # После TTL столько секунд отдаём старое и пересчитываем в фоне
+    TRANSPORT_SEARCH_CACHE_TTL: int = 60  # Результаты поиска транспорта (общие для клиентов, app/api/shipments/search_cache.py)
+
+    # Снапшоты деревьев фильтра городов (app/api/common/services/location_tree_snapshots.py)
+    LOCATION_TREE_SNAPSHOT_TTL: int = 24 * 60 * 60
+    LOCATION_TREE_MAX_STALENESS: int = 120  # Дольше дерево не бывает «грязным» — запрос пересоберёт сам
+    LOCATION_TREE_LOCAL_TTL: int = 5  # Как часто воркер сверяет свою копию с Redis
+
+    # Справочник городов в памяти для автодополнения (app/api/common/services/gazetteer.py)
+    GAZETTEER_CHECK_INTERVAL: int = 5  # Как часто воркер сверяет поколение справочника с Redis
+    GAZETTEER_RELOAD_INTERVAL: int = 60 * 60  # Перечитать в любом случае (правки в обход API)
+    GAZETTEER_SEARCH_LIMIT: int = 20  # /locations/cities с search: сколько городов по умолчанию
+    GAZETTEER_MAX_RESULTS: int = 2000  # Жёсткий предел выдачи /locations/cities
+
+    # Кэш сгенерированных .docx/.pdf по сделке (ключ: версия + хэш шаблона + хэш контекста)
+    DOC_RENDER_CACHE_ENABLED: bool = True
+    DOC_RENDER_CACHE_DIR: Path = BASE_DIR.parent / "uploads" / "render_cache"
+    DOC_RENDER_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    DOC_RENDER_CACHE_SHARED: bool = False  # Дублировать в общее хранилище (STORAGE_BACKEND) для всех воркеров
+
     # API ключ для сервиса локаций (htmlweb.ru)
     LOCATION_API_KEY: Optional[str] = None
 
@@ -122,11 +165,23 @@ class Settings(BaseSettings):
     S3_REGION: str = "auto"  # R2 uses "auto", AWS uses e.g. us-east-1
     S3_DOCUMENTS_PREFIX: str = "documents"
     S3_PRESIGNED_EXPIRES: int = 3600  # seconds
+    S3_PRESIGNED_REFRESH_MARGIN: int = 300  # Не отдавать закэшированную ссылку, если до истечения меньше (сек)
+    S3_MAX_POOL_CONNECTIONS: int = 50  # Пул HTTP-соединений общего boto3-клиента
+    S3_STREAM_CHUNK_SIZE: int = 1024 * 1024
+    # Хранилище документов: s3 | filesystem (локальная замена S3 для dev/тестов)
+    STORAGE_BACKEND: str = "s3"
+    STORAGE_FILESYSTEM_ROOT: Path = BASE_DIR.parent / "uploads" / "storage"
 
     @property
     def S3_ENABLED(self) -> bool:
         return bool(self.S3_BUCKET and self.S3_ACCESS_KEY and self.S3_SECRET_KEY)
 
+    @property
+    def STORAGE_ENABLED(self) -> bool:
+        if self.STORAGE_BACKEND.strip().lower() == "filesystem":
+            return True
+        return self.S3_ENABLED
+
     @property
     def ASYNC_DATABASE_URL(self) -> str:
         return get_async_database_url(self.SQLALCHEMY_DATABASE_URL)
@@ -0,0 +1,133 @@
+"""
+Keyset-пагинация и приблизительные total для каталожных списков.
+
+OFFSET заставляет БД пройти и выбросить все предыдущие строки, поэтому глубокие страницы
+дорожают линейно. Курсор хранит ключ сортировки последней строки, и следующая страница
+начинается с условия (created_at, id) < (…) по индексу. Точный COUNT(*) по тем же условиям
+удваивал работу каждого запроса: total берётся из кэша (CATALOG_TOTAL_CACHE_TTL), а для
+больших выборок в PostgreSQL — из оценки планировщика; точный подсчёт — по exact_total.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import ColumnElement, Select, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.elements import ClauseElement
+
+from app.core.config import settings
+from app.core.ttl_cache import cache_get, cache_set
+from app_logging.logger import logger
+
+TOTAL_CACHE_PREFIX = "catalog:total:"
+
+
+class InvalidCursorError(ValueError):
+	"""Курсор повреждён или не подходит к этому списку."""
+
+
+class CatalogPage(NamedTuple):
+	items: List[Any]
+	total: int
+	total_is_estimate: bool
+	next_cursor: Optional[str]
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+	payload = [{"dt": v.isoformat()} if isinstance(v, datetime) else v for v in values]
+	raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+	return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+	try:
+		raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+		payload = json.loads(raw)
+		if not isinstance(payload, list) or len(payload) != size:
+			raise ValueError("wrong cursor size")
+		return [datetime.fromisoformat(v["dt"]) if isinstance(v, dict) else v for v in payload]
+	except (ValueError, TypeError, KeyError) as e:
+		raise InvalidCursorError("Invalid cursor") from e
+
+
+def keyset_query(query: Select, order_by: Sequence[ColumnElement], cursor: Optional[str], limit: int) -> Select:
+	"""Сортировка по убыванию order_by и старт после курсора; берётся limit + 1 строка, чтобы знать, есть ли ещё."""
+	if cursor:
+		values = decode_cursor(cursor, len(order_by))
+		query = query.where(tuple_(*order_by) < tuple_(*values))
+	return query.order_by(*(column.desc() for column in order_by)).limit(limit + 1)
+
+
+def split_page(rows: list, limit: int, key) -> tuple[list, Optional[str]]:
+	"""Отрезать лишнюю строку keyset_query и собрать курсор следующей страницы."""
+	if len(rows) <= limit:
+		return rows, None
+	rows = rows[:limit]
+	return rows, encode_cursor(key(rows[-1]))
+
+
+def _total_cache_key(query: Select) -> str:
+	compiled = query.compile()
+	params = sorted((k, repr(v)) for k, v in compiled.params.items())
+	digest = hashlib.sha1(f"{compiled}|{params}".encode("utf-8")).hexdigest()
+	return f"{TOTAL_CACHE_PREFIX}{digest}"
+
+
+class _Explain(Executable, ClauseElement):
+	"""EXPLAIN (FORMAT JSON) над запросом с обычными bind-параметрами.
+
+	Подставлять значения в текст (literal_binds) нельзя: не у всех типов есть литералы
+	(REGCONFIG полнотекстового поиска), а IN/enum/даты и так обрабатывает компилятор.
+	"""
+
+	inherit_cache = False
+
+	def __init__(self, query: Select):
+		self.query = query
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element: _Explain, compiler, **kw) -> str:
+	return f"EXPLAIN (FORMAT JSON) {compiler.process(element.query, **kw)}"
+
+
+async def _planner_estimate(session: AsyncSession, query: Select) -> Optional[int]:
+	try:
+		result = await session.execute(_Explain(query))
+		plan = result.scalar()
+		if isinstance(plan, str):
+			plan = json.loads(plan)
+		return int(plan[0]["Plan"]["Plan Rows"])
+	except Exception as e:
+		logger.warning("Planner estimate failed: %s", e)
+		return None
+
+
+async def catalog_total(session: AsyncSession, rows_query: Select, exact: bool = False) -> tuple[int, bool]:
+	"""
+	(total, total_is_estimate) для выборки rows_query (SELECT без ORDER BY/LIMIT).
+
+	exact=True — всегда COUNT(*). Иначе значение из кэша (может отставать на TTL, поэтому
+	помечается как оценка); при промахе в PostgreSQL смотрим оценку планировщика и считаем
+	точно, только если выборка небольшая.
+	"""
+	key = _total_cache_key(rows_query)
+	if not exact:
+		cached = await cache_get(key)
+		if cached is not None:
+			return int(cached), True
+		if session.bind.dialect.name == "postgresql":
+			estimate = await _planner_estimate(session, rows_query)
+			if estimate is not None and estimate >= settings.CATALOG_EXACT_COUNT_THRESHOLD:
+				await cache_set(key, estimate, ttl=settings.CATALOG_TOTAL_CACHE_TTL)
+				return estimate, True
+	count_query = select(func.count()).select_from(rows_query.order_by(None).subquery())
+	total = (await session.execute(count_query)).scalar() or 0
+	await cache_set(key, total, ttl=settings.CATALOG_TOTAL_CACHE_TTL)
+	return total, False
@@ -1,33 +1,76 @@
 """
 S3-compatible storage: upload, presigned URL for download, delete.
 Works with Cloudflare R2, MinIO, AWS S3.
+
+Клиенты boto3 создаются один раз на процесс (они потокобезопасны) и держат пул
+HTTP-соединений; async-обёртки для FastAPI — в app.core.storage.
 """
 from __future__ import annotations
 
+import threading
+import time
 import uuid
+from collections import OrderedDict
 from typing import Optional
 
 import boto3
+from boto3.exceptions import S3UploadFailedError
 from botocore.config import Config
 from botocore.exceptions import ClientError
 
 from app.core.config import settings
 
 
-def _client():
-    if not settings.S3_ENABLED:
-        raise RuntimeError("S3 is not configured. Set S3_BUCKET, S3_ACCESS_KEY, S3_SECRET_KEY.")
+_clients: dict[str, object] = {}
+_clients_lock = threading.Lock()
+
+# Кэш presigned URL: {(key, expires_in): (url, истекает_в_monotonic)}
+_presigned_cache: "OrderedDict[tuple[str, int], tuple[str, float]]" = OrderedDict()
+_presigned_lock = threading.Lock()
+_PRESIGNED_CACHE_MAX = 10_000
+
+
+def _make_client(endpoint: Optional[str]):
     kwargs = {
         "aws_access_key_id": settings.S3_ACCESS_KEY,
         "aws_secret_access_key": settings.S3_SECRET_KEY,
         "region_name": settings.S3_REGION,
-        "config": Config(signature_version="s3v4"),
+        "config": Config(
+            signature_version="s3v4",
+            max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+        ),
     }
-    if settings.S3_ENDPOINT_URL:
-        kwargs["endpoint_url"] = settings.S3_ENDPOINT_URL
+    if endpoint:
+        kwargs["endpoint_url"] = endpoint
     return boto3.client("s3", **kwargs)
 
 
+def _pooled_client(name: str, endpoint: Optional[str]):
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    with _clients_lock:
+        client = _clients.get(name)
+        if client is None:
+            client = _make_client(endpoint)
+            _clients[name] = client
+        return client
+
+
+def reset_clients() -> None:
+    """Сбросить пул клиентов и кэш ссылок (смена настроек, тесты)."""
+    with _clients_lock:
+        _clients.clear()
+    with _presigned_lock:
+        _presigned_cache.clear()
+
+
+def _client():
+    if not settings.S3_ENABLED:
+        raise RuntimeError("S3 is not configured. Set S3_BUCKET, S3_ACCESS_KEY, S3_SECRET_KEY.")
+    return _pooled_client("internal", settings.S3_ENDPOINT_URL)
+
+
 def _bucket():
     return settings.S3_BUCKET
 
@@ -54,17 +97,21 @@ def build_key(prefix: str, *parts: str) -> str:
     return "/".join([prefix.strip("/")] + list(parts))
 
 
-def upload_document(deal_id: int, filename: str, content: bytes, content_type: Optional[str] = None) -> str:
-    """
-    Upload document to S3. Returns the S3 key (stored in DB as document_file_path).
-    """
+def build_document_key(deal_id: int, filename: str) -> str:
     ext = filename.rsplit(".", 1)[-1] if "." in filename else "bin"
-    key = build_key(
+    return build_key(
         settings.S3_DOCUMENTS_PREFIX,
         "deals",
         str(deal_id),
         f"{uuid.uuid4().hex}.{ext}",
     )
+
+
+def upload_document(deal_id: int, filename: str, content: bytes, content_type: Optional[str] = None) -> str:
+    """
+    Upload document to S3. Returns the S3 key (stored in DB as document_file_path).
+    """
+    key = build_document_key(deal_id, filename)
     client = _client()
     extra = {}
     if content_type:
@@ -91,30 +138,79 @@ def upload_document(deal_id: int, filename: str, content: bytes, content_type: O
     return key
 
 
+def _is_missing_bucket(e: Exception) -> bool:
+    # S3Transfer заворачивает ClientError в S3UploadFailedError — код остаётся только в тексте
+    if isinstance(e, ClientError):
+        return e.response.get("Error", {}).get("Code", "") == "NoSuchBucket"
+    return isinstance(e, S3UploadFailedError) and "NoSuchBucket" in str(e)
+
+
+def upload_file(key: str, path: str, content_type: Optional[str] = None) -> str:
+    """Загрузить файл с диска по ключу (multipart для больших файлов, без чтения в память)."""
+    extra = {"ContentType": content_type} if content_type else None
+    try:
+        _client().upload_file(path, _bucket(), key, ExtraArgs=extra)
+    except (ClientError, S3UploadFailedError) as e:
+        if not _is_missing_bucket(e):
+            raise
+        ensure_bucket()
+        _client().upload_file(path, _bucket(), key, ExtraArgs=extra)
+    return key
+
+
+def _is_missing_key(e: ClientError) -> bool:
+    code = e.response.get("Error", {}).get("Code", "")
+    status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return code in ("404", "NoSuchKey", "NotFound") or status == 404
+
+
+def object_exists(key: str) -> bool:
+    try:
+        _client().head_object(Bucket=_bucket(), Key=key)
+        return True
+    except ClientError as e:
+        if _is_missing_key(e):
+            return False
+        raise
+
+
 def _client_for_presigned():
     """Client для presigned URL: использует S3_PUBLIC_ENDPOINT_URL если задан (доступен из браузера)."""
-    base_kwargs = {
-        "aws_access_key_id": settings.S3_ACCESS_KEY,
-        "aws_secret_access_key": settings.S3_SECRET_KEY,
-        "region_name": settings.S3_REGION,
-        "config": Config(signature_version="s3v4"),
-    }
     endpoint = settings.S3_PUBLIC_ENDPOINT_URL or settings.S3_ENDPOINT_URL
-    if endpoint:
-        base_kwargs["endpoint_url"] = endpoint
-    return boto3.client("s3", **base_kwargs)
+    return _pooled_client("presigned", endpoint)
 
 
 def get_presigned_download_url(key: str, expires_in: Optional[int] = None) -> str:
-    """Generate presigned URL for GET. Uses S3_PUBLIC_ENDPOINT_URL when set (browser-accessible)."""
+    """
+    Generate presigned URL for GET. Uses S3_PUBLIC_ENDPOINT_URL when set (browser-accessible).
+    Ссылка переиспользуется, пока до её истечения больше S3_PRESIGNED_REFRESH_MARGIN секунд.
+    """
     if expires_in is None:
         expires_in = settings.S3_PRESIGNED_EXPIRES
-    client = _client_for_presigned()
-    return client.generate_presigned_url(
+    cache_key = (key, expires_in)
+    now = time.monotonic()
+    with _presigned_lock:
+        cached = _presigned_cache.get(cache_key)
+        if cached is not None and cached[1] - now > settings.S3_PRESIGNED_REFRESH_MARGIN:
+            _presigned_cache.move_to_end(cache_key)
+            return cached[0]
+    url = _client_for_presigned().generate_presigned_url(
         "get_object",
         Params={"Bucket": _bucket(), "Key": key},
         ExpiresIn=expires_in,
     )
+    with _presigned_lock:
+        _presigned_cache[cache_key] = (url, now + expires_in)
+        _presigned_cache.move_to_end(cache_key)
+        while len(_presigned_cache) > _PRESIGNED_CACHE_MAX:
+            _presigned_cache.popitem(last=False)
+    return url
+
+
+def _forget_presigned(key: str) -> None:
+    with _presigned_lock:
+        for cache_key in [k for k in _presigned_cache if k[0] == key]:
+            _presigned_cache.pop(cache_key, None)
 
 
 def get_document_content(key: str) -> tuple[bytes, Optional[str]]:
@@ -126,8 +222,39 @@ def get_document_content(key: str) -> tuple[bytes, Optional[str]]:
     return (body, content_type)
 
 
+def open_document_stream(key: str) -> tuple[object, Optional[str], Optional[int]]:
+    """Открыть объект для чтения по частям: (body, content_type, content_length).
+
+    Отсутствующий ключ — FileNotFoundError, как у FilesystemStorage.open.
+    """
+    try:
+        response = _client().get_object(Bucket=_bucket(), Key=key)
+    except ClientError as e:
+        if _is_missing_key(e):
+            raise FileNotFoundError(key) from e
+        raise
+    return response["Body"], response.get("ContentType"), response.get("ContentLength")
+
+
+def upload_fileobj(key: str, fileobj, content_type: Optional[str] = None) -> str:
+    """Загрузить file-like объект потоково (multipart для больших файлов)."""
+    extra = {"ContentType": content_type} if content_type else None
+    start = fileobj.tell() if fileobj.seekable() else None
+    try:
+        _client().upload_fileobj(fileobj, _bucket(), key, ExtraArgs=extra)
+    except (ClientError, S3UploadFailedError) as e:
+        # Повтор возможен, только если поток можно перемотать к началу
+        if not _is_missing_bucket(e) or start is None:
+            raise
+        ensure_bucket()
+        fileobj.seek(start)
+        _client().upload_fileobj(fileobj, _bucket(), key, ExtraArgs=extra)
+    return key
+
+
 def delete_document(key: str) -> bool:
     """Delete object from S3. Returns True if deleted or not found."""
+    _forget_presigned(key)
     try:
         _client().delete_object(Bucket=_bucket(), Key=key)
         return True
@@ -0,0 +1,168 @@
+"""
+Общий для воркеров кэш с версией (поколением), single-flight и stale-while-revalidate.
+
+Уровни: L1 — словарь процесса, L2 — Redis. Ключи включают поколение пространства имён.
+Поколение хранится в Redis без срока жизни: первый воркер атомарно записывает начальное
+"0" (SET NX), invalidate() записывает новое — со следующего запроса все воркеры
+читают и строят данные заново. Пока запись свежая, она отдаётся как есть; после
+fresh_ttl и в пределах stale_ttl отдаётся старое значение, а пересчёт идёт в фоне
+(не больше одного на ключ). Без Redis всё работает в пределах процесса.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+from app_logging.logger import logger
+
+Loader = Callable[[], Awaitable[Any]]
+
+_L1_MAX_ENTRIES = 512
+_INITIAL_GENERATION = "0"
+
+
+class SharedCache:
+	def __init__(self, namespace: str, fresh_ttl: int, stale_ttl: int = 0):
+		self.namespace = namespace
+		self.fresh_ttl = fresh_ttl
+		self.stale_ttl = stale_ttl
+		self._l1: "OrderedDict[str, dict]" = OrderedDict()
+		self._local_generation = str(time.time_ns())
+		self._locks: dict[str, asyncio.Lock] = {}
+		self._refreshing: dict[str, asyncio.Task] = {}
+		self.hits = 0
+		self.stale_hits = 0
+		self.misses = 0
+
+	@property
+	def _generation_key(self) -> str:
+		return f"{self.namespace}:generation"
+
+	async def generation(self) -> str:
+		"""Общее для воркеров поколение; своё, процессное — только если Redis недоступен."""
+		try:
+			from app.core.cache import redis_cache
+
+			value = await redis_cache.get(self._generation_key)
+			if value is None:
+				# Все воркеры засевают одно и то же значение — кто первый, тот и записал
+				await redis_cache.add(self._generation_key, _INITIAL_GENERATION)
+				value = await redis_cache.get(self._generation_key)
+		except Exception:
+			value = None
+		return str(value) if value is not None else self._local_generation
+
+	async def _full_key(self, key: str) -> str:
+		return f"{self.namespace}:{await self.generation()}:{key}"
+
+	async def _read(self, full_key: str) -> Optional[dict]:
+		entry = self._l1.get(full_key)
+		if entry is not None:
+			if entry["expires"] >= time.time():
+				self._l1.move_to_end(full_key)
+				return entry
+			self._l1.pop(full_key, None)
+		try:
+			from app.core.cache import redis_cache
+
+			entry = await redis_cache.get(full_key)
+		except Exception:
+			entry = None
+		if isinstance(entry, dict) and "value" in entry:
+			self._remember(full_key, entry)
+			return entry
+		return None
+
+	async def _write(self, full_key: str, value: Any) -> dict:
+		now = time.time()
+		entry = {"value": value, "fresh_until": now + self.fresh_ttl, "expires": now + self.fresh_ttl + self.stale_ttl}
+		self._remember(full_key, entry)
+		try:
+			from app.core.cache import redis_cache
+
+			await redis_cache.set(full_key, entry, expire=self.fresh_ttl + self.stale_ttl)
+		except Exception:
+			pass
+		return entry
+
+	def _remember(self, full_key: str, entry: dict) -> None:
+		self._l1[full_key] = entry
+		self._l1.move_to_end(full_key)
+		while len(self._l1) > _L1_MAX_ENTRIES:
+			self._l1.popitem(last=False)
+
+	async def get(self, key: str) -> Optional[Any]:
+		entry = await self._read(await self._full_key(key))
+		return entry["value"] if entry is not None else None
+
+	async def set(self, key: str, value: Any) -> None:
+		await self._write(await self._full_key(key), value)
+
+	async def get_or_load(self, key: str, loader: Loader, refresh_loader: Optional[Loader] = None) -> Any:
+		"""
+		Значение из кэша или loader() — один на ключ, даже при сотне одновременных промахов.
+		refresh_loader — для фонового пересчёта устаревшей записи (loader может держать
+		сессию запроса, которая к тому времени закроется).
+		"""
+		full_key = await self._full_key(key)
+		entry = await self._read(full_key)
+		if entry is not None:
+			if entry["fresh_until"] >= time.time():
+				self.hits += 1
+			else:
+				self.stale_hits += 1
+				self._refresh_in_background(full_key, refresh_loader or loader)
+			return entry["value"]
+
+		lock = self._locks.setdefault(full_key, asyncio.Lock())
+		try:
+			async with lock:
+				entry = await self._read(full_key)
+				if entry is not None:
+					self.hits += 1
+					return entry["value"]
+				self.misses += 1
+				value = await loader()
+				await self._write(full_key, value)
+		finally:
+			# И при ошибке loader: иначе замок остаётся навсегда (по одному на ключ и поколение)
+			if self._locks.get(full_key) is lock:
+				self._locks.pop(full_key, None)
+		return value
+
+	def _refresh_in_background(self, full_key: str, loader: Loader) -> None:
+		task = self._refreshing.get(full_key)
+		if task is not None and not task.done():
+			return
+
+		async def refresh() -> None:
+			try:
+				await self._write(full_key, await loader())
+			except Exception as e:
+				logger.warning("Background refresh of %s failed: %s", full_key, e)
+			finally:
+				self._refreshing.pop(full_key, None)
+
+		self._refreshing[full_key] = asyncio.create_task(refresh())
+
+	async def invalidate(self) -> None:
+		self._l1.clear()
+		self._local_generation = str(time.time_ns())
+		try:
+			from app.core.cache import redis_cache
+
+			# Без срока жизни: истёкшее поколение воркеры засеяли бы заново и вернули старые ключи
+			await redis_cache.set(self._generation_key, self._local_generation, expire=None)
+		except Exception:
+			pass
+
+	def metrics(self) -> dict:
+		return {
+			"hits": self.hits,
+			"stale_hits": self.stale_hits,
+			"misses": self.misses,
+			"l1_entries": len(self._l1),
+			"refreshing": len(self._refreshing),
+		}
@@ -0,0 +1,171 @@
+"""
+Асинхронный доступ к хранилищу документов.
+
+S3Storage — обёртка над app.core.s3: блокирующие вызовы boto3 уходят в пул потоков,
+клиент и пул соединений общие на процесс, presigned URL кэшируются.
+FilesystemStorage — тот же интерфейс поверх локального каталога (dev, тесты без MinIO).
+"""
+from __future__ import annotations
+
+import asyncio
+import mimetypes
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Optional
+
+import aiofiles
+
+from app.core.config import settings
+
+
+class StoredObject:
+    """Открытый на чтение объект хранилища: поток частей + метаданные для ответа."""
+
+    def __init__(self, chunks: AsyncIterator[bytes], content_type: Optional[str], content_length: Optional[int]):
+        self.chunks = chunks
+        self.content_type = content_type
+        self.content_length = content_length
+
+
+class S3Storage:
+    name = "s3"
+
+    def __init__(self, chunk_size: Optional[int] = None):
+        self.chunk_size = chunk_size or settings.S3_STREAM_CHUNK_SIZE
+
+    async def upload_fileobj(self, key: str, fileobj: BinaryIO, content_type: Optional[str] = None) -> str:
+        from app.core import s3
+
+        return await asyncio.to_thread(s3.upload_fileobj, key, fileobj, content_type)
+
+    async def upload_file(self, key: str, path: str, content_type: Optional[str] = None) -> str:
+        from app.core import s3
+
+        return await asyncio.to_thread(s3.upload_file, key, path, content_type)
+
+    async def exists(self, key: str) -> bool:
+        from app.core import s3
+
+        return await asyncio.to_thread(s3.object_exists, key)
+
+    async def presigned_download_url(self, key: str) -> Optional[str]:
+        from app.core import s3
+
+        return await asyncio.to_thread(s3.get_presigned_download_url, key)
+
+    async def open(self, key: str) -> StoredObject:
+        from app.core import s3
+
+        body, content_type, content_length = await asyncio.to_thread(s3.open_document_stream, key)
+        return StoredObject(self._iter_body(body), content_type, content_length)
+
+    async def _iter_body(self, body) -> AsyncIterator[bytes]:
+        try:
+            while True:
+                chunk = await asyncio.to_thread(body.read, self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            await asyncio.to_thread(body.close)
+
+    async def delete(self, key: str) -> bool:
+        from app.core import s3
+
+        return await asyncio.to_thread(s3.delete_document, key)
+
+
+class FilesystemStorage:
+    """Хранилище в локальном каталоге. Ключи те же, что в S3 (documents/deals/...)."""
+
+    name = "filesystem"
+
+    def __init__(self, root: Optional[Path] = None, chunk_size: Optional[int] = None):
+        self.root = Path(root or settings.STORAGE_FILESYSTEM_ROOT).resolve()
+        self.chunk_size = chunk_size or settings.S3_STREAM_CHUNK_SIZE
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if path != self.root and self.root not in path.parents:
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def _write_fileobj(self, key: str, fileobj: BinaryIO) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+        try:
+            with open(tmp_path, "wb") as out:
+                shutil.copyfileobj(fileobj, out, self.chunk_size)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    async def upload_fileobj(self, key: str, fileobj: BinaryIO, content_type: Optional[str] = None) -> str:
+        await asyncio.to_thread(self._write_fileobj, key, fileobj)
+        return key
+
+    async def upload_file(self, key: str, path: str, content_type: Optional[str] = None) -> str:
+        def _copy() -> None:
+            with open(path, "rb") as src:
+                self._write_fileobj(key, src)
+
+        await asyncio.to_thread(_copy)
+        return key
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(self._path(key).is_file)
+
+    async def presigned_download_url(self, key: str) -> Optional[str]:
+        # Подписанных ссылок нет — файл отдаётся потоком через backend
+        return None
+
+    async def open(self, key: str) -> StoredObject:
+        path = self._path(key)
+        try:
+            size = (await asyncio.to_thread(path.stat)).st_size
+        except OSError as e:
+            raise FileNotFoundError(key) from e
+        content_type = mimetypes.guess_type(path.name)[0]
+        return StoredObject(self._iter_file(path), content_type, size)
+
+    async def _iter_file(self, path: Path) -> AsyncIterator[bytes]:
+        async with aiofiles.open(path, "rb") as f:
+            while True:
+                chunk = await f.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    async def delete(self, key: str) -> bool:
+        def _unlink() -> bool:
+            try:
+                self._path(key).unlink()
+                return True
+            except FileNotFoundError:
+                return False
+
+        return await asyncio.to_thread(_unlink)
+
+
+_storage = None
+
+
+def get_storage():
+    """Хранилище по настройке STORAGE_BACKEND (создаётся один раз на процесс)."""
+    global _storage
+    if _storage is None:
+        if settings.STORAGE_BACKEND.strip().lower() == "filesystem":
+            _storage = FilesystemStorage()
+        else:
+            _storage = S3Storage()
+    return _storage
+
+
+def set_storage(storage) -> None:
+    """Подменить хранилище (тесты) или сбросить выбор (None)."""
+    global _storage
+    _storage = storage
@@ -2,10 +2,14 @@
 from __future__ import annotations
 
 import time
+from collections import OrderedDict
 from typing import Any, Optional
 
 _AUTH_TTL = 45
-_memory: dict[str, tuple[float, Any]] = {}
+# Ключи бывают по запросу/компании/чату (total каталога, членство в чате): без предела
+# память процесса росла бы с каждым новым ключом
+_MEMORY_MAX_ENTRIES = 10_000
+_memory: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
 
 
 def _mem_get(key: str) -> Optional[Any]:
@@ -16,11 +20,24 @@ def _mem_get(key: str) -> Optional[Any]:
 	if expires < time.time():
 		_memory.pop(key, None)
 		return None
+	_memory.move_to_end(key)
 	return value
 
 
+def _sweep() -> None:
+	"""Убрать истёкшие записи; если их мало — самые давние, до 90% предела (реже следующий проход)."""
+	now = time.time()
+	for key in [key for key, (expires, _) in _memory.items() if expires < now]:
+		del _memory[key]
+	while len(_memory) > _MEMORY_MAX_ENTRIES * 9 // 10:
+		_memory.popitem(last=False)
+
+
 def _mem_set(key: str, value: Any, ttl: int = _AUTH_TTL) -> None:
 	_memory[key] = (time.time() + ttl, value)
+	_memory.move_to_end(key)
+	if len(_memory) > _MEMORY_MAX_ENTRIES:
+		_sweep()
 
 
 def _mem_delete(key: str) -> None:
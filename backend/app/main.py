@@ -41,8 +41,35 @@ async def lifespan(app: FastAPI):
             print(f"✅ S3 bucket ready: {settings.S3_BUCKET}")
         except Exception as e:
             print(f"⚠️ S3 bucket ensure failed: {e}")
+    try:
+        from app.api.chats.backplane import create_backplane
+        from app.api.chats.websocket_manager import chat_manager
+
+        await chat_manager.start(
+            create_backplane(settings.CHAT_BACKPLANE, settings.CHAT_PRESENCE_TTL_SECONDS)
+        )
+    except Exception as e:
+        print(f"⚠️ Chat backplane start failed: {e}")
+    try:
+        from app.api.common.services.gazetteer import gazetteer_store
+
+        await gazetteer_store.reload()
+    except Exception as e:
+        print(f"⚠️ Gazetteer warmup failed: {e}")
     yield
     # Shutdown
+    try:
+        from app.api.chats.websocket_manager import chat_manager
+
+        await chat_manager.stop()
+    except Exception as e:
+        print(f"⚠️ Chat backplane stop failed: {e}")
+    try:
+        from app.api.purchases.services.docx_render_pool import docx_render_pool
+
+        docx_render_pool.shutdown()
+    except Exception as e:
+        print(f"⚠️ DOCX render pool shutdown failed: {e}")
     print("🔄 Disposing database engine...")
     await engine.dispose()
 
@@ -189,6 +216,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Пагинация списков сделок и id задачи выгрузки — в заголовках, браузер должен их видеть
+    expose_headers=["X-Total-Count", "X-Total-Is-Estimate", "X-Next-Cursor", "X-Export-Job-Id"],
 )
 
 # Admin panel setup
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк генерации счетов (.docx): N рендеров одновременно, задержки p50/p99.
+
+Режимы:
+	legacy  — как раньше: DocxTemplate с диска на каждый запрос, asyncio.to_thread
+	thread  — подготовленные шаблоны (template_registry), asyncio.to_thread
+	process — подготовленные шаблоны в DocxRenderPool (ProcessPoolExecutor)
+
+Кроме задержек меряется лаг event loop: насколько опаздывает тикер с периодом 10 мс,
+пока идёт рендер, — так видно, мешает ли рендер остальному API.
+
+	python scripts/bench_docx_render.py --bills 200 --concurrency 50 --workers 4
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import copy
+import statistics
+import time
+from io import BytesIO
+from pathlib import Path
+
+from docxtpl import DocxTemplate
+
+from app.api.purchases.deal_docx_context import build_deal_docx_context
+from app.api.purchases.schemas import DealResponse
+from app.api.purchases.services.docx_render_pool import DocxRenderPool
+from app.api.purchases.services.docx_template_service import (
+	BILL_DOCX_FILENAME,
+	render_docx_bytes,
+	resolve_docx_template_path,
+)
+
+
+def _sample_context(items: int) -> dict:
+	data = copy.deepcopy(DealResponse.model_config["json_schema_extra"]["example"])
+	data["supply_contract"]["officials"] = []
+	for key in ("buyer_company", "seller_company"):
+		company = data[key]
+		company.update(id=company["company_id"], company_type="ООО", name=company["company_name"])
+	data["items"] = [
+		{
+			"id": i,
+			"order_id": 1,
+			"position": i,
+			"product_name": f"Товар {i}",
+			"quantity": 2,
+			"unit_of_measurement": "шт",
+			"price": 100.0,
+			"amount": 200.0,
+			"created_at": "2025-01-01T12:00:00",
+			"updated_at": "2025-01-01T12:00:00",
+		}
+		for i in range(1, items + 1)
+	]
+	return build_deal_docx_context(DealResponse.model_validate(data))
+
+
+def _legacy_render(template_path: Path, context: dict) -> bytes:
+	tpl = DocxTemplate(str(template_path))
+	tpl.render(context)
+	buf = BytesIO()
+	tpl.save(buf)
+	return buf.getvalue()
+
+
+async def _loop_lag(stop: asyncio.Event, lags: list[float]) -> None:
+	period = 0.01
+	while not stop.is_set():
+		started = time.perf_counter()
+		await asyncio.sleep(period)
+		lags.append(time.perf_counter() - started - period)
+
+
+async def _run(mode: str, template_path: Path, context: dict, bills: int, concurrency: int, workers: int) -> dict:
+	pool = DocxRenderPool(workers, max_queue=bills) if mode == "process" else None
+	if pool is not None:
+		# Прогрев процессов, чтобы не мерить их запуск
+		await asyncio.gather(*(pool.render(template_path, context) for _ in range(workers)))
+
+	async def render_one() -> bytes:
+		if mode == "legacy":
+			return await asyncio.to_thread(_legacy_render, template_path, context)
+		if mode == "thread":
+			return await asyncio.to_thread(render_docx_bytes, template_path, context)
+		return await pool.render(template_path, context)
+
+	gate = asyncio.Semaphore(concurrency)
+	latencies: list[float] = []
+
+	async def timed() -> None:
+		async with gate:
+			started = time.perf_counter()
+			await render_one()
+			latencies.append(time.perf_counter() - started)
+
+	stop = asyncio.Event()
+	lags: list[float] = []
+	ticker = asyncio.create_task(_loop_lag(stop, lags))
+	started = time.perf_counter()
+	await asyncio.gather(*(timed() for _ in range(bills)))
+	elapsed = time.perf_counter() - started
+	stop.set()
+	await ticker
+	if pool is not None:
+		pool.shutdown()
+
+	latencies.sort()
+	lags.sort()
+	return {
+		"p50_ms": statistics.median(latencies) * 1000,
+		"p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+		"rps": bills / elapsed,
+		"loop_lag_p99_ms": lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000 if lags else 0.0,
+	}
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--bills", type=int, default=200)
+	parser.add_argument("--concurrency", type=int, default=50)
+	parser.add_argument("--workers", type=int, default=4)
+	parser.add_argument("--items", type=int, default=30, help="позиций в счёте")
+	parser.add_argument("--modes", default="legacy,thread,process")
+	args = parser.parse_args()
+
+	template_path = resolve_docx_template_path(BILL_DOCX_FILENAME)
+	context = _sample_context(args.items)
+	print(f"template: {template_path.name}, bills: {args.bills}, concurrency: {args.concurrency}, workers: {args.workers}")
+	print(f"{'mode':8} {'p50 ms':>9} {'p99 ms':>9} {'bills/s':>9} {'loop lag p99 ms':>16}")
+	for mode in args.modes.split(","):
+		result = asyncio.run(_run(mode.strip(), template_path, context, args.bills, args.concurrency, args.workers))
+		print(
+			f"{mode:8} {result['p50_ms']:9.1f} {result['p99_ms']:9.1f} "
+			f"{result['rps']:9.1f} {result['loop_lag_p99_ms']:16.1f}"
+		)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк выбора получателей presence-событий чата.
+
+Сравнивает старый полный обход presence_connections (O(онлайн)) с обратным индексом
+chat_id -> {user_id} (O(участников чата)).
+
+	python scripts/bench_presence_fanout.py --users 10000 --chats-per-user 20 --events 2000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+from app.api.chats.websocket_manager import ChatWebSocketManager
+
+
+def _legacy_recipients(manager: ChatWebSocketManager, chat_id: int, exclude_user_id: int) -> list[int]:
+	"""Как было до индекса: проверка каждого онлайн-пользователя."""
+	recipients = []
+	for user_id in list(manager.presence_connections):
+		if user_id == exclude_user_id:
+			continue
+		if chat_id not in manager.user_presence_chat_ids.get(user_id, set()):
+			continue
+		recipients.append(user_id)
+	return recipients
+
+
+def _indexed_recipients(manager: ChatWebSocketManager, chat_id: int, exclude_user_id: int) -> list[int]:
+	return [
+		user_id
+		for user_id in manager.chat_presence_user_ids.get(chat_id, ())
+		if user_id != exclude_user_id and user_id in manager.presence_connections
+	]
+
+
+def _populate(manager: ChatWebSocketManager, users: int, chats: int, chats_per_user: int) -> None:
+	rng = random.Random(42)
+	for user_id in range(1, users + 1):
+		manager.presence_connections[user_id] = object()
+		manager._set_presence_chat_ids(user_id, set(rng.sample(range(1, chats + 1), chats_per_user)))
+
+
+def _bench(fn, manager: ChatWebSocketManager, events: list[tuple[int, int]]) -> tuple[float, int]:
+	delivered = 0
+	started = time.perf_counter()
+	for chat_id, sender in events:
+		delivered += len(fn(manager, chat_id, sender))
+	return time.perf_counter() - started, delivered
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--users", type=int, default=10_000)
+	parser.add_argument("--chats", type=int, default=50_000)
+	parser.add_argument("--chats-per-user", type=int, default=20)
+	parser.add_argument("--events", type=int, default=2_000)
+	args = parser.parse_args()
+
+	manager = ChatWebSocketManager()
+	_populate(manager, args.users, args.chats, args.chats_per_user)
+	rng = random.Random(7)
+	events = [(rng.randint(1, args.chats), rng.randint(1, args.users)) for _ in range(args.events)]
+
+	legacy_s, legacy_n = _bench(_legacy_recipients, manager, events)
+	indexed_s, indexed_n = _bench(_indexed_recipients, manager, events)
+	assert legacy_n == indexed_n, (legacy_n, indexed_n)
+
+	print(f"online users: {args.users}, events: {args.events}, deliveries: {indexed_n}")
+	print(f"full scan : {legacy_s * 1e6 / args.events:10.1f} us/event")
+	print(f"index     : {indexed_s * 1e6 / args.events:10.1f} us/event")
+	print(f"speedup   : {legacy_s / max(indexed_s, 1e-9):10.1f}x")
+
+
+if __name__ == "__main__":
+	main()
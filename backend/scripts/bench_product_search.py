@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска по каталогу (POST /products/search): задержки p50/p95 на PostgreSQL.
+
+С --seed N в products добавляется N синтетических товаров первой найденной компании
+(slug с префиксом bench-, удаляются через --cleanup), после чего выполняется ANALYZE.
+Затем каждый запрос из набора гоняется через ProductSearchService --runs раз.
+
+	python scripts/bench_product_search.py --seed 1000000
+	python scripts/bench_product_search.py --runs 50
+	python scripts/bench_product_search.py --cleanup
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import text
+
+import app.main  # noqa: F401 — регистрирует все модели
+from app.api.company.schemas.filters import ProductFilterRequest
+from app.api.products.services.search_service import ProductSearchService
+from app.db.base import AsyncSessionLocal, engine
+
+WORDS = [
+	"болт", "гайка", "шайба", "винт", "саморез", "анкер", "дюбель", "шуруп", "заклёпка", "шпилька",
+	"труба", "уголок", "швеллер", "арматура", "лист", "профиль", "кабель", "провод", "муфта", "фланец",
+	"оцинкованный", "нержавеющий", "стальной", "латунный", "медный", "усиленный", "монтажный", "крепёжный",
+]
+QUERIES = ["болт", "болты оцинкованные", "гайка м8", "нержавеющая труба", "кабел", "анкерный болт", "BN-1234", "шпилка"]
+
+SEED_SQL = """
+INSERT INTO products (
+	name, slug, description, article, type, price, images, characteristics,
+	is_hidden, is_deleted, unit_of_measurement, created_at, updated_at, company_id
+)
+SELECT
+	w1 || ' ' || w2 || ' М' || (g % 30 + 3),
+	'bench-' || g,
+	'Синтетический товар ' || g || ': ' || w2 || ' ' || w1 || ', ГОСТ ' || (7000 + g % 900),
+	'BN-' || g,
+	'GOOD', (g % 5000) + 1, '[]', '[]', false, false, 'шт', now(), now(), :company_id
+FROM (
+	SELECT g,
+		(CAST(:words AS text[]))[1 + (g * 7) % cardinality(CAST(:words AS text[]))] AS w1,
+		(CAST(:words AS text[]))[1 + (g * 13) % cardinality(CAST(:words AS text[]))] AS w2
+	FROM generate_series(:start, :stop) AS g
+) s
+"""
+
+
+async def _seed(count: int, batch: int) -> None:
+	async with AsyncSessionLocal() as session:
+		company_id = (await session.execute(text("SELECT id FROM companies ORDER BY id LIMIT 1"))).scalar()
+		if company_id is None:
+			raise SystemExit("Нет ни одной компании — сначала создайте тестовые данные")
+		offset = (await session.execute(text("SELECT count(*) FROM products WHERE slug LIKE 'bench-%'"))).scalar()
+		for start in range(offset + 1, offset + count + 1, batch):
+			stop = min(start + batch - 1, offset + count)
+			await session.execute(
+				text(SEED_SQL), {"company_id": company_id, "words": WORDS, "start": start, "stop": stop}
+			)
+			await session.commit()
+			print(f"seeded {stop - offset}/{count}")
+		await session.execute(text("ANALYZE products"))
+		await session.commit()
+
+
+async def _cleanup() -> None:
+	async with AsyncSessionLocal() as session:
+		await session.execute(text("DELETE FROM products WHERE slug LIKE 'bench-%'"))
+		await session.commit()
+
+
+async def _bench(runs: int, limit: int) -> None:
+	print(f"{'query':24} {'total':>9} {'p50 ms':>9} {'p95 ms':>9}")
+	all_latencies: list[float] = []
+	for query in QUERIES:
+		latencies: list[float] = []
+		total = 0
+		for _ in range(runs):
+			async with AsyncSessionLocal() as session:
+				service = ProductSearchService(session)
+				started = time.perf_counter()
+				result = await service.search_products(ProductFilterRequest(search=query, skip=0, limit=limit))
+				latencies.append(time.perf_counter() - started)
+				total = result.total
+		latencies.sort()
+		all_latencies.extend(latencies)
+		p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+		print(f"{query:24} {total:9} {statistics.median(latencies) * 1000:9.1f} {p95 * 1000:9.1f}")
+	all_latencies.sort()
+	print(f"overall p95: {all_latencies[min(len(all_latencies) - 1, int(len(all_latencies) * 0.95))] * 1000:.1f} ms")
+
+
+async def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--seed", type=int, default=0, help="добавить N синтетических товаров")
+	parser.add_argument("--batch", type=int, default=50_000)
+	parser.add_argument("--runs", type=int, default=30)
+	parser.add_argument("--limit", type=int, default=20)
+	parser.add_argument("--cleanup", action="store_true", help="удалить синтетические товары и выйти")
+	args = parser.parse_args()
+
+	if engine.dialect.name != "postgresql":
+		raise SystemExit("Бенчмарк рассчитан на PostgreSQL (tsvector/pg_trgm)")
+	if args.cleanup:
+		await _cleanup()
+		return
+	if args.seed:
+		await _seed(args.seed, args.batch)
+	await _bench(args.runs, args.limit)
+
+
+if __name__ == "__main__":
+	asyncio.run(main())
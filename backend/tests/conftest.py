@@ -49,3 +49,31 @@ async def async_client():
 	transport = ASGITransport(app=app)
 	async with AsyncClient(transport=transport, base_url="http://testserver") as client:
 		yield client
+
+
+class FakeRedis:
+	"""Общий для «воркеров» Redis: значения и сроки жизни ключей."""
+
+	def __init__(self):
+		self.values: dict = {}
+		self.ttls: dict = {}
+
+	async def get(self, key):
+		return self.values.get(key)
+
+	async def set(self, key, value, ex=None, nx=False):
+		if nx and key in self.values:
+			return None
+		self.values[key] = value
+		self.ttls[key] = ex
+		return True
+
+
+@pytest.fixture
+def shared_redis(monkeypatch):
+	"""Подменить клиент redis_cache на FakeRedis — общий L2 для нескольких SharedCache."""
+	from app.core.cache import redis_cache
+
+	fake = FakeRedis()
+	monkeypatch.setattr(redis_cache, "redis_client", fake)
+	return fake
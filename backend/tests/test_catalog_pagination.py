@@ -0,0 +1,149 @@
+"""Keyset-пагинация каталога и кэшированный total."""
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from app.api.company.models.company import BusinessType, Company, TradeActivity
+from app.api.products.models.product import Product, ProductType
+from app.api.products.services.full_text_search import ProductTextSearch
+from app.core import pagination
+from app.core.pagination import InvalidCursorError, decode_cursor, encode_cursor
+from app.db.base import AsyncSessionLocal
+from app.main import app
+
+
+def test_cursor_roundtrip_keeps_datetime_and_id():
+	created = datetime(2026, 1, 2, 3, 4, 5, 678000)
+	cursor = encode_cursor((created, 42))
+	assert decode_cursor(cursor, 2) == [created, 42]
+
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", encode_cursor((1, 2, 3))])
+def test_invalid_cursor_rejected(cursor):
+	with pytest.raises(InvalidCursorError):
+		decode_cursor(cursor, 2)
+
+
+@pytest.fixture
+async def company_with_goods():
+	suffix = uuid4().hex[:8]
+	seed = 7300000000 + int(suffix[:4], 16) % 80000000
+	started = datetime(2026, 3, 1, 12, 0, 0)
+	async with AsyncSessionLocal() as session:
+		company = Company(
+			name=f"Page Co {suffix}",
+			slug=f"page-co-{suffix}",
+			type="ООО",
+			trade_activity=TradeActivity.SELLER,
+			business_type=BusinessType.GOODS,
+			activity_type="Торговля",
+			description="Тест",
+			inn=f"{seed:010d}",
+			ogrn=f"{seed:013d}",
+			kpp=f"{(seed % 10**9):09d}",
+			country="Россия",
+			federal_district="ЦФО",
+			region="Москва",
+			city="Москва",
+			full_name=f"ООО Page {suffix}",
+			registration_date=datetime.utcnow(),
+			legal_address="ул. Тест, 1",
+			production_address="ул. Тест, 2",
+			phone="+79000000001",
+			email=f"page-{suffix}@example.com",
+			website="https://example.com",
+			is_active=True,
+		)
+		session.add(company)
+		await session.flush()
+		for i in range(5):
+			session.add(
+				Product(
+					name=f"Товар {i}",
+					slug=f"page-{suffix}-{i}",
+					article=f"PG-{suffix}-{i}",
+					type=ProductType.GOOD,
+					price=10.0 + i,
+					images=[],
+					characteristics=[],
+					unit_of_measurement="шт",
+					company_id=company.id,
+					# два товара с одинаковым created_at — порядок добирается по id
+					created_at=started + timedelta(minutes=min(i, 3)),
+				)
+			)
+		await session.commit()
+		data = {"company_id": company.id, "slug": company.slug}
+	yield data
+	async with AsyncSessionLocal() as session:
+		await session.execute(delete(Product).where(Product.company_id == data["company_id"]))
+		await session.execute(delete(Company).where(Company.id == data["company_id"]))
+		await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_company_products_keyset_pages_cover_all_rows(company_with_goods):
+	transport = ASGITransport(app=app)
+	async with AsyncClient(transport=transport, base_url="http://testserver") as client:
+		url = f"/api/v1/products/company/{company_with_goods['slug']}"
+		first = await client.get(url, params={"limit": 2})
+		assert first.status_code == 200, first.text
+		body = first.json()
+		assert body["total"] == 5
+		assert body["next_cursor"]
+
+		names = [p["name"] for p in body["products"]]
+		cursor = body["next_cursor"]
+		while cursor:
+			r = await client.get(url, params={"limit": 2, "cursor": cursor})
+			assert r.status_code == 200, r.text
+			names.extend(p["name"] for p in r.json()["products"])
+			cursor = r.json()["next_cursor"]
+		assert names == ["Товар 4", "Товар 3", "Товар 2", "Товар 1", "Товар 0"]
+
+		# Старые клиенты со skip получают те же страницы
+		offset_page = await client.get(url, params={"limit": 2, "skip": 2})
+		assert [p["name"] for p in offset_page.json()["products"]] == ["Товар 2", "Товар 1"]
+
+		# Повторный запрос — total из кэша; exact_total — точный подсчёт
+		cached = await client.get(url, params={"limit": 2})
+		assert cached.json()["total_is_estimate"] is True
+		exact = await client.get(url, params={"limit": 2, "exact_total": True})
+		assert exact.json()["total"] == 5
+		assert exact.json()["total_is_estimate"] is False
+
+		bad = await client.get(url, params={"cursor": "garbage"})
+		assert bad.status_code == 400
+
+
+class _PlannerSession:
+	"""Сессия PostgreSQL без БД: компилирует оператор диалектом asyncpg и отдаёт план."""
+
+	def __init__(self, plan_rows: int):
+		self.bind = type("Bind", (), {"dialect": asyncpg.dialect()})()
+		self.plan_rows = plan_rows
+		self.compiled = []
+
+	async def execute(self, statement):
+		self.compiled.append(statement.compile(dialect=self.bind.dialect))
+		plan = [{"Plan": {"Plan Rows": self.plan_rows}}]
+		return type("Result", (), {"scalar": lambda _: plan})()
+
+
+@pytest.mark.asyncio
+async def test_planner_estimate_compiles_full_text_search_count():
+	search = ProductTextSearch("болт м8", full_text=True)
+	rows_query = select(Product.id).where(Product.is_deleted == False, search.condition())
+	session = _PlannerSession(plan_rows=250000)
+
+	assert await pagination._planner_estimate(session, rows_query) == 250000
+	compiled = session.compiled[0]
+	# REGCONFIG и поисковая строка идут параметрами, а не литералами в тексте
+	assert str(compiled).startswith("EXPLAIN (FORMAT JSON) SELECT products.id")
+	assert "болт" not in str(compiled)
+	assert "russian" in compiled.params.values()
+	assert "болт м8" in compiled.params.values()
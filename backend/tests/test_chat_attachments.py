@@ -0,0 +1,47 @@
+"""Потоковое сохранение вложений чата: лимит размера и дедупликация по хэшу."""
+import io
+import os
+
+import pytest
+
+from app.api.chats.services import attachments
+from app.api.chats.services.attachments import AttachmentTooLargeError, store_chat_attachment
+
+
+class FakeUpload:
+	def __init__(self, data: bytes, filename: str = "doc.pdf", content_type: str = "application/pdf"):
+		self._buf = io.BytesIO(data)
+		self.filename = filename
+		self.content_type = content_type
+
+	async def read(self, size: int = -1) -> bytes:
+		return self._buf.read(size)
+
+
+@pytest.fixture
+def chat_files_dir(tmp_path, monkeypatch):
+	target = tmp_path / "chat_files"
+	monkeypatch.setattr(attachments, "CHAT_FILES_DIR", str(target))
+	monkeypatch.setattr(attachments.settings, "CHAT_FILES_STORAGE", "local")
+	return target
+
+
+@pytest.mark.asyncio
+async def test_same_content_stored_once(chat_files_dir):
+	data = b"%PDF-1.4 " + os.urandom(3 * attachments.CHUNK_SIZE // 2)
+	first = await store_chat_attachment(FakeUpload(data))
+	second = await store_chat_attachment(FakeUpload(data, filename="copy.PDF"))
+
+	assert first.file_path == second.file_path
+	assert first.file_size == len(data)
+	assert first.file_path.endswith(".pdf")
+	stored = [f for _, _, files in os.walk(chat_files_dir) for f in files]
+	assert len(stored) == 1
+
+
+@pytest.mark.asyncio
+async def test_size_limit_enforced_while_streaming(chat_files_dir):
+	with pytest.raises(AttachmentTooLargeError):
+		await store_chat_attachment(FakeUpload(b"x" * 2048), max_bytes=1024)
+	leftovers = [f for _, _, files in os.walk(chat_files_dir) for f in files]
+	assert leftovers == []
@@ -0,0 +1,93 @@
+"""Рассылка событий чата между воркерами через backplane (in-memory stand-in для Redis)."""
+import asyncio
+import json
+
+import pytest
+
+from app.api.chats.backplane import InMemoryBackplane, InMemoryBackplaneHub
+from app.api.chats.websocket_manager import ChatWebSocketManager
+
+
+class FakeWebSocket:
+	def __init__(self):
+		self.sent: list[dict] = []
+
+	async def accept(self):
+		return None
+
+	async def close(self):
+		return None
+
+	async def send_text(self, data: str):
+		self.sent.append(json.loads(data))
+
+
+def _types(ws: FakeWebSocket) -> list[str]:
+	return [m["type"] for m in ws.sent]
+
+
+async def _two_workers():
+	hub = InMemoryBackplaneHub()
+	worker_a = ChatWebSocketManager()
+	worker_b = ChatWebSocketManager()
+	await worker_a.start(InMemoryBackplane(hub, worker_id="a"))
+	await worker_b.start(InMemoryBackplane(hub, worker_id="b"))
+	return worker_a, worker_b
+
+
+@pytest.mark.asyncio
+async def test_message_reaches_socket_on_other_worker():
+	worker_a, worker_b = await _two_workers()
+	reader_ws = FakeWebSocket()
+	await worker_b.connect(reader_ws, chat_id=7, user_id=2)
+
+	await worker_a.send_message_to_chat(7, {"id": 1, "content": "hi"}, sender_user_id=1)
+	await worker_b.flush()
+
+	new_messages = [m for m in reader_ws.sent if m["type"] == "new_message"]
+	assert len(new_messages) == 1
+	assert new_messages[0]["message"]["content"] == "hi"
+
+
+@pytest.mark.asyncio
+async def test_typing_and_read_events_cross_workers():
+	worker_a, worker_b = await _two_workers()
+	chat_ws = FakeWebSocket()
+	presence_ws = FakeWebSocket()
+	await worker_b.connect(chat_ws, chat_id=7, user_id=2)
+	await worker_b.connect_presence(presence_ws, user_id=3, chat_ids={7})
+
+	await worker_a.send_typing_indicator(7, user_id=1, is_typing=True)
+	await worker_a.send_messages_read(7, [10, 11], reader_user_id=1)
+	await worker_b.flush()
+
+	assert "typing_indicator" in _types(chat_ws)
+	assert "messages_read" in _types(chat_ws)
+	# typing уходит только в WS чата, messages_read — и в presence
+	assert "typing_indicator" not in _types(presence_ws)
+	assert "messages_read" in _types(presence_ws)
+
+
+@pytest.mark.asyncio
+async def test_presence_is_cluster_wide():
+	worker_a, worker_b = await _two_workers()
+	watcher_ws = FakeWebSocket()
+	await worker_a.connect_presence(watcher_ws, user_id=1, chat_ids={7})
+
+	await worker_b.connect_presence(FakeWebSocket(), user_id=2, chat_ids={7})
+	await worker_a.flush()
+	assert "user_online" in _types(watcher_ws)
+	assert await worker_a.get_online_users_in_chat(7, {1, 2, 3}) == {1, 2}
+
+	# второй сокет того же пользователя на другом воркере — повторного user_online нет
+	watcher_ws.sent.clear()
+	await worker_a.connect(FakeWebSocket(), chat_id=7, user_id=2)
+	await worker_a.flush()
+	assert "user_online" not in _types(watcher_ws)
+
+	# ушёл с воркера b, но ещё в чате на воркере a — офлайн не объявляется
+	worker_b.disconnect_presence(2)
+	await asyncio.sleep(0.01)
+	await worker_a.flush()
+	assert "user_offline" not in _types(watcher_ws)
+	assert await worker_b.get_online_users_in_chat(7, {2}) == {2}
@@ -0,0 +1,151 @@
+"""Курсор истории сообщений чата и эндпоинт /chats/{chat_id}/history."""
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import delete
+
+from app.api.authentication.dependencies import get_current_user
+from app.api.authentication.models.user import User
+from app.api.chats.models.chat import Chat
+from app.api.chats.models.chat_participant import ChatParticipant
+from app.api.chats.services.message_history import decode_history_cursor, encode_history_cursor
+from app.api.company.models.company import BusinessType, Company, TradeActivity
+from app.api.messages.models.message import Message
+from app.db.base import AsyncSessionLocal
+from app.main import app
+
+MESSAGES = 5
+
+
+def test_history_cursor_roundtrip_is_opaque():
+	cursor = encode_history_cursor(12345)
+	assert "12345" not in cursor
+	assert decode_history_cursor(cursor) == 12345
+
+
+@pytest.mark.parametrize("bad", ["", "abc", "!!!", encode_history_cursor(1)[:-2] + "zz"])
+def test_history_cursor_rejects_garbage(bad):
+	with pytest.raises(ValueError):
+		decode_history_cursor(bad)
+
+
+def _company(tag: str, index: int, seed: int) -> Company:
+	return Company(
+		name=f"History {index} {tag}",
+		slug=f"history-{index}-{tag}",
+		type="ООО",
+		trade_activity=TradeActivity.SELLER,
+		business_type=BusinessType.SERVICES,
+		activity_type="Торговля",
+		description="Тест",
+		inn=f"{seed:010d}",
+		ogrn=f"{seed:013d}",
+		kpp=f"{seed % 10**9:09d}",
+		country="Россия",
+		federal_district="ЦФО",
+		region="Москва",
+		city="Москва",
+		full_name=f"ООО History {index} {tag}",
+		registration_date=datetime.utcnow(),
+		legal_address="ул. Тест, 1",
+		production_address="ул. Тест, 2",
+		phone="+79000000001",
+		email=f"history-{index}-{tag}@example.com",
+		website="https://example.com",
+		is_active=True,
+	)
+
+
+@pytest.fixture
+async def chat_history():
+	"""Чат участника с MESSAGES сообщениями и пользователь чужой компании."""
+	tag = uuid4().hex[:8]
+	seed = 7900000000 + int(tag[:4], 16) % 80000000
+	async with AsyncSessionLocal() as session:
+		member_company, outsider_company = _company(tag, 0, seed), _company(tag, 1, seed + 1)
+		session.add_all([member_company, outsider_company])
+		await session.flush()
+		member, outsider = (
+			User(
+				email=f"history-{i}-{tag}@test.local", phone="+79001111111", first_name="History",
+				last_name="Test", hashed_password="x", company_id=company.id, is_active=True,
+			)
+			for i, company in enumerate((member_company, outsider_company))
+		)
+		chat = Chat(title=f"History {tag}")
+		session.add_all([member, outsider, chat])
+		await session.flush()
+		session.add(ChatParticipant(chat_id=chat.id, company_id=member_company.id, user_id=member.id))
+		messages = [
+			Message(
+				chat_id=chat.id, sender_company_id=member_company.id, sender_user_id=member.id,
+				content=f"message {i}",
+			)
+			for i in range(MESSAGES)
+		]
+		session.add_all(messages)
+		await session.commit()
+		state = {
+			"chat": chat.id,
+			"companies": [member_company.id, outsider_company.id],
+			"users": {"member": member.id, "outsider": outsider.id},
+			"messages": [message.id for message in messages],
+			"user": member.id,
+		}
+
+	async def _current_user():
+		async with AsyncSessionLocal() as session:
+			return await session.get(User, state["user"])
+
+	app.dependency_overrides[get_current_user] = _current_user
+	yield state
+	app.dependency_overrides.pop(get_current_user, None)
+	async with AsyncSessionLocal() as session:
+		await session.execute(delete(Message).where(Message.chat_id == state["chat"]))
+		await session.execute(delete(ChatParticipant).where(ChatParticipant.chat_id == state["chat"]))
+		await session.execute(delete(Chat).where(Chat.id == state["chat"]))
+		await session.execute(delete(User).where(User.id.in_(state["users"].values())))
+		await session.execute(delete(Company).where(Company.id.in_(state["companies"])))
+		await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_history_pages_walk_back_to_first_message(chat_history):
+	url = f"/api/v1/chats/{chat_history['chat']}/history"
+	pages = []
+	async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+		params = {"limit": 2}
+		while True:
+			response = await client.get(url, params=params)
+			assert response.status_code == 200, response.text
+			body = response.json()
+			pages.append(body)
+			if not body["has_more"]:
+				break
+			params["cursor"] = body["next_cursor"]
+
+	ids = chat_history["messages"]
+	# Каждая страница — от старых к новым, страницы идут от новых к старым
+	assert [[item["id"] for item in page["items"]] for page in pages] == [ids[3:5], ids[1:3], ids[0:1]]
+	assert [page["has_more"] for page in pages] == [True, True, False]
+	assert pages[-1]["next_cursor"] is None
+	assert pages[0]["items"][-1]["content"] == f"message {MESSAGES - 1}"
+
+
+@pytest.mark.asyncio
+async def test_history_rejects_non_member(chat_history):
+	chat_history["user"] = chat_history["users"]["outsider"]
+	async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+		response = await client.get(f"/api/v1/chats/{chat_history['chat']}/history")
+	assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_history_rejects_invalid_cursor(chat_history):
+	async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+		response = await client.get(
+			f"/api/v1/chats/{chat_history['chat']}/history", params={"cursor": "not-a-cursor"}
+		)
+	assert response.status_code == 400
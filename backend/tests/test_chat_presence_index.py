@@ -0,0 +1,81 @@
+"""Обратный индекс chat_id -> presence-пользователи в ChatWebSocketManager."""
+import json
+
+import pytest
+
+from app.api.chats.websocket_manager import ChatWebSocketManager
+
+
+class FakeWebSocket:
+	def __init__(self):
+		self.sent: list[dict] = []
+
+	async def accept(self):
+		return None
+
+	async def close(self):
+		return None
+
+	async def send_text(self, data: str):
+		self.sent.append(json.loads(data))
+
+
+@pytest.mark.asyncio
+async def test_index_follows_connect_update_disconnect():
+	manager = ChatWebSocketManager()
+	await manager.connect_presence(FakeWebSocket(), user_id=1, chat_ids={10, 11})
+	await manager.connect_presence(FakeWebSocket(), user_id=2, chat_ids={11})
+	assert manager.chat_presence_user_ids == {10: {1}, 11: {1, 2}}
+
+	manager.update_presence_chat_ids(1, {11, 12})
+	assert manager.chat_presence_user_ids == {11: {1, 2}, 12: {1}}
+
+	manager.disconnect_presence(2)
+	assert manager.chat_presence_user_ids == {11: {1}, 12: {1}}
+
+
+@pytest.mark.asyncio
+async def test_presence_event_goes_only_to_chat_subscribers():
+	manager = ChatWebSocketManager()
+	member = FakeWebSocket()
+	outsider = FakeWebSocket()
+	await manager.connect_presence(member, user_id=1, chat_ids={10})
+	await manager.connect_presence(outsider, user_id=2, chat_ids={20})
+	await manager.flush()
+	member.sent.clear()
+	outsider.sent.clear()
+
+	await manager.send_messages_read(10, [5], reader_user_id=3)
+	await manager.flush()
+
+	assert [m["type"] for m in member.sent] == ["messages_read"]
+	assert outsider.sent == []
+
+
+@pytest.mark.asyncio
+async def test_participant_added_updates_user_and_company_colleagues():
+	manager = ChatWebSocketManager()
+	await manager.connect_presence(FakeWebSocket(), user_id=1, chat_ids={10}, company_id=100)
+	await manager.connect_presence(FakeWebSocket(), user_id=2, chat_ids=set(), company_id=100)
+	await manager.connect_presence(FakeWebSocket(), user_id=3, chat_ids=set(), company_id=200)
+
+	await manager.on_participant_added(55, company_id=100, user_id=1)
+
+	assert manager.user_presence_chat_ids[1] == {10, 55}
+	assert manager.user_presence_chat_ids[2] == {55}
+	assert manager.user_presence_chat_ids[3] == set()
+	assert manager.chat_presence_user_ids[55] == {1, 2}
+
+
+@pytest.mark.asyncio
+async def test_ping_resync_only_when_stale():
+	manager = ChatWebSocketManager()
+	await manager.connect_presence(FakeWebSocket(), user_id=1, chat_ids={10}, company_id=100)
+	assert not manager.presence_needs_resync(1, max_age_seconds=600)
+
+	await manager.mark_presence_stale(1)
+	assert manager.presence_needs_resync(1, max_age_seconds=600)
+
+	manager.update_presence_chat_ids(1, {10, 11}, company_id=300)
+	assert not manager.presence_needs_resync(1, max_age_seconds=600)
+	assert manager.company_presence_user_ids == {300: {1}}
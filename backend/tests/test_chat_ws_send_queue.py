@@ -0,0 +1,71 @@
+"""Исходящие очереди WS чата: рассылка не ждёт медленных клиентов, политика переполнения."""
+import asyncio
+import json
+
+import pytest
+
+from app.api.chats.websocket_manager import ChatWebSocketManager
+
+
+class FakeWebSocket:
+	def __init__(self, delay: float = 0.0):
+		self.delay = delay
+		self.sent: list[dict] = []
+		self.closed = False
+		self.gate: asyncio.Event | None = None
+
+	async def accept(self):
+		return None
+
+	async def close(self):
+		self.closed = True
+
+	async def send_text(self, data: str):
+		if self.gate is not None:
+			await self.gate.wait()
+		if self.delay:
+			await asyncio.sleep(self.delay)
+		self.sent.append(json.loads(data))
+
+
+@pytest.mark.asyncio
+async def test_broadcast_does_not_wait_for_slow_socket():
+	manager = ChatWebSocketManager()
+	slow = FakeWebSocket(delay=5)
+	fast = FakeWebSocket()
+	await manager.connect(slow, chat_id=1, user_id=10)
+	await manager.connect(fast, chat_id=1, user_id=11)
+
+	await asyncio.wait_for(
+		manager.send_message_to_chat(1, {"id": 1, "content": "x"}, sender_user_id=99),
+		timeout=1,
+	)
+	await asyncio.sleep(0.05)
+	assert "new_message" in [m["type"] for m in fast.sent]
+	assert "new_message" not in [m["type"] for m in slow.sent]
+	assert manager.metrics_snapshot()["queued_total"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_typing_dropped_first_then_slow_consumer_disconnected():
+	manager = ChatWebSocketManager(send_queue_size=3)
+	stuck = FakeWebSocket()
+	await manager.connect(stuck, chat_id=1, user_id=10)
+	await manager.flush()
+	stuck.gate = asyncio.Event()
+
+	# писатель зависает на первом сообщении, очередь заполняется typing-событиями
+	await manager.send_message_to_chat(1, {"id": 1}, sender_user_id=99)
+	await asyncio.sleep(0)
+	for _ in range(5):
+		await manager.send_typing_indicator(1, user_id=99, is_typing=True)
+	assert manager.metrics.dropped >= 2
+	assert 10 in manager.chat_connections.get(1, {})
+
+	# важные сообщения вытесняют typing, пока они есть, затем клиент отключается
+	for message_id in range(2, 7):
+		await manager.send_message_to_chat(1, {"id": message_id}, sender_user_id=99)
+	await asyncio.sleep(0)
+	assert manager.metrics.slow_disconnects == 1
+	assert 10 not in manager.chat_connections.get(1, {})
+	assert stuck.closed
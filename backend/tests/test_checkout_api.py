@@ -15,7 +15,7 @@ from app.api.authentication.models.user import User
 from app.api.company.models.company import Company, TradeActivity, BusinessType
 from app.api.messages.models.message import Message
 from app.api.products.models.product import Product, ProductType
-from app.api.purchases.models import Order, OrderType
+from app.api.purchases.models import Order, OrderItem, OrderType
 
 
 def _company_payload(suffix: str, inn_seed: int) -> dict:
@@ -326,3 +326,83 @@ async def test_checkout_resolves_seller_from_product_slug(
     data = response.json()
     assert len(data["deals"]) == 2
     assert {d["deal_type"] for d in data["deals"]} == {"Товары", "Услуги"}
+
+
+@pytest.mark.asyncio
+async def test_checkout_large_cart_resolves_articles_in_bulk(
+    client: AsyncClient, checkout_context: dict
+):
+    """Большая корзина: каталожные позиции по article, ручные — как есть, номера заказов подряд."""
+    unique = uuid4().hex[:8]
+    seller_id = checkout_context["seller_company_id"]
+    goods = [
+        Product(
+            name=f"Товар {i}",
+            slug=f"bulk-good-{unique}-{i}",
+            article=f"BULK-{unique}-{i}",
+            type=ProductType.GOOD,
+            price=10.0 + i,
+            unit_of_measurement="шт",
+            company_id=seller_id,
+        )
+        for i in range(40)
+    ]
+    async with AsyncSessionLocal() as session:
+        session.add_all(goods)
+        await session.commit()
+
+    items = [
+        {
+            "slug": f"bulk-good-{unique}-{i}",
+            "description": "",
+            "logoUrl": None,
+            "article": f"BULK-{unique}-{i}",
+            "productName": f"Товар {i}",
+            "productType": "Товар",
+            "quantity": 2,
+            "units": "шт",
+            "price": 1.0,
+            "amount": 2.0,
+            "companyId": seller_id,
+        }
+        for i in range(40)
+    ]
+    items.append(
+        _checkout_item(
+            company_id=seller_id,
+            company_name=checkout_context["seller_name"],
+            company_slug=checkout_context["seller_slug"],
+            product_name="Ручная услуга",
+            product_type="Услуга",
+            slug=f"manual-{unique}",
+        )
+    )
+
+    response = await client.post("/api/v1/purchases/checkout", json={"items": items})
+    assert response.status_code == 200, response.text
+    deals = {deal["deal_type"]: deal for deal in response.json()["deals"]}
+    assert set(deals) == {"Товары", "Услуги"}
+
+    goods_deal = deals["Товары"]
+    # SQLite в тестах не каскадирует удаление — берём только свои позиции
+    goods_items = [
+        item for item in goods_deal["items"]
+        if (item.get("product_article") or "").startswith(f"BULK-{unique}-")
+    ]
+    assert len(goods_items) == 40
+    # Цена берётся из каталога, а не из корзины
+    assert goods_deal["total_amount_excl_vat"] == sum(2 * (10.0 + i) for i in range(40))
+    assert sorted(item["position"] for item in goods_items) == list(range(1, 41))
+    assert any(item.get("product_slug") == f"manual-{unique}" for item in deals["Услуги"]["items"])
+
+    numbers = sorted(int(deal["buyer_order_number"]) for deal in deals.values())
+    assert numbers[1] == numbers[0] + 1
+    assert deals["Товары"]["id"] != deals["Услуги"]["id"]
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(OrderItem).where(OrderItem.order_row_id.in_(
+            select(Order.row_id).where(Order.buyer_company_id == checkout_context["buyer_company_id"])
+        )))
+        await session.execute(delete(Order).where(Order.buyer_company_id == checkout_context["buyer_company_id"]))
+        await session.execute(delete(Product).where(Product.slug.like(f"bulk-good-{unique}-%")))
+        await session.commit()
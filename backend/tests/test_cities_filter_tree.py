@@ -0,0 +1,212 @@
+"""Дерево фильтра городов: построение за один проход, снапшоты с ETag, пересборка по изменениям."""
+import asyncio
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import delete
+
+from app.api.admin.locations import GazetteerInvalidationMixin
+from app.api.common.models import City, Country, FederalDistrict, Region
+from app.api.common.services.cities_filter_service import CitiesFilterService
+from app.api.common.services.location_tree_snapshots import (
+	LOCATION_TREE_KINDS,
+	mark_location_trees_dirty,
+	refresh_dirty_location_trees,
+)
+from app.api.common.tasks import refresh_location_trees_task
+from app.api.company.models.company import BusinessType, Company, TradeActivity
+from app.api.products.models.product import Product, ProductType
+from app.db.base import AsyncSessionLocal
+from app.main import app
+
+
+def _city(city_id, name, region_id, fd_id, country_id, count):
+	return {
+		"id": city_id,
+		"name": name,
+		"region_id": region_id,
+		"region_name": f"Регион {region_id}",
+		"region_code": f"R{region_id}",
+		"federal_district_id": fd_id,
+		"federal_district_name": f"Округ {fd_id}",
+		"federal_district_code": f"F{fd_id}",
+		"country_id": country_id,
+		"country_name": f"Страна {country_id}",
+		"country_code": f"C{country_id}",
+		"products_count": count,
+	}
+
+
+def test_tree_groups_cities_and_sums_counts():
+	cities = [
+		_city(1, "Б-город", 10, 100, 1000, 2),
+		_city(2, "А-город", 10, 100, 1000, 3),
+		_city(3, "В-город", 11, 100, 1000, 1),
+		_city(4, "Г-город", 20, 200, 2000, 5),
+	]
+	tree = CitiesFilterService._build_tree_from_cities_data({c["id"]: c for c in cities})
+
+	assert [country["name"] for country in tree] == ["Страна 1000", "Страна 2000"]
+	first = tree[0]
+	assert first["products_count"] == 6
+	assert len(first["federal_districts"]) == 1
+	regions = first["federal_districts"][0]["regions"]
+	assert [(r["id"], r["products_count"]) for r in regions] == [(10, 5), (11, 1)]
+	assert [c["name"] for c in regions[0]["cities"]] == ["А-город", "Б-город"]
+	assert CitiesFilterService._build_tree_from_cities_data({}) == []
+
+
+@pytest.fixture
+async def city_with_goods():
+	tag = uuid4().hex[:8]
+	seed = 7700000000 + int(tag[:4], 16) % 80000000
+	async with AsyncSessionLocal() as session:
+		country = Country(code=f"T{tag[:4]}", name=f"Страна {tag}", is_active=True)
+		session.add(country)
+		await session.flush()
+		fd = FederalDistrict(country_id=country.id, name=f"Округ {tag}", code=f"FD{tag}", is_active=True)
+		session.add(fd)
+		await session.flush()
+		region = Region(country_id=country.id, federal_district_id=fd.id, name=f"Регион {tag}", code=f"RG{tag}", is_active=True)
+		session.add(region)
+		await session.flush()
+		city = City(country_id=country.id, region_id=region.id, federal_district_id=fd.id, name=f"Город {tag}", is_active=True)
+		session.add(city)
+		await session.flush()
+		company = Company(
+			name=f"Tree Co {tag}",
+			slug=f"tree-co-{tag}",
+			type="ООО",
+			trade_activity=TradeActivity.SELLER,
+			business_type=BusinessType.GOODS,
+			activity_type="Торговля",
+			description="Тест",
+			inn=f"{seed:010d}",
+			ogrn=f"{seed:013d}",
+			kpp=f"{(seed % 10**9):09d}",
+			country=country.name,
+			federal_district=fd.name,
+			region=region.name,
+			city=city.name,
+			city_id=city.id,
+			full_name=f"ООО Tree {tag}",
+			registration_date=datetime.utcnow(),
+			legal_address="ул. Тест, 1",
+			production_address="ул. Тест, 2",
+			phone="+79000000001",
+			email=f"tree-{tag}@example.com",
+			website="https://example.com",
+			is_active=True,
+		)
+		session.add(company)
+		await session.flush()
+		session.add(
+			Product(
+				name=f"Товар {tag}",
+				slug=f"tree-{tag}",
+				article=f"T-{tag}",
+				type=ProductType.GOOD,
+				price=1.0,
+				images=[],
+				characteristics=[],
+				unit_of_measurement="шт",
+				company_id=company.id,
+			)
+		)
+		await session.commit()
+		ids = {"tag": tag, "country": country.id, "fd": fd.id, "region": region.id, "city": city.id, "company": company.id}
+	await mark_location_trees_dirty()
+	await refresh_dirty_location_trees()
+	yield ids
+	async with AsyncSessionLocal() as session:
+		await session.execute(delete(Product).where(Product.company_id == ids["company"]))
+		await session.execute(delete(Company).where(Company.id == ids["company"]))
+		await session.execute(delete(City).where(City.id == ids["city"]))
+		await session.execute(delete(Region).where(Region.id == ids["region"]))
+		await session.execute(delete(FederalDistrict).where(FederalDistrict.id == ids["fd"]))
+		await session.execute(delete(Country).where(Country.id == ids["country"]))
+		await session.commit()
+	await mark_location_trees_dirty()
+
+
+def _find_city(body: dict, city_id: int):
+	for country in body["countries"]:
+		for fd in country["federal_districts"]:
+			for region in fd["regions"]:
+				for city in region["cities"]:
+					if city["id"] == city_id:
+						return city
+	return None
+
+
+def _city_count(body: dict, city_id: int):
+	city = _find_city(body, city_id)
+	return city["products_count"] if city else None
+
+
+@pytest.mark.asyncio
+async def test_products_tree_served_with_etag_and_refreshed_on_change(city_with_goods):
+	transport = ASGITransport(app=app)
+	async with AsyncClient(transport=transport, base_url="http://testserver") as client:
+		r = await client.get("/api/v1/cities-filter/products")
+		assert r.status_code == 200, r.text
+		etag = r.headers["etag"]
+		assert _city_count(r.json(), city_with_goods["city"]) == 1
+
+		r = await client.get("/api/v1/cities-filter/products", headers={"If-None-Match": etag})
+		assert r.status_code == 304
+		assert r.content == b""
+
+		async with AsyncSessionLocal() as session:
+			session.add(
+				Product(
+					name="ещё товар",
+					slug=f"tree-{city_with_goods['tag']}-2",
+					article="T-2",
+					type=ProductType.GOOD,
+					price=2.0,
+					images=[],
+					characteristics=[],
+					unit_of_measurement="шт",
+					company_id=city_with_goods["company"],
+				)
+			)
+			await session.commit()
+		await mark_location_trees_dirty(["products"])
+		assert await refresh_dirty_location_trees() == ["products"]
+
+		r = await client.get("/api/v1/cities-filter/products", headers={"If-None-Match": etag})
+		assert r.status_code == 200
+		assert r.headers["etag"] != etag
+		assert _city_count(r.json(), city_with_goods["city"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_city_rename_in_admin_marks_trees_dirty(city_with_goods):
+	city_id = city_with_goods["city"]
+	new_name = f"Переименован {city_with_goods['tag']}"
+	transport = ASGITransport(app=app)
+	async with AsyncClient(transport=transport, base_url="http://testserver") as client:
+		r = await client.get("/api/v1/cities-filter/products")
+		assert _find_city(r.json(), city_id)["name"] == f"Город {city_with_goods['tag']}"
+
+		async with AsyncSessionLocal() as session:
+			city = await session.get(City, city_id)
+			city.name = new_name
+			await session.commit()
+		await GazetteerInvalidationMixin().after_model_change({"name": new_name}, city, False, None)
+		assert await refresh_dirty_location_trees() == list(LOCATION_TREE_KINDS)
+
+		r = await client.get("/api/v1/cities-filter/products")
+		assert r.status_code == 200
+		assert _find_city(r.json(), city_id)["name"] == new_name
+
+
+def test_refresh_task_runs_repeatedly_in_fresh_loops():
+	# Каждый запуск задачи — свой asyncio.run(); пул engine и Redis не должны тянуться из прошлого loop
+	refresh_location_trees_task()
+	for _ in range(2):
+		asyncio.run(mark_location_trees_dirty(["companies"]))
+		assert refresh_location_trees_task() == ["companies"]
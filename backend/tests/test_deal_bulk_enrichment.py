@@ -0,0 +1,109 @@
+"""Пакетная сборка DealResponse: число запросов /deals/by-ids не растёт с числом сделок."""
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import delete, event, select
+
+from app.api.company.models.company import BusinessType, Company, TradeActivity
+from app.api.purchases.models import DocumentCounter, Order, OrderHistory, OrderItem
+from app.api.purchases.services import DealService
+from app.db import base as db_base
+
+SELLERS = 4
+
+
+def _company(suffix: str, inn_seed: int) -> Company:
+	return Company(
+		name=f"Bulk Co {suffix}",
+		slug=f"bulk-co-{suffix}",
+		type="ООО",
+		trade_activity=TradeActivity.SELLER,
+		business_type=BusinessType.GOODS,
+		activity_type="Торговля",
+		description="Тест",
+		inn=f"{inn_seed:010d}",
+		ogrn=f"{inn_seed:013d}",
+		kpp=f"{(inn_seed % 10**9):09d}",
+		country="Россия",
+		federal_district="ЦФО",
+		region="Москва",
+		city="Москва",
+		full_name=f"ООО Bulk {suffix}",
+		registration_date=datetime.utcnow(),
+		legal_address="ул. Тест, 1",
+		production_address="ул. Тест, 2",
+		phone="+79000000003",
+		email=f"bulk-{suffix}@example.com",
+		website="https://example.com",
+		is_active=True,
+	)
+
+
+@pytest.fixture
+async def deals():
+	tag = uuid4().hex[:8]
+	seed = 7600000000 + int(tag[:4], 16) % 80000000
+	async with db_base.AsyncSessionLocal() as session:
+		buyer = _company(f"{tag}-buyer", seed)
+		sellers = [_company(f"{tag}-seller-{i}", seed + 1 + i) for i in range(SELLERS)]
+		session.add_all([buyer, *sellers])
+		await session.commit()
+		company_ids = [buyer.id, *(seller.id for seller in sellers)]
+		created = await DealService(session).create_deals_from_checkout(
+			{
+				"items": [
+					{
+						"companyId": seller.id,
+						"productName": f"{kind} {seller.id}",
+						"productType": kind,
+						"quantity": 1,
+						"units": "шт",
+						"price": 5.0,
+					}
+					for seller in sellers
+					for kind in ("Товар", "Услуга")
+				],
+			},
+			buyer.id,
+		)
+		seller_names = {seller.id: seller.name for seller in sellers}
+	yield {"buyer": buyer.id, "sellers": seller_names, "deal_ids": [deal.id for deal in created]}
+	async with db_base.AsyncSessionLocal() as session:
+		row_ids = select(Order.row_id).where(Order.buyer_company_id == company_ids[0])
+		await session.execute(delete(OrderItem).where(OrderItem.order_row_id.in_(row_ids)))
+		await session.execute(delete(OrderHistory).where(OrderHistory.order_row_id.in_(row_ids)))
+		await session.execute(delete(Order).where(Order.buyer_company_id == company_ids[0]))
+		await session.execute(delete(DocumentCounter).where(DocumentCounter.company_id.in_(company_ids)))
+		await session.execute(delete(Company).where(Company.id.in_(company_ids)))
+		await session.commit()
+
+
+async def _count_queries(deal_ids: list[int], buyer_id: int) -> tuple[int, list]:
+	statements = []
+
+	def _record(conn, cursor, statement, parameters, context, executemany):
+		statements.append(statement)
+
+	sync_engine = db_base.engine.sync_engine
+	async with db_base.AsyncSessionLocal() as session:
+		event.listen(sync_engine, "before_cursor_execute", _record)
+		try:
+			deals = await DealService(session).get_deals_by_ids(deal_ids, buyer_id)
+		finally:
+			event.remove(sync_engine, "before_cursor_execute", _record)
+	return len(statements), deals
+
+
+@pytest.mark.asyncio
+async def test_deals_by_ids_query_count_is_flat(deals):
+	assert len(deals["deal_ids"]) == SELLERS * 2
+
+	few_queries, few = await _count_queries(deals["deal_ids"][:1], deals["buyer"])
+	many_queries, many = await _count_queries(deals["deal_ids"], deals["buyer"])
+
+	assert [deal.id for deal in many] == deals["deal_ids"]
+	assert few_queries == many_queries
+	assert all(deal.seller_company.company_name == deals["sellers"][deal.seller_company_id] for deal in many)
+	assert all(deal.buyer_company.id == deals["buyer"] for deal in many)
+	assert [item.product_name for item in few[0].items] == [item.product_name for item in many[0].items]
@@ -0,0 +1,177 @@
+"""Версии сделок: флаг is_latest, списки latest-версий с keyset по курсору, общие (copy-on-write) позиции."""
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import delete, func, select
+
+from app.api.company.models.company import BusinessType, Company, TradeActivity
+from app.api.purchases.models import DocumentCounter, Order, OrderHistory, OrderItem
+from app.api.purchases.repositories import DealRepository
+from app.api.purchases.schemas import DealUpdate, OrderItemUpdate
+from app.api.purchases.services import DealService
+from app.db.base import AsyncSessionLocal
+
+
+def _company(suffix: str, inn_seed: int) -> Company:
+	return Company(
+		name=f"Latest Co {suffix}",
+		slug=f"latest-co-{suffix}",
+		type="ООО",
+		trade_activity=TradeActivity.SELLER,
+		business_type=BusinessType.GOODS,
+		activity_type="Торговля",
+		description="Тест",
+		inn=f"{inn_seed:010d}",
+		ogrn=f"{inn_seed:013d}",
+		kpp=f"{(inn_seed % 10**9):09d}",
+		country="Россия",
+		federal_district="ЦФО",
+		region="Москва",
+		city="Москва",
+		full_name=f"ООО Latest {suffix}",
+		registration_date=datetime.utcnow(),
+		legal_address="ул. Тест, 1",
+		production_address="ул. Тест, 2",
+		phone="+79000000002",
+		email=f"latest-{suffix}@example.com",
+		website="https://example.com",
+		is_active=True,
+	)
+
+
+@pytest.fixture
+async def deals():
+	tag = uuid4().hex[:8]
+	seed = 7800000000 + int(tag[:4], 16) % 80000000
+	async with AsyncSessionLocal() as session:
+		buyer = _company(f"{tag}-buyer", seed)
+		seller = _company(f"{tag}-seller", seed + 1)
+		session.add_all([buyer, seller])
+		await session.commit()
+		ids = {"tag": tag, "buyer": buyer.id, "seller": seller.id}
+		created = await DealService(session).create_deals_from_checkout(
+			{
+				"items": [
+					{
+						"companyId": seller.id,
+						"productName": f"Позиция {i}",
+						"productType": "Товар" if i % 2 else "Услуга",
+						"quantity": 1,
+						"units": "шт",
+						"price": 10.0 + i,
+					}
+					for i in range(2)
+				],
+			},
+			buyer.id,
+		)
+		ids["deals"] = [deal.id for deal in created]
+	yield ids
+	async with AsyncSessionLocal() as session:
+		row_ids = select(Order.row_id).where(Order.buyer_company_id == ids["buyer"])
+		await session.execute(delete(OrderItem).where(OrderItem.order_row_id.in_(row_ids)))
+		await session.execute(delete(OrderHistory).where(OrderHistory.order_row_id.in_(row_ids)))
+		await session.execute(delete(Order).where(Order.buyer_company_id == ids["buyer"]))
+		await session.execute(delete(DocumentCounter).where(DocumentCounter.company_id.in_([ids["buyer"], ids["seller"]])))
+		await session.execute(delete(Company).where(Company.id.in_([ids["buyer"], ids["seller"]])))
+		await session.commit()
+
+
+async def _latest_flags(deal_id: int) -> dict:
+	async with AsyncSessionLocal() as session:
+		rows = await session.execute(select(Order.version, Order.is_latest).where(Order.id == deal_id))
+		return dict(rows.all())
+
+
+@pytest.mark.asyncio
+async def test_version_create_and_delete_move_latest_flag(deals):
+	deal_id = deals["deals"][0]
+	async with AsyncSessionLocal() as session:
+		repo = DealRepository(session)
+		new_version = await repo.create_new_order_version(deal_id, deals["seller"])
+		assert new_version.version == 2 and new_version.is_latest
+	assert await _latest_flags(deal_id) == {1: False, 2: True}
+
+	async with AsyncSessionLocal() as session:
+		repo = DealRepository(session)
+		assert (await repo.get_order_by_id(deal_id, deals["buyer"])).version == 2
+		# Отклонить pending-версию может только контрагент инициатора
+		assert await repo.delete_last_order_version(deal_id, deals["buyer"]) == 2
+	assert await _latest_flags(deal_id) == {1: True}
+
+
+@pytest.mark.asyncio
+async def test_deal_lists_return_latest_summaries_with_cursor(deals):
+	first, second = deals["deals"]
+	async with AsyncSessionLocal() as session:
+		await DealRepository(session).create_new_order_version(first, deals["seller"])
+
+	async with AsyncSessionLocal() as session:
+		repo = DealRepository(session)
+		page = await repo.get_seller_orders(deals["seller"], limit=1, exact_total=True)
+		assert page.total == 2
+		assert len(page.items) == 1 and page.next_cursor
+		assert "order_items" not in page.items[0]
+		assert page.items[0]["counterparty_name"] == f"Latest Co {deals['tag']}-buyer"
+
+		rest = await repo.get_seller_orders(deals["seller"], limit=1, cursor=page.next_cursor)
+		assert rest.next_cursor is None
+		versions = {row["id"]: row["version"] for row in page.items + rest.items}
+		assert versions == {first: 2, second: 1}
+
+		buyer_page = await repo.get_buyer_orders(deals["buyer"], exact_total=True)
+		assert buyer_page.total == 2
+		assert {row["id"] for row in buyer_page.items} == {first, second}
+
+		by_ids = await repo.get_orders_by_ids([second, first], deals["buyer"])
+		assert [(order.id, order.version) for order in by_ids] == [(second, 1), (first, 2)]
+
+
+
+async def _item_rows(deal_id: int) -> dict:
+	"""version -> число собственных строк order_items."""
+	async with AsyncSessionLocal() as session:
+		rows = await session.execute(
+			select(Order.version, func.count(OrderItem.id))
+			.outerjoin(OrderItem, OrderItem.order_row_id == Order.row_id)
+			.where(Order.id == deal_id)
+			.group_by(Order.version)
+		)
+		return dict(rows.all())
+
+
+@pytest.mark.asyncio
+async def test_new_version_shares_items_until_they_change(deals):
+	deal_id = deals["deals"][0]
+	items = [OrderItemUpdate(product_name="Позиция", quantity=2, price=10.0, unit_of_measurement="шт")]
+	async with AsyncSessionLocal() as session:
+		service = DealService(session)
+		await service.update_deal(deal_id, DealUpdate(items=items), deals["seller"])
+		v2 = await service.create_new_deal_version(deal_id, deals["seller"], DealUpdate(comments="v2"))
+		assert v2.version == 2
+		assert [(i.product_name, i.quantity) for i in v2.items] == [("Позиция", 2)]
+	# Новая версия не копирует позиции
+	assert await _item_rows(deal_id) == {1: 1, 2: 0}
+
+	async with AsyncSessionLocal() as session:
+		await DealService(session).update_deal(deal_id, DealUpdate(items=items), deals["seller"])
+	# Те же позиции — по-прежнему общие
+	assert await _item_rows(deal_id) == {1: 1, 2: 0}
+
+	changed = [items[0].model_copy(update={"quantity": 5})]
+	async with AsyncSessionLocal() as session:
+		v2 = await DealService(session).update_deal(deal_id, DealUpdate(items=changed), deals["seller"])
+		assert [i.quantity for i in v2.items] == [5]
+	assert await _item_rows(deal_id) == {1: 1, 2: 1}
+
+	async with AsyncSessionLocal() as session:
+		repo = DealRepository(session)
+		v1 = await repo.get_order_by_id_and_version(deal_id, 1, deals["seller"])
+		assert [i.quantity for i in v1.version_items] == [2]
+		review = await repo.get_change_review_state(deal_id, deals["buyer"])
+		assert [item["status"] for item in review["diff"]["items"]] == ["modified"]
+
+		# Отклонение версии со своими позициями возвращает v1 как есть
+		assert await repo.delete_last_order_version(deal_id, deals["buyer"]) == 2
+	assert await _item_rows(deal_id) == {1: 1}
@@ -0,0 +1,149 @@
+"""Счётчики номеров документов: параллельные checkout не получают одинаковых номеров."""
+import asyncio
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import delete, select
+
+from app.api.company.models.company import BusinessType, Company, TradeActivity
+from app.api.purchases.models import DocumentCounter, Order, OrderHistory, OrderItem
+from app.api.purchases.repositories import document_counters
+from app.api.purchases.repositories.document_counters import DocumentCounterRepository
+from app.api.purchases.services import DealService
+from app.db.base import AsyncSessionLocal
+
+CHECKOUTS = 100
+
+
+def _company(suffix: str, inn_seed: int) -> Company:
+	return Company(
+		name=f"Counter Co {suffix}",
+		slug=f"counter-co-{suffix}",
+		type="ООО",
+		trade_activity=TradeActivity.SELLER,
+		business_type=BusinessType.GOODS,
+		activity_type="Торговля",
+		description="Тест",
+		inn=f"{inn_seed:010d}",
+		ogrn=f"{inn_seed:013d}",
+		kpp=f"{(inn_seed % 10**9):09d}",
+		country="Россия",
+		federal_district="ЦФО",
+		region="Москва",
+		city="Москва",
+		full_name=f"ООО Counter {suffix}",
+		registration_date=datetime.utcnow(),
+		legal_address="ул. Тест, 1",
+		production_address="ул. Тест, 2",
+		phone="+79000000001",
+		email=f"counter-{suffix}@example.com",
+		website="https://example.com",
+		is_active=True,
+	)
+
+
+@pytest.fixture
+async def parties():
+	tag = uuid4().hex[:8]
+	seed = 7900000000 + int(tag[:4], 16) % 80000000
+	async with AsyncSessionLocal() as session:
+		buyer = _company(f"{tag}-buyer", seed)
+		seller = _company(f"{tag}-seller", seed + 1)
+		other_seller = _company(f"{tag}-other", seed + 2)
+		session.add_all([buyer, seller, other_seller])
+		await session.commit()
+		ids = {"buyer": buyer.id, "seller": seller.id, "other_seller": other_seller.id}
+	yield ids
+	async with AsyncSessionLocal() as session:
+		row_ids = select(Order.row_id).where(Order.buyer_company_id == ids["buyer"])
+		await session.execute(delete(OrderItem).where(OrderItem.order_row_id.in_(row_ids)))
+		await session.execute(delete(OrderHistory).where(OrderHistory.order_row_id.in_(row_ids)))
+		await session.execute(delete(Order).where(Order.buyer_company_id == ids["buyer"]))
+		await session.execute(delete(DocumentCounter).where(DocumentCounter.company_id.in_(ids.values())))
+		await session.execute(delete(Company).where(Company.id.in_(ids.values())))
+		await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_next_values_reserves_consecutive_block(parties):
+	async with AsyncSessionLocal() as session:
+		repo = DocumentCounterRepository(session)
+
+		async def seed():
+			return 41
+
+		assert await repo.next_values(parties["seller"], "bill", 2026, 1, seed) == [42]
+		# Сид нужен только для первой строки счётчика
+		assert await repo.next_values(parties["seller"], "bill", 2026, 3, seed) == [43, 44, 45]
+		assert await repo.next_values(parties["seller"], "bill", 2027) == [1]
+		await session.rollback()
+
+
+def _item(seller_id: int, i: int) -> dict:
+	return {
+		"companyId": seller_id,
+		"productName": f"Позиция {i}",
+		"productType": "Товар",
+		"quantity": 1,
+		"units": "шт",
+		"price": 10.0,
+	}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_checkouts_get_unique_gap_free_numbers(parties):
+	async def checkout(i: int):
+		async with AsyncSessionLocal() as session:
+			return await DealService(session).create_deals_from_checkout(
+				{"items": [_item(parties["seller"], i)]},
+				parties["buyer"],
+			)
+
+	results = await asyncio.gather(*(checkout(i) for i in range(CHECKOUTS)))
+	deals = [deal for result in results for deal in result]
+	assert len(deals) == CHECKOUTS
+
+	expected = {f"{n:05d}" for n in range(1, CHECKOUTS + 1)}
+	assert {deal.seller_order_number for deal in deals} == expected
+	assert {deal.buyer_order_number for deal in deals} == expected
+	assert len({deal.id for deal in deals}) == CHECKOUTS
+
+
+@pytest.mark.asyncio
+async def test_two_seller_checkouts_lock_counters_in_global_order(parties, monkeypatch):
+	sellers = [parties["seller"], parties["other_seller"]]
+	locked: dict = {}
+	next_values = DocumentCounterRepository.next_values
+
+	async def recording(self, company_id, doc_type, *args, **kwargs):
+		if doc_type != document_counters.DEAL_ID_COUNTER:
+			locked.setdefault(id(self.session), []).append((company_id, doc_type))
+		return await next_values(self, company_id, doc_type, *args, **kwargs)
+
+	monkeypatch.setattr(document_counters.DocumentCounterRepository, "next_values", recording)
+
+	async def checkout(i: int, order: list):
+		async with AsyncSessionLocal() as session:
+			return await DealService(session).create_deals_from_checkout(
+				{"items": [_item(seller_id, i) for seller_id in order]},
+				parties["buyer"],
+			)
+
+	# Корзины с продавцами в противоположном порядке — параллельно
+	rounds = CHECKOUTS // 10
+	results = await asyncio.wait_for(
+		asyncio.gather(*(checkout(i, sellers if i % 2 else sellers[::-1]) for i in range(rounds))),
+		timeout=60,
+	)
+	deals = [deal for result in results for deal in result]
+	assert len(deals) == 2 * rounds
+
+	expected = {f"{n:05d}" for n in range(1, rounds + 1)}
+	for seller_id in sellers:
+		assert {deal.seller_order_number for deal in deals if deal.seller_company_id == seller_id} == expected
+	assert {deal.buyer_order_number for deal in deals} == {f"{n:05d}" for n in range(1, 2 * rounds + 1)}
+
+	# Каждая транзакция берёт строки счётчиков по возрастанию (company_id, doc_type)
+	assert len(locked) == rounds
+	assert all(len(keys) == 3 and keys == sorted(keys) for keys in locked.values())
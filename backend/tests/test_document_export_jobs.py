@@ -0,0 +1,54 @@
+"""Состояние задач выгрузки документов: готовые задачи не копятся в памяти процесса."""
+import pytest
+
+from app.api.purchases.services import document_export
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+	monkeypatch.setattr(document_export, "_local_jobs", {})
+	monkeypatch.setattr(document_export, "_finished_jobs", document_export.OrderedDict())
+	return document_export
+
+
+@pytest.mark.asyncio
+async def test_finished_job_leaves_process_memory_when_redis_stores_it(jobs, monkeypatch):
+	stored = {}
+
+	async def store(job):
+		stored[job["job_id"]] = dict(job)
+		return True
+
+	monkeypatch.setattr(jobs, "_store_job", store)
+	job = await jobs.create_export_job(company_id=1, total=1, filename="a.zip")
+	assert job["job_id"] in jobs._local_jobs
+
+	job["status"] = "done"
+	await jobs._save_job(job)
+	assert jobs._local_jobs == {}
+	assert not jobs._finished_jobs
+	assert stored[job["job_id"]]["status"] == "done"
+
+
+@pytest.mark.asyncio
+async def test_finished_jobs_without_redis_are_bounded(jobs, monkeypatch):
+	async def unavailable(job):
+		return False
+
+	monkeypatch.setattr(jobs, "_store_job", unavailable)
+	monkeypatch.setattr(jobs, "_LOCAL_FINISHED_MAX", 3)
+	created = []
+	for _ in range(5):
+		job = await jobs.create_export_job(company_id=1, total=1, filename="a.zip")
+		job["status"] = "failed"
+		await jobs._save_job(job)
+		created.append(job["job_id"])
+
+	assert jobs._local_jobs == {}
+	assert list(jobs._finished_jobs) == created[2:]
+	assert (await jobs.get_export_job(created[-1]))["status"] == "failed"
+	assert await jobs.get_export_job(created[0]) is None
+
+	# Истёкшая по EXPORT_JOB_TTL задача не отдаётся
+	jobs._finished_jobs[created[-1]]["updated_at"] -= jobs.EXPORT_JOB_TTL + 1
+	assert await jobs.get_export_job(created[-1]) is None
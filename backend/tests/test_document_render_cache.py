@@ -0,0 +1,84 @@
+"""Кэш сгенерированных документов сделки: ключи, LRU-вытеснение, инвалидация."""
+import os
+import time
+
+import pytest
+
+from app.api.purchases.services.render_cache import DocumentRenderCache
+
+
+@pytest.fixture
+def template(tmp_path):
+	path = tmp_path / "bill.docx"
+	path.write_bytes(b"template-v1")
+	return path
+
+
+def test_key_depends_on_version_template_and_context(tmp_path, template):
+	cache = DocumentRenderCache(tmp_path / "cache", max_bytes=1024)
+	context = {"bill_number": "1", "items": [{"name": "A", "price": 10}]}
+
+	key = cache.make_key(7, 1, template, context, "docx")
+	assert key == cache.make_key(7, 1, template, dict(context), "docx")
+	assert key.startswith("7/")
+	assert key != cache.make_key(7, 2, template, context, "docx")
+	assert key != cache.make_key(7, 1, template, {**context, "bill_number": "2"}, "docx")
+	assert key != cache.make_key(7, 1, template, context, "pdf")
+
+	# Шаблон заменили на сервере — старые файлы больше не подходят
+	time.sleep(0.01)
+	template.write_bytes(b"template-v2")
+	os.utime(template, ns=(time.time_ns(), time.time_ns() + 1_000_000))
+	assert key != cache.make_key(7, 1, template, context, "docx")
+
+
+def test_missing_template_raises(tmp_path):
+	cache = DocumentRenderCache(tmp_path / "cache", max_bytes=1024)
+	with pytest.raises(FileNotFoundError):
+		cache.make_key(1, 1, tmp_path / "nope.docx", {}, "docx")
+
+
+@pytest.mark.asyncio
+async def test_get_put_and_metrics(tmp_path):
+	cache = DocumentRenderCache(tmp_path / "cache", max_bytes=1024)
+	assert await cache.get("1/a.docx") is None
+	await cache.put("1/a.docx", b"docx-bytes")
+	assert await cache.get("1/a.docx") == b"docx-bytes"
+
+	metrics = cache.metrics()
+	assert metrics["hits"] == 1
+	assert metrics["misses"] == 1
+	assert metrics["stores"] == 1
+	assert metrics["hit_ratio"] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_keeps_recently_used(tmp_path):
+	cache = DocumentRenderCache(tmp_path / "cache", max_bytes=250)
+	await cache.put("1/old.pdf", b"o" * 100)
+	await cache.put("2/used.pdf", b"u" * 100)
+	past = time.time() - 60
+	os.utime(tmp_path / "cache" / "1" / "old.pdf", (past, past))
+	os.utime(tmp_path / "cache" / "2" / "used.pdf", (past, past))
+	assert await cache.get("2/used.pdf") is not None
+
+	await cache.put("3/new.pdf", b"n" * 100)
+
+	assert await cache.get("1/old.pdf") is None
+	assert await cache.get("2/used.pdf") is not None
+	assert await cache.get("3/new.pdf") is not None
+	assert cache.metrics()["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidate_deal_drops_only_that_deal(tmp_path):
+	cache = DocumentRenderCache(tmp_path / "cache", max_bytes=1024)
+	await cache.put("5/v1-a.docx", b"a")
+	await cache.put("5/v1-a.pdf", b"b")
+	await cache.put("6/v1-a.docx", b"c")
+
+	await cache.invalidate_deal(5)
+
+	assert await cache.get("5/v1-a.docx") is None
+	assert await cache.get("5/v1-a.pdf") is None
+	assert await cache.get("6/v1-a.docx") == b"c"
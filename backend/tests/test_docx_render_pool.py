@@ -0,0 +1,102 @@
+"""Подготовленные шаблоны docx и рендер в пуле процессов."""
+import io
+import os
+import shutil
+import zipfile
+
+import pytest
+from docxtpl import DocxTemplate
+
+from app.api.purchases.services import docx_template_service
+from app.api.purchases.services.docx_render_pool import DocxRenderPool, DocxRenderQueueFullError
+from app.api.purchases.services.docx_template_service import (
+	ORDER_DOCX_FILENAME,
+	DocxTemplateRegistry,
+	render_docx_bytes,
+	resolve_docx_template_path,
+	template_registry,
+)
+
+CONTEXT = {"id": 42, "items": [], "seller_company": {}, "buyer_company": {}, "bill": {"officials": []}}
+
+
+def _document_xml(content: bytes) -> bytes:
+	return zipfile.ZipFile(io.BytesIO(content)).read("word/document.xml")
+
+
+def _minimal_template(path, text: str) -> None:
+	from docx import Document
+
+	doc = Document()
+	doc.add_paragraph(text)
+	doc.save(str(path))
+
+
+def test_prepared_render_matches_docxtpl(tmp_path):
+	template_path = tmp_path / "t.docx"
+	_minimal_template(template_path, "Заказ № {{ id }}")
+	expected = DocxTemplate(str(template_path))
+	expected.render(CONTEXT)
+	buf = io.BytesIO()
+	expected.save(buf)
+
+	first = render_docx_bytes(template_path, CONTEXT)
+	second = render_docx_bytes(template_path, {**CONTEXT, "id": 43})
+
+	assert _document_xml(first) == _document_xml(buf.getvalue())
+	assert b"43" in _document_xml(second)
+
+
+def test_unsupported_docxtpl_falls_back_to_plain_render(tmp_path, monkeypatch):
+	monkeypatch.setattr(docx_template_service, "COMPILED_TEMPLATES_SUPPORTED", False)
+
+	def fail(*args, **kwargs):
+		raise AssertionError("compiled template used on unsupported docxtpl")
+
+	monkeypatch.setattr(docx_template_service._CompiledDocxTemplate, "__init__", fail)
+	template_path = tmp_path / "t.docx"
+	_minimal_template(template_path, "Заказ № {{ id }}")
+	assert b"42" in _document_xml(render_docx_bytes(template_path, CONTEXT))
+	assert DocxTemplateRegistry().warm_up(tmp_path) == 1
+
+
+def test_registry_reloads_changed_template(tmp_path):
+	registry = DocxTemplateRegistry()
+	template_path = tmp_path / "t.docx"
+	_minimal_template(template_path, "v1 {{ id }}")
+	first = registry.get(template_path)
+	assert registry.get(template_path) is first
+
+	_minimal_template(template_path, "v2 {{ id }} и ещё текст")
+	stat = os.stat(template_path)
+	os.utime(template_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+	assert registry.get(template_path) is not first
+
+
+def test_registry_missing_template(tmp_path):
+	with pytest.raises(FileNotFoundError):
+		DocxTemplateRegistry().get(tmp_path / "missing.docx")
+
+
+@pytest.mark.asyncio
+async def test_pool_rejects_when_queue_full():
+	pool = DocxRenderPool(workers=1, max_queue=0)
+	slots = pool._get_slots()
+	for _ in range(2):
+		await slots.acquire()
+	with pytest.raises(DocxRenderQueueFullError):
+		await pool.render(resolve_docx_template_path(ORDER_DOCX_FILENAME), CONTEXT)
+	assert pool.metrics()["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_pool_renders_in_worker_process(tmp_path):
+	template_path = tmp_path / "t.docx"
+	_minimal_template(template_path, "Счёт {{ id }}")
+	pool = DocxRenderPool(workers=1, max_queue=4)
+	try:
+		content = await pool.render(template_path, CONTEXT)
+	finally:
+		pool.shutdown()
+	assert b"42" in _document_xml(content)
+	assert pool.metrics()["rendered"] == 1
@@ -0,0 +1,208 @@
+"""Справочник городов в памяти: ранжирование автодополнения, лимиты, /locations/cities, /autocomplete и /location-tree."""
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import delete
+
+from app.api.common.models import City, Country, FederalDistrict, Region
+from app.api.common.services.gazetteer import Gazetteer, GazetteerArea, invalidate_gazetteer
+from app.db.base import AsyncSessionLocal
+from app.main import app
+
+
+def _row(city_id, name, population, region_id=10, country_id=1, million=False):
+	return SimpleNamespace(
+		id=city_id,
+		name=name,
+		country_id=country_id,
+		region_id=region_id,
+		federal_district_id=100,
+		population=population,
+		is_million_city=million,
+		is_regional_center=False,
+		latitude=None,
+		longitude=None,
+	)
+
+
+@pytest.fixture
+def gazetteer():
+	return Gazetteer(
+		[GazetteerArea(1, "RU", "Россия", None), GazetteerArea(2, "BY", "Беларусь", None)],
+		[GazetteerArea(100, "ЦФО", "Центральный", 1)],
+		[
+			GazetteerArea(10, "MOW", "Московская область", 1),
+			GazetteerArea(11, "NIZ", "Нижегородская область", 1),
+			GazetteerArea(20, "MI", "Минская область", 2),
+		],
+		[
+			_row(1, "Москва", 13_000_000, million=True),
+			_row(2, "Мосальск", 4_000),
+			_row(3, "Нижний Новгород", 1_200_000, region_id=11, million=True),
+			_row(4, "Великий Новгород", 220_000),
+			_row(5, "Орехово-Зуево", 120_000),
+			_row(6, "Минск", 2_000_000, region_id=20, country_id=2),
+			_row(7, "Королёв", 220_000),
+		],
+	)
+
+
+def _names(result):
+	return [city.name for city in result[0]]
+
+
+def test_prefix_ranked_by_population_and_exact_first(gazetteer):
+	assert _names(gazetteer.search("мос", limit=10)) == ["Москва", "Мосальск"]
+	assert _names(gazetteer.search("Москва", limit=10)) == ["Москва"]
+	# Начало названия выше начала слова, внутри группы — по населению
+	assert _names(gazetteer.search("нов", limit=10)) == ["Нижний Новгород", "Великий Новгород"]
+	assert _names(gazetteer.search("ни", limit=10)) == ["Нижний Новгород"]
+
+
+def test_normalization_substring_and_typos(gazetteer):
+	assert _names(gazetteer.search("королев", limit=10)) == ["Королёв"]
+	assert _names(gazetteer.search("орехово зуево", limit=10)) == ["Орехово-Зуево"]
+	assert _names(gazetteer.search("зуево", limit=10)) == ["Орехово-Зуево"]
+	# Подстрока из середины слова — как прежний ILIKE '%...%'
+	assert _names(gazetteer.search("овгор", limit=10)) == ["Нижний Новгород", "Великий Новгород"]
+	# Опечатка находится по триграммам
+	assert _names(gazetteer.search("масква", limit=10))[:1] == ["Москва"]
+	assert _names(gazetteer.search("qwerty", limit=10)) == []
+
+
+def test_filters_limit_total_and_labels(gazetteer):
+	cities, total = gazetteer.search("м", limit=1)
+	assert total == 3
+	assert [city.label for city in cities] == ["Москва, Московская область, Россия"]
+	assert _names(gazetteer.search("м", country_id=2, limit=10)) == ["Минск"]
+	assert _names(gazetteer.search(None, country_id=1, million_cities_only=True, limit=10)) == [
+		"Москва",
+		"Нижний Новгород",
+	]
+	# Без поиска — по алфавиту
+	cities, total = gazetteer.search("", country_id=1, region_id=10, limit=3)
+	assert total == 5
+	assert [city.name for city in cities] == ["Великий Новгород", "Королёв", "Мосальск"]
+
+
+def test_resolve_by_code_then_name(gazetteer):
+	assert gazetteer.resolve_country("RU").id == 1
+	assert gazetteer.resolve_country("Беларусь").id == 2
+	assert gazetteer.resolve_region("Минская область").id == 20
+	assert gazetteer.resolve_federal_district("ЦФО").id == 100
+	assert gazetteer.resolve_country("XX") is None
+
+
+@pytest.fixture
+async def country_with_cities():
+	tag = uuid4().hex[:8]
+	async with AsyncSessionLocal() as session:
+		country = Country(code=f"G{tag[:4]}", name=f"Страна {tag}", is_active=True)
+		session.add(country)
+		await session.flush()
+		fd = FederalDistrict(country_id=country.id, name=f"Округ {tag}", code=f"FD{tag}", is_active=True)
+		session.add(fd)
+		await session.flush()
+		region = Region(country_id=country.id, federal_district_id=fd.id, name=f"Регион {tag}", code=f"RG{tag}", is_active=True)
+		session.add(region)
+		await session.flush()
+		cities = [
+			City(country_id=country.id, region_id=region.id, federal_district_id=fd.id, name=f"Зет {tag}", population=10, is_active=True),
+			City(country_id=country.id, region_id=region.id, federal_district_id=fd.id, name=f"Зет-Град {tag}", population=5000, is_active=True),
+			City(country_id=country.id, region_id=region.id, federal_district_id=fd.id, name=f"Альфа {tag}", population=100, is_active=True),
+		]
+		session.add_all(cities)
+		await session.commit()
+		ids = {
+			"tag": tag,
+			"country_code": country.code,
+			"country": country.id,
+			"fd": fd.id,
+			"region": region.id,
+			"cities": [city.id for city in cities],
+		}
+	await invalidate_gazetteer()
+	yield ids
+	async with AsyncSessionLocal() as session:
+		await session.execute(delete(City).where(City.id.in_(ids["cities"])))
+		await session.execute(delete(Region).where(Region.id == ids["region"]))
+		await session.execute(delete(FederalDistrict).where(FederalDistrict.id == ids["fd"]))
+		await session.execute(delete(Country).where(Country.id == ids["country"]))
+		await session.commit()
+	await invalidate_gazetteer()
+
+
+@pytest.mark.asyncio
+async def test_cities_and_autocomplete_endpoints(country_with_cities):
+	tag = country_with_cities["tag"]
+	transport = ASGITransport(app=app)
+	async with AsyncClient(transport=transport, base_url="http://testserver") as client:
+		response = await client.get(
+			"/api/v1/locations/cities", params={"country_code": country_with_cities["country_code"]}
+		)
+		assert response.status_code == 200
+		body = response.json()
+		assert body["total"] == 3
+		assert [item["value"] for item in body["items"]] == [f"Альфа {tag}", f"Зет {tag}", f"Зет-Град {tag}"]
+
+		response = await client.get(
+			"/api/v1/locations/cities",
+			params={"country_code": f"Страна {tag}", "search": "зет", "limit": 1},
+		)
+		body = response.json()
+		assert body["total"] == 2
+		assert body["items"] == [{"label": f"Зет-Град {tag}", "value": f"Зет-Град {tag}"}]
+
+		response = await client.get(
+			"/api/v1/locations/autocomplete",
+			params={"q": f"альфа {tag}", "country_code": country_with_cities["country_code"]},
+		)
+		assert response.status_code == 200
+		item = response.json()["items"][0]
+		assert item["label"] == f"Альфа {tag}, Регион {tag}, Страна {tag}"
+		assert item["id"] == country_with_cities["cities"][2]
+		assert item["population"] == 100
+
+		response = await client.get("/api/v1/locations/autocomplete", params={"q": "зет", "limit": 51})
+		assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_location_tree_etag_gzip_and_refresh(country_with_cities):
+	tag = country_with_cities["tag"]
+	transport = ASGITransport(app=app)
+	async with AsyncClient(transport=transport, base_url="http://testserver") as client:
+		response = await client.get("/api/v1/locations/location-tree", headers={"Accept-Encoding": "gzip"})
+		assert response.status_code == 200
+		assert response.headers["content-encoding"] == "gzip"
+		etag = response.headers["etag"]
+		country = next(c for c in response.json()["countries"] if c["id"] == country_with_cities["country"])
+		region = country["federal_districts"][0]["regions"][0]
+		assert region["id"] == country_with_cities["region"]
+		assert [city["name"] for city in region["cities"]] == [f"Альфа {tag}", f"Зет {tag}", f"Зет-Град {tag}"]
+
+		response = await client.get("/api/v1/locations/location-tree", headers={"If-None-Match": etag})
+		assert response.status_code == 304
+
+		async with AsyncSessionLocal() as session:
+			city = City(
+				country_id=country_with_cities["country"],
+				region_id=country_with_cities["region"],
+				federal_district_id=country_with_cities["fd"],
+				name=f"Бета {tag}",
+				is_active=True,
+			)
+			session.add(city)
+			await session.commit()
+			country_with_cities["cities"].append(city.id)
+		await invalidate_gazetteer()
+
+		response = await client.get(
+			"/api/v1/locations/location-tree", headers={"If-None-Match": etag, "Accept-Encoding": "identity"}
+		)
+		assert response.status_code == 200
+		assert "content-encoding" not in response.headers
+		assert response.headers["etag"] != etag
+		assert f"Бета {tag}" in response.text
@@ -0,0 +1,137 @@
+"""Фасеты каталога: один проход, учёт поиска, сброс кэша."""
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import delete
+
+from app.api.company.models.company import BusinessType, Company, TradeActivity
+from app.api.products.models.product import Product, ProductType
+from app.api.products.services.facet_cache import invalidate_catalog_facets
+from app.db.base import AsyncSessionLocal
+from app.main import app
+
+
+def _company(suffix: str, inn_seed: int, country: str, city: str) -> Company:
+	return Company(
+		name=f"Facet Co {suffix}",
+		slug=f"facet-co-{suffix}",
+		type="ООО",
+		trade_activity=TradeActivity.SELLER,
+		business_type=BusinessType.GOODS,
+		activity_type="Торговля",
+		description="Тест",
+		inn=f"{inn_seed:010d}",
+		ogrn=f"{inn_seed:013d}",
+		kpp=f"{(inn_seed % 10**9):09d}",
+		country=country,
+		federal_district=f"Округ {suffix}",
+		region=f"Регион {suffix}",
+		city=city,
+		full_name=f"ООО Facet {suffix}",
+		registration_date=datetime.utcnow(),
+		legal_address="ул. Тест, 1",
+		production_address="ул. Тест, 2",
+		phone="+79000000001",
+		email=f"facet-{suffix}@example.com",
+		website="https://example.com",
+		is_active=True,
+	)
+
+
+@pytest.fixture
+async def catalog():
+	tag = uuid4().hex[:8]
+	seed = 7500000000 + int(tag[:4], 16) % 80000000
+	countries = {"a": f"Страна А {tag}", "b": f"Страна Б {tag}"}
+	cities = {"a": f"Город А {tag}", "b": f"Город Б {tag}"}
+	company_ids = []
+	async with AsyncSessionLocal() as session:
+		for i, key in enumerate(("a", "b")):
+			company = _company(f"{tag}{key}", seed + i, countries[key], cities[key])
+			session.add(company)
+			await session.flush()
+			company_ids.append(company.id)
+			# В городе А — 2 товара «кран» и 1 «насос», в городе Б — 1 «кран»
+			names = ["кран", "кран", "насос"] if key == "a" else ["кран"]
+			for j, name in enumerate(names):
+				session.add(
+					Product(
+						name=f"{name} {tag}",
+						slug=f"facet-{tag}-{key}-{j}",
+						article=f"F-{tag}-{key}-{j}",
+						type=ProductType.GOOD,
+						price=100.0 * (j + 1),
+						images=[],
+						characteristics=[],
+						unit_of_measurement="шт",
+						company_id=company.id,
+					)
+				)
+		await session.commit()
+	await invalidate_catalog_facets()
+	yield {"tag": tag, "countries": countries, "cities": cities, "company_ids": company_ids}
+	async with AsyncSessionLocal() as session:
+		await session.execute(delete(Product).where(Product.company_id.in_(company_ids)))
+		await session.execute(delete(Company).where(Company.id.in_(company_ids)))
+		await session.commit()
+	await invalidate_catalog_facets()
+
+
+def _counts(items: list, values) -> dict:
+	return {item["value"]: item["count"] for item in items if item["value"] in values}
+
+
+@pytest.mark.asyncio
+async def test_filters_respect_search_and_keep_sibling_options(catalog):
+	countries, cities = catalog["countries"], catalog["cities"]
+	transport = ASGITransport(app=app)
+	async with AsyncClient(transport=transport, base_url="http://testserver") as client:
+		r = await client.get("/api/v1/products/filters")
+		assert r.status_code == 200, r.text
+		assert _counts(r.json()["cities"], cities.values()) == {cities["a"]: 3, cities["b"]: 1}
+
+		r = await client.post("/api/v1/products/filters", json={"search": f"насос {catalog['tag']}"})
+		assert r.status_code == 200, r.text
+		# Варианты без совпадений остаются в списке с нулём
+		assert _counts(r.json()["cities"], cities.values()) == {cities["a"]: 1, cities["b"]: 0}
+
+		r = await client.post("/api/v1/products/filters", json={"country": countries["a"], "max_price": 150})
+		assert r.status_code == 200, r.text
+		body = r.json()
+		# Свой уровень не сужается выбранной страной, остальные — сужаются
+		assert _counts(body["countries"], countries.values()) == {countries["a"]: 1, countries["b"]: 1}
+		assert _counts(body["cities"], cities.values()) == {cities["a"]: 1, cities["b"]: 0}
+
+
+@pytest.mark.asyncio
+async def test_filters_cache_dropped_on_invalidate(catalog):
+	cities = catalog["cities"]
+	transport = ASGITransport(app=app)
+	async with AsyncClient(transport=transport, base_url="http://testserver") as client:
+		r = await client.get("/api/v1/products/filters")
+		assert _counts(r.json()["cities"], cities.values())[cities["b"]] == 1
+
+		async with AsyncSessionLocal() as session:
+			session.add(
+				Product(
+					name="новый",
+					slug=f"facet-{catalog['tag']}-new",
+					article="NEW",
+					type=ProductType.GOOD,
+					price=1.0,
+					images=[],
+					characteristics=[],
+					unit_of_measurement="шт",
+					company_id=catalog["company_ids"][1],
+				)
+			)
+			await session.commit()
+
+		r = await client.get("/api/v1/products/filters")
+		assert _counts(r.json()["cities"], cities.values())[cities["b"]] == 1  # из кэша
+
+		await invalidate_catalog_facets()
+		r = await client.get("/api/v1/products/filters")
+		assert _counts(r.json()["cities"], cities.values())[cities["b"]] == 2
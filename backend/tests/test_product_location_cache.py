@@ -0,0 +1,107 @@
+"""Общий кэш локаций: single-flight, stale-while-revalidate, сброс при записи."""
+import asyncio
+
+import pytest
+
+from app.api.products.services.cache_service import product_location_cache
+from app.core.cache import redis_cache
+from app.core.shared_cache import SharedCache
+from app.db.base import AsyncSessionLocal
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_run_loader_once():
+	cache = SharedCache("test:single-flight", fresh_ttl=60)
+	calls = 0
+
+	async def loader():
+		nonlocal calls
+		calls += 1
+		await asyncio.sleep(0.05)
+		return {"value": calls}
+
+	results = await asyncio.gather(*(cache.get_or_load("k", loader) for _ in range(20)))
+	assert calls == 1
+	assert all(r == {"value": 1} for r in results)
+
+
+@pytest.mark.asyncio
+async def test_stale_value_served_while_refreshing():
+	cache = SharedCache("test:swr", fresh_ttl=0, stale_ttl=60)
+	versions = iter(range(1, 10))
+
+	async def loader():
+		return next(versions)
+
+	assert await cache.get_or_load("k", loader) == 1
+	await asyncio.sleep(0.01)
+	# Запись устарела: отдаём старое значение, пересчёт — в фоне
+	assert await cache.get_or_load("k", loader) == 1
+	await asyncio.sleep(0.05)
+	assert cache.stale_hits >= 1
+	assert await cache.get("k") == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidate_forces_reload():
+	cache = SharedCache("test:invalidate", fresh_ttl=60)
+	calls = 0
+
+	async def loader():
+		nonlocal calls
+		calls += 1
+		return calls
+
+	assert await cache.get_or_load("k", loader) == 1
+	assert await cache.get_or_load("k", loader) == 1
+	await cache.invalidate()
+	assert await cache.get_or_load("k", loader) == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_loader_releases_lock():
+	cache = SharedCache("test:loader-error", fresh_ttl=60)
+
+	async def broken():
+		raise RuntimeError("boom")
+
+	async def loader():
+		return 1
+
+	for _ in range(3):
+		with pytest.raises(RuntimeError):
+			await cache.get_or_load("k", broken)
+	assert cache._locks == {}
+	assert await cache.get_or_load("k", loader) == 1
+	assert cache._locks == {}
+
+
+@pytest.mark.asyncio
+async def test_refresh_cache_does_not_deadlock():
+	async with AsyncSessionLocal() as session:
+		await asyncio.wait_for(product_location_cache.refresh_cache(session), timeout=5)
+		locations = await product_location_cache.get_company_locations(session)
+	assert set(locations) == {"countries", "federal_districts", "regions", "cities"}
+	assert all(isinstance(values, set) for values in locations.values())
+
+
+@pytest.mark.asyncio
+async def test_workers_share_generation_seeded_in_redis(shared_redis):
+	first, second = SharedCache("test:generation", fresh_ttl=60), SharedCache("test:generation", fresh_ttl=60)
+	# Разные процессные поколения не должны разводить воркеров по разным ключам
+	first._local_generation, second._local_generation = "1", "2"
+
+	assert await first.generation() == await second.generation() == "0"
+	assert shared_redis.ttls[first._generation_key] is None
+
+	await first.invalidate()
+	assert await second.generation() == first._local_generation != "0"
+	assert shared_redis.ttls[first._generation_key] is None
+
+
+@pytest.mark.asyncio
+async def test_generation_is_local_without_redis(monkeypatch):
+	monkeypatch.setattr(redis_cache, "redis_client", None)
+	monkeypatch.setattr(redis_cache, "_unavailable_until", float("inf"))
+	cache = SharedCache("test:generation-local", fresh_ttl=60)
+	assert await cache.generation() == cache._local_generation
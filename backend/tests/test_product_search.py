@@ -0,0 +1,174 @@
+"""Поиск товаров: полнотекстовые выражения для PostgreSQL и ILIKE-фолбэк."""
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql
+
+from app.api.company.models.company import BusinessType, Company, TradeActivity
+from app.api.products.models.product import Product, ProductType
+from app.api.products.services.full_text_search import ProductTextSearch
+from app.db.base import AsyncSessionLocal
+from app.main import app
+
+
+def _company(suffix: str, inn_seed: int) -> Company:
+	return Company(
+		name=f"Search Co {suffix}",
+		slug=f"search-co-{suffix}",
+		type="ООО",
+		trade_activity=TradeActivity.SELLER,
+		business_type=BusinessType.GOODS,
+		activity_type="Торговля",
+		description="Тест",
+		inn=f"{inn_seed:010d}",
+		ogrn=f"{inn_seed:013d}",
+		kpp=f"{(inn_seed % 10**9):09d}",
+		country="Россия",
+		federal_district="ЦФО",
+		region="Москва",
+		city="Москва",
+		full_name=f"ООО Search {suffix}",
+		registration_date=datetime.utcnow(),
+		legal_address="ул. Тест, 1",
+		production_address="ул. Тест, 2",
+		phone="+79000000001",
+		email=f"search-{suffix}@example.com",
+		website="https://example.com",
+		is_active=True,
+	)
+
+
+def test_postgres_search_uses_tsvector_trigram_and_rank():
+	search = ProductTextSearch("болты оцинкованные", full_text=True)
+	query = (
+		select(Product.id, search.headline())
+		.where(search.condition())
+		.order_by(search.rank().desc())
+	)
+	sql = str(query.compile(dialect=postgresql.dialect()))
+
+	assert "products.search_vector @@ websearch_to_tsquery" in sql
+	assert "products.name %" in sql
+	assert "ts_rank_cd(products.search_vector" in sql
+	assert "similarity(products.name" in sql
+	assert "ts_headline(" in sql
+	assert "ILIKE" in sql  # артикул по триграммному индексу
+
+
+def test_short_term_skips_fuzzy_matching():
+	search = ProductTextSearch("м8", full_text=True)
+	sql = str(
+		select(Product.id).where(search.condition()).order_by(search.rank()).compile(dialect=postgresql.dialect())
+	)
+	assert "@@" in sql
+	assert "similarity" not in sql
+	assert "ILIKE" not in sql
+
+
+def test_fallback_has_no_rank_or_headline():
+	search = ProductTextSearch("болт", full_text=False)
+	assert search.rank() is None
+	assert search.headline() is None
+	assert "ILIKE" in str(search.condition().compile(dialect=postgresql.dialect()))
+
+
+@pytest.mark.asyncio
+async def test_search_endpoint_matches_name_article_and_description():
+	suffix = uuid4().hex[:8]
+	seed = 7100000000 + int(suffix[:4], 16) % 80000000
+	async with AsyncSessionLocal() as session:
+		company = _company(suffix, seed)
+		session.add(company)
+		await session.flush()
+		rows = [
+			("Болт оцинкованный", f"ART-{suffix}-1", None),
+			("Гайка", f"ART-{suffix}-2", f"Подходит к болту {suffix}"),
+			("Шайба", f"ZZZ-{suffix}", None),
+		]
+		for i, (name, article, description) in enumerate(rows):
+			session.add(
+				Product(
+					name=f"{name} {suffix}",
+					slug=f"search-{suffix}-{i}",
+					description=description,
+					article=article,
+					type=ProductType.GOOD,
+					price=10.0,
+					images=[],
+					characteristics=[],
+					unit_of_measurement="шт",
+					company_id=company.id,
+				)
+			)
+		await session.commit()
+		company_id = company.id
+
+	try:
+		transport = ASGITransport(app=app)
+		async with AsyncClient(transport=transport, base_url="http://testserver") as client:
+			r = await client.post("/api/v1/products/search", json={"search": suffix, "limit": 100})
+			assert r.status_code == 200, r.text
+			assert r.json()["total"] == 3
+
+			r = await client.post("/api/v1/products/search", json={"search": f"ART-{suffix}", "limit": 100})
+			assert r.status_code == 200, r.text
+			assert {p["article"] for p in r.json()["products"]} == {f"ART-{suffix}-1", f"ART-{suffix}-2"}
+			assert all(p["highlight"] is None for p in r.json()["products"])
+	finally:
+		async with AsyncSessionLocal() as session:
+			await session.execute(delete(Product).where(Product.company_id == company_id))
+			await session.execute(delete(Company).where(Company.id == company_id))
+			await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_filter_search_pages_by_cursor():
+	suffix = uuid4().hex[:8]
+	seed = 7150000000 + int(suffix[:4], 16) % 80000000
+	async with AsyncSessionLocal() as session:
+		company = _company(suffix, seed)
+		session.add(company)
+		await session.flush()
+		for i in range(5):
+			session.add(
+				Product(
+					name=f"Шайба {suffix} {i}",
+					slug=f"cursor-{suffix}-{i}",
+					article=f"CUR-{suffix}-{i}",
+					type=ProductType.GOOD,
+					price=1.0,
+					images=[],
+					characteristics=[],
+					unit_of_measurement="шт",
+					company_id=company.id,
+				)
+			)
+		await session.commit()
+		company_id = company.id
+
+	try:
+		async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as client:
+			request = {"search": f"Шайба {suffix}", "limit": 2}
+			seen = []
+			while True:
+				r = await client.post("/api/v1/products/search", json=request)
+				assert r.status_code == 200, r.text
+				body = r.json()
+				assert body["total"] == 5
+				seen.extend(p["slug"] for p in body["products"])
+				if body["next_cursor"] is None:
+					break
+				request["cursor"] = body["next_cursor"]
+			assert sorted(seen) == [f"cursor-{suffix}-{i}" for i in range(5)]
+			assert len(seen) == 5
+
+			bad = await client.post("/api/v1/products/search", json={"search": suffix, "cursor": "garbage"})
+			assert bad.status_code == 400
+	finally:
+		async with AsyncSessionLocal() as session:
+			await session.execute(delete(Product).where(Product.company_id == company_id))
+			await session.execute(delete(Company).where(Company.id == company_id))
+			await session.commit()
@@ -10,6 +10,7 @@ from httpx import ASGITransport, AsyncClient
 
 from app.main import app
 from app.db.base import AsyncSessionLocal
+from app.core.config import settings
 from app.api.authentication.dependencies import get_current_user
 from app.api.authentication.models.user import User
 from app.api.company.models.company import Company, TradeActivity, BusinessType
@@ -161,6 +162,21 @@ async def test_get_buyer_deals_after_create(client: AsyncClient, seeded_context:
     assert "supplier_name" in deal or "buyer_name" in deal or "id" in deal
 
 
+@pytest.mark.asyncio
+async def test_deal_list_pagination_headers_exposed_to_browser(client: AsyncClient, seeded_context: dict):
+    """Cross-origin фронтенд читает X-Next-Cursor/X-Total-Count — они в Access-Control-Expose-Headers."""
+    for _ in range(2):
+        await client.post("/api/v1/purchases/deals", json=_valid_deal_payload(seeded_context["seller_company_id"]))
+
+    origin = settings.BACKEND_CORS_ORIGINS[0]
+    response = await client.get("/api/v1/purchases/buyer/deals", params={"limit": 1}, headers={"Origin": origin})
+    assert response.status_code == 200, response.text
+    assert response.headers["access-control-allow-origin"] == origin
+    exposed = {h.strip().lower() for h in response.headers["access-control-expose-headers"].split(",")}
+    assert {"x-next-cursor", "x-total-count"} <= exposed
+    assert response.headers["x-next-cursor"]
+
+
 @pytest.mark.asyncio
 async def test_get_seller_deals_returns_list(client: AsyncClient, seeded_context: dict):
     """GET /api/v1/purchases/seller/deals — возвращает 200 и список (текущий пользователь — покупатель, у продавца заказов может не быть)."""
@@ -253,6 +269,95 @@ async def test_download_order_pdf_success_mock_gotenberg(client: AsyncClient, se
         assert r.content.startswith(b"%PDF")
 
 
+@pytest.mark.asyncio
+async def test_download_order_pdf_served_from_render_cache(client: AsyncClient, seeded_context: dict, monkeypatch, tmp_path):
+    """Повторное скачивание PDF той же версии сделки не ходит в Gotenberg; новая версия — ходит."""
+    from unittest.mock import AsyncMock
+
+    from app.api.purchases.services import render_cache
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "GOTENBERG_URL", "http://gotenberg:3000")
+    monkeypatch.setattr(settings, "DOC_RENDER_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "DOC_RENDER_CACHE_DIR", tmp_path / "render_cache")
+    monkeypatch.setattr(render_cache, "_render_cache", None)
+    convert = AsyncMock(return_value=b"%PDF-1.4\n%\ntrailer<<>>\n%%EOF\n")
+    monkeypatch.setattr("app.api.purchases.router.convert_docx_bytes_to_pdf", convert)
+    payload = _valid_deal_payload(seeded_context["seller_company_id"])
+    create_resp = await client.post("/api/v1/purchases/deals", json=payload)
+    assert create_resp.status_code == 200
+    deal_id = create_resp.json()["id"]
+
+    for _ in range(3):
+        r = await client.get(f"/api/v1/purchases/deals/{deal_id}/documents/bill.pdf")
+        assert r.status_code == 200, r.text
+        assert r.content.startswith(b"%PDF")
+    assert convert.await_count == 1
+
+    version_resp = await client.post(f"/api/v1/purchases/deals/{deal_id}/versions", json={"comments": "v2"})
+    assert version_resp.status_code == 200, version_resp.text
+    r = await client.get(f"/api/v1/purchases/deals/{deal_id}/documents/bill.pdf")
+    assert r.status_code == 200, r.text
+    assert convert.await_count == 2
+
+    metrics = await client.get("/api/v1/purchases/render-cache/metrics")
+    assert metrics.status_code == 200
+    assert metrics.json()["hits"] >= 2
+    assert metrics.json()["invalidations"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_export_deal_documents_zip(client: AsyncClient, seeded_context: dict, monkeypatch, tmp_path):
+    """POST /deals/documents/export — один ZIP с документами нескольких сделок; чужие/несуществующие — в errors.txt."""
+    import io
+    import zipfile
+    from unittest.mock import AsyncMock
+
+    from app.api.purchases.services import render_cache
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "GOTENBERG_URL", "http://gotenberg:3000")
+    monkeypatch.setattr(settings, "DOC_RENDER_CACHE_DIR", tmp_path / "render_cache")
+    monkeypatch.setattr(render_cache, "_render_cache", None)
+    convert = AsyncMock(return_value=b"%PDF-1.4\n%%EOF\n")
+    monkeypatch.setattr("app.api.purchases.services.document_export.convert_docx_bytes_to_pdf", convert)
+
+    deal_ids = []
+    for _ in range(2):
+        create_resp = await client.post(
+            "/api/v1/purchases/deals", json=_valid_deal_payload(seeded_context["seller_company_id"])
+        )
+        assert create_resp.status_code == 200
+        deal_ids.append(create_resp.json()["id"])
+
+    r = await client.post(
+        "/api/v1/purchases/deals/documents/export",
+        json={"deal_ids": deal_ids + [999999], "documents": ["bill", "order"]},
+    )
+    assert r.status_code == 200, r.text
+    assert r.headers["content-type"] == "application/zip"
+    job_id = r.headers["x-export-job-id"]
+
+    with zipfile.ZipFile(io.BytesIO(r.content)) as archive:
+        names = set(archive.namelist())
+        assert names == {
+            *(f"{deal_id}/{doc}-deal-{deal_id}.pdf" for deal_id in deal_ids for doc in ("bill", "order")),
+            "errors.txt",
+        }
+        assert archive.read(f"{deal_ids[0]}/bill-deal-{deal_ids[0]}.pdf").startswith(b"%PDF")
+        assert "deal 999999" in archive.read("errors.txt").decode()
+    assert convert.await_count == 4
+
+    status_resp = await client.get(f"/api/v1/purchases/deals/documents/export/{job_id}")
+    assert status_resp.status_code == 200, status_resp.text
+    assert status_resp.json()["status"] == "done"
+    assert status_resp.json()["done"] == 4
+    assert status_resp.json()["download_url"] is None
+
+    missing = await client.post("/api/v1/purchases/deals/documents/export", json={"deal_ids": [999999]})
+    assert missing.status_code == 404
+
+
 @pytest.mark.asyncio
 async def test_download_order_docx_success(client: AsyncClient, seeded_context: dict):
     """GET .../documents/order.docx — 200 и docx при наличии шаблона на сервере."""
@@ -0,0 +1,170 @@
+"""Пассивные заявки после поиска транспорта: один upsert на всех перевозчиков."""
+import asyncio
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import delete, event, select
+
+from app.api.authentication.models.user import User
+from app.api.company.models.company import BusinessType, Company, TradeActivity
+from app.api.company.models.fleet import CompanyVehicle
+from app.api.shipments.models import ShipmentRequest
+from app.api.shipments.router import _upsert_passive_requests, send_vehicle_request
+from app.db import base as db_base
+
+CARRIERS = 30
+
+
+def _company(tag: str, index: int, seed: int, carrier: bool) -> Company:
+	return Company(
+		name=f"Upsert {index} {tag}",
+		slug=f"upsert-{index}-{tag}",
+		type="ООО",
+		trade_activity=TradeActivity.CARRIER if carrier else TradeActivity.SELLER,
+		business_type=BusinessType.SERVICES,
+		activity_type="Перевозки",
+		description="Тест",
+		inn=f"{seed:010d}",
+		ogrn=f"{seed:013d}",
+		kpp=f"{seed % 10**9:09d}",
+		country="Россия",
+		federal_district="ЦФО",
+		region="Москва",
+		city="Москва",
+		full_name=f"ООО Upsert {index} {tag}",
+		registration_date=datetime.utcnow(),
+		legal_address="ул. Тест, 1",
+		production_address="ул. Тест, 2",
+		phone="+79000000001",
+		email=f"upsert-{index}-{tag}@example.com",
+		website="https://example.com",
+		is_active=True,
+	)
+
+
+@pytest.fixture
+async def companies():
+	tag = uuid4().hex[:8]
+	seed = 7500000000 + int(tag[:4], 16) % 80000000 * 100
+	async with db_base.AsyncSessionLocal() as session:
+		rows = [_company(tag, i, seed + i, carrier=i > 0) for i in range(CARRIERS + 1)]
+		session.add_all(rows)
+		await session.commit()
+		ids = [row.id for row in rows]
+	yield {"client": ids[0], "carriers": ids[1:]}
+	async with db_base.AsyncSessionLocal() as session:
+		await session.execute(delete(ShipmentRequest).where(ShipmentRequest.client_company_id == ids[0]))
+		await session.execute(delete(Company).where(Company.id.in_(ids)))
+		await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_upsert_creates_then_merges_in_constant_statements(companies):
+	client_id, carriers = companies["client"], companies["carriers"]
+	statements = []
+
+	def _count(conn, cursor, statement, parameters, context, executemany):
+		statements.append(statement)
+
+	engine = db_base.engine.sync_engine
+	event.listen(engine, "before_cursor_execute", _count)
+	try:
+		async with db_base.AsyncSessionLocal() as session:
+			created = await _upsert_passive_requests(
+				session, client_id, {carrier: [carrier * 10] for carrier in carriers}, {"round": 1}
+			)
+		first_round = len(statements)
+		statements.clear()
+		async with db_base.AsyncSessionLocal() as session:
+			# Одна заявка просрочена — её срок продлевается
+			await session.execute(
+				ShipmentRequest.__table__.update()
+				.where(
+					ShipmentRequest.client_company_id == client_id,
+					ShipmentRequest.carrier_company_id == carriers[0],
+				)
+				.values(expires_at=datetime.utcnow() - timedelta(days=1))
+			)
+			await session.commit()
+			statements.clear()
+			updated = await _upsert_passive_requests(
+				session, client_id, {carrier: [carrier * 10 + 1, carrier * 10] for carrier in carriers}, {"round": 2}
+			)
+	finally:
+		event.remove(engine, "before_cursor_execute", _count)
+
+	assert created == (CARRIERS, 0)
+	assert updated == (0, CARRIERS)
+	assert first_round <= 3
+	assert len(statements) <= 3
+
+	async with db_base.AsyncSessionLocal() as session:
+		requests = (await session.execute(
+			select(ShipmentRequest).where(ShipmentRequest.client_company_id == client_id)
+		)).scalars().all()
+	assert len(requests) == CARRIERS
+	for request in requests:
+		base = request.carrier_company_id * 10
+		assert request.matched_vehicle_ids == [base, base + 1]
+		assert request.search_filters == {"round": 2}
+		assert request.status == "passive"
+		assert request.expires_at > datetime.utcnow()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_upserts_merge_vehicle_ids(companies):
+	client_id, carrier = companies["client"], companies["carriers"][0]
+
+	async def search(vehicle_ids):
+		async with db_base.AsyncSessionLocal() as session:
+			return await _upsert_passive_requests(session, client_id, {carrier: vehicle_ids}, {})
+
+	results = await asyncio.gather(search([1, 2]), search([3, 2]), search([4]))
+	assert sorted(results) == [(0, 1), (0, 1), (1, 0)]
+
+	async with db_base.AsyncSessionLocal() as session:
+		request = (await session.execute(
+			select(ShipmentRequest).where(ShipmentRequest.client_company_id == client_id)
+		)).scalar_one()
+	# Ни один поиск не затёр id ТС другого
+	assert sorted(request.matched_vehicle_ids) == [1, 2, 3, 4]
+	assert len(request.matched_vehicle_ids) == 4
+
+
+@pytest.mark.asyncio
+async def test_send_request_twice_reuses_open_request(companies):
+	client_id, carrier = companies["client"], companies["carriers"][0]
+	async with db_base.AsyncSessionLocal() as session:
+		vehicles = [
+			CompanyVehicle(company_id=carrier, name=f"ТС {i}", loading_methods=[], adr_classes=[])
+			for i in range(2)
+		]
+		session.add_all(vehicles)
+		await session.commit()
+		vehicle_ids = [vehicle.id for vehicle in vehicles]
+
+	async def send(vehicle_id):
+		async with db_base.AsyncSessionLocal() as session:
+			return (await send_vehicle_request(vehicle_id, session, User(company_id=client_id))).id
+
+	try:
+		# Двойной клик: обе отправки не нашли открытой заявки — и обе попадают в одну, без IntegrityError
+		first, second = await asyncio.gather(send(vehicle_ids[0]), send(vehicle_ids[0]))
+		assert first == second
+		assert await send(vehicle_ids[1]) == first
+	finally:
+		async with db_base.AsyncSessionLocal() as session:
+			requests = (await session.execute(
+				select(ShipmentRequest).where(ShipmentRequest.client_company_id == client_id)
+			)).scalars().all()
+			await session.execute(delete(ShipmentRequest).where(ShipmentRequest.client_company_id == client_id))
+			await session.execute(delete(CompanyVehicle).where(CompanyVehicle.id.in_(vehicle_ids)))
+			await session.commit()
+
+	assert len(requests) == 1
+	request = requests[0]
+	assert request.id == first
+	assert (request.status, request.is_highlighted) == ("active", True)
+	assert request.matched_vehicle_ids == vehicle_ids
+	assert request.search_filters == {}
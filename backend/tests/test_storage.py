@@ -0,0 +1,130 @@
+"""Хранилище документов: файловый бэкенд и кэш presigned URL."""
+import io
+
+import pytest
+from botocore.exceptions import ClientError
+
+from app.core import s3
+from app.core.storage import FilesystemStorage, S3Storage
+
+
+@pytest.mark.asyncio
+async def test_filesystem_storage_roundtrip(tmp_path):
+	storage = FilesystemStorage(root=tmp_path, chunk_size=4)
+	key = "documents/deals/1/report.txt"
+	data = b"0123456789abcdef"
+
+	await storage.upload_fileobj(key, io.BytesIO(data), "text/plain")
+	assert await storage.exists(key)
+	assert await storage.presigned_download_url(key) is None
+
+	obj = await storage.open(key)
+	chunks = [chunk async for chunk in obj.chunks]
+	assert b"".join(chunks) == data
+	assert len(chunks) == 4
+	assert obj.content_length == len(data)
+	assert obj.content_type == "text/plain"
+
+	assert await storage.delete(key)
+	assert not await storage.exists(key)
+	assert not await storage.delete(key)
+
+
+@pytest.mark.asyncio
+async def test_filesystem_storage_rejects_escaping_keys(tmp_path):
+	storage = FilesystemStorage(root=tmp_path / "root")
+	with pytest.raises(ValueError):
+		await storage.upload_fileobj("../outside.txt", io.BytesIO(b"x"))
+
+
+@pytest.mark.asyncio
+async def test_filesystem_storage_missing_file(tmp_path):
+	storage = FilesystemStorage(root=tmp_path)
+	with pytest.raises(FileNotFoundError):
+		await storage.open("documents/nope.pdf")
+
+
+class FakePresignClient:
+	def __init__(self):
+		self.calls = 0
+
+	def generate_presigned_url(self, operation, Params, ExpiresIn):
+		self.calls += 1
+		return f"https://s3.local/{Params['Key']}?sig={self.calls}"
+
+
+@pytest.fixture
+def fake_presign(monkeypatch):
+	client = FakePresignClient()
+	s3.reset_clients()
+	monkeypatch.setattr(s3, "_client_for_presigned", lambda: client)
+	monkeypatch.setattr(s3, "_bucket", lambda: "documents")
+	monkeypatch.setattr(s3, "_client", lambda: type("C", (), {"delete_object": lambda self, **kw: None})())
+	yield client
+	s3.reset_clients()
+
+
+def test_presigned_url_is_reused_until_refresh_margin(fake_presign, monkeypatch):
+	monkeypatch.setattr(s3.settings, "S3_PRESIGNED_REFRESH_MARGIN", 300)
+	first = s3.get_presigned_download_url("documents/a.pdf", expires_in=3600)
+	second = s3.get_presigned_download_url("documents/a.pdf", expires_in=3600)
+	assert first == second
+	assert fake_presign.calls == 1
+
+	# Ссылка живёт меньше запаса — каждый раз подписывается заново
+	s3.get_presigned_download_url("documents/b.pdf", expires_in=60)
+	s3.get_presigned_download_url("documents/b.pdf", expires_in=60)
+	assert fake_presign.calls == 3
+
+
+def test_delete_forgets_presigned_url(fake_presign):
+	first = s3.get_presigned_download_url("documents/c.pdf", expires_in=3600)
+	s3.delete_document("documents/c.pdf")
+	assert s3.get_presigned_download_url("documents/c.pdf", expires_in=3600) != first
+
+
+@pytest.mark.asyncio
+async def test_s3_storage_missing_key_is_file_not_found(monkeypatch):
+	class MissingClient:
+		def get_object(self, Bucket, Key):
+			raise ClientError(
+				{"Error": {"Code": "NoSuchKey"}, "ResponseMetadata": {"HTTPStatusCode": 404}}, "GetObject"
+			)
+
+	monkeypatch.setattr(s3, "_bucket", lambda: "documents")
+	monkeypatch.setattr(s3, "_client", lambda: MissingClient())
+	with pytest.raises(FileNotFoundError):
+		await S3Storage().open("documents/nope.pdf")
+
+
+class NoBucketClient:
+	"""Первая загрузка падает на отсутствующем бакете, после head/create_bucket проходит."""
+
+	def __init__(self):
+		self.bucket_created = False
+		self.uploaded = []
+
+	def head_bucket(self, Bucket):
+		raise ClientError({"Error": {"Code": "404"}}, "HeadBucket")
+
+	def create_bucket(self, Bucket):
+		self.bucket_created = True
+
+	def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None):
+		if not self.bucket_created:
+			fileobj.read()
+			raise ClientError({"Error": {"Code": "NoSuchBucket"}}, "PutObject")
+		self.uploaded.append((key, fileobj.read()))
+
+
+def test_upload_fileobj_creates_missing_bucket(monkeypatch):
+	client = NoBucketClient()
+	monkeypatch.setattr(s3, "_bucket", lambda: "documents")
+	monkeypatch.setattr(s3, "_client", lambda: client)
+	monkeypatch.setattr(s3.settings, "S3_BUCKET", "documents")
+	monkeypatch.setattr(s3.settings, "S3_ACCESS_KEY", "key")
+	monkeypatch.setattr(s3.settings, "S3_SECRET_KEY", "secret")
+
+	assert s3.upload_fileobj("chat/a.pdf", io.BytesIO(b"payload"), "application/pdf") == "chat/a.pdf"
+	assert client.bucket_created
+	assert client.uploaded == [("chat/a.pdf", b"payload")]
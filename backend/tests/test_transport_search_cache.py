@@ -0,0 +1,174 @@
+"""Общий кэш поиска транспорта: один запрос к БД на одинаковый поиск, свои ТС клиента, сброс при записи."""
+import asyncio
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import delete, select
+
+from app.api.authentication.dependencies import get_current_user
+from app.api.authentication.models.user import User
+from app.api.company.models.company import BusinessType, Company, TradeActivity
+from app.api.company.models.fleet import CompanyVehicle, VehicleRoutePoint
+from app.api.company.repositories.fleet_repository import CompanyVehicleRepository
+from app.api.company.schemas.fleet import CompanyVehicleCreate, CompanyVehicleUpdate
+from app.api.shipments.schemas import TransportSearchFilters
+from app.api.shipments.search_cache import search_cache_key, transport_search_cache
+from app.core.shared_cache import SharedCache
+from app.db.base import AsyncSessionLocal
+from app.main import app
+
+
+def _company(tag: str, index: int, seed: int) -> Company:
+	return Company(
+		name=f"Search cache {index} {tag}",
+		slug=f"search-cache-{index}-{tag}",
+		type="ООО",
+		trade_activity=TradeActivity.CARRIER,
+		business_type=BusinessType.SERVICES,
+		activity_type="Перевозки",
+		description="Тест",
+		inn=f"{seed:010d}",
+		ogrn=f"{seed:013d}",
+		kpp=f"{seed % 10**9:09d}",
+		country="Россия",
+		federal_district="ЦФО",
+		region="Москва",
+		city="Москва",
+		full_name=f"ООО Search cache {index} {tag}",
+		registration_date=datetime.utcnow(),
+		legal_address="ул. Тест, 1",
+		production_address="ул. Тест, 2",
+		phone="+79000000001",
+		email=f"search-cache-{index}-{tag}@example.com",
+		website="https://example.com",
+		is_active=True,
+	)
+
+
+@pytest.fixture
+async def carriers():
+	"""Два перевозчика с одним ТС уникального типа кузова; каждый ищет как клиент."""
+	tag = uuid4().hex[:8]
+	seed = 7800000000 + int(tag[:4], 16) % 80000000
+	body_type = f"Кузов {tag}"
+	async with AsyncSessionLocal() as session:
+		companies = [_company(tag, i, seed + i) for i in range(2)]
+		session.add_all(companies)
+		await session.flush()
+		users = [
+			User(
+				email=f"search-cache-{i}-{tag}@test.local", phone="+79001111111", first_name="Search",
+				last_name="Cache", hashed_password="x", company_id=company.id, is_active=True,
+			)
+			for i, company in enumerate(companies)
+		]
+		session.add_all(users)
+		session.add_all([
+			CompanyVehicle(company_id=company.id, name=f"own {i}", body_type=body_type, loading_methods=[], adr_classes=[])
+			for i, company in enumerate(companies)
+		])
+		await session.commit()
+		state = {
+			"tag": tag,
+			"body_type": body_type,
+			"companies": [company.id for company in companies],
+			"users": [user.id for user in users],
+			"user": users[0].id,
+		}
+
+	async def _current_user():
+		async with AsyncSessionLocal() as session:
+			return await session.get(User, state["user"])
+
+	app.dependency_overrides[get_current_user] = _current_user
+	yield state
+	app.dependency_overrides.pop(get_current_user, None)
+	async with AsyncSessionLocal() as session:
+		vehicle_ids = select(CompanyVehicle.id).where(CompanyVehicle.company_id.in_(state["companies"]))
+		await session.execute(delete(VehicleRoutePoint).where(VehicleRoutePoint.vehicle_id.in_(vehicle_ids)))
+		await session.execute(delete(CompanyVehicle).where(CompanyVehicle.company_id.in_(state["companies"])))
+		await session.execute(delete(User).where(User.id.in_(state["users"])))
+		await session.execute(delete(Company).where(Company.id.in_(state["companies"])))
+		await session.commit()
+
+
+async def _search(client: AsyncClient, body_type: str) -> set:
+	response = await client.post("/api/v1/transport/search", json={"body_types": [body_type]})
+	assert response.status_code == 200, response.text
+	return {item["name"] for item in response.json()["vehicles"]}
+
+
+def test_cache_key_is_canonical():
+	first = TransportSearchFilters(
+		body_types=["Тент", "Рефрижератор"],
+		from_locations=[{"name": "Москва"}, {"name": "Тверь"}],
+	)
+	second = TransportSearchFilters(
+		body_types=["Рефрижератор", "Тент", "Тент"],
+		from_locations=[{"name": "тверь "}, {"name": "МОСКВА"}],
+	)
+	assert search_cache_key(first) == search_cache_key(second)
+	assert search_cache_key(first) != search_cache_key(TransportSearchFilters(body_types=["Тент"]))
+
+
+@pytest.mark.asyncio
+async def test_clients_share_one_load_without_own_vehicles(carriers):
+	misses = transport_search_cache.misses
+	async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+		results = await asyncio.gather(*(_search(client, carriers["body_type"]) for _ in range(5)))
+		assert results == [{"own 1"}] * 5
+		carriers["user"] = carriers["users"][1]
+		assert await _search(client, carriers["body_type"]) == {"own 0"}
+	# Одновременные и повторные поиски разных клиентов — один запрос к БД
+	assert transport_search_cache.misses - misses == 1
+
+
+@pytest.mark.asyncio
+async def test_vehicle_writes_invalidate_search(carriers):
+	other = carriers["companies"][1]
+	async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+		assert await _search(client, carriers["body_type"]) == {"own 1"}
+
+		async with AsyncSessionLocal() as session:
+			repo = CompanyVehicleRepository(session)
+			vehicle = await repo.create(CompanyVehicleCreate(name="new", body_type=carriers["body_type"]), other)
+			vehicle_id = vehicle.id
+		assert await _search(client, carriers["body_type"]) == {"own 1", "new"}
+
+		async with AsyncSessionLocal() as session:
+			await CompanyVehicleRepository(session).update(vehicle_id, CompanyVehicleUpdate(is_active=False))
+		assert await _search(client, carriers["body_type"]) == {"own 1"}
+
+		async with AsyncSessionLocal() as session:
+			await CompanyVehicleRepository(session).update(vehicle_id, CompanyVehicleUpdate(is_active=True))
+		assert await _search(client, carriers["body_type"]) == {"own 1", "new"}
+
+		async with AsyncSessionLocal() as session:
+			await CompanyVehicleRepository(session).delete(vehicle_id)
+		assert await _search(client, carriers["body_type"]) == {"own 1"}
+
+
+@pytest.mark.asyncio
+async def test_one_load_serves_every_worker(shared_redis):
+	# Два воркера: у каждого свой экземпляр кэша и своё процессное поколение, Redis общий
+	workers = [SharedCache(transport_search_cache.namespace, fresh_ttl=60) for _ in range(2)]
+	workers[0]._local_generation, workers[1]._local_generation = "1", "2"
+	calls = 0
+
+	async def loader():
+		nonlocal calls
+		calls += 1
+		return [{"name": "own 1"}]
+
+	key = search_cache_key(TransportSearchFilters(body_types=["Тент"]))
+	assert await workers[0].get_or_load(key, loader) == [{"name": "own 1"}]
+	assert await workers[1].get_or_load(key, loader) == [{"name": "own 1"}]
+	assert calls == 1
+	assert (workers[0].misses, workers[1].hits) == (1, 1)
+
+	# Сброс на одном воркере виден другому
+	await workers[0].invalidate()
+	assert await workers[1].get_or_load(key, loader) == [{"name": "own 1"}]
+	assert calls == 2
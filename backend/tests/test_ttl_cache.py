@@ -0,0 +1,38 @@
+"""Память процесса в ttl_cache: ограничена по числу записей, истёкшие вычищаются."""
+import time
+
+import pytest
+
+from app.core import ttl_cache
+
+
+@pytest.fixture
+def memory(monkeypatch):
+	monkeypatch.setattr(ttl_cache, "_memory", ttl_cache.OrderedDict())
+	monkeypatch.setattr(ttl_cache, "_MEMORY_MAX_ENTRIES", 10)
+	return ttl_cache
+
+
+def test_memory_is_bounded_and_keeps_recent_keys(memory):
+	for i in range(10):
+		memory._mem_set(f"k{i}", i, ttl=60)
+	assert memory._mem_get("k0") == 0  # k0 становится недавним
+	for i in range(10, 25):
+		memory._mem_set(f"k{i}", i, ttl=60)
+
+	assert len(memory._memory) <= 10
+	assert memory._mem_get("k24") == 24
+	assert memory._mem_get("k1") is None
+
+
+def test_sweep_drops_expired_before_live_entries(memory):
+	for i in range(5):
+		memory._mem_set(f"old{i}", i, ttl=60)
+	for key in list(memory._memory):
+		expires, value = memory._memory[key]
+		memory._memory[key] = (time.time() - 1, value)
+	for i in range(6):
+		memory._mem_set(f"live{i}", i, ttl=60)
+
+	assert not any(key.startswith("old") for key in memory._memory)
+	assert [memory._mem_get(f"live{i}") for i in range(6)] == list(range(6))
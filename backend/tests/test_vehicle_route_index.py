@@ -0,0 +1,273 @@
+"""Поиск транспорта по индексу точек маршрута: города, регионы, радиус, без предела кандидатов."""
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import delete, select
+
+from app.api.authentication.dependencies import get_current_user
+from app.api.authentication.models.user import User
+from app.api.common.models import City, Country, FederalDistrict, Region
+from app.api.common.services.gazetteer import gazetteer_store, invalidate_gazetteer
+from app.api.company.models.company import BusinessType, Company, TradeActivity
+from app.api.company.models.fleet import CompanyVehicle, VehicleRoutePoint
+from app.api.company.services.vehicle_routes import reindex_vehicle_routes
+from app.api.shipments.models import ShipmentRequest
+from app.db.base import AsyncSessionLocal
+from app.main import app
+
+FILLER_VEHICLES = 650
+
+
+def _company(tag: str, seed: int, carrier: bool) -> Company:
+	role = "carrier" if carrier else "client"
+	return Company(
+		name=f"Route {role} {tag}",
+		slug=f"route-{role}-{tag}",
+		type="ООО",
+		trade_activity=TradeActivity.CARRIER if carrier else TradeActivity.SELLER,
+		business_type=BusinessType.SERVICES,
+		activity_type="Перевозки",
+		description="Тест",
+		inn=f"{seed:010d}",
+		ogrn=f"{seed:013d}",
+		kpp=f"{seed % 10**9:09d}",
+		country="Россия",
+		federal_district="ЦФО",
+		region="Москва",
+		city="Москва",
+		full_name=f"ООО Route {role} {tag}",
+		registration_date=datetime.utcnow(),
+		legal_address="ул. Тест, 1",
+		production_address="ул. Тест, 2",
+		phone="+79000000001",
+		email=f"route-{role}-{tag}@example.com",
+		website="https://example.com",
+		is_active=True,
+	)
+
+
+@pytest.fixture
+async def route_world():
+	tag = uuid4().hex[:8]
+	seed = 7600000000 + int(tag[:4], 16) % 80000000
+	async with AsyncSessionLocal() as session:
+		country = Country(code=f"V{tag[:4]}", name=f"Страна {tag}", is_active=True)
+		session.add(country)
+		await session.flush()
+		fd = FederalDistrict(country_id=country.id, name=f"Округ {tag}", code=f"FD{tag}", is_active=True)
+		session.add(fd)
+		await session.flush()
+		region = Region(country_id=country.id, federal_district_id=fd.id, name=f"Область {tag}", code=f"RG{tag}", is_active=True)
+		session.add(region)
+		await session.flush()
+
+		def city(name, latitude, longitude):
+			return City(
+				country_id=country.id, region_id=region.id, federal_district_id=fd.id, name=f"{name} {tag}",
+				latitude=latitude, longitude=longitude, is_active=True,
+			)
+
+		start, nearby, finish = city("Старт", 55.0, 37.0), city("Соседний", 55.3, 37.2), city("Финиш", 59.0, 30.0)
+		session.add_all([start, nearby, finish])
+		client, carrier = _company(tag, seed, False), _company(tag, seed + 1, True)
+		session.add_all([client, carrier])
+		await session.flush()
+		user = User(
+			email=f"route-{tag}@test.local", phone="+79001111111", first_name="Route", last_name="Test",
+			hashed_password="x", company_id=client.id, is_active=True,
+		)
+		session.add(user)
+		await session.commit()
+		ids = {
+			"tag": tag,
+			"country": country.id,
+			"fd": fd.id,
+			"region": region.id,
+			"cities": {"start": start.id, "nearby": nearby.id, "finish": finish.id},
+			"client": client.id,
+			"carrier": carrier.id,
+			"user": user.id,
+		}
+	await invalidate_gazetteer()
+	await gazetteer_store.get()
+
+	async def _current_user():
+		async with AsyncSessionLocal() as session:
+			return await session.get(User, ids["user"])
+
+	app.dependency_overrides[get_current_user] = _current_user
+	yield ids
+	app.dependency_overrides.pop(get_current_user, None)
+	async with AsyncSessionLocal() as session:
+		vehicle_ids = select(CompanyVehicle.id).where(CompanyVehicle.company_id == ids["carrier"])
+		await session.execute(delete(VehicleRoutePoint).where(VehicleRoutePoint.vehicle_id.in_(vehicle_ids)))
+		await session.execute(delete(CompanyVehicle).where(CompanyVehicle.company_id == ids["carrier"]))
+		await session.execute(delete(ShipmentRequest).where(ShipmentRequest.client_company_id == ids["client"]))
+		await session.execute(delete(User).where(User.id == ids["user"]))
+		await session.execute(delete(Company).where(Company.id.in_([ids["client"], ids["carrier"]])))
+		await session.execute(delete(City).where(City.id.in_(ids["cities"].values())))
+		await session.execute(delete(Region).where(Region.id == ids["region"]))
+		await session.execute(delete(FederalDistrict).where(FederalDistrict.id == ids["fd"]))
+		await session.execute(delete(Country).where(Country.id == ids["country"]))
+		await session.commit()
+	await invalidate_gazetteer()
+
+
+def _vehicle(carrier_id: int, name: str, from_names, to_names, loading=("Задняя",)) -> CompanyVehicle:
+	return CompanyVehicle(
+		company_id=carrier_id,
+		name=name,
+		body_type="Тентованный",
+		capacity_tons=20,
+		volume_m3=80,
+		loading_methods=list(loading),
+		adr_classes=[],
+		from_locations=[{"name": value} for value in from_names],
+		to_locations=[{"name": value} for value in to_names],
+	)
+
+
+async def _search(client: AsyncClient, **filters) -> set:
+	response = await client.post("/api/v1/transport/search", json={"body_types": ["Тентованный"], **filters})
+	assert response.status_code == 200, response.text
+	return {item["name"] for item in response.json()["vehicles"]}
+
+
+@pytest.mark.asyncio
+async def test_route_points_resolve_cities_and_regions(route_world):
+	tag = route_world["tag"]
+	async with AsyncSessionLocal() as session:
+		session.add_all([
+			_vehicle(route_world["carrier"], "city", [f"старт {tag}"], [f"Финиш {tag}"]),
+			_vehicle(route_world["carrier"], "region", [f"Область {tag}"], [f"Финиш {tag}"]),
+			_vehicle(route_world["carrier"], "nearby", [f"Соседний {tag}"], [f"Финиш {tag}"]),
+			_vehicle(route_world["carrier"], "unknown", [f"Деревня {tag}"], [f"Финиш {tag}"]),
+		])
+		await session.commit()
+		points = (await session.execute(
+			select(VehicleRoutePoint.direction, VehicleRoutePoint.city_id, VehicleRoutePoint.region_id)
+			.join(CompanyVehicle, CompanyVehicle.id == VehicleRoutePoint.vehicle_id)
+			.where(CompanyVehicle.company_id == route_world["carrier"], CompanyVehicle.name == "city")
+		)).all()
+	cities = route_world["cities"]
+	assert sorted(points) == [
+		("from", cities["start"], route_world["region"]),
+		("to", cities["finish"], route_world["region"]),
+	]
+
+	async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+		to = [{"name": f"Финиш {tag}"}]
+		# Город: само ТС из города и ТС «по всему региону»
+		assert await _search(client, from_locations=[{"name": f"Старт {tag}"}], to_locations=to) == {"city", "region"}
+		# Регион: все ТС из его городов
+		assert await _search(client, from_locations=[{"name": f"область {tag}"}], to_locations=to) == {
+			"city", "region", "nearby",
+		}
+		# Радиус: соседний город в ~35 км
+		assert await _search(
+			client, from_locations=[{"city_id": cities["start"], "name": ""}], to_locations=to, radius_km=50,
+		) == {"city", "region", "nearby"}
+		# Нераспознанное название сравнивается как есть
+		assert await _search(client, from_locations=[{"name": f"деревня {tag}"}], to_locations=to) == {"unknown"}
+		# Из Финиша едет только ТС «по всему региону»
+		assert await _search(client, from_locations=[{"name": f"Финиш {tag}"}], to_locations=to) == {"region"}
+
+
+@pytest.mark.asyncio
+async def test_search_has_no_candidate_cap(route_world):
+	tag = route_world["tag"]
+	route = ([f"Старт {tag}"], [f"Финиш {tag}"])
+	async with AsyncSessionLocal() as session:
+		session.add_all([
+			_vehicle(route_world["carrier"], f"filler {i}", *route, loading=("Боковая",))
+			for i in range(FILLER_VEHICLES)
+		])
+		await session.commit()
+		session.add(_vehicle(route_world["carrier"], "target", *route))
+		await session.commit()
+
+	async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+		found = await _search(
+			client,
+			loading_methods=["Задняя"],
+			from_locations=[{"name": f"Старт {tag}"}],
+			to_locations=[{"name": f"Финиш {tag}"}],
+		)
+	assert found == {"target"}
+
+
+@pytest.mark.asyncio
+async def test_reindex_attaches_ids_to_name_only_points(route_world):
+	tag = route_world["tag"]
+	async with AsyncSessionLocal() as session:
+		vehicle = _vehicle(route_world["carrier"], "stale", [f"Старт {tag}"], [f"Финиш {tag}"])
+		session.add(vehicle)
+		await session.commit()
+		# Точки, записанные без справочника
+		await session.execute(
+			VehicleRoutePoint.__table__.update()
+			.where(VehicleRoutePoint.vehicle_id == vehicle.id)
+			.values(city_id=None, region_id=None)
+		)
+		await session.commit()
+
+	assert await reindex_vehicle_routes() >= 1
+	async with AsyncSessionLocal() as session:
+		city_ids = set((await session.execute(
+			select(VehicleRoutePoint.city_id).where(VehicleRoutePoint.vehicle_id == vehicle.id)
+		)).scalars())
+	assert city_ids == {route_world["cities"]["start"], route_world["cities"]["finish"]}
+
+
+@pytest.mark.asyncio
+async def test_city_id_does_not_match_same_named_city(route_world):
+	tag = route_world["tag"]
+	async with AsyncSessionLocal() as session:
+		twin = City(
+			country_id=route_world["country"], region_id=route_world["region"], federal_district_id=route_world["fd"],
+			name=f"Старт {tag}", latitude=45.0, longitude=20.0, is_active=True,
+		)
+		session.add(twin)
+		await session.commit()
+		route_world["cities"]["twin"] = twin.id
+	await invalidate_gazetteer()
+	await gazetteer_store.get()
+	async with AsyncSessionLocal() as session:
+		session.add_all([
+			CompanyVehicle(
+				company_id=route_world["carrier"], name=name, body_type="Тентованный", capacity_tons=20, volume_m3=80,
+				loading_methods=["Задняя"], adr_classes=[],
+				from_locations=[{"name": f"Старт {tag}", "city_id": city_id}], to_locations=[{"name": f"Финиш {tag}"}],
+			)
+			for name, city_id in (("start", route_world["cities"]["start"]), ("twin", twin.id))
+		])
+		await session.commit()
+
+	async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+		to = [{"name": f"Финиш {tag}"}]
+		start = {"city_id": route_world["cities"]["start"], "name": f"Старт {tag}"}
+		assert await _search(client, from_locations=[start], to_locations=to) == {"start"}
+		# Без id название относится к обоим городам
+		assert await _search(client, from_locations=[{"name": f"Старт {tag}"}], to_locations=to) == {"start", "twin"}
+
+
+@pytest.mark.asyncio
+async def test_free_text_points_match_by_substring(route_world):
+	tag = route_world["tag"]
+	async with AsyncSessionLocal() as session:
+		session.add_all([
+			_vehicle(route_world["carrier"], "free", [f"Старт {tag} и область"], [f"Финиш {tag}"]),
+			_vehicle(route_world["carrier"], "short", ["ст"], [f"Финиш {tag}"]),
+		])
+		await session.commit()
+
+	async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+		to = [{"name": f"Финиш {tag}"}]
+		# Распознанный город из запроса находит и свободный текст ТС с его названием
+		assert await _search(client, from_locations=[{"name": f"Старт {tag}"}], to_locations=to) == {"free"}
+		assert await _search(
+			client, from_locations=[{"city_id": route_world["cities"]["start"], "name": ""}], to_locations=to,
+		) == {"free"}
+		assert await _search(client, from_locations=[{"name": f"Финиш {tag}"}], to_locations=to) == set()